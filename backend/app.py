@@ -1,4 +1,19 @@
-from flask import Flask, request, jsonify, send_file, make_response
+"""
+Aplicación principal Flask del sistema POS / facturación electrónica
+
+La aplicación se construye con `create_app()`: los blueprints de dominio se
+importan y registran dentro de la fábrica y la preparación de la BD se reduce
+a verificar `PRAGMA user_version`. Los datos iniciales solo se insertan en el
+primer arranque (o con `python3 datos_iniciales.py`). Cada arranque deja un
+reporte de tiempos en `tiempos_arranque` (visible en /health).
+"""
+
+import time
+_inicio_importacion = time.perf_counter()
+
+import importlib
+from contextlib import contextmanager
+from flask import Flask, Blueprint, request, jsonify, send_file, make_response
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -10,22 +25,40 @@ import base64
 import json
 from io import BytesIO
 from dotenv import load_dotenv
-from csrf import generate_csrf_token, validate_csrf_token
-from notificaciones import NotificadorPedidos, registrar_socketio_handlers
+import csrf
+from csrf import generate_csrf_token, validate_csrf_token, inject_token_into_json
+from notificaciones import NotificadorPedidos, conectar_bus, registrar_socketio_handlers
+from bus_eventos import opciones_socketio
+from database import liberar_unidad_de_trabajo, registrar_unidad_de_trabajo
+from auth import role_required, set_limiter, login_required
 
 load_dotenv()
 
-app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY', 'pupuseria-secret-key-2024')
-CORS(app, supports_credentials=True)
+# Reporte de tiempos del último arranque (ms por etapa)
+tiempos_arranque = {
+    'dependencias': round((time.perf_counter() - _inicio_importacion) * 1000, 1)
+}
+
+# Blueprints de dominio: (módulo, blueprint, prefijo). Se importan en create_app()
+BLUEPRINTS = (
+    ('auth', 'auth_bp', '/api/auth'),
+    ('pos', 'pos_bp', '/api/pos'),
+    ('inventario', 'inventario_bp', '/api/inventario'),
+    ('clientes', 'clientes_bp', '/api/clientes'),
+)
+
+# Rutas propias de app.py (salud, Digifact, notificaciones, imágenes)
+core_bp = Blueprint('core', __name__)
 
 # Inicializar WebSocket con Socket.IO (para notificaciones en tiempo real)
+# Con NOTIF_BUS=sqlite los emits se reparten entre workers (ver bus_eventos.py)
+# servidor.py usa SOCKETIO_ASYNC_MODE=gevent; `python app.py` queda con hilos
 socketio = SocketIO(
-    app,
     cors_allowed_origins="*",
     ping_timeout=60,
     ping_interval=25,
-    async_mode='threading'
+    async_mode=os.getenv('SOCKETIO_ASYNC_MODE', 'threading'),
+    **opciones_socketio()
 )
 
 # Registrar handlers de Socket.IO
@@ -35,22 +68,123 @@ registrar_socketio_handlers(socketio)
 # Límites altos porque un POS hace muchas peticiones legítimas
 # Aumentados para evitar 429 durante supervisión activa del manager
 limiter = Limiter(
-    app=app,
     key_func=get_remote_address,
     default_limits=["100000 per day", "10000 per hour", "500 per minute"],
     storage_uri="memory://"
 )
 
-# Registrar Blueprint de Autenticación
-from auth import auth_bp, init_auth_db, role_required, set_limiter, login_required
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-
 # Pasar el limiter a auth.py para rate limiting en login
 set_limiter(limiter)
 
+
+@contextmanager
+def _medir(etapa):
+    """Registra en tiempos_arranque la duración de una etapa"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tiempos_arranque[etapa] = round((time.perf_counter() - inicio) * 1000, 1)
+
+
+def preparar_bases_de_datos():
+    """
+    Aplica migraciones pendientes (camino rápido: solo lee user_version).
+    Si se acaba de crear el esquema, inserta los datos iniciales.
+    """
+    from migraciones import BASES_DE_DATOS, aplicar_migraciones
+
+    esquema_nuevo = False
+    with _medir('migraciones'):
+        for db_file in BASES_DE_DATOS:
+            if 1 in aplicar_migraciones(db_file):
+                esquema_nuevo = True
+
+    if esquema_nuevo:
+        from datos_iniciales import sembrar_datos_iniciales
+        with _medir('datos_iniciales'):
+            sembrar_datos_iniciales()
+
+
+def create_app():
+    """Construye la aplicación Flask con sus blueprints y extensiones"""
+    inicio = time.perf_counter()
+
+    app = Flask(__name__)
+    app.secret_key = os.getenv('SECRET_KEY', 'pupuseria-secret-key-2024')
+    CORS(app, supports_credentials=True, expose_headers=['X-CSRF-Token'])
+
+    # Una conexión y una transacción por petición HTTP (ver database.py)
+    registrar_unidad_de_trabajo(app)
+
+    socketio.init_app(app)
+    limiter.init_app(app)
+
+    app.before_request(csrf_protect)
+    app.after_request(add_csrf_token)
+
+    preparar_bases_de_datos()
+
+    blueprints = []
+    for modulo, nombre_bp, prefijo in BLUEPRINTS:
+        with _medir(f'import_{modulo}'):
+            blueprints.append((getattr(importlib.import_module(modulo), nombre_bp), prefijo))
+
+    with _medir('registro_rutas'):
+        for blueprint, prefijo in blueprints:
+            app.register_blueprint(blueprint, url_prefix=prefijo)
+        app.register_blueprint(core_bp)
+
+    # Pasar la instancia de socketio a pos.py para notificaciones
+    importlib.import_module('pos').init_socketio(socketio)
+
+    # Barrido periódico de sesiones vencidas (ver barrido_sesiones.py)
+    from barrido_sesiones import barrido_sesiones
+    barrido_sesiones.iniciar()
+
+    # Eventos de polling de otros workers (ver bus_eventos.py)
+    conectar_bus()
+
+    # Pedidos activos en memoria para colas y mesas (ver indice_pedidos.py)
+    with _medir('indice_pedidos'):
+        from indice_pedidos import indice_pedidos
+        indice_pedidos.cargar()
+
+    # Menú serializado en memoria (ver cache_menu.py)
+    with _medir('cache_menu'):
+        from cache_menu import cache_menu
+        cache_menu.obtener('productos')
+
+    tiempos_arranque['create_app'] = round((time.perf_counter() - inicio) * 1000, 1)
+    tiempos_arranque['total'] = round(tiempos_arranque['dependencias'] + tiempos_arranque['create_app'], 1)
+    return app
+
+
+def reporte_arranque():
+    """Retorna el reporte de tiempos de arranque en una línea"""
+    etapas = ', '.join(f'{etapa} {ms} ms' for etapa, ms in tiempos_arranque.items() if etapa != 'total')
+    return f"[ARRANQUE] total {tiempos_arranque.get('total', 0)} ms ({etapas})"
+
+
+_app = None
+
+
+def obtener_app():
+    """Retorna la aplicación del proceso, creándola en el primer uso"""
+    global _app
+    if _app is None:
+        _app = create_app()
+    return _app
+
+
+def __getattr__(nombre):
+    # `from app import app` sigue funcionando: la app se crea al pedirla
+    if nombre == 'app':
+        return obtener_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
 # ============ CSRF PROTECTION ============
 
-@app.before_request
 def csrf_protect():
     """
     Validates CSRF token for state-changing requests (POST, PUT, DELETE).
@@ -78,11 +212,11 @@ def csrf_protect():
             return jsonify({"error": f"CSRF validation failed: {message}"}), 403
 
 
-@app.after_request
 def add_csrf_token(response):
     """
     Adds a new CSRF token to every response.
-    Token is included in response header and JSON body if applicable.
+    Token is always sent in the X-CSRF-Token header. With CSRF_MODE=body it
+    is also spliced into JSON object bodies without re-serialising them.
     """
     # Generate a new CSRF token
     token = generate_csrf_token()
@@ -90,37 +224,17 @@ def add_csrf_token(response):
     # Add token to response header
     response.headers['X-CSRF-Token'] = token
 
-    # If response is JSON, try to include token in body
+    if csrf.CSRF_MODE == 'header' or response.direct_passthrough or response.is_streamed:
+        return response
+
+    # If response is JSON, include token in object bodies
     if response.content_type and 'application/json' in response.content_type:
-        try:
-            data = json.loads(response.get_data(as_text=True))
-            if isinstance(data, dict):
-                data['_csrf_token'] = token
-                response.set_data(json.dumps(data))
-        except Exception:
-            # If response is not valid JSON, just use header
-            pass
+        body = inject_token_into_json(response.get_data(), token)
+        if body is not None:
+            response.set_data(body)
 
     return response
 
-# Registrar Blueprint del POS
-from pos import pos_bp, init_socketio
-app.register_blueprint(pos_bp, url_prefix='/api/pos')
-
-# Pasar la instancia de socketio a pos.py para notificaciones
-init_socketio(socketio)
-
-# Registrar Blueprint de Inventario
-from inventario import inventario_bp
-app.register_blueprint(inventario_bp, url_prefix='/api/inventario')
-
-# Registrar Blueprint de Clientes
-from clientes import clientes_bp
-app.register_blueprint(clientes_bp, url_prefix='/api/clientes')
-
-# Inicializar base de datos de autenticación
-init_auth_db()
-
 class DigifactClient:
     def __init__(self):
         self.base_url = os.getenv('DIGIFACT_URL', 'https://felgttestaws.digifact.com.sv')
@@ -391,14 +505,34 @@ class DigifactClient:
 # Instancia global del cliente
 digifact = DigifactClient()
 
-@app.route('/health', methods=['GET'])
+@core_bp.route('/health', methods=['GET'])
 @role_required('manager')
 def health():
     """Endpoint de salud (protegido: solo `manager`)"""
-    return jsonify({"status": "ok", "timestamp": datetime.now().isoformat()})
-
-
-@app.route('/healthz', methods=['GET'])
+    from database import obtener_estadisticas_pool, obtener_estadisticas_escritura
+    from cache_sesiones import obtener_estadisticas_cache_sesiones
+    from tokens_sesion import lista_revocacion, modo_tokens
+    from contrasenas import obtener_estadisticas_hash
+    from barrido_sesiones import barrido_sesiones
+    from indice_pedidos import indice_pedidos
+    from cache_menu import cache_menu
+    return jsonify({
+        "status": "ok",
+        "timestamp": datetime.now().isoformat(),
+        "db_pool": obtener_estadisticas_pool(),
+        "db_escritura": obtener_estadisticas_escritura(),
+        "cache_sesiones": obtener_estadisticas_cache_sesiones(),
+        "tokens": {"modo": modo_tokens(), "revocaciones": lista_revocacion.estadisticas()},
+        "hash_contrasenas": obtener_estadisticas_hash(),
+        "sesiones": barrido_sesiones.estadisticas(),
+        "notificaciones": NotificadorPedidos.obtener_estadisticas_polling(),
+        "indice_pedidos": indice_pedidos.estadisticas(),
+        "cache_menu": cache_menu.estadisticas(),
+        "arranque": tiempos_arranque
+    })
+
+
+@core_bp.route('/healthz', methods=['GET'])
 def healthz():
     """Public health endpoint for CI / load balancers."""
     # Intentar obtener información de commit/version desde variables de entorno
@@ -433,7 +567,7 @@ def healthz():
     }
     return jsonify(payload)
 
-@app.route('/api/auth/test', methods=['POST'])
+@core_bp.route('/api/auth/test', methods=['POST'])
 def test_auth():
     """Prueba credenciales y conexión"""
     try:
@@ -446,7 +580,7 @@ def test_auth():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 401
 
-@app.route('/api/certificar', methods=['POST'])
+@core_bp.route('/api/certificar', methods=['POST'])
 def certificar():
     """Certifica DTE desde archivo XML"""
     try:
@@ -467,7 +601,7 @@ def certificar():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@app.route('/api/certificar-json', methods=['POST'])
+@core_bp.route('/api/certificar-json', methods=['POST'])
 def certificar_json():
     """
     Certifica DTE desde JSON estructurado (formato Digifact)
@@ -526,7 +660,7 @@ def certificar_json():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/anular', methods=['POST'])
+@core_bp.route('/api/anular', methods=['POST'])
 def anular():
     """Anula DTE certificado"""
     try:
@@ -550,7 +684,7 @@ def anular():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/consultar', methods=['GET'])
+@core_bp.route('/api/consultar', methods=['GET'])
 def consultar():
     """Consulta información de DTE"""
     try:
@@ -570,7 +704,7 @@ def consultar():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/download/pdf', methods=['POST'])
+@core_bp.route('/api/download/pdf', methods=['POST'])
 def download_pdf():
     """Descarga PDF desde base64"""
     try:
@@ -593,7 +727,7 @@ def download_pdf():
 
 # ============ NOTIFICACIONES EN TIEMPO REAL ============
 
-@app.route('/api/notificaciones/polling/<rol>', methods=['GET'])
+@core_bp.route('/api/notificaciones/polling/<rol>', methods=['GET'])
 @login_required
 def obtener_notificaciones_polling(rol):
     """
@@ -601,34 +735,61 @@ def obtener_notificaciones_polling(rol):
     Retorna eventos pendientes para el rol del usuario
 
     Parámetro:
-        rol: Rol del usuario (cocina, meseros, etc.)
+        rol: Rol del usuario (cocinero, mesero, etc.) o canal (cocina, meseros, etc.)
+
+    Query params:
+        since: último `seq` recibido; solo se devuelven eventos posteriores.
+               Sin él se devuelven los eventos de los últimos 5 minutos.
+        wait:  segundos (con `since`): long polling. Si no hay eventos nuevos
+               la petición espera hasta que llegue uno o venza el plazo
+               (máximo NOTIF_LONGPOLL_ESPERA_MAX).
 
     Respuesta:
         {
             "eventos": [
                 {
                     "tipo": "nuevo_pedido|pedido_listo|cambio_estado|...",
+                    "seq": int,
                     "datos": {...},
                     "timestamp": "ISO-8601"
                 },
                 ...
             ],
+            "ultimo_seq": int,   # enviar como `since` en el siguiente polling
+            "perdidos": bool,    # hubo eventos descartados: recargar el estado completo
+            "saturado": bool,    # long polling no disponible: reintentar con el intervalo normal
             "timestamp": "ISO-8601"
         }
     """
+    since = request.args.get('since')
+    wait = request.args.get('wait')
     try:
-        eventos = NotificadorPedidos.obtener_eventos_pendientes(rol)
+        since = int(since) if since is not None else None
+        wait = float(wait) if wait is not None else 0
+    except ValueError:
+        return jsonify({"error": "since debe ser un entero y wait un número de segundos"}), 400
+
+    try:
+        if since is not None and wait > 0:
+            # No retener conexiones del pool mientras la petición espera
+            liberar_unidad_de_trabajo()
+            resultado = NotificadorPedidos.esperar_eventos(rol, since, wait)
+        else:
+            resultado = NotificadorPedidos.obtener_eventos_pendientes(rol, since)
 
         return jsonify({
-            "eventos": eventos,
+            "eventos": resultado["eventos"],
+            "ultimo_seq": resultado["ultimo_seq"],
+            "perdidos": resultado["perdidos"],
+            "saturado": resultado.get("saturado", False),
             "timestamp": datetime.now().isoformat(),
-            "total": len(eventos)
+            "total": len(resultado["eventos"])
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/api/notificaciones/estado', methods=['GET'])
+@core_bp.route('/api/notificaciones/estado', methods=['GET'])
 @role_required(['manager'])
 def obtener_estado_notificaciones():
     """
@@ -650,7 +811,7 @@ def obtener_estado_notificaciones():
 
 # ============ SERVIR IMÁGENES ============
 
-@app.route('/uploads/<path:filename>')
+@core_bp.route('/uploads/<path:filename>')
 def serve_image(filename):
     """Sirve imágenes de productos y combos"""
     try:
@@ -665,6 +826,10 @@ def serve_image(filename):
 
 
 if __name__ == '__main__':
+    # Modo desarrollo (debug, un hilo por conexión); en producción: servidor.py
+    app = create_app()
+    print(reporte_arranque())
+
     # Usar socketio.run() para soporte WebSocket
     socketio.run(
         app,
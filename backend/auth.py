@@ -4,14 +4,24 @@ Maneja usuarios, roles y sesiones
 """
 
 from flask import Blueprint, request, jsonify, session
-import hashlib
+import os
 import secrets
 from datetime import datetime, timedelta
 from functools import wraps
 from database import get_db_inventory as get_db
+from migraciones import aplicar_migraciones
+from cache_sesiones import cache_sesiones
+from contrasenas import hash_password, necesita_rehash, verify_password
+from csrf import bind_session
+from tokens_sesion import (DURACION_SESION, emitir_token, es_jti, es_token_firmado,
+                           leer_token, modo_tokens, revocar_jti, revocar_token, revocar_usuario,
+                           verificar_token)
 
 auth_bp = Blueprint('auth', __name__)
 
+# Sesiones abiertas como máximo por usuario (0 = sin límite)
+AUTH_MAX_SESIONES_USUARIO = int(os.getenv('AUTH_MAX_SESIONES_USUARIO', '10'))
+
 # El limiter se inyecta desde app.py después de la inicialización
 limiter = None
 
@@ -32,22 +42,6 @@ def rate_limit_login(f):
 
     return decorated
 
-def hash_password(password, salt=None):
-    """Hash password with salt"""
-    if salt is None:
-        salt = secrets.token_hex(16)
-    hashed = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
-    return salt + ':' + hashed.hex()
-
-def verify_password(password, stored_hash):
-    """Verify password against stored hash"""
-    try:
-        salt, hash_value = stored_hash.split(':')
-        new_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
-        return new_hash.hex() == hash_value
-    except (ValueError, AttributeError, TypeError):
-        return False
-
 def validar_contrasena(password):
     """
     Valida que la contraseña cumpla con requisitos de seguridad
@@ -80,50 +74,12 @@ def validar_contrasena(password):
     return True, ""
 
 def init_auth_db():
-    """Inicializa las tablas de autenticación"""
+    """Aplica las migraciones de pos_database.db y crea el manager inicial"""
+    aplicar_migraciones('pos_database.db')
+
     conn = get_db()
     cursor = conn.cursor()
 
-    # Tabla de usuarios
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            nombre TEXT NOT NULL,
-            rol TEXT NOT NULL CHECK(rol IN ('manager', 'mesero', 'cajero', 'cocinero')),
-            activo INTEGER DEFAULT 1,
-            ultimo_login TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            created_by INTEGER,
-            FOREIGN KEY (created_by) REFERENCES usuarios(id)
-        )
-    ''')
-
-    # Tabla de sesiones
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sesiones (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            usuario_id INTEGER NOT NULL,
-            token TEXT UNIQUE NOT NULL,
-            expires_at TEXT NOT NULL,
-            ip_address TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
-        )
-    ''')
-
-    # ============ ÍNDICES PARA OPTIMIZAR CONSULTAS ============
-    # Índices en usuarios
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_username ON usuarios(username)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_activo ON usuarios(activo)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_rol ON usuarios(rol)')
-
-    # Índices en sesiones
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sesiones_usuario_id ON sesiones(usuario_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sesiones_token ON sesiones(token)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sesiones_expires_at ON sesiones(expires_at)')
-
     # Crear usuario manager por defecto si no existe
     cursor.execute('SELECT COUNT(*) FROM usuarios WHERE rol = "manager"')
     if cursor.fetchone()[0] == 0:
@@ -146,6 +102,39 @@ def init_auth_db():
     conn.commit()
     conn.close()
 
+def limitar_sesiones_usuario(conn, usuario_id, maximo=None):
+    """
+    Cierra las sesiones más antiguas de un usuario por encima del máximo.
+    No hace commit.
+
+    Returns:
+        int: Cantidad de sesiones cerradas
+    """
+    maximo = AUTH_MAX_SESIONES_USUARIO if maximo is None else maximo
+    if maximo <= 0:
+        return 0
+
+    sobrantes = conn.execute('''
+        SELECT token, expires_at FROM sesiones
+        WHERE usuario_id = ?
+        ORDER BY id DESC
+        LIMIT -1 OFFSET ?
+    ''', (usuario_id, maximo)).fetchall()
+
+    for token, expires_at in sobrantes:
+        conn.execute('DELETE FROM sesiones WHERE token = ?', (token,))
+        cache_sesiones.invalidar_token(token)
+        if es_jti(token):
+            # Sesión firmada: el token sigue valiendo hasta revocar su jti.
+            # Un token opaco deja de valer al borrar la fila.
+            try:
+                vence = int(datetime.fromisoformat(expires_at).timestamp())
+            except (TypeError, ValueError):
+                vence = int((datetime.now() + timedelta(seconds=DURACION_SESION)).timestamp())
+            revocar_jti(conn, token, usuario_id, vence)
+
+    return len(sobrantes)
+
 # Decorador para requerir autenticación
 def login_required(f):
     @wraps(f)
@@ -157,20 +146,35 @@ def login_required(f):
         if not token:
             return jsonify({'error': 'No autorizado', 'code': 'NO_TOKEN'}), 401
 
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT u.* FROM usuarios u
-            JOIN sesiones s ON u.id = s.usuario_id
-            WHERE s.token = ? AND s.expires_at > datetime('now') AND u.activo = 1
-        ''', (token,))
-        user = cursor.fetchone()
-        conn.close()
+        if es_token_firmado(token):
+            # Token firmado: se verifica sin consultar la BD (ver tokens_sesion.py)
+            user = verificar_token(token)
+            if user is None:
+                return jsonify({'error': 'Sesión inválida o expirada', 'code': 'INVALID_SESSION'}), 401
+            request.current_user = user
+            return f(*args, **kwargs)
+
+        user = cache_sesiones.obtener(token)
+        if user is None:
+            conn = get_db()
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT u.*,
+                       (julianday(s.expires_at) - julianday('now')) * 86400 AS segundos_restantes
+                FROM usuarios u
+                JOIN sesiones s ON u.id = s.usuario_id
+                WHERE s.token = ? AND s.expires_at > datetime('now') AND u.activo = 1
+            ''', (token,))
+            row = cursor.fetchone()
+            conn.close()
+
+            if not row:
+                return jsonify({'error': 'Sesión inválida o expirada', 'code': 'INVALID_SESSION'}), 401
 
-        if not user:
-            return jsonify({'error': 'Sesión inválida o expirada', 'code': 'INVALID_SESSION'}), 401
+            user = dict(row)
+            cache_sesiones.guardar(token, user, user.pop('segundos_restantes'))
 
-        request.current_user = dict(user)
+        request.current_user = user
         return f(*args, **kwargs)
     return decorated_function
 
@@ -209,19 +213,39 @@ def login():
         conn.close()
         return jsonify({'error': 'Usuario o contraseña incorrectos'}), 401
 
+    # Regenerar hashes legados o con menos iteraciones que las configuradas.
+    # El PBKDF2 se calcula antes de la primera escritura: así no retiene el
+    # bloqueo de escritura de la BD de auth mientras corre.
+    nuevo_hash = hash_password(password) if necesita_rehash(user['password_hash']) else None
+
     # Crear token de sesión
-    token = secrets.token_urlsafe(32)
-    expires_at = (datetime.now() + timedelta(hours=12)).isoformat()
+    expires_at = (datetime.now() + timedelta(seconds=DURACION_SESION)).isoformat()
     ip_address = request.remote_addr
 
+    if modo_tokens() == 'firmado':
+        # En `sesiones` queda el jti como registro de auditoría
+        token, claims = emitir_token(user)
+        token_sesion = claims['jti']
+    else:
+        token = secrets.token_urlsafe(32)
+        token_sesion = token
+
     cursor.execute('''
         INSERT INTO sesiones (usuario_id, token, expires_at, ip_address)
         VALUES (?, ?, ?, ?)
-    ''', (user['id'], token, expires_at, ip_address))
+    ''', (user['id'], token_sesion, expires_at, ip_address))
+
+    # Cerrar las sesiones más antiguas si se supera el máximo por usuario
+    limitar_sesiones_usuario(conn, user['id'])
 
     # Actualizar último login
     cursor.execute('UPDATE usuarios SET ultimo_login = datetime("now") WHERE id = ?', (user['id'],))
 
+    # Solo si la contraseña no cambió entre la lectura y esta escritura
+    if nuevo_hash:
+        cursor.execute('UPDATE usuarios SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                       (nuevo_hash, user['id'], user['password_hash']))
+
     conn.commit()
     conn.close()
 
@@ -237,7 +261,10 @@ def login():
     })
 
     # También establecer cookie
-    response.set_cookie('session_token', token, httponly=True, max_age=43200)
+    response.set_cookie('session_token', token, httponly=True, max_age=DURACION_SESION)
+
+    # El token CSRF de esta respuesta se vincula a la nueva sesión
+    bind_session(token)
 
     return response
 
@@ -248,15 +275,25 @@ def logout():
     if not token:
         token = request.cookies.get('session_token')
 
-    if token:
+    if token and es_token_firmado(token):
+        claims = leer_token(token)
+        if claims:
+            conn = get_db()
+            revocar_token(conn, claims)
+            conn.execute('DELETE FROM sesiones WHERE token = ?', (claims['jti'],))
+            conn.commit()
+            conn.close()
+    elif token:
         conn = get_db()
         cursor = conn.cursor()
         cursor.execute('DELETE FROM sesiones WHERE token = ?', (token,))
         conn.commit()
         conn.close()
+        cache_sesiones.invalidar_token(token)
 
     response = jsonify({'success': True, 'mensaje': 'Sesión cerrada'})
     response.delete_cookie('session_token')
+    bind_session('')
     return response
 
 @auth_bp.route('/me', methods=['GET'])
@@ -303,6 +340,7 @@ def cambiar_password():
 
     conn.commit()
     conn.close()
+    cache_sesiones.invalidar_usuario(request.current_user['id'])
 
     return jsonify({'success': True, 'mensaje': 'Contraseña actualizada'})
 
@@ -430,8 +468,13 @@ def actualizar_usuario(id):
         WHERE id = ?
     ''', (nombre, rol, activo, id))
 
+    # Los tokens firmados llevan nombre y rol: revocar los emitidos hasta ahora
+    if (nombre, rol, activo) != (user['nombre'], user['rol'], user['activo']):
+        revocar_usuario(conn, id)
+
     conn.commit()
     conn.close()
+    cache_sesiones.invalidar_usuario(id)
 
     return jsonify({'success': True, 'mensaje': 'Usuario actualizado'})
 
@@ -460,9 +503,11 @@ def reset_password(id):
 
     # Invalidar sesiones existentes
     cursor.execute('DELETE FROM sesiones WHERE usuario_id = ?', (id,))
+    revocar_usuario(conn, id)
 
     conn.commit()
     conn.close()
+    cache_sesiones.invalidar_usuario(id)
 
     return jsonify({'success': True, 'mensaje': 'Contraseña restablecida'})
 
@@ -497,9 +542,11 @@ def eliminar_usuario(id):
 
     # Invalidar sesiones
     cursor.execute('DELETE FROM sesiones WHERE usuario_id = ?', (id,))
+    revocar_usuario(conn, id)
 
     conn.commit()
     conn.close()
+    cache_sesiones.invalidar_usuario(id)
 
     return jsonify({'success': True, 'mensaje': 'Usuario desactivado'})
 
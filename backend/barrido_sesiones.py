@@ -0,0 +1,150 @@
+"""
+Barrido periódico de sesiones vencidas (pos_database.db)
+
+auth.login inserta una fila en `sesiones` por cada inicio de sesión y solo el
+logout explícito la borraba, así que la tabla y sus índices crecían sin
+límite. `BarridoSesiones` corre en un hilo daemon y cada
+AUTH_BARRIDO_INTERVALO segundos:
+
+- borra las sesiones vencidas en lotes de AUTH_BARRIDO_LOTE filas, con un
+  commit y una pausa breve entre lotes para no retener el bloqueo de
+  escritura mientras llegan logins;
+- borra las revocaciones de tokens firmados que ya vencieron;
+- ejecuta PRAGMA optimize para mantener al día las estadísticas de índices.
+
+Las métricas (tamaño de la tabla, filas borradas, duración del último
+barrido) se publican en /health.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+from database import get_db_inventory
+
+AUTH_BARRIDO_INTERVALO = float(os.getenv('AUTH_BARRIDO_INTERVALO', '300'))
+AUTH_BARRIDO_LOTE = int(os.getenv('AUTH_BARRIDO_LOTE', '500'))
+AUTH_BARRIDO_PAUSA_MS = float(os.getenv('AUTH_BARRIDO_PAUSA_MS', '5'))
+
+
+class BarridoSesiones:
+    """Hilo que elimina sesiones y revocaciones vencidas en lotes pequeños"""
+
+    def __init__(self, obtener_conexion=get_db_inventory, intervalo=AUTH_BARRIDO_INTERVALO,
+                 lote=AUTH_BARRIDO_LOTE, pausa_ms=AUTH_BARRIDO_PAUSA_MS):
+        self._obtener_conexion = obtener_conexion
+        self.intervalo = intervalo
+        self.lote = max(1, lote)
+        self.pausa = max(0.0, pausa_ms) / 1000
+        self._detener = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+        self.barridos = 0
+        self.sesiones_borradas = 0
+        self.revocaciones_borradas = 0
+        self.lotes = 0
+        self.ultimo_barrido_ms = 0.0
+        self.ultimo_barrido_at = None
+        self.ultimo_error = None
+
+    def _borrar_en_lotes(self, sql, params):
+        """Ejecuta un DELETE ... LIMIT por lotes; cada lote es una transacción corta"""
+        total = 0
+        while not self._detener.is_set():
+            conn = self._obtener_conexion()
+            try:
+                borradas = conn.execute(sql, params + (self.lote,)).rowcount
+                conn.commit()
+            finally:
+                conn.close()
+            total += borradas
+            self.lotes += 1
+            if borradas < self.lote:
+                break
+            time.sleep(self.pausa)  # Dejar pasar a otros escritores
+        return total
+
+    def barrer(self):
+        """
+        Ejecuta un barrido completo.
+
+        Returns:
+            dict: sesiones y revocaciones borradas y duración en ms
+        """
+        with self._lock:
+            inicio = time.perf_counter()
+            # Misma condición que login_required para considerar vencida una sesión
+            sesiones = self._borrar_en_lotes('''
+                DELETE FROM sesiones WHERE id IN (
+                    SELECT id FROM sesiones WHERE expires_at <= datetime('now') LIMIT ?
+                )
+            ''', ())
+            revocaciones = self._borrar_en_lotes('''
+                DELETE FROM revocaciones WHERE id IN (
+                    SELECT id FROM revocaciones WHERE expires_at <= ? LIMIT ?
+                )
+            ''', (int(time.time()),))
+
+            conn = self._obtener_conexion()
+            try:
+                conn.execute('PRAGMA optimize')
+            finally:
+                conn.close()
+
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+            self.barridos += 1
+            self.sesiones_borradas += sesiones
+            self.revocaciones_borradas += revocaciones
+            self.ultimo_barrido_ms = round(duracion_ms, 2)
+            self.ultimo_barrido_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        return {'sesiones': sesiones, 'revocaciones': revocaciones, 'duracion_ms': round(duracion_ms, 2)}
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.barrer()
+                self.ultimo_error = None
+            except Exception as e:
+                self.ultimo_error = str(e)
+                print(f"[WARN] Barrido de sesiones falló: {e}")
+
+    def iniciar(self):
+        """Arranca el hilo de barrido (una sola vez)"""
+        if self.intervalo <= 0 or (self._hilo and self._hilo.is_alive()):
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name='barrido-sesiones', daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout=5):
+        """Detiene el hilo de barrido"""
+        self._detener.set()
+        if self._hilo and self._hilo.is_alive():
+            self._hilo.join(timeout)
+
+    def estadisticas(self):
+        """Tamaño de la tabla y métricas de los barridos"""
+        conn = self._obtener_conexion()
+        try:
+            total, vencidas = conn.execute('''
+                SELECT COUNT(*), COALESCE(SUM(expires_at <= datetime('now')), 0) FROM sesiones
+            ''').fetchone()
+        finally:
+            conn.close()
+        return {
+            'sesiones': total,
+            'sesiones_vencidas': vencidas,
+            'intervalo_segundos': self.intervalo,
+            'barridos': self.barridos,
+            'sesiones_borradas': self.sesiones_borradas,
+            'revocaciones_borradas': self.revocaciones_borradas,
+            'lotes': self.lotes,
+            'ultimo_barrido_ms': self.ultimo_barrido_ms,
+            'ultimo_barrido_at': self.ultimo_barrido_at,
+            'ultimo_error': self.ultimo_error,
+        }
+
+
+barrido_sesiones = BarridoSesiones()
+atexit.register(barrido_sesiones.detener)
@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de acceso a datos del backend POS
+Compara la implementación anterior ("antes") con la actual ("después")
+sobre una BD temporal con el esquema de migraciones y datos sintéticos.
+
+Uso:
+    python3 benchmark.py                   # Ejecuta todos los benchmarks
+    python3 benchmark.py credito_clientes  # Ejecuta solo uno
+    python3 benchmark.py csrf_respuestas
+    python3 benchmark.py catalogo_combos
+    python3 benchmark.py crear_pedido
+    python3 benchmark.py totales_incrementales
+    python3 benchmark.py lote_pedidos
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Agregar ruta del backend al path para importar módulos
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import migraciones
+
+
+def print_header(text):
+    """Imprime encabezado"""
+    print("\n" + "=" * 70)
+    print(f"  {text}")
+    print("=" * 70)
+
+
+def medir(funcion, repeticiones=20):
+    """Ejecuta `funcion` varias veces y retorna (ms promedio, último resultado)"""
+    resultado = funcion()  # Calentamiento
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return (time.perf_counter() - inicio) * 1000 / repeticiones, resultado
+
+
+def reportar(nombre, antes_ms, despues_ms, detalle=''):
+    """Imprime una línea de comparación"""
+    mejora = antes_ms / despues_ms if despues_ms else float('inf')
+    print(f"  {nombre:<28} antes {antes_ms:9.2f} ms   después {despues_ms:9.2f} ms   x{mejora:6.1f}")
+    if detalle:
+        print(f"  {'':<28} {detalle}")
+
+
+def recalcular_por_linea(cursor, pedido_id):
+    """recalcular_totales_pedido anterior: relee los items y hace un UPDATE por línea"""
+    cursor.execute('''
+        SELECT id, subtotal FROM pedido_items
+        WHERE pedido_id = ? AND (combo_id IS NULL OR combo_id = 0 OR combo_id = '')
+          AND (notas IS NULL OR notas NOT LIKE '%Desglose de combo%')
+    ''', (pedido_id,))
+    subtotal_total = 0.0
+    iva_total = 0.0
+    for item_id, subtotal in cursor.fetchall():
+        subtotal = float(subtotal) if subtotal else 0.0
+        iva_monto = round(subtotal * 0.13, 2)
+        cursor.execute('''
+            UPDATE pedido_items SET iva_porcentaje = 13.0, iva_monto = ?, total_item = ?
+            WHERE id = ?
+        ''', (iva_monto, round(subtotal + iva_monto, 2), item_id))
+        subtotal_total += subtotal
+        iva_total += iva_monto
+    cursor.execute('''
+        UPDATE pedidos SET subtotal = ?, impuesto = ?, total = ?, updated_at = ?
+        WHERE id = ?
+    ''', (round(subtotal_total, 2), round(iva_total, 2), round(subtotal_total + iva_total, 2),
+          datetime.now().isoformat(), pedido_id))
+
+
+# ============ BENCHMARKS ============
+
+def bench_credito_clientes():
+    """Alertas de crédito: bucle N+1 con conexión cruda vs. una consulta con índice"""
+    from clientes import SQL_CREDITO_UTILIZADO
+
+    ruta = migraciones.crear_bd_temporal('pos', prefijo='bench_pos_')
+    try:
+        num_clientes, num_pedidos = 300, 30000
+        conn = database.get_db(ruta)
+        conn.executemany(
+            'INSERT INTO clientes (codigo, nombre, credito_autorizado) VALUES (?, ?, ?)',
+            [(f'CLI-{i:04d}', f'Cliente {i}', 100.0) for i in range(num_clientes)]
+        )
+        random.seed(42)
+        inicio = datetime(2025, 1, 1)
+        conn.executemany(
+            'INSERT INTO pedidos (cliente_id, estado, total, created_at) VALUES (?, ?, ?, ?)',
+            [(random.randint(1, num_clientes),
+              random.choice(['credito', 'pagado', 'cerrado']),
+              round(random.uniform(1, 10), 2),
+              (inicio + timedelta(minutes=i)).isoformat())
+             for i in range(num_pedidos)]
+        )
+        conn.commit()
+        conn.close()
+
+        def antes():
+            # Implementación anterior: lista de clientes y una consulta por cliente
+            # en una conexión abierta a mano
+            conn = sqlite3.connect(ruta)
+            conn.row_factory = sqlite3.Row
+            clientes = [dict(row) for row in conn.execute('''
+                SELECT id, codigo, nombre, credito_autorizado
+                FROM clientes WHERE activo = 1 AND credito_autorizado > 0
+            ''')]
+            alertas = []
+            for cliente in clientes:
+                utilizado = conn.execute('''
+                    SELECT COALESCE(SUM(total), 0) as credito_utilizado
+                    FROM pedidos WHERE cliente_id = ? AND estado = 'credito'
+                ''', (cliente['id'],)).fetchone()['credito_utilizado']
+                if utilizado >= cliente['credito_autorizado'] * 0.8:
+                    alertas.append(cliente['id'])
+            conn.close()
+            return len(alertas), len(clientes) + 1
+
+        def despues():
+            conn = database.get_db(ruta)
+            filas = conn.execute(f'''
+                WITH uso AS (
+                    SELECT c.id, c.credito_autorizado, {SQL_CREDITO_UTILIZADO} AS credito_utilizado
+                    FROM clientes c
+                    WHERE c.activo = 1 AND c.credito_autorizado > 0
+                )
+                SELECT id FROM uso WHERE credito_utilizado >= credito_autorizado * 0.8
+            ''').fetchall()
+            conn.close()
+            return len(filas), 1
+
+        antes_ms, (alertas_antes, consultas_antes) = medir(antes)
+        despues_ms, (alertas_despues, consultas_despues) = medir(despues)
+        assert alertas_antes == alertas_despues, 'Los resultados no coinciden'
+
+        reportar('alertas de crédito', antes_ms, despues_ms,
+                 f'{num_clientes} clientes, {num_pedidos} pedidos: '
+                 f'{consultas_antes} consultas -> {consultas_despues}')
+    finally:
+        migraciones.eliminar_bd_temporal(ruta)
+
+
+def bench_csrf_respuestas():
+    """Token CSRF en respuestas grandes: json.loads + json.dumps vs. cabecera o inserción directa"""
+    import json
+    from unittest import mock
+    from flask import Flask, Response, jsonify
+    import app as app_modulo
+    import csrf
+
+    flask_app = Flask(__name__)
+    random.seed(42)
+    pedidos = [{
+        'id': i, 'mesa_id': i % 20 + 1, 'estado': 'en_cocina', 'total': round(random.uniform(2, 40), 2),
+        'created_at': (datetime(2025, 1, 1) + timedelta(minutes=i)).isoformat(),
+        'items': [{'producto_id': j, 'producto_nombre': f'Producto {j}', 'cantidad': 2,
+                   'precio_unitario': 1.25, 'subtotal': 2.5, 'notas': ''} for j in range(6)],
+    } for i in range(2000)]
+    cargas = {
+        'lista de pedidos': pedidos,                   # get_pedidos: lista
+        'reporte': {'productos': pedidos, 'total': len(pedidos)},  # reportes: objeto
+    }
+
+    def antes_add_csrf_token(response):
+        # Implementación anterior: decodificar y volver a serializar el body
+        token = csrf.generate_csrf_token()
+        response.headers['X-CSRF-Token'] = token
+        if response.content_type and 'application/json' in response.content_type:
+            try:
+                data = json.loads(response.get_data(as_text=True))
+                if isinstance(data, dict):
+                    data['_csrf_token'] = token
+                    response.set_data(json.dumps(data))
+            except Exception:
+                pass
+        return response
+
+    with flask_app.app_context():
+        for nombre, carga in cargas.items():
+            cuerpo = jsonify(carga).get_data()
+
+            def medir_modo(funcion):
+                # Respuesta ya serializada: se mide solo el costo del after_request
+                return medir(lambda: len(funcion(Response(cuerpo, mimetype='application/json')).get_data()))[0]
+
+            antes_ms = medir_modo(antes_add_csrf_token)
+            for modo in ('body', 'header'):
+                with mock.patch.object(csrf, 'CSRF_MODE', modo):
+                    despues_ms = medir_modo(app_modulo.add_csrf_token)
+                reportar(f'{nombre} ({modo})', antes_ms, despues_ms,
+                         f'{len(cuerpo) / 1024:.0f} KB por respuesta')
+
+
+def bench_catalogo_combos():
+    """Combos: una consulta y conexión por combo vs. catálogo cargado en una consulta y en memoria"""
+    from cache_menu import CacheMenu
+    from catalogo_combos import cargar_catalogo, combo_a_dict
+
+    ruta = migraciones.crear_bd_temporal('pos', prefijo='bench_pos_')
+    try:
+        num_productos, num_combos, por_combo = 40, 60, 4
+        conn = database.get_db(ruta)
+        conn.execute("INSERT INTO categorias (nombre, orden) VALUES ('Pupusas', 1)")
+        conn.executemany('INSERT INTO productos (nombre, precio, categoria_id) VALUES (?, ?, 1)',
+                         [(f'Producto {i}', 0.5 + i * 0.05) for i in range(num_productos)])
+        conn.executemany('INSERT INTO combos (nombre, precio_combo) VALUES (?, ?)',
+                         [(f'Combo {i:02d}', 3.0) for i in range(num_combos)])
+        random.seed(42)
+        conn.executemany('INSERT INTO combo_items (combo_id, producto_id, cantidad) VALUES (?, ?, ?)',
+                         [(c, random.randint(1, num_productos), random.randint(1, 3))
+                          for c in range(1, num_combos + 1) for _ in range(por_combo)])
+        conn.commit()
+        conn.close()
+
+        def conexion_antes():
+            # Implementación original: cada helper abría su propia conexión
+            conn = sqlite3.connect(ruta)
+            conn.row_factory = sqlite3.Row
+            return conn
+
+        def items_combo_antes(combo_id):
+            conn = conexion_antes()
+            items = conn.execute('''
+                SELECT ci.*, p.nombre, p.precio
+                FROM combo_items ci
+                JOIN productos p ON ci.producto_id = p.id
+                WHERE ci.combo_id = ?
+            ''', (combo_id,)).fetchall()
+            conn.close()
+            return items
+
+        def listado_antes():
+            conn = conexion_antes()
+            combos = conn.execute('''
+                SELECT c.*, COUNT(ci.id) as cantidad_items
+                FROM combos c
+                LEFT JOIN combo_items ci ON c.id = ci.combo_id
+                WHERE c.activo = 1
+                GROUP BY c.id
+                ORDER BY c.nombre
+            ''').fetchall()
+            conn.close()
+            resultado = [(combo['id'], len(items_combo_antes(combo['id']))) for combo in combos]
+            return resultado, len(combos) + 1
+
+        def listado_catalogo():
+            conn = database.get_db(ruta)
+            catalogo = cargar_catalogo(conn.cursor())
+            conn.close()
+            activos = sorted((c for c in catalogo.values() if c.activo == 1), key=lambda c: (c.nombre, c.id))
+            return [(c['id'], len(c['items'])) for c in map(combo_a_dict, activos)], 1
+
+        cache = CacheMenu(ruta, revalidar=60)
+
+        def combo_pedido_antes():
+            # agregar_item_pedido anterior: obtener_combo + obtener_items_combo
+            conn = conexion_antes()
+            combo = conn.execute('''
+                SELECT c.*, COUNT(ci.id) as cantidad_items
+                FROM combos c
+                LEFT JOIN combo_items ci ON c.id = ci.combo_id
+                WHERE c.id = ?
+                GROUP BY c.id
+            ''', (7,)).fetchone()
+            conn.close()
+            return combo['precio_combo'], len(items_combo_antes(7))
+
+        def combo_pedido_despues():
+            combo = cache.combo(7, revisar=True)
+            return combo.precio_combo, len(combo.items)
+
+        antes_ms, (listado, consultas_antes) = medir(listado_antes)
+        despues_ms, (listado_nuevo, consultas_despues) = medir(listado_catalogo)
+        assert listado == listado_nuevo, 'Los resultados no coinciden'
+        reportar('listado (carga)', antes_ms, despues_ms,
+                 f'{num_combos} combos x {por_combo} productos: '
+                 f'{consultas_antes} consultas y conexiones -> {consultas_despues}')
+
+        memoria_ms = medir(lambda: cache.obtener('combos'), repeticiones=200)[0]
+        reportar('listado (en memoria)', antes_ms, memoria_ms, 'JSON ya serializado de la caché del menú')
+
+        antes_ms, combo_antes = medir(combo_pedido_antes, repeticiones=200)
+        despues_ms, combo_despues = medir(combo_pedido_despues, repeticiones=200)
+        assert combo_antes == combo_despues, 'Los resultados no coinciden'
+        reportar('combo en un pedido', antes_ms, despues_ms,
+                 '2 consultas y conexiones -> lectura de la versión del menú')
+    finally:
+        migraciones.eliminar_bd_temporal(ruta)
+
+
+def bench_crear_pedido():
+    """crear_pedido: consulta e INSERT por línea + recálculo vs. precios en memoria y executemany"""
+    from cache_menu import CacheMenu
+    from lineas_pedido import armar_lineas, insertar_lineas
+
+    ruta = migraciones.crear_bd_temporal('pos', prefijo='bench_pos_')
+    try:
+        num_productos = 40
+        conn = database.get_db(ruta)
+        conn.execute("INSERT INTO categorias (nombre, orden) VALUES ('Pupusas', 1)")
+        conn.executemany('INSERT INTO productos (nombre, precio, categoria_id) VALUES (?, ?, 1)',
+                         [(f'Producto {i}', round(0.5 + i * 0.05, 2)) for i in range(num_productos)])
+        conn.commit()
+        conn.close()
+        cache = CacheMenu(ruta, revalidar=60)
+
+        def antes(items):
+            # crear_pedido anterior (productos): SELECT e INSERT por línea,
+            # recalcular_totales_pedido con UPDATE por línea y SELECT final
+            conn = database.get_db(ruta)
+            cursor = conn.cursor()
+            filas = conn.total_changes
+            subtotal = 0
+            lineas = []
+            for item in items:
+                cursor.execute('SELECT precio FROM productos WHERE id = ?', (item['producto_id'],))
+                precio = cursor.fetchone()['precio']
+                lineas.append((item['producto_id'], item['cantidad'], precio, precio * item['cantidad']))
+                subtotal += precio * item['cantidad']
+            impuesto = round(subtotal * 0.13, 2)
+            cursor.execute('''
+                INSERT INTO pedidos (mesero, estado, tipo_pago, subtotal, impuesto, total)
+                VALUES ('Mesero', 'en_mesa', 'al_final', ?, ?, ?)
+            ''', (subtotal, impuesto, round(subtotal + impuesto, 2)))
+            pedido_id = cursor.lastrowid
+            for producto_id, cantidad, precio, subtotal_linea in lineas:
+                cursor.execute('''
+                    INSERT INTO pedido_items (pedido_id, producto_id, combo_id, cantidad, precio_unitario, subtotal, notas)
+                    VALUES (?, ?, NULL, ?, ?, ?, '')
+                ''', (pedido_id, producto_id, cantidad, precio, subtotal_linea))
+            recalcular_por_linea(cursor, pedido_id)
+            filas = conn.total_changes - filas
+            conn.commit()
+            cursor.execute('SELECT * FROM pedidos WHERE id = ?', (pedido_id,))
+            total = cursor.fetchone()['total']
+            conn.close()
+            return total, 3 * len(items) + 4, filas
+
+        def despues(items):
+            productos, combos = cache.productos_y_combos(revisar=True)
+            lineas, totales = armar_lineas(items, productos, combos)
+            conn = database.get_db(ruta)
+            cursor = conn.cursor()
+            filas = conn.total_changes
+            cursor.execute('''
+                INSERT INTO pedidos (mesero, estado, tipo_pago, subtotal, impuesto, total)
+                VALUES ('Mesero', 'en_mesa', 'al_final', ?, ?, ?)
+            ''', (totales['subtotal'], totales['impuesto'], totales['total']))
+            insertar_lineas(cursor, cursor.lastrowid, lineas)
+            filas = conn.total_changes - filas
+            conn.commit()
+            conn.close()
+            return totales['total'], 2, filas
+
+        random.seed(42)
+        for num_lineas in (1, 10, 50):
+            items = [{'producto_id': random.randint(1, num_productos), 'cantidad': random.randint(1, 4)}
+                     for _ in range(num_lineas)]
+            antes_ms, (total_antes, sentencias_antes, filas_antes) = medir(lambda: antes(items), repeticiones=100)
+            despues_ms, (total_despues, sentencias_despues, filas_despues) = medir(lambda: despues(items),
+                                                                                   repeticiones=100)
+            assert total_antes == total_despues, 'Los totales no coinciden'
+            # Filas escritas según total_changes: incluye las de los triggers de colas
+            reportar(f'pedido de {num_lineas} líneas', antes_ms, despues_ms,
+                     f'{sentencias_antes} sentencias y {filas_antes} filas -> {sentencias_despues} '
+                     f'sentencias y {filas_despues} filas (INSERT del pedido y executemany de las líneas)')
+    finally:
+        migraciones.eliminar_bd_temporal(ruta)
+
+
+def bench_totales_incrementales():
+    """Editar un item: recálculo completo del pedido vs. delta de la línea"""
+    from lineas_pedido import aplicar_delta_totales, iva_linea
+    from pos import recalcular_totales_pedido
+
+    ruta = migraciones.crear_bd_temporal('pos', prefijo='bench_pos_')
+    try:
+        conn = database.get_db(ruta)
+        conn.execute("INSERT INTO categorias (nombre, orden) VALUES ('Pupusas', 1)")
+        conn.executemany('INSERT INTO productos (nombre, precio, categoria_id) VALUES (?, ?, 1)',
+                         [(f'Producto {i}', round(0.5 + i * 0.05, 2)) for i in range(40)])
+        conn.commit()
+        conn.close()
+
+        def crear_pedido(num_lineas):
+            conn = database.get_db(ruta)
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO pedidos (mesero, estado, tipo_pago) VALUES ('Mesero', 'en_mesa', 'al_final')")
+            pedido_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal, notas)
+                SELECT ?, id, 1, precio, precio, '' FROM productos WHERE id = ?
+            ''', [(pedido_id, random.randint(1, 40)) for _ in range(num_lineas)])
+            recalcular_totales_pedido(pedido_id, conn)
+            conn.commit()
+            item_id = cursor.execute('SELECT MIN(id) FROM pedido_items WHERE pedido_id = ?',
+                                     (pedido_id,)).fetchone()[0]
+            conn.close()
+            return pedido_id, item_id
+
+        def editar(pedido_id, item_id, cantidad, incremental):
+            # modificar_item_pedido: leer la línea, actualizarla y ajustar el pedido
+            conn = database.get_db(ruta)
+            cursor = conn.cursor()
+            cursor.execute('SELECT precio_unitario, subtotal, iva_monto FROM pedido_items WHERE id = ?', (item_id,))
+            precio, subtotal_anterior, iva_anterior = cursor.fetchone()
+            subtotal = precio * cantidad
+            iva_monto, total_item = iva_linea(subtotal)
+            cursor.execute('''
+                UPDATE pedido_items SET cantidad = ?, subtotal = ?, iva_monto = ?, total_item = ?
+                WHERE id = ?
+            ''', (cantidad, subtotal, iva_monto, total_item, item_id))
+            if incremental:
+                aplicar_delta_totales(cursor, pedido_id, subtotal - subtotal_anterior, iva_monto - iva_anterior)
+            else:
+                recalcular_por_linea(cursor, pedido_id)
+            conn.commit()
+            total = cursor.execute('SELECT total FROM pedidos WHERE id = ?', (pedido_id,)).fetchone()[0]
+            conn.close()
+            return total
+
+        random.seed(42)
+        for num_lineas in (10, 60, 200):
+            cantidades = iter(range(10 ** 6))
+            pedido_antes, item_antes = crear_pedido(num_lineas)
+            pedido_despues, item_despues = crear_pedido(num_lineas)
+            antes_ms, _ = medir(lambda: editar(pedido_antes, item_antes, next(cantidades) % 5 + 1, False),
+                                repeticiones=200)
+            despues_ms, total = medir(lambda: editar(pedido_despues, item_despues, next(cantidades) % 5 + 1, True),
+                                      repeticiones=200)
+
+            # El total mantenido con deltas coincide con la reparación completa
+            conn = database.get_db(ruta)
+            assert total == recalcular_totales_pedido(pedido_despues, conn)['total'], 'Los totales no coinciden'
+            conn.rollback()
+            conn.close()
+            reportar(f'edición en pedido de {num_lineas}', antes_ms, despues_ms,
+                     f'{num_lineas + 4} sentencias -> 3 (UPDATE de la línea y delta al pedido)')
+    finally:
+        migraciones.eliminar_bd_temporal(ruta)
+
+
+def bench_lote_pedidos():
+    """Cola de una tablet: un POST /pedidos por pedido vs. un lote en una transacción"""
+    from cache_menu import CacheMenu
+    from lineas_pedido import insertar_pedido
+    from lote_pedidos import aplicar_lote
+
+    ruta = migraciones.crear_bd_temporal('pos', prefijo='bench_pos_')
+    try:
+        conn = database.get_db(ruta)
+        conn.execute("INSERT INTO categorias (nombre, orden) VALUES ('Pupusas', 1)")
+        conn.executemany('INSERT INTO productos (nombre, precio, categoria_id) VALUES (?, ?, 1)',
+                         [(f'Producto {i}', round(0.5 + i * 0.05, 2)) for i in range(40)])
+        conn.commit()
+        conn.close()
+        cache = CacheMenu(ruta, revalidar=60)
+        lotes = iter(range(10 ** 6))
+
+        def cola(num_pedidos):
+            return [{'mesa_id': None, 'tipo_pago': 'al_final',
+                     'items': [{'producto_id': random.randint(1, 40), 'cantidad': random.randint(1, 3)}
+                               for _ in range(5)]}
+                    for _ in range(num_pedidos)]
+
+        def antes(pedidos):
+            # Una petición por pedido: foto del menú, transacción y commit propios
+            for datos in pedidos:
+                productos, combos = cache.productos_y_combos(revisar=True)
+                conn = database.get_db(ruta)
+                insertar_pedido(conn.cursor(), datos, productos, combos)
+                conn.commit()
+                conn.close()
+            return len(pedidos)
+
+        def despues(entradas):
+            productos, combos = cache.productos_y_combos(revisar=True)
+            conn = database.get_db(ruta)
+            resultados, aplicadas = aplicar_lote(conn, entradas, productos, combos)
+            conn.commit()
+            conn.close()
+            return len(aplicadas)
+
+        random.seed(42)
+        for num_pedidos in (5, 20, 50):
+            pedidos = cola(num_pedidos)
+            antes_ms, _ = medir(lambda: antes(pedidos), repeticiones=20)
+
+            def lote_nuevo():
+                prefijo = f'bench-{next(lotes)}'
+                return despues([{'clave': f'{prefijo}-{i}', 'tipo': 'crear_pedido', 'pedido': datos}
+                                for i, datos in enumerate(pedidos)])
+            despues_ms, aplicadas = medir(lote_nuevo, repeticiones=20)
+            assert aplicadas == num_pedidos, 'No se aplicó el lote completo'
+            reportar(f'cola de {num_pedidos} pedidos', antes_ms, despues_ms,
+                     f'{num_pedidos} commits -> 1 (sin contar {num_pedidos - 1} viajes de red ahorrados)')
+
+            entradas = [{'clave': f'reintento-{num_pedidos}-{i}', 'tipo': 'crear_pedido', 'pedido': datos}
+                        for i, datos in enumerate(pedidos)]
+            despues(entradas)
+            reintento_ms, aplicadas = medir(lambda: despues(entradas), repeticiones=20)
+            assert aplicadas == 0, 'Un reintento volvió a aplicar entradas'
+            reportar(f'reintento de {num_pedidos} pedidos', antes_ms, reintento_ms,
+                     'duplicaba los pedidos -> una lectura de claves, sin escribir pedidos')
+    finally:
+        migraciones.eliminar_bd_temporal(ruta)
+
+
+BENCHMARKS = {
+    'credito_clientes': bench_credito_clientes,
+    'csrf_respuestas': bench_csrf_respuestas,
+    'catalogo_combos': bench_catalogo_combos,
+    'crear_pedido': bench_crear_pedido,
+    'totales_incrementales': bench_totales_incrementales,
+    'lote_pedidos': bench_lote_pedidos,
+}
+
+
+def main():
+    """Ejecuta los benchmarks solicitados"""
+    nombres = sys.argv[1:] or list(BENCHMARKS)
+    desconocidos = [nombre for nombre in nombres if nombre not in BENCHMARKS]
+    if desconocidos:
+        print(f"[ERROR] Benchmarks desconocidos: {', '.join(desconocidos)}")
+        print(f"[INFO] Disponibles: {', '.join(BENCHMARKS)}")
+        return 1
+
+    print_header("⏱️  BENCHMARKS DE ACCESO A DATOS")
+    for nombre in nombres:
+        print(f"\n📋 {nombre}: {BENCHMARKS[nombre].__doc__}")
+        BENCHMARKS[nombre]()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
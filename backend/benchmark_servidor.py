@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Benchmark de capacidad del servidor: modo hilos vs. modo gevent (servidor.py)
+
+Arranca servidor.py en cada modo sobre una copia temporal del backend y mide:
+- clientes Socket.IO por WebSocket que el proceso sostiene a la vez
+  (suscritos a la sala de cocina), con la memoria y los hilos del servidor;
+- pedidos por segundo (POST /api/pos/pedidos alternado con GET de productos)
+  mientras esos clientes siguen conectados, con la latencia p95 y los
+  eventos de Socket.IO entregados;
+- el tiempo de apagado ordenado tras SIGTERM.
+
+Requiere websocket-client (solo para este benchmark). Cada hilo de carga usa
+una IP de loopback distinta (127.0.0.N) para no toparse con el rate limit
+por IP.
+
+Uso:
+    python3 benchmark_servidor.py                      # 500 sockets, 32 hilos, 10 s
+    python3 benchmark_servidor.py --sockets 1000 --hilos 64 --segundos 20
+    python3 benchmark_servidor.py --modos gevent
+"""
+
+import argparse
+import http.client
+import json
+import os
+import selectors
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import websocket
+
+BACKEND = os.path.dirname(os.path.abspath(__file__))
+PASSWORD_BENCH = 'Bench123!'
+
+# Inicializa las BD de la copia y fija una contraseña conocida para admin
+_PREPARAR_BD = f'''
+import contextlib, io
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+    app.create_app()
+from auth import hash_password
+from database import get_db_inventory
+conn = get_db_inventory()
+conn.execute("UPDATE usuarios SET password_hash = ? WHERE username = 'admin'",
+             (hash_password({PASSWORD_BENCH!r}),))
+conn.commit()
+'''
+
+
+def print_header(text):
+    """Imprime encabezado"""
+    print("\n" + "=" * 70)
+    print(f"  {text}")
+    print("=" * 70)
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def preparar_directorio():
+    """Copia el backend sin BD a un directorio temporal y lo inicializa"""
+    destino = os.path.join(tempfile.mkdtemp(prefix='bench_servidor_'), 'backend')
+    shutil.copytree(BACKEND, destino, ignore=shutil.ignore_patterns('*.db', '*.db-*', '__pycache__'))
+    subprocess.run([sys.executable, '-c', _PREPARAR_BD], cwd=destino, check=True)
+    return destino
+
+
+def recursos(pid):
+    """RSS (MB) e hilos del sistema de un proceso, según /proc"""
+    valores = {}
+    with open(f'/proc/{pid}/status') as f:
+        for linea in f:
+            clave, _, valor = linea.partition(':')
+            valores[clave] = valor.strip()
+    return int(valores['VmRSS'].split()[0]) / 1024, int(valores['Threads'])
+
+
+class Servidor:
+    """servidor.py en un subproceso"""
+
+    def __init__(self, directorio, modo, puerto):
+        self.puerto = puerto
+        entorno = dict(os.environ, SERVIDOR_MODO=modo, SERVIDOR_HOST='127.0.0.1',
+                       SERVIDOR_PUERTO=str(puerto), PYTHONUNBUFFERED='1')
+        self.proceso = subprocess.Popen(
+            [sys.executable, 'servidor.py'], cwd=directorio, env=entorno,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        limite = time.monotonic() + 60
+        while time.monotonic() < limite:
+            try:
+                if self.peticion('GET', '/healthz')[0] == 200:
+                    return
+            except OSError:
+                time.sleep(0.2)
+        self.proceso.kill()
+        raise RuntimeError(f'servidor en modo {modo} no respondió')
+
+    def peticion(self, metodo, ruta, cuerpo=None, cabeceras=None, conexion=None):
+        """Retorna (status, cabeceras, json)"""
+        propia = conexion is None
+        conexion = conexion or http.client.HTTPConnection('127.0.0.1', self.puerto, timeout=30)
+        try:
+            datos = json.dumps(cuerpo) if cuerpo is not None else None
+            cabeceras = dict(cabeceras or {}, **({'Content-Type': 'application/json'} if datos else {}))
+            conexion.request(metodo, ruta, body=datos, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            contenido = respuesta.read()
+            return respuesta.status, respuesta.headers, json.loads(contenido) if contenido else None
+        finally:
+            if propia:
+                conexion.close()
+
+    def apagar(self):
+        """SIGTERM y espera; retorna los segundos hasta la salida"""
+        inicio = time.perf_counter()
+        self.proceso.send_signal(signal.SIGTERM)
+        try:
+            self.proceso.wait(30)
+        except subprocess.TimeoutExpired:
+            self.proceso.kill()
+            self.proceso.wait()
+        return time.perf_counter() - inicio
+
+
+class ClientesSocketIO:
+    """N clientes Socket.IO por WebSocket atendidos por un solo hilo con selectors"""
+
+    def __init__(self, puerto):
+        self.url = f'ws://127.0.0.1:{puerto}/socket.io/?EIO=4&transport=websocket'
+        self.sockets = []
+        self.fallidos = 0
+        self.eventos = 0
+        self._selector = selectors.DefaultSelector()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+
+    def conectar(self, cantidad):
+        for _ in range(cantidad):
+            try:
+                ws = websocket.create_connection(self.url, timeout=10)
+                ws.recv()  # '0{...}' open de engine.io
+                ws.send('40')
+                ws.recv()  # '40{"sid":...}' conexión al namespace
+                ws.send('42' + json.dumps(['conectar_usuario', {'usuario_id': 1, 'rol': 'cocinero'}]))
+                self._selector.register(ws.sock, selectors.EVENT_READ, ws)
+                self.sockets.append(ws)
+            except (OSError, websocket.WebSocketException):
+                self.fallidos += 1
+        self._hilo.start()
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            for clave, _ in self._selector.select(0.2):
+                ws = clave.data
+                try:
+                    # Un frame por aviso del selector, más los que ya quedaron en el buffer
+                    while True:
+                        mensaje = ws.recv()
+                        if mensaje == '2':
+                            ws.send('3')  # pong de engine.io
+                        elif mensaje.startswith('42'):
+                            self.eventos += 1
+                        if not ws.frame_buffer.recv_buffer:
+                            break
+                except (websocket.WebSocketException, OSError, ValueError):
+                    self._selector.unregister(ws.sock)
+
+    def conectados(self):
+        return sum(1 for ws in self.sockets if ws.connected)
+
+    def cerrar(self):
+        self._detener.set()
+        self._hilo.join(5)
+        for ws in self.sockets:
+            try:
+                ws.close(timeout=0.1)
+            except Exception:
+                pass
+
+
+def generar_carga(servidor, token, hilos, segundos):
+    """Hilos con conexión keep-alive propia; retorna (peticiones, errores, latencias ms)"""
+    latencias, errores = [], []
+    fin = time.monotonic() + segundos
+    inicio_barrera = threading.Barrier(hilos)
+
+    def trabajador(indice):
+        conexion = http.client.HTTPConnection('127.0.0.1', servidor.puerto, timeout=30,
+                                              source_address=(f'127.0.0.{2 + indice}', 0))
+        csrf = None
+        propias, fallos = [], 0
+        inicio_barrera.wait()
+        n = 0
+        while time.monotonic() < fin:
+            cabeceras = {'Authorization': f'Bearer {token}'}
+            if n % 2 == 0:
+                metodo, ruta, cuerpo = 'GET', '/api/pos/productos', None
+            else:
+                metodo, ruta = 'POST', '/api/pos/pedidos'
+                cuerpo = {'tipo_pago': 'anticipado', 'cliente_nombre': f'bench {indice}',
+                          'items': [{'producto_id': 1, 'cantidad': 2}, {'producto_id': 2, 'cantidad': 1}]}
+                if csrf:
+                    cabeceras['X-CSRF-Token'] = csrf
+            inicio = time.perf_counter()
+            try:
+                status, resp_cabeceras, _ = servidor.peticion(metodo, ruta, cuerpo, cabeceras, conexion)
+                csrf = resp_cabeceras.get('X-CSRF-Token', csrf)
+                if status >= 400:
+                    fallos += 1
+            except (OSError, http.client.HTTPException):
+                fallos += 1
+                conexion.close()
+            propias.append((time.perf_counter() - inicio) * 1000)
+            n += 1
+        conexion.close()
+        latencias.extend(propias)
+        errores.append(fallos)
+
+    trabajadores = [threading.Thread(target=trabajador, args=(i,)) for i in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    return len(latencias), sum(errores), sorted(latencias)
+
+
+def bench_modo(directorio, modo, sockets, hilos, segundos):
+    print_header(f"Modo {modo}: {sockets} WebSocket, {hilos} hilos de carga, {segundos} s")
+    servidor = Servidor(directorio, modo, puerto_libre())
+    clientes = ClientesSocketIO(servidor.puerto)
+    try:
+        rss_base, hilos_base = recursos(servidor.proceso.pid)
+
+        inicio = time.perf_counter()
+        clientes.conectar(sockets)
+        conexion_s = time.perf_counter() - inicio
+        time.sleep(1)
+        rss_ws, hilos_ws = recursos(servidor.proceso.pid)
+        conectados = clientes.conectados()
+        print(f"  WebSocket conectados     {conectados}/{sockets} en {conexion_s:.1f} s "
+              f"({clientes.fallidos} fallidos)")
+        print(f"  Memoria del servidor     {rss_base:.0f} MB -> {rss_ws:.0f} MB "
+              f"({(rss_ws - rss_base) * 1024 / max(conectados, 1):.0f} KB por socket)")
+        print(f"  Hilos del servidor       {hilos_base} -> {hilos_ws}")
+
+        status, cabeceras, datos = servidor.peticion(
+            'POST', '/api/auth/login', {'username': 'admin', 'password': PASSWORD_BENCH})
+        if status != 200:
+            raise RuntimeError(f'login falló: {status} {datos}')
+
+        total, errores, latencias = generar_carga(servidor, datos['token'], hilos, segundos)
+        p50 = latencias[len(latencias) // 2] if latencias else 0
+        p95 = latencias[int(len(latencias) * 0.95)] if latencias else 0
+        print(f"  Peticiones               {total} ({errores} errores): {total / segundos:.0f} req/s, "
+              f"{total / 2 / segundos:.0f} pedidos/s")
+        print(f"  Latencia                 p50 {p50:.1f} ms   p95 {p95:.1f} ms")
+        print(f"  Frames Socket.IO         {clientes.eventos} recibidos, "
+              f"{clientes.conectados()} sockets siguen conectados")
+        return {'conectados': conectados, 'rss_ws': rss_ws, 'req_s': total / segundos, 'p95': p95}
+    finally:
+        clientes.cerrar()
+        print(f"  Apagado (SIGTERM)        {servidor.apagar():.2f} s, código {servidor.proceso.returncode}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sockets', type=int, default=500)
+    parser.add_argument('--hilos', type=int, default=32)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--modos', nargs='+', default=['hilos', 'gevent'], choices=['hilos', 'gevent'])
+    args = parser.parse_args()
+
+    directorio = preparar_directorio()
+    try:
+        for modo in args.modos:
+            bench_modo(directorio, modo, args.sockets, args.hilos, args.segundos)
+    finally:
+        shutil.rmtree(os.path.dirname(directorio), ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
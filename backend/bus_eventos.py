@@ -0,0 +1,303 @@
+"""
+Bus de eventos entre procesos para las notificaciones en tiempo real
+
+Los sockets conectados, sus salas y los buffers de polling viven en la
+memoria de cada proceso (notificaciones.py). Con un solo worker basta con
+entregar los eventos en el mismo proceso; con varios, un evento generado en
+un worker debe llegar a los sockets y buffers de todos. El backend se elige
+con NOTIF_BUS:
+
+- 'local' (por defecto): entrega síncrona en el mismo proceso.
+- 'sqlite': outbox en un archivo SQLite del host (NOTIF_BUS_DB). Publicar es
+  insertar una fila; un hilo lector por proceso toma las filas nuevas cada
+  NOTIF_BUS_INTERVALO_MS (o al instante si las publicó el mismo proceso) y
+  las entrega en orden de id a sus suscriptores. Cada proceso lee cada fila
+  una sola vez y solo la entrega a sus sockets locales, así cada sala recibe
+  cada evento exactamente una vez. Las filas se purgan tras
+  NOTIF_BUS_RETENCION segundos.
+
+Socket.IO se conecta con `opciones_socketio()`, que devuelve el
+`client_manager` (el hook de message queue de Flask-SocketIO) apoyado en el
+bus. Los buffers de polling se suscriben al tema 'notificaciones' y usan el
+id de la fila como `seq`, de modo que un cursor `since` vale en cualquier
+worker.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+from socketio.pubsub_manager import PubSubManager
+
+from database import get_db_independiente
+
+NOTIF_BUS_DB = os.getenv('NOTIF_BUS_DB', 'bus_eventos.db')
+NOTIF_BUS_INTERVALO_MS = float(os.getenv('NOTIF_BUS_INTERVALO_MS', '50'))
+NOTIF_BUS_RETENCION = float(os.getenv('NOTIF_BUS_RETENCION', '900'))
+NOTIF_BUS_LOTE = int(os.getenv('NOTIF_BUS_LOTE', '500'))
+
+# Segundos entre purgas de filas vencidas del outbox
+_INTERVALO_PURGA = 60
+
+
+class BusEventosLocal:
+    """Bus en memoria: entrega a los suscriptores del mismo proceso"""
+
+    tipo = 'local'
+
+    def __init__(self):
+        self._suscriptores = {}
+        self.publicados = 0
+        self.entregados = 0
+        self.errores = 0
+
+    def suscribir(self, tema, funcion):
+        """
+        Registra `funcion(datos, id_mensaje)` para los mensajes de un tema.
+        `id_mensaje` es creciente entre procesos (None en el bus local).
+        """
+        self._suscriptores.setdefault(tema, []).append(funcion)
+
+    def publicar(self, tema, datos):
+        """Publica un mensaje (dict serializable a JSON) en un tema"""
+        self.publicados += 1
+        self._entregar(tema, datos, None)
+
+    def recientes(self, tema, segundos):
+        """Mensajes de los últimos `segundos` ya publicados: [(id, datos)]"""
+        return []
+
+    def _entregar(self, tema, datos, id_mensaje):
+        for funcion in self._suscriptores.get(tema, ()):
+            try:
+                funcion(datos, id_mensaje)
+                self.entregados += 1
+            except Exception as e:
+                self.errores += 1
+                print(f"[WARN] Bus de eventos: suscriptor de '{tema}' falló: {e}")
+
+    def iniciar(self):
+        """Arranca el hilo lector (sin efecto en el bus local)"""
+
+    def detener(self, timeout=5):
+        """Detiene el hilo lector (sin efecto en el bus local)"""
+
+    def estadisticas(self):
+        return {
+            'tipo': self.tipo,
+            'publicados': self.publicados,
+            'entregados': self.entregados,
+            'errores': self.errores,
+        }
+
+
+class BusEventosSQLite(BusEventosLocal):
+    """Bus entre procesos del mismo host con una tabla outbox en SQLite"""
+
+    tipo = 'sqlite'
+
+    def __init__(self, db_file=NOTIF_BUS_DB, intervalo_ms=NOTIF_BUS_INTERVALO_MS,
+                 retencion=NOTIF_BUS_RETENCION, lote=NOTIF_BUS_LOTE):
+        super().__init__()
+        self.db_file = db_file
+        self.intervalo = max(0.001, intervalo_ms / 1000)
+        self.retencion = retencion
+        self.lote = max(1, lote)
+        self._lock = threading.Lock()
+        self._aviso = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._ultima_purga = 0.0
+        self.leidos = 0
+        self.purgados = 0
+        self.ultimo_error = None
+        self._crear_tabla()
+        # Solo se entregan los mensajes publicados desde que arrancó este proceso
+        self._ultimo_id = self._consultar('SELECT COALESCE(MAX(id), 0) FROM bus_eventos')[0][0]
+
+    def _consultar(self, sql, parametros=()):
+        conn = get_db_independiente(self.db_file)
+        try:
+            return conn.execute(sql, parametros).fetchall()
+        finally:
+            conn.close()
+
+    def _escribir(self, sql, parametros=()):
+        conn = get_db_independiente(self.db_file)
+        try:
+            filas = conn.execute(sql, parametros).rowcount
+            conn.commit()
+            return filas
+        finally:
+            conn.close()
+
+    def _crear_tabla(self):
+        # Cola transitoria, no datos de la aplicación: se crea aquí y no en migraciones/
+        conn = get_db_independiente(self.db_file)
+        try:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS bus_eventos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tema TEXT NOT NULL,
+                    datos TEXT NOT NULL,
+                    creado_en REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_bus_eventos_creado_en ON bus_eventos(creado_en);
+            ''')
+        finally:
+            conn.close()
+
+    def publicar(self, tema, datos):
+        """Inserta el mensaje en el outbox y despierta al lector de este proceso"""
+        self._escribir(
+            'INSERT INTO bus_eventos (tema, datos, creado_en) VALUES (?, ?, ?)',
+            (tema, json.dumps(datos, default=str), time.time())
+        )
+        self.publicados += 1
+        self._aviso.set()
+
+    def recientes(self, tema, segundos):
+        filas = self._consultar('''
+            SELECT id, datos FROM bus_eventos
+            WHERE tema = ? AND creado_en >= ? AND id <= ?
+            ORDER BY id
+        ''', (tema, time.time() - segundos, self._ultimo_id))
+        return [(fila['id'], json.loads(fila['datos'])) for fila in filas]
+
+    def leer_pendientes(self):
+        """
+        Entrega a los suscriptores los mensajes nuevos del outbox, en orden.
+
+        Returns:
+            int: mensajes leídos
+        """
+        with self._lock:
+            total = 0
+            while True:
+                filas = self._consultar(
+                    'SELECT id, tema, datos FROM bus_eventos WHERE id > ? ORDER BY id LIMIT ?',
+                    (self._ultimo_id, self.lote)
+                )
+                for fila in filas:
+                    self._ultimo_id = fila['id']
+                    self._entregar(fila['tema'], json.loads(fila['datos']), fila['id'])
+                total += len(filas)
+                if len(filas) < self.lote:
+                    break
+            self.leidos += total
+            return total
+
+    def purgar(self):
+        """Borra los mensajes más viejos que la retención"""
+        borradas = self._escribir(
+            'DELETE FROM bus_eventos WHERE creado_en < ?',
+            (time.time() - self.retencion,)
+        )
+        self.purgados += borradas
+        self._ultima_purga = time.monotonic()
+        return borradas
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            self._aviso.wait(self.intervalo)
+            self._aviso.clear()
+            try:
+                self.leer_pendientes()
+                if time.monotonic() - self._ultima_purga >= _INTERVALO_PURGA:
+                    self.purgar()
+                self.ultimo_error = None
+            except Exception as e:
+                self.ultimo_error = str(e)
+                print(f"[WARN] Bus de eventos: lectura falló: {e}")
+                self._detener.wait(1)
+
+    def iniciar(self):
+        """Arranca el hilo lector (una sola vez)"""
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name='bus-eventos', daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout=5):
+        self._detener.set()
+        self._aviso.set()
+        if self._hilo and self._hilo.is_alive():
+            self._hilo.join(timeout)
+
+    def estadisticas(self):
+        stats = super().estadisticas()
+        stats.update({
+            'db': self.db_file,
+            'ultimo_id': self._ultimo_id,
+            'leidos': self.leidos,
+            'purgados': self.purgados,
+            'intervalo_ms': self.intervalo * 1000,
+            'ultimo_error': self.ultimo_error,
+        })
+        return stats
+
+
+class GestorSocketIOBus(PubSubManager):
+    """
+    Client manager de python-socketio que reparte los emits por el bus.
+
+    Cada `socketio.emit()` se publica en el bus; el hilo del manager en cada
+    proceso lo recibe y lo emite a los sockets locales de la sala.
+    """
+
+    name = 'bus_eventos'
+
+    def __init__(self, bus, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = bus
+        self._mensajes = queue.Queue()
+        if not write_only:
+            bus.suscribir(channel, lambda datos, _id: self._mensajes.put(datos))
+
+    def _publish(self, data):
+        self.bus.publicar(self.channel, data)
+
+    def _listen(self):
+        while True:
+            yield self._mensajes.get()
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def crear_bus(tipo=None):
+    """Crea el backend configurado en NOTIF_BUS ('local' o 'sqlite')"""
+    # Se lee al crear el bus y no al importar: .env se carga después
+    tipo = tipo or os.getenv('NOTIF_BUS', 'local')
+    if tipo == 'sqlite':
+        return BusEventosSQLite()
+    if tipo != 'local':
+        raise ValueError(f"NOTIF_BUS desconocido: {tipo} (usar 'local' o 'sqlite')")
+    return BusEventosLocal()
+
+
+def obtener_bus():
+    """Retorna (creándolo la primera vez) el bus del proceso"""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                _bus = crear_bus()
+                atexit.register(_bus.detener)
+    return _bus
+
+
+def opciones_socketio():
+    """
+    Opciones para SocketIO(): con un bus entre procesos, el client manager
+    que reparte los emits por él; con el bus local, las de siempre.
+    """
+    bus = obtener_bus()
+    if bus.tipo == 'local':
+        return {}
+    return {'client_manager': GestorSocketIOBus(bus)}
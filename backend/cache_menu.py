@@ -0,0 +1,228 @@
+"""
+Caché en memoria del menú (productos, categorías y combos)
+
+Cada tablet carga el menú al abrir y lo refresca seguido, pero el menú cambia
+pocas veces al día. La caché guarda por proceso una foto del menú y el JSON
+ya serializado de cada vista, de modo que GET /productos, /categorias,
+/categorias/<id>/productos y /combos responden sin consultar SQLite:
+
+- La foto lleva la versión de `version_menu` (triggers de
+  migraciones/pos/0006), que sube con cualquier escritura a productos,
+  categorías, combos o combo_items. Las respuestas usan esa versión como
+  ETag y responden 304 si el cliente ya la tiene.
+- Las rutas de escritura del menú llaman a `registrar_cambio()`: al terminar
+  la unidad de trabajo la siguiente lectura compara la versión y, si cambió,
+  recarga la foto.
+- Sin escrituras locales la versión se revisa como mucho cada
+  MENU_CACHE_REVALIDAR segundos (una lectura por clave primaria). Ese
+  intervalo acota cuánto tarda un worker en ver lo escrito por otro.
+
+La foto incluye el catálogo de combos (catalogo_combos.py) y los productos
+por id. Las rutas que cobran con esos precios (crear_pedido,
+agregar_item_pedido) piden la foto con `revisar=True`: leen siempre la
+versión, nunca un precio viejo.
+"""
+
+import json
+import os
+import threading
+import time
+
+from catalogo_combos import cargar_catalogo, combo_a_dict
+from database import al_terminar_unidad_de_trabajo, get_db_independiente
+
+MENU_CACHE_REVALIDAR = float(os.getenv('MENU_CACHE_REVALIDAR', '2'))
+
+
+def version_menu(cursor):
+    """Versión actual del menú (0 si nunca cambió)"""
+    cursor.execute('SELECT version FROM version_menu WHERE id = 1')
+    fila = cursor.fetchone()
+    return fila[0] if fila else 0
+
+
+def etag_menu(version):
+    """ETag de cualquier vista del menú en una versión"""
+    return f'menu-{version}'
+
+
+def cargar_menu(cursor):
+    """
+    Lee el menú completo de SQLite.
+
+    Returns:
+        dict: 'productos' (con categoria_nombre) y 'productos_por_id',
+        'categorias' (con total_productos) y 'combos' (catálogo
+        {combo_id: Combo})
+    """
+    cursor.execute('''
+        SELECT p.*, c.nombre as categoria_nombre
+        FROM productos p
+        LEFT JOIN categorias c ON p.categoria_id = c.id
+        ORDER BY c.orden, p.nombre
+    ''')
+    productos = [dict(row) for row in cursor.fetchall()]
+
+    cursor.execute('''
+        SELECT c.*, COUNT(p.id) as total_productos
+        FROM categorias c
+        LEFT JOIN productos p ON c.id = p.categoria_id
+        GROUP BY c.id
+        ORDER BY c.orden
+    ''')
+    categorias = [dict(row) for row in cursor.fetchall()]
+
+    return {
+        'productos': productos,
+        'productos_por_id': {producto['id']: producto for producto in productos},
+        'categorias': categorias,
+        'combos': cargar_catalogo(cursor),
+    }
+
+
+def _serializar(datos):
+    """JSON en el mismo formato que jsonify (compacto, claves ordenadas)"""
+    return (json.dumps(datos, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def _vista(datos, vista):
+    """Datos de una vista: 'productos', 'categorias', 'combos' o ('categoria', id)"""
+    if isinstance(vista, tuple):
+        _, categoria_id = vista
+        disponibles = [
+            {campo: p[campo] for campo in ('id', 'nombre', 'precio', 'categoria_id', 'disponible')}
+            for p in datos['productos']
+            if p['categoria_id'] == categoria_id and p['disponible'] == 1
+        ]
+        return sorted(disponibles, key=lambda p: p['nombre'])
+    if vista == 'combos':
+        activos = sorted((c for c in datos['combos'].values() if c.activo == 1),
+                         key=lambda c: (c.nombre, c.id))
+        return [combo_a_dict(combo) for combo in activos]
+    return datos[vista]
+
+
+class CacheMenu:
+    """Menú de pos.db en memoria, invalidado por versión"""
+
+    def __init__(self, db_file='pos.db', revalidar=MENU_CACHE_REVALIDAR):
+        self.db_file = db_file
+        self.revalidar = revalidar
+        self._menu = None  # {'version', 'datos', 'json': {vista: bytes}}
+        self._revisado_en = 0.0
+        self._invalidado = False
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.revisiones = 0
+        self.recargas = 0
+        self.invalidaciones = 0
+
+    def _al_dia(self, menu):
+        return (menu is not None and not self._invalidado
+                and time.monotonic() - self._revisado_en < self.revalidar)
+
+    def _vigente(self, revisar=False):
+        """
+        Foto actual; lee la versión de SQLite solo si toca revalidar o si se
+        pide `revisar` (rutas que cobran con los precios del menú).
+        """
+        menu = self._menu
+        if not revisar and self._al_dia(menu):
+            self.aciertos += 1
+            return menu
+        with self._lock:
+            menu = self._menu
+            if not revisar and self._al_dia(menu):
+                self.aciertos += 1
+                return menu
+            conn = get_db_independiente(self.db_file)
+            try:
+                cursor = conn.cursor()
+                # Se limpia antes de leer la versión: una invalidación posterior
+                # obliga a revisar de nuevo. Y la versión se lee antes que el
+                # menú: un cambio entre ambas lecturas recarga en la siguiente
+                self._invalidado = False
+                version = version_menu(cursor)
+                self.revisiones += 1
+                if menu is None or menu['version'] != version:
+                    menu = {'version': version, 'datos': cargar_menu(cursor), 'json': {}}
+                    self._menu = menu
+                    self.recargas += 1
+                self._revisado_en = time.monotonic()
+            finally:
+                conn.close()
+        return menu
+
+    def obtener(self, vista):
+        """
+        JSON ya serializado de una vista del menú.
+
+        Args:
+            vista: 'productos', 'categorias', 'combos' o ('categoria', id)
+
+        Returns:
+            tuple: (versión, bytes del JSON)
+        """
+        menu = self._vigente()
+        cuerpo = menu['json'].get(vista)
+        if cuerpo is None:
+            cuerpo = _serializar(_vista(menu['datos'], vista))
+            # Las vistas por categoría solo se guardan si la categoría existe,
+            # para que ids inventados no hagan crecer la caché
+            if not isinstance(vista, tuple) or any(
+                    c['id'] == vista[1] for c in menu['datos']['categorias']):
+                menu['json'][vista] = cuerpo
+        return menu['version'], cuerpo
+
+    def combo(self, combo_id, revisar=False):
+        """
+        Combo del catálogo, activo o no.
+
+        Args:
+            combo_id: Id del combo (int o texto numérico)
+            revisar: Confirmar antes que la foto sea la versión actual
+
+        Returns:
+            Combo o None si no existe
+        """
+        try:
+            combo_id = int(combo_id)
+        except (TypeError, ValueError):
+            return None
+        return self._vigente(revisar)['datos']['combos'].get(combo_id)
+
+    def productos_y_combos(self, revisar=False):
+        """
+        Precios de una misma versión del menú para armar un pedido.
+
+        Returns:
+            tuple: ({producto_id: fila}, {combo_id: Combo}); no modificar
+        """
+        datos = self._vigente(revisar)['datos']
+        return datos['productos_por_id'], datos['combos']
+
+    def invalidar(self):
+        """Obliga a revisar la versión en la próxima lectura"""
+        self._invalidado = True
+        self.invalidaciones += 1
+
+    def registrar_cambio(self):
+        """
+        Para las rutas que escriben el menú: invalida al terminar la unidad de
+        trabajo de la petición, ya confirmada la escritura.
+        """
+        al_terminar_unidad_de_trabajo(self.invalidar, clave='cache_menu')
+
+    def estadisticas(self):
+        menu = self._menu
+        return {
+            'version': menu['version'] if menu else None,
+            'vistas': len(menu['json']) if menu else 0,
+            'aciertos': self.aciertos,
+            'revisiones': self.revisiones,
+            'recargas': self.recargas,
+            'invalidaciones': self.invalidaciones,
+        }
+
+
+cache_menu = CacheMenu()
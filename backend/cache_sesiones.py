@@ -0,0 +1,135 @@
+"""
+Caché en memoria de sesiones autenticadas (TTL + LRU)
+
+`login_required` resuelve el token bearer con un JOIN de usuarios y sesiones
+en pos_database.db. Las pantallas que hacen polling (cocina, caja) repiten esa
+consulta en cada petición; con esta caché la resolución del token cuesta una
+búsqueda en un dict.
+
+- La clave es el SHA-256 del token: el token en claro no queda en memoria.
+- Cada entrada vive como máximo AUTH_CACHE_TTL segundos y nunca más allá del
+  vencimiento de la sesión.
+- Al superar AUTH_CACHE_MAX entradas se descarta la menos usada.
+- Logout, reset de contraseña y cambios o desactivación de usuario invalidan
+  las entradas afectadas (ver auth.py).
+
+La caché es por proceso: con varios workers, el TTL acota cuánto tarda otro
+proceso en ver una sesión invalidada.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', '30'))
+AUTH_CACHE_MAX = int(os.getenv('AUTH_CACHE_MAX', '1024'))
+
+
+def hash_token(token):
+    """Clave de caché para un token de sesión"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class CacheSesiones:
+    """Caché LRU con vencimiento por entrada: hash de token -> usuario"""
+
+    def __init__(self, ttl=AUTH_CACHE_TTL, maximo=AUTH_CACHE_MAX):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._entradas = OrderedDict()  # clave -> (vence_en, usuario)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expiradas = 0
+        self.descartadas = 0
+        self.invalidadas = 0
+
+    def obtener(self, token):
+        """Retorna una copia del usuario cacheado para el token, o None"""
+        if self.ttl <= 0:
+            return None
+        clave = hash_token(token)
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            vence_en, usuario = entrada
+            if vence_en <= ahora:
+                del self._entradas[clave]
+                self.expiradas += 1
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+        return dict(usuario)
+
+    def guardar(self, token, usuario, segundos_restantes=None):
+        """
+        Cachea el usuario de una sesión válida.
+
+        Args:
+            token: Token de sesión en claro
+            usuario: dict con la fila de usuarios
+            segundos_restantes: Vida restante de la sesión; acota el TTL
+        """
+        if self.ttl <= 0:
+            return
+        vida = self.ttl if segundos_restantes is None else min(self.ttl, segundos_restantes)
+        if vida <= 0:
+            return
+        clave = hash_token(token)
+        with self._lock:
+            self._entradas[clave] = (time.monotonic() + vida, dict(usuario))
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+                self.descartadas += 1
+
+    def invalidar_token(self, token):
+        """Elimina la entrada de un token (logout)"""
+        with self._lock:
+            if self._entradas.pop(hash_token(token), None) is not None:
+                self.invalidadas += 1
+
+    def invalidar_usuario(self, usuario_id):
+        """Elimina todas las entradas de un usuario (cambios de usuario o contraseña)"""
+        with self._lock:
+            claves = [clave for clave, (_, usuario) in self._entradas.items()
+                      if usuario.get('id') == usuario_id]
+            for clave in claves:
+                del self._entradas[clave]
+            self.invalidadas += len(claves)
+
+    def limpiar(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        """Retorna contadores de aciertos, fallos y tamaño"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'maximo': self.maximo,
+                'ttl_segundos': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 3) if consultas else 0.0,
+                'expiradas': self.expiradas,
+                'descartadas': self.descartadas,
+                'invalidadas': self.invalidadas,
+            }
+
+
+# Caché compartida por todos los hilos del proceso
+cache_sesiones = CacheSesiones()
+
+
+def obtener_estadisticas_cache_sesiones():
+    """Estadísticas de la caché de sesiones del proceso"""
+    return cache_sesiones.estadisticas()
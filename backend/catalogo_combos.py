@@ -0,0 +1,73 @@
+"""
+Catálogo de combos con sus productos
+
+Carga todos los combos y sus productos en una sola consulta y los guarda
+como registros inmutables. El catálogo vive en la foto de la caché del menú
+(cache_menu.py), que lo recarga cuando cambia la versión del menú. De ahí
+lo leen el listado de combos, el detalle, crear_pedido y
+agregar_item_pedido, en lugar de consultar combos y combo_items por cada
+combo.
+"""
+
+from typing import NamedTuple, Optional
+
+
+class ItemCombo(NamedTuple):
+    """Producto dentro de un combo, con nombre y precio del menú"""
+    id: int
+    producto_id: int
+    producto_nombre: str
+    cantidad: int
+    precio_unitario: float
+
+
+class Combo(NamedTuple):
+    """Combo del catálogo (activo o no) con sus items"""
+    id: int
+    nombre: str
+    descripcion: Optional[str]
+    precio_combo: float
+    imagen: Optional[str]
+    activo: int
+    cantidad_items: int
+    items: tuple
+
+
+def cargar_catalogo(cursor):
+    """
+    Lee todos los combos con sus productos en una consulta.
+
+    Returns:
+        dict: {combo_id: Combo}
+    """
+    cursor.execute('''
+        SELECT c.id, c.nombre, c.descripcion, c.precio_combo, c.imagen, c.activo,
+               ci.id AS item_id, ci.producto_id, ci.cantidad,
+               p.nombre AS producto_nombre, p.precio AS precio_unitario
+        FROM combos c
+        LEFT JOIN combo_items ci ON ci.combo_id = c.id
+        LEFT JOIN productos p ON ci.producto_id = p.id
+        ORDER BY c.id, ci.id
+    ''')
+    catalogo = {}
+    items = {}
+    for (combo_id, nombre, descripcion, precio_combo, imagen, activo,
+         item_id, producto_id, cantidad, producto_nombre, precio_unitario) in cursor.fetchall():
+        if combo_id not in catalogo:
+            catalogo[combo_id] = [combo_id, nombre, descripcion, precio_combo, imagen, activo, 0]
+            items[combo_id] = []
+        if item_id is None:
+            continue
+        catalogo[combo_id][6] += 1
+        # Un producto borrado cuenta en cantidad_items pero no aparece en items
+        if producto_nombre is not None:
+            items[combo_id].append(ItemCombo(item_id, producto_id, producto_nombre, cantidad, precio_unitario))
+
+    return {combo_id: Combo(*campos, tuple(items[combo_id])) for combo_id, campos in catalogo.items()}
+
+
+def combo_a_dict(combo):
+    """Combo en el formato JSON de GET /combos y /combos/<id>"""
+    datos = combo._asdict()
+    datos['items'] = [item._asdict() for item in combo.items]
+    return datos
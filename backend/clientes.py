@@ -6,6 +6,7 @@ Sistema de Facturación - El Salvador
 from flask import Blueprint, request, jsonify
 from datetime import datetime
 from database import get_db
+from migraciones import aplicar_migraciones
 from validators import (
     validar_email, validar_telefono, validar_nit, validar_nrc,
     validar_numero_positivo
@@ -14,45 +15,12 @@ from validators import (
 clientes_bp = Blueprint('clientes', __name__)
 
 def init_db():
-    """Inicializa la tabla de clientes"""
+    """Aplica las migraciones pendientes e inserta el cliente genérico"""
+    aplicar_migraciones('pos.db')
+
     conn = get_db()
     cursor = conn.cursor()
 
-    # Crear tabla de clientes
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS clientes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            codigo TEXT UNIQUE,
-            tipo_documento TEXT DEFAULT 'DUI',
-            numero_documento TEXT,
-            nrc TEXT,
-            nombre TEXT NOT NULL,
-            nombre_comercial TEXT,
-            direccion TEXT,
-            departamento TEXT,
-            municipio TEXT,
-            telefono TEXT,
-            email TEXT,
-            tipo_cliente TEXT DEFAULT 'consumidor_final',
-            actividad_economica TEXT,
-            credito_autorizado REAL DEFAULT 0,
-            dias_credito INTEGER DEFAULT 0,
-            notas TEXT,
-            activo INTEGER DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Crear índices para búsquedas rápidas
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_documento ON clientes(numero_documento)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_nrc ON clientes(nrc)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes(nombre)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_codigo ON clientes(codigo)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_email ON clientes(email)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_activo ON clientes(activo)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_tipo_cliente ON clientes(tipo_cliente)')
-
     # Insertar cliente genérico si no existe
     cursor.execute('SELECT COUNT(*) FROM clientes')
     if cursor.fetchone()[0] == 0:
@@ -64,9 +32,6 @@ def init_db():
     conn.commit()
     conn.close()
 
-# Inicializar base de datos al importar el módulo
-init_db()
-
 def generar_codigo_cliente():
     """Genera código único para cliente"""
     conn = get_db()
@@ -77,6 +42,31 @@ def generar_codigo_cliente():
     return f"CLI-{(max_id + 1):04d}"
 
 
+# Crédito utilizado de un cliente `c`: pedidos a crédito aún no pagados.
+# Se resuelve con el índice idx_pedidos_cliente_estado (cliente_id, estado, total)
+SQL_CREDITO_UTILIZADO = '''
+    COALESCE((SELECT SUM(p.total) FROM pedidos p
+              WHERE p.cliente_id = c.id AND p.estado = 'credito'), 0)
+'''
+
+
+def obtener_credito_cliente(cursor, cliente_id):
+    """
+    Obtiene en una sola consulta los datos de crédito de un cliente activo
+
+    Returns:
+        sqlite3.Row con id, nombre, credito_autorizado, dias_credito y
+        credito_utilizado, o None si el cliente no existe o está inactivo
+    """
+    cursor.execute(f'''
+        SELECT c.id, c.nombre, c.credito_autorizado, c.dias_credito,
+               {SQL_CREDITO_UTILIZADO} AS credito_utilizado
+        FROM clientes c
+        WHERE c.id = ? AND c.activo = 1
+    ''', (cliente_id,))
+    return cursor.fetchone()
+
+
 # ============ ENDPOINTS API ============
 
 @clientes_bp.route('/clientes', methods=['GET'])
@@ -682,50 +672,25 @@ def get_credito_cliente(id):
         conn = get_db()
         cursor = conn.cursor()
 
-        # Obtener datos del cliente
-        cursor.execute('''
-            SELECT id, nombre, credito_autorizado, dias_credito
-            FROM clientes WHERE id = ? AND activo = 1
-        ''', (id,))
-
-        cliente = cursor.fetchone()
+        # Datos del cliente y crédito utilizado (pedidos en estado 'credito')
+        cliente = obtener_credito_cliente(cursor, id)
         if not cliente:
             conn.close()
             return jsonify({'error': 'Cliente no encontrado'}), 404
 
         credito_autorizado = cliente['credito_autorizado'] or 0
-        conn.close()
+        credito_utilizado = cliente['credito_utilizado'] or 0
 
-        # Calcular crédito utilizado desde la base de datos de POS
-        # Los pedidos con estado 'credito' son ventas a crédito pendientes de pago
-        import sqlite3 as sqlite_pos
-        try:
-            conn_pos = sqlite_pos.connect('pos.db')
-            conn_pos.row_factory = sqlite_pos.Row
-            cursor_pos = conn_pos.cursor()
-
-            cursor_pos.execute('''
-                SELECT COALESCE(SUM(total), 0) as credito_utilizado
-                FROM pedidos
-                WHERE cliente_id = ? AND estado = 'credito'
-            ''', (id,))
-
-            credito_utilizado = cursor_pos.fetchone()['credito_utilizado'] or 0
-
-            # Obtener pedidos pendientes de pago (crédito)
-            cursor_pos.execute('''
-                SELECT id, created_at, total, estado
-                FROM pedidos
-                WHERE cliente_id = ? AND estado = 'credito'
-                ORDER BY created_at ASC
-            ''', (id,))
-
-            pedidos_pendientes = [dict(row) for row in cursor_pos.fetchall()]
-            conn_pos.close()
-        except Exception as e:
-            print(f"Error consultando pos.db: {e}")
-            credito_utilizado = 0
-            pedidos_pendientes = []
+        # Obtener pedidos pendientes de pago (crédito)
+        cursor.execute('''
+            SELECT id, created_at, total, estado
+            FROM pedidos
+            WHERE cliente_id = ? AND estado = 'credito'
+            ORDER BY created_at ASC
+        ''', (id,))
+
+        pedidos_pendientes = [dict(row) for row in cursor.fetchall()]
+        conn.close()
 
         credito_disponible = credito_autorizado - credito_utilizado
 
@@ -792,19 +757,13 @@ def verificar_credito_cliente(id):
         conn = get_db()
         cursor = conn.cursor()
 
-        # Obtener crédito autorizado
-        cursor.execute('''
-            SELECT credito_autorizado FROM clientes
-            WHERE id = ? AND activo = 1
-        ''', (id,))
-
-        cliente = cursor.fetchone()
+        # Crédito autorizado y utilizado en una sola consulta
+        cliente = obtener_credito_cliente(cursor, id)
+        conn.close()
         if not cliente:
-            conn.close()
             return jsonify({'error': 'Cliente no encontrado'}), 404
 
         credito_autorizado = cliente['credito_autorizado'] or 0
-        conn.close()
 
         if credito_autorizado <= 0:
             return jsonify({
@@ -812,24 +771,7 @@ def verificar_credito_cliente(id):
                 'mensaje': 'El cliente no tiene crédito autorizado'
             })
 
-        # Calcular crédito utilizado desde pos.db
-        import sqlite3 as sqlite_pos
-        try:
-            conn_pos = sqlite_pos.connect('pos.db')
-            conn_pos.row_factory = sqlite_pos.Row
-            cursor_pos = conn_pos.cursor()
-
-            cursor_pos.execute('''
-                SELECT COALESCE(SUM(total), 0) as credito_utilizado
-                FROM pedidos
-                WHERE cliente_id = ? AND estado = 'credito'
-            ''', (id,))
-
-            credito_utilizado = cursor_pos.fetchone()['credito_utilizado'] or 0
-            conn_pos.close()
-        except Exception:
-            credito_utilizado = 0
-
+        credito_utilizado = cliente['credito_utilizado'] or 0
         credito_disponible = credito_autorizado - credito_utilizado
 
         if monto > credito_disponible:
@@ -857,62 +799,42 @@ def get_alertas_credito():
         conn = get_db()
         cursor = conn.cursor()
 
-        # Obtener clientes con crédito autorizado
-        cursor.execute('''
-            SELECT id, codigo, nombre, credito_autorizado
-            FROM clientes
-            WHERE activo = 1 AND credito_autorizado > 0
+        # Crédito utilizado de todos los clientes con crédito en una sola consulta
+        cursor.execute(f'''
+            WITH uso AS (
+                SELECT c.id, c.codigo, c.nombre, c.credito_autorizado,
+                       {SQL_CREDITO_UTILIZADO} AS credito_utilizado
+                FROM clientes c
+                WHERE c.activo = 1 AND c.credito_autorizado > 0
+            )
+            SELECT *, credito_utilizado * 100.0 / credito_autorizado AS porcentaje
+            FROM uso
+            WHERE credito_utilizado >= credito_autorizado * 0.8
+            ORDER BY porcentaje DESC
         ''')
-
-        clientes = [dict(row) for row in cursor.fetchall()]
+        filas = cursor.fetchall()
         conn.close()
 
-        if not clientes:
-            return jsonify([])
-
-        # Consultar crédito utilizado desde pos.db
-        import sqlite3 as sqlite_pos
         alertas = []
-
-        try:
-            conn_pos = sqlite_pos.connect('pos.db')
-            conn_pos.row_factory = sqlite_pos.Row
-            cursor_pos = conn_pos.cursor()
-
-            for cliente in clientes:
-                cursor_pos.execute('''
-                    SELECT COALESCE(SUM(total), 0) as credito_utilizado
-                    FROM pedidos
-                    WHERE cliente_id = ? AND estado = 'credito'
-                ''', (cliente['id'],))
-
-                credito_utilizado = cursor_pos.fetchone()['credito_utilizado'] or 0
-                credito_autorizado = cliente['credito_autorizado']
-
-                if credito_autorizado > 0:
-                    porcentaje = (credito_utilizado / credito_autorizado) * 100
-
-                    # Solo incluir si está por encima del 80%
-                    if porcentaje >= 80:
-                        cliente['credito_utilizado'] = credito_utilizado
-                        cliente['porcentaje_utilizado'] = round(porcentaje, 1)
-                        cliente['credito_disponible'] = credito_autorizado - credito_utilizado
-
-                        if porcentaje >= 100:
-                            cliente['nivel_alerta'] = 'critico'
-                        elif porcentaje >= 90:
-                            cliente['nivel_alerta'] = 'alto'
-                        else:
-                            cliente['nivel_alerta'] = 'medio'
-
-                        alertas.append(cliente)
-
-            conn_pos.close()
-        except Exception as e:
-            print(f"Error consultando pos.db para alertas: {e}")
-
-        # Ordenar por porcentaje descendente
-        alertas.sort(key=lambda x: x.get('porcentaje_utilizado', 0), reverse=True)
+        for fila in filas:
+            porcentaje = fila['porcentaje']
+            if porcentaje >= 100:
+                nivel_alerta = 'critico'
+            elif porcentaje >= 90:
+                nivel_alerta = 'alto'
+            else:
+                nivel_alerta = 'medio'
+
+            alertas.append({
+                'id': fila['id'],
+                'codigo': fila['codigo'],
+                'nombre': fila['nombre'],
+                'credito_autorizado': fila['credito_autorizado'],
+                'credito_utilizado': fila['credito_utilizado'],
+                'porcentaje_utilizado': round(porcentaje, 1),
+                'credito_disponible': fila['credito_autorizado'] - fila['credito_utilizado'],
+                'nivel_alerta': nivel_alerta
+            })
 
         return jsonify(alertas)
     except Exception as e:
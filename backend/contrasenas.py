@@ -0,0 +1,177 @@
+"""
+Hash de contraseñas PBKDF2 en un ejecutor acotado
+
+PBKDF2 con 100k iteraciones tarda decenas de milisegundos de CPU. Cuando
+varios empleados inician sesión a la vez (cambio de turno) esos cálculos
+ocupaban los hilos del servidor y retrasaban el tráfico de pedidos. Aquí se
+ejecutan en un ejecutor dedicado con un máximo de PASSWORD_HASH_WORKERS
+cálculos simultáneos; el resto espera en cola y se registran métricas de
+espera y duración.
+
+- PASSWORD_HASH_EJECUTOR=hilos (por defecto): hashlib.pbkdf2_hmac libera el
+  GIL, así que los hilos usan varios núcleos sin el coste de procesos.
+- PASSWORD_HASH_EJECUTOR=procesos: ProcessPoolExecutor (contexto spawn).
+
+Con gevent (servidor.py) los hilos de `threading` son greenlets y el cálculo
+bloquearía el bucle de eventos, así que el modo hilos usa entonces el pool de
+hilos nativos de gevent.
+
+Formato almacenado, con los parámetros en cada hash:
+
+    pbkdf2_sha256$<iteraciones>$<salt>$<hash hex>
+
+Los hashes antiguos `salt:hash` (100k iteraciones) se siguen aceptando;
+`necesita_rehash()` indica cuándo conviene regenerarlos con los parámetros
+actuales (PASSWORD_ITERACIONES), lo que auth.login hace al validar.
+"""
+
+import atexit
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+ALGORITMO = 'pbkdf2_sha256'
+ITERACIONES_LEGADAS = 100000
+PASSWORD_ITERACIONES = int(os.getenv('PASSWORD_ITERACIONES', '100000'))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_EJECUTOR = os.getenv('PASSWORD_HASH_EJECUTOR', 'hilos')
+
+
+def _pbkdf2(password, salt, iteraciones):
+    """Cálculo puro (corre en el ejecutor). Retorna (hash hex, ms de cálculo)"""
+    inicio = time.perf_counter()
+    resultado = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iteraciones).hex()
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+
+def _threading_parcheado():
+    """True si gevent reemplazó `threading` (servidor.py en modo gevent)"""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+
+class EjecutorHash:
+    """Ejecutor con concurrencia máxima fija y métricas de cola"""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, tipo=PASSWORD_HASH_EJECUTOR):
+        self.workers = max(1, workers)
+        self.tipo = tipo
+        self._ejecutor = None
+        self._lock = threading.Lock()
+        self.pendientes = 0
+        self.max_pendientes = 0
+        self.completados = 0
+        self.espera_total_ms = 0.0
+        self.espera_max_ms = 0.0
+        self.calculo_total_ms = 0.0
+
+    def _obtener_ejecutor(self):
+        with self._lock:
+            if self._ejecutor is None:
+                if self.tipo == 'procesos':
+                    self._ejecutor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                elif _threading_parcheado():
+                    from gevent.threadpool import ThreadPoolExecutor as ThreadPoolExecutorNativo
+                    self._ejecutor = ThreadPoolExecutorNativo(max_workers=self.workers)
+                else:
+                    self._ejecutor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='hash-contrasenas')
+            return self._ejecutor
+
+    def calcular(self, password, salt, iteraciones):
+        """Calcula PBKDF2 en el ejecutor y espera el resultado"""
+        ejecutor = self._obtener_ejecutor()
+        inicio = time.perf_counter()
+        with self._lock:
+            self.pendientes += 1
+            self.max_pendientes = max(self.max_pendientes, self.pendientes)
+        try:
+            resultado, calculo_ms = ejecutor.submit(_pbkdf2, password, salt, iteraciones).result()
+        finally:
+            with self._lock:
+                self.pendientes -= 1
+        espera_ms = max(0.0, (time.perf_counter() - inicio) * 1000 - calculo_ms)
+        with self._lock:
+            self.completados += 1
+            self.calculo_total_ms += calculo_ms
+            self.espera_total_ms += espera_ms
+            self.espera_max_ms = max(self.espera_max_ms, espera_ms)
+        return resultado
+
+    def estadisticas(self):
+        """Retorna contadores de cola, espera y duración"""
+        with self._lock:
+            completados = self.completados or 1
+            return {
+                'ejecutor': self.tipo,
+                'workers': self.workers,
+                'iteraciones': PASSWORD_ITERACIONES,
+                'pendientes': self.pendientes,
+                'max_pendientes': self.max_pendientes,
+                'completados': self.completados,
+                'espera_promedio_ms': round(self.espera_total_ms / completados, 2),
+                'espera_max_ms': round(self.espera_max_ms, 2),
+                'calculo_promedio_ms': round(self.calculo_total_ms / completados, 2),
+            }
+
+    def detener(self):
+        """Detiene el ejecutor (se vuelve a crear en el siguiente uso)"""
+        with self._lock:
+            ejecutor, self._ejecutor = self._ejecutor, None
+        if ejecutor is not None:
+            ejecutor.shutdown(wait=False)
+
+
+ejecutor_hash = EjecutorHash()
+atexit.register(ejecutor_hash.detener)
+
+
+def _parsear(stored_hash):
+    """Retorna (iteraciones, salt, hash hex) de un hash nuevo o legado"""
+    if stored_hash.startswith(ALGORITMO + '$'):
+        _, iteraciones, salt, hash_value = stored_hash.split('$')
+        return int(iteraciones), salt, hash_value
+    salt, hash_value = stored_hash.split(':')
+    return ITERACIONES_LEGADAS, salt, hash_value
+
+
+def hash_password(password, salt=None, iteraciones=None):
+    """Hash password with salt"""
+    if salt is None:
+        salt = secrets.token_hex(16)
+    iteraciones = iteraciones or PASSWORD_ITERACIONES
+    hashed = ejecutor_hash.calcular(password, salt, iteraciones)
+    return f'{ALGORITMO}${iteraciones}${salt}${hashed}'
+
+
+def verify_password(password, stored_hash):
+    """Verify password against stored hash"""
+    try:
+        iteraciones, salt, hash_value = _parsear(stored_hash)
+        new_hash = ejecutor_hash.calcular(password, salt, iteraciones)
+        return hmac.compare_digest(new_hash, hash_value)
+    except (ValueError, AttributeError, TypeError):
+        return False
+
+
+def necesita_rehash(stored_hash):
+    """True si el hash es legado o usa menos iteraciones que las configuradas"""
+    try:
+        iteraciones, _, _ = _parsear(stored_hash)
+    except (ValueError, AttributeError):
+        return False
+    return not stored_hash.startswith(ALGORITMO + '$') or iteraciones < PASSWORD_ITERACIONES
+
+
+def obtener_estadisticas_hash():
+    """Métricas del ejecutor de hash de contraseñas"""
+    return ejecutor_hash.estadisticas()
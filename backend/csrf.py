@@ -1,36 +1,99 @@
 """
 CSRF Token protection module for Sistema POS
-Provides functions to generate, store, and validate CSRF tokens
+Provides functions to generate and validate CSRF tokens
+
+Tokens are stateless and signed:
+
+    <issued at, ms, hex>.<nonce>.<HMAC-SHA256(issued at, nonce, session)>
+
+They are bound to the session token of the request that receives them
+(Authorization bearer or session_token cookie) and are validated by
+recomputing the signature, so any worker process sharing CSRF_SECRET (or
+SECRET_KEY) accepts them and nothing is stored per issued token.
+
+Semantics kept from the previous in-memory store:
+- tokens expire after CSRF_TOKEN_EXPIRY (1 hour);
+- a token may be reused freely within REUSE_WINDOW (5 seconds) of being
+  issued (double clicks, mobile + desktop buttons);
+- after that a token is single use. Used nonces are remembered in a bounded
+  per-process set (CSRF_REPLAY_CACHE entries), so memory stays flat; a
+  replay that lands on another worker is still rejected if it belongs to a
+  different session, which is what CSRF protection relies on.
+
+A used nonce is only forgotten once its token has expired. If the set is
+full of unexpired nonces, further tokens are rejected instead of evicting
+one, which would make an already used token valid again.
 """
 
-import secrets
+import base64
 import hashlib
+import hmac
 import json
-from datetime import datetime, timedelta
 import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context, request
 
-# CSRF tokens store in memory (in production, use Redis or database)
-# Format: {token: (timestamp, ip_address, user_id)}
-_csrf_tokens = {}
 CSRF_TOKEN_EXPIRY = 3600  # 1 hour
+REUSE_WINDOW = 5  # seconds
+CSRF_REPLAY_CACHE = int(os.getenv('CSRF_REPLAY_CACHE', '10000'))
+
+# How the token reaches the client on each response:
+#   'header' - only in the X-CSRF-Token header (no work on the body)
+#   'body'   - header plus `_csrf_token` spliced into JSON object bodies
+CSRF_MODE = os.getenv('CSRF_MODE', 'body')
+
+# Fallback key when no secret is configured (valid only in this process)
+_process_key = secrets.token_bytes(32)
+
+# Nonces of tokens used after their reuse window: nonce -> expiry (epoch)
+_used_nonces = OrderedDict()
+_used_lock = threading.RLock()
+
+
+def _key():
+    """HMAC key (read on each use: .env may be loaded after import)"""
+    secret = os.getenv('CSRF_SECRET') or os.getenv('SECRET_KEY')
+    return secret.encode() if secret else _process_key
+
+
+def bind_session(session_token):
+    """
+    Binds the tokens issued for the current request to `session_token`.
+    Used by login/logout, where the session changes during the request.
+    """
+    g.csrf_session = session_token or ''
+
+
+def _session_binding():
+    """Session token of the current request ('' when anonymous)"""
+    if not has_request_context():
+        return ''
+    if 'csrf_session' in g:
+        return g.csrf_session
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    return token or request.cookies.get('session_token') or ''
+
+
+def _sign(issued, nonce, session):
+    message = f'{issued}.{nonce}.{session}'.encode()
+    digest = hmac.new(_key(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
 
 
 def generate_csrf_token():
     """
-    Generates a new CSRF token using secure random bytes.
+    Generates a new signed CSRF token bound to the current session.
 
     Returns:
         str: A secure CSRF token
     """
-    token = secrets.token_urlsafe(32)
-    timestamp = datetime.now()
-    _csrf_tokens[token] = timestamp
-
-    # Clean up expired tokens every 100 generations
-    if len(_csrf_tokens) % 100 == 0:
-        _cleanup_expired_tokens()
-
-    return token
+    issued = format(int(time.time() * 1000), 'x')
+    nonce = secrets.token_urlsafe(12)
+    return f'{issued}.{nonce}.{_sign(issued, nonce, _session_binding())}'
 
 
 def validate_csrf_token(token):
@@ -46,31 +109,78 @@ def validate_csrf_token(token):
     if not token:
         return False, "CSRF token is missing"
 
-    if token not in _csrf_tokens:
+    parts = token.split('.')
+    if len(parts) != 3:
         return False, "CSRF token is invalid"
+    issued, nonce, signature = parts
 
-    token_time = _csrf_tokens[token]
-    age_seconds = (datetime.now() - token_time).total_seconds()
+    if not hmac.compare_digest(signature, _sign(issued, nonce, _session_binding())):
+        return False, "CSRF token is invalid"
+
+    try:
+        age_seconds = time.time() - int(issued, 16) / 1000
+    except ValueError:
+        return False, "CSRF token is invalid"
 
     if age_seconds > CSRF_TOKEN_EXPIRY:
-        del _csrf_tokens[token]
         return False, "CSRF token has expired"
 
     # Allow token reuse within 5 seconds to handle rapid requests
     # This prevents 403 errors when buttons are double-clicked
     # or when both mobile/desktop buttons trigger simultaneously
-    REUSE_WINDOW = 5  # seconds
-    if age_seconds > REUSE_WINDOW:
+    if age_seconds > REUSE_WINDOW and CSRF_REPLAY_CACHE > 0:
         # Token older than 5 seconds - consume it (one-time use)
-        del _csrf_tokens[token]
-    # If within reuse window, don't delete - allow reuse
+        with _used_lock:
+            if nonce in _used_nonces:
+                return False, "CSRF token is invalid (already used)"
+            _cleanup_expired_tokens()
+            if len(_used_nonces) >= CSRF_REPLAY_CACHE:
+                _cleanup_expired_tokens(full=True)
+            if len(_used_nonces) >= CSRF_REPLAY_CACHE:
+                # Evicting an unexpired nonce would let its token be replayed
+                return False, "CSRF token rejected (too many tokens in use)"
+            _used_nonces[nonce] = int(issued, 16) / 1000 + CSRF_TOKEN_EXPIRY
 
     return True, ""
 
 
-def _cleanup_expired_tokens():
-    """Removes expired tokens from the store."""
-    cutoff_time = datetime.now() - timedelta(seconds=CSRF_TOKEN_EXPIRY)
-    expired = [token for token, time in _csrf_tokens.items() if time < cutoff_time]
-    for token in expired:
-        del _csrf_tokens[token]
+def _cleanup_expired_tokens(full=False):
+    """
+    Removes used nonces whose tokens have expired anyway.
+
+    Nonces are stored in the order their tokens are consumed, which follows
+    issue order closely, so expired ones collect at the head: by default
+    only the head is pruned. With full=True every entry is checked.
+    """
+    now = time.time()
+    with _used_lock:
+        if full:
+            expired = [nonce for nonce, expiry in _used_nonces.items() if expiry < now]
+            for nonce in expired:
+                del _used_nonces[nonce]
+        else:
+            while _used_nonces and next(iter(_used_nonces.values())) < now:
+                _used_nonces.popitem(last=False)
+
+
+def inject_token_into_json(body, token):
+    """
+    Adds `"_csrf_token": token` to a serialized JSON object without decoding it.
+
+    The key is spliced in front of the closing brace, so the cost is one copy
+    of the body instead of a full json.loads + json.dumps round trip.
+
+    Args:
+        body (bytes): Serialized JSON response body
+        token (str): CSRF token to include
+
+    Returns:
+        bytes: New body, or None if the body is not a JSON object
+    """
+    content = body.strip()
+    if not content.startswith(b'{') or not content.endswith(b'}'):
+        return None
+    field = b'"_csrf_token":' + json.dumps(token).encode()
+    if content[1:-1].strip():
+        return content[:-1].rstrip() + b',' + field + b'}'
+    return b'{' + field + b'}'
@@ -1,15 +1,383 @@
 """
 Módulo centralizado de configuración de base de datos
 Proporciona funciones compartidas para conexión y gestión de BD
+
+Las conexiones se obtienen de un pool acotado por archivo de BD. Cada conexión
+se abre una sola vez con los PRAGMAs de rendimiento aplicados (WAL,
+synchronous, cache, mmap, busy_timeout) y al llamar a `conn.close()` vuelve
+al pool en lugar de cerrarse.
+
+Dentro de una petición HTTP `get_db()` actúa como unidad de trabajo: todas
+las llamadas de la misma petición (handler y funciones auxiliares) comparten
+una sola conexión y transacción. Al terminar la petición se confirma lo
+pendiente si la respuesta fue exitosa o se revierte si hubo error (ver
+`registrar_unidad_de_trabajo`).
+
+Opcionalmente (DB_COLA_ESCRITURA=1) las escrituras independientes pueden
+enviarse a un único hilo escritor por archivo de BD con `escribir()`: el hilo
+agrupa los trabajos en lotes y los confirma con un solo commit, evitando que
+varios hilos compitan por el bloqueo de escritura de SQLite.
 """
 
+import atexit
 import sqlite3
 import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
+
+from flask import g, has_request_context
 
 # Rutas de bases de datos
 DB_PATH = os.path.join(os.path.dirname(__file__), 'pos.db')
 DB_INVENTORY_PATH = os.path.join(os.path.dirname(__file__), 'pos_database.db')
 
+# Configuración del pool (ajustable por variables de entorno)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_STATEMENT_CACHE = int(os.getenv('DB_STATEMENT_CACHE', '256'))
+
+# PRAGMAs aplicados una sola vez al abrir cada conexión
+PRAGMAS_CONEXION = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', os.getenv('DB_SYNCHRONOUS', 'NORMAL')),
+    ('cache_size', int(os.getenv('DB_CACHE_SIZE_KB', '16384')) * -1),
+    ('mmap_size', int(os.getenv('DB_MMAP_SIZE', str(128 * 1024 * 1024)))),
+    ('busy_timeout', int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))),
+    ('temp_store', 'MEMORY'),
+    ('foreign_keys', 'ON'),
+)
+
+# Cola de escritura con commit agrupado (desactivada por defecto)
+DB_COLA_ESCRITURA = os.getenv('DB_COLA_ESCRITURA', '0') == '1'
+DB_ESCRITURA_LOTE = int(os.getenv('DB_ESCRITURA_LOTE', '64'))
+DB_ESCRITURA_LATENCIA_MS = float(os.getenv('DB_ESCRITURA_LATENCIA_MS', '2'))
+
+
+def _abrir_conexion(db_path, factory=sqlite3.Connection):
+    """Abre una conexión física con row factory y los PRAGMAs de rendimiento"""
+    conn = sqlite3.connect(
+        db_path,
+        factory=factory,
+        check_same_thread=False,
+        cached_statements=DB_STATEMENT_CACHE
+    )
+    conn.row_factory = sqlite3.Row
+    for nombre, valor in PRAGMAS_CONEXION:
+        conn.execute(f'PRAGMA {nombre} = {valor}')
+    return conn
+
+
+class ConexionPool(sqlite3.Connection):
+    """
+    Conexión SQLite que regresa a su pool al cerrarse.
+
+    Se mantiene la interfaz de sqlite3.Connection para que el código existente
+    (`conn = get_db(); ...; conn.close()`) siga funcionando sin cambios.
+    """
+
+    _pool = None
+    _prestada = False
+    _en_peticion = False
+
+    def close(self):
+        """Devuelve la conexión al pool (descarta cambios no confirmados)"""
+        if self._en_peticion:
+            # Conexión de la unidad de trabajo: se libera al terminar la petición
+            return
+        if self._pool is None:
+            super().close()
+            return
+        if not self._prestada:
+            # Doble close(): la conexión ya fue devuelta
+            return
+        self._prestada = False
+        self._pool._devolver(self)
+
+    def cerrar_definitivamente(self):
+        """Cierra la conexión física (usado por el pool)"""
+        super().close()
+
+
+class PoolConexiones:
+    """Pool acotado de conexiones para un archivo de BD"""
+
+    def __init__(self, db_path, tamano=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.db_path = db_path
+        self.tamano = tamano
+        self.timeout = timeout
+        self._libres = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._abiertas = 0
+        self._checkouts = 0
+        self._esperas = 0
+        self._tiempo_espera_total = 0.0
+        self._desbordes = 0
+
+    def _crear_conexion(self):
+        """Abre una conexión física nueva con los PRAGMAs de rendimiento"""
+        conn = _abrir_conexion(self.db_path, factory=ConexionPool)
+        conn._pool = self
+        # Si el llamador pierde la conexión sin cerrarla, liberar su cupo
+        weakref.finalize(conn, self._olvidar)
+        return conn
+
+    def _olvidar(self):
+        with self._lock:
+            self._abiertas -= 1
+
+    def obtener(self):
+        """
+        Obtiene una conexión del pool.
+
+        Si no hay conexiones libres y el pool está lleno, espera hasta
+        `timeout` segundos; pasado ese tiempo abre una conexión de desborde
+        para no rechazar la petición.
+        """
+        conn = None
+        try:
+            conn = self._libres.get_nowait()
+        except queue.Empty:
+            crear = False
+            with self._lock:
+                if self._abiertas < self.tamano:
+                    self._abiertas += 1
+                    crear = True
+            if crear:
+                try:
+                    conn = self._crear_conexion()
+                except Exception:
+                    with self._lock:
+                        self._abiertas -= 1
+                    raise
+            else:
+                inicio = time.perf_counter()
+                try:
+                    conn = self._libres.get(timeout=self.timeout)
+                except queue.Empty:
+                    conn = None
+                with self._lock:
+                    self._esperas += 1
+                    self._tiempo_espera_total += time.perf_counter() - inicio
+                if conn is None:
+                    with self._lock:
+                        self._abiertas += 1
+                        self._desbordes += 1
+                    conn = self._crear_conexion()
+
+        with self._lock:
+            self._checkouts += 1
+        conn._prestada = True
+        return conn
+
+    def _devolver(self, conn):
+        """Regresa una conexión al pool tras limpiar su estado"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            self._descartar(conn)
+            return
+
+        if self._libres.qsize() >= self.tamano:
+            self._descartar(conn)
+            return
+        self._libres.put(conn)
+
+    def _descartar(self, conn):
+        conn._pool = None
+        try:
+            conn.cerrar_definitivamente()
+        except sqlite3.Error:
+            pass
+
+    def cerrar(self):
+        """Cierra todas las conexiones libres del pool"""
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conn)
+
+    def estadisticas(self):
+        """Retorna contadores del pool"""
+        with self._lock:
+            return {
+                'db': os.path.basename(self.db_path),
+                'tamano': self.tamano,
+                'conexiones_abiertas': self._abiertas,
+                'conexiones_libres': self._libres.qsize(),
+                'checkouts': self._checkouts,
+                'esperas': self._esperas,
+                'tiempo_espera_total_ms': round(self._tiempo_espera_total * 1000, 2),
+                'desbordes': self._desbordes
+            }
+
+
+class EscritorSerializado:
+    """
+    Hilo escritor único para un archivo de BD con commit agrupado.
+
+    Los trabajos son funciones `funcion(conn)` que ejecutan sus sentencias sin
+    hacer commit. El hilo toma hasta `tamano_lote` trabajos (esperando como
+    máximo `latencia_ms` a que lleguen más), ejecuta cada uno dentro de un
+    SAVEPOINT para que un fallo no afecte a los demás y confirma el lote
+    completo con un solo commit. El resultado de cada trabajo se entrega en
+    un Future una vez confirmado.
+    """
+
+    def __init__(self, db_path, tamano_lote=DB_ESCRITURA_LOTE,
+                 latencia_ms=DB_ESCRITURA_LATENCIA_MS):
+        self.db_path = db_path
+        self.tamano_lote = max(1, tamano_lote)
+        self.latencia = max(0.0, latencia_ms) / 1000
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._trabajos = 0
+        self._fallidos = 0
+        self._lotes = 0
+        self._lote_max = 0
+        self._latencia_commit_total = 0.0
+        self._latencia_commit_max = 0.0
+        self._hilo = threading.Thread(
+            target=self._bucle, name=f'escritor-{os.path.basename(db_path)}', daemon=True
+        )
+        self._hilo.start()
+
+    def enviar(self, funcion):
+        """Encola un trabajo de escritura y retorna su Future"""
+        if not self._hilo.is_alive():
+            raise RuntimeError('El escritor de la BD está detenido')
+        futuro = Future()
+        self._cola.put((funcion, futuro))
+        return futuro
+
+    def detener(self, timeout=5):
+        """Procesa los trabajos pendientes y detiene el hilo escritor"""
+        if self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join(timeout)
+
+    def _bucle(self):
+        conn = _abrir_conexion(self.db_path)
+        try:
+            detener = False
+            while not detener:
+                trabajo = self._cola.get()
+                if trabajo is None:
+                    break
+                lote = [trabajo]
+                limite = time.perf_counter() + self.latencia
+                while len(lote) < self.tamano_lote:
+                    try:
+                        restante = limite - time.perf_counter()
+                        if restante > 0:
+                            trabajo = self._cola.get(timeout=restante)
+                        else:
+                            trabajo = self._cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if trabajo is None:
+                        detener = True
+                        break
+                    lote.append(trabajo)
+                self._procesar_lote(conn, lote)
+        finally:
+            conn.close()
+
+    def _procesar_lote(self, conn, lote):
+        """Ejecuta un lote de trabajos y lo confirma con un solo commit"""
+        lote = [(funcion, futuro) for funcion, futuro in lote
+                if futuro.set_running_or_notify_cancel()]
+        if not lote:
+            return
+
+        resultados = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.Error as e:
+            self._fallar([futuro for _, futuro in lote], e)
+            return
+
+        for funcion, futuro in lote:
+            conn.execute('SAVEPOINT trabajo')
+            try:
+                resultado = funcion(conn)
+            except Exception as e:
+                conn.execute('ROLLBACK TO SAVEPOINT trabajo')
+                conn.execute('RELEASE SAVEPOINT trabajo')
+                with self._lock:
+                    self._fallidos += 1
+                futuro.set_exception(e)
+                continue
+            conn.execute('RELEASE SAVEPOINT trabajo')
+            resultados.append((futuro, resultado))
+
+        inicio = time.perf_counter()
+        try:
+            conn.commit()
+        except sqlite3.Error as e:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            self._fallar([futuro for futuro, _ in resultados], e)
+            return
+        duracion = time.perf_counter() - inicio
+
+        with self._lock:
+            self._lotes += 1
+            self._trabajos += len(resultados)
+            self._lote_max = max(self._lote_max, len(lote))
+            self._latencia_commit_total += duracion
+            self._latencia_commit_max = max(self._latencia_commit_max, duracion)
+        for futuro, resultado in resultados:
+            futuro.set_result(resultado)
+
+    def _fallar(self, futuros, error):
+        with self._lock:
+            self._fallidos += len(futuros)
+        for futuro in futuros:
+            futuro.set_exception(error)
+
+    def estadisticas(self):
+        """Retorna profundidad de la cola y latencias de commit"""
+        with self._lock:
+            return {
+                'db': os.path.basename(self.db_path),
+                'activo': self._hilo.is_alive(),
+                'profundidad_cola': self._cola.qsize(),
+                'trabajos': self._trabajos,
+                'fallidos': self._fallidos,
+                'lotes': self._lotes,
+                'lote_max': self._lote_max,
+                'trabajos_por_lote': round(self._trabajos / self._lotes, 2) if self._lotes else 0,
+                'latencia_commit_promedio_ms': round(
+                    self._latencia_commit_total / self._lotes * 1000, 3) if self._lotes else 0,
+                'latencia_commit_max_ms': round(self._latencia_commit_max * 1000, 3)
+            }
+
+
+# Pools por ruta absoluta de archivo
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _obtener_pool(db_path):
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = PoolConexiones(db_path)
+                _pools[db_path] = pool
+    return pool
+
 
 def get_db(db_file='pos.db'):
     """
@@ -19,16 +387,130 @@ def get_db(db_file='pos.db'):
         db_file (str): Nombre del archivo de BD ('pos.db' o 'pos_database.db')
 
     Returns:
-        sqlite3.Connection: Conexión a la base de datos con row factory configurada
+        sqlite3.Connection: Conexión del pool con row factory configurada.
+        Llamar a close() la devuelve al pool. Dentro de una petición HTTP
+        se retorna siempre la misma conexión y close() no tiene efecto.
     """
-    db_path = os.path.join(os.path.dirname(__file__), db_file)
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    # Habilitar foreign key constraints
-    conn.execute('PRAGMA foreign_keys = ON')
+    db_path = _ruta_db(db_file)
+    if has_request_context():
+        return _conexion_de_peticion(db_path)
+    return _obtener_pool(db_path).obtener()
+
+
+def get_db_independiente(db_file='pos.db'):
+    """
+    Obtiene una conexión del pool que no participa de la unidad de trabajo.
+
+    Para escrituras que deben confirmarse por su cuenta aunque se hagan
+    dentro de una petición (o de un handler de Socket.IO, que no pasa por
+    after_request). El llamador hace commit() y close().
+    """
+    return _obtener_pool(_ruta_db(db_file)).obtener()
+
+
+def _ruta_db(db_file):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), db_file)
+
+
+def _conexion_de_peticion(db_path):
+    """Retorna (o abre) la conexión de la petición actual para db_path"""
+    conexiones = g.get('_unidad_trabajo')
+    if conexiones is None:
+        conexiones = {}
+        g._unidad_trabajo = conexiones
+    conn = conexiones.get(db_path)
+    if conn is None:
+        conn = _obtener_pool(db_path).obtener()
+        conn._en_peticion = True
+        conexiones[db_path] = conn
     return conn
 
 
+def _finalizar_unidad_de_trabajo(confirmar):
+    """Confirma o revierte y devuelve al pool las conexiones de la petición"""
+    conexiones = g.pop('_unidad_trabajo', None)
+    try:
+        _cerrar_conexiones_de_peticion(conexiones, confirmar)
+    finally:
+        for funcion in g.pop('_al_terminar', {}).values():
+            try:
+                funcion()
+            except Exception as e:
+                print(f"[WARN] Callback de fin de unidad de trabajo falló: {e}")
+
+
+def _cerrar_conexiones_de_peticion(conexiones, confirmar):
+    if not conexiones:
+        return
+    error = None
+    for conn in conexiones.values():
+        try:
+            if conn.in_transaction:
+                if confirmar and error is None:
+                    conn.commit()
+                else:
+                    conn.rollback()
+        except sqlite3.Error as e:
+            error = e
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+        finally:
+            conn._en_peticion = False
+            conn.close()
+    if error is not None:
+        raise error
+
+
+def al_terminar_unidad_de_trabajo(funcion, clave=None):
+    """
+    Ejecuta `funcion()` cuando termina la unidad de trabajo de la petición,
+    ya confirmada o revertida (fuera de una petición, en el acto). Con la
+    misma `clave` se registra una sola vez por petición.
+    """
+    if not has_request_context():
+        funcion()
+        return
+    pendientes = g.get('_al_terminar')
+    if pendientes is None:
+        pendientes = g._al_terminar = {}
+    pendientes[clave if clave is not None else funcion] = funcion
+
+
+def liberar_unidad_de_trabajo():
+    """
+    Confirma lo pendiente y devuelve al pool las conexiones de la petición.
+
+    Para handlers que van a bloquearse mucho tiempo sin tocar la BD (long
+    polling): así no retienen conexiones del pool mientras esperan. Un
+    `get_db()` posterior en la misma petición abre una unidad nueva.
+    """
+    if has_request_context():
+        _finalizar_unidad_de_trabajo(True)
+
+
+def registrar_unidad_de_trabajo(app):
+    """
+    Registra en la app los hooks de la unidad de trabajo por petición.
+
+    - Respuestas exitosas (< 400): se confirma lo pendiente en un solo commit
+    - Respuestas de error o excepciones: se revierte lo no confirmado
+    """
+
+    @app.after_request
+    def _confirmar_unidad_de_trabajo(response):
+        _finalizar_unidad_de_trabajo(response.status_code < 400)
+        return response
+
+    @app.teardown_request
+    def _liberar_unidad_de_trabajo(exc):
+        try:
+            _finalizar_unidad_de_trabajo(False)
+        except sqlite3.Error:
+            pass
+
+
 def get_db_pos():
     """
     Obtiene conexión a la BD principal (pos.db).
@@ -43,3 +525,221 @@ def get_db_inventory():
     Alias para get_db('pos_database.db').
     """
     return get_db('pos_database.db')
+
+
+def rango_dia(fecha=None):
+    """
+    Retorna el rango semiabierto [inicio, fin) de un día para filtrar columnas
+    de fecha/hora almacenadas como texto ('YYYY-MM-DD HH:MM:SS' o ISO 8601).
+
+    `columna >= inicio AND columna < fin` equivale a `DATE(columna) = fecha`
+    pero puede usar índices sobre la columna (consulta sargable).
+
+    Args:
+        fecha: 'YYYY-MM-DD', date/datetime o None para el día local actual
+
+    Raises:
+        ValueError: Si la fecha no tiene formato YYYY-MM-DD
+    """
+    return rango_fechas(fecha, fecha)
+
+
+def rango_fechas(desde=None, hasta=None):
+    """
+    Retorna el rango semiabierto [inicio, fin) desde el día `desde` hasta el
+    día `hasta` inclusive. Cualquiera de los extremos puede ser None (abierto).
+    Si ambos son None se usa el día local actual.
+
+    Raises:
+        ValueError: Si alguna fecha no tiene formato YYYY-MM-DD
+    """
+    if desde is None and hasta is None:
+        desde = hasta = date.today()
+    inicio = _a_fecha(desde).isoformat() if desde is not None else None
+    fin = (_a_fecha(hasta) + timedelta(days=1)).isoformat() if hasta is not None else None
+    return inicio, fin
+
+
+def _a_fecha(valor):
+    """Normaliza 'YYYY-MM-DD', date o datetime a date"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def filtro_rango(columna, inicio, fin):
+    """
+    Construye la condición SQL y los parámetros de un rango semiabierto.
+
+    Returns:
+        tuple: (sql, params) listo para agregar con AND; sql vacío si no hay límites
+    """
+    condiciones, params = [], []
+    if inicio is not None:
+        condiciones.append(f'{columna} >= ?')
+        params.append(inicio)
+    if fin is not None:
+        condiciones.append(f'{columna} < ?')
+        params.append(fin)
+    return ' AND '.join(condiciones), params
+
+
+# Escritores por ruta absoluta de archivo
+_escritores = {}
+_escritores_lock = threading.Lock()
+
+
+def obtener_escritor(db_file='pos.db'):
+    """Retorna (creándolo si hace falta) el hilo escritor de un archivo de BD"""
+    db_path = _ruta_db(db_file)
+    with _escritores_lock:
+        escritor = _escritores.get(db_path)
+        if escritor is None:
+            escritor = EscritorSerializado(db_path)
+            _escritores[db_path] = escritor
+    return escritor
+
+
+def escribir(funcion, db_file='pos.db'):
+    """
+    Ejecuta un trabajo de escritura `funcion(conn)` y retorna un Future.
+
+    Con DB_COLA_ESCRITURA=1 el trabajo se encola en el hilo escritor y se
+    confirma en grupo con otros trabajos. Si la cola está desactivada se
+    ejecuta en el momento: dentro de una petición usa la conexión de la
+    unidad de trabajo; fuera de ella hace commit de inmediato.
+
+    La función no debe llamar a commit(). Con la cola activa, no esperar el
+    resultado mientras la petición tiene una escritura abierta sobre el mismo
+    archivo: el escritor quedaría bloqueado hasta el busy_timeout.
+    """
+    if DB_COLA_ESCRITURA:
+        return obtener_escritor(db_file).enviar(funcion)
+
+    futuro = Future()
+    conn = get_db(db_file)
+    try:
+        resultado = funcion(conn)
+        if not conn._en_peticion:
+            conn.commit()
+        futuro.set_result(resultado)
+    except Exception as e:
+        futuro.set_exception(e)
+    finally:
+        conn.close()
+    return futuro
+
+
+def ejecutar_escritura(sql, parametros=(), db_file='pos.db'):
+    """
+    Atajo de `escribir()` para una sola sentencia.
+
+    Returns:
+        Future: resuelve a {'lastrowid': ..., 'rowcount': ...}
+    """
+    def _trabajo(conn):
+        cursor = conn.execute(sql, parametros)
+        return {'lastrowid': cursor.lastrowid, 'rowcount': cursor.rowcount}
+    return escribir(_trabajo, db_file)
+
+
+class _RespuestaDeError(Exception):
+    """Lleva fuera de un trabajo su resultado `(cuerpo, status >= 400)`"""
+
+    def __init__(self, resultado):
+        super().__init__(resultado)
+        self.resultado = resultado
+
+
+def _es_respuesta_de_error(resultado):
+    return (isinstance(resultado, tuple) and len(resultado) == 2
+            and isinstance(resultado[1], int) and resultado[1] >= 400)
+
+
+def escribir_y_esperar(funcion, db_file='pos.db'):
+    """
+    Ejecuta `funcion(conn)` con escribir() y retorna su resultado confirmado.
+
+    Para las rutas que leen, validan y escriben en un solo trabajo (así la
+    lectura y la escritura siguen siendo atómicas también con la cola) y
+    notifican después. Sin la cola, confirma en el acto la unidad de trabajo
+    de la petición, como hacían esas rutas con conn.commit(): el trabajo
+    debe ser la única escritura de la ruta. Las excepciones del trabajo se
+    propagan.
+
+    Si el trabajo retorna `(cuerpo, status)` con status >= 400 no se
+    confirma nada, igual que la unidad de trabajo con una respuesta de
+    error: con la cola se descarta su SAVEPOINT y sin ella queda para el
+    rollback de after_request. La tupla se retorna tal cual.
+    """
+    def _trabajo(conn):
+        resultado = funcion(conn)
+        if _es_respuesta_de_error(resultado):
+            raise _RespuestaDeError(resultado)
+        return resultado
+
+    try:
+        resultado = escribir(_trabajo, db_file).result()
+    except _RespuestaDeError as e:
+        return e.resultado
+    if not DB_COLA_ESCRITURA and has_request_context():
+        get_db(db_file).commit()
+    return resultado
+
+
+def obtener_estadisticas_escritura():
+    """Retorna las estadísticas de los hilos escritores activos"""
+    with _escritores_lock:
+        escritores = list(_escritores.values())
+    return [escritor.estadisticas() for escritor in escritores]
+
+
+@atexit.register
+def detener_escritores():
+    """Vacía las colas de escritura y detiene los hilos escritores"""
+    with _escritores_lock:
+        escritores = list(_escritores.values())
+        _escritores.clear()
+    for escritor in escritores:
+        escritor.detener()
+
+
+def obtener_estadisticas_pool():
+    """
+    Retorna las estadísticas de todos los pools de conexiones.
+
+    Returns:
+        list: Un dict por archivo de BD con checkouts, esperas y conexiones abiertas
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.estadisticas() for pool in pools]
+
+
+def cerrar_pools():
+    """Cierra las conexiones libres de todos los pools"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.cerrar()
+
+
+def olvidar_pool(db_file):
+    """
+    Detiene el hilo escritor de un archivo, si lo hay, cierra las conexiones
+    libres de su pool y lo descarta.
+
+    Para BDs temporales (tests y benchmarks) que se borran al terminar: la
+    próxima get_db sobre esa ruta crea un pool nuevo.
+    """
+    db_path = _ruta_db(db_file)
+    with _escritores_lock:
+        escritor = _escritores.pop(db_path, None)
+    if escritor is not None:
+        escritor.detener()
+    with _pools_lock:
+        pool = _pools.pop(db_path, None)
+    if pool is not None:
+        pool.cerrar()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Script para insertar los datos iniciales del sistema.
+Se ejecuta automáticamente en el primer arranque (cuando se crea el esquema);
+los reinicios posteriores no lo ejecutan.
+
+Inserta solo lo que falta: menú y mesas, materia prima y recetas, cliente
+"Consumidor Final" y el usuario manager inicial.
+
+Uso:
+    python3 datos_iniciales.py
+"""
+
+import sys
+import os
+
+# Agregar ruta del backend al path para importar módulos
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def sembrar_datos_iniciales():
+    """Inserta los datos iniciales que falten en pos.db y pos_database.db"""
+    from auth import init_auth_db
+    from pos import init_db as init_pos_db
+    from inventario import inicializar_inventario_productos
+    from clientes import init_db as init_clientes_db
+
+    init_auth_db()
+    init_pos_db()
+    # El inventario depende de que los productos existan
+    inicializar_inventario_productos()
+    init_clientes_db()
+
+
+def main():
+    """Función principal para ejecutar la inserción"""
+    try:
+        sembrar_datos_iniciales()
+    except Exception as e:
+        print(f"[ERROR] Fallo insertando datos iniciales: {e}")
+        return 1
+
+    print("[SUCCESS] Datos iniciales verificados")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -849,15 +849,7 @@ class ControlCorrelativo:
         """
         cursor = conn.cursor()
 
-        # Crear tabla de correlativos si no existe
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS correlativos (
-                tipo TEXT PRIMARY KEY,
-                ultimo INTEGER DEFAULT 0,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
+        # La tabla correlativos la crea la migración 0001 de pos.db
         # Obtener o crear correlativo
         cursor.execute('SELECT ultimo FROM correlativos WHERE tipo = ?', (tipo,))
         row = cursor.fetchone()
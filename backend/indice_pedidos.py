@@ -0,0 +1,224 @@
+"""
+Índice en memoria de los pedidos activos
+
+Los pedidos activos (pendiente_pago, en_mesa, pagado, en_cocina, listo,
+servido) son pocos, pero las colas por rol, GET /pedidos?estado= y la
+ocupación de mesas los consultan sin parar. El índice los guarda por
+proceso, con su número de mesa e items, y responde esas lecturas sin SQL:
+
+- Se carga completo al arrancar (create_app).
+- Se sincroniza con la cola 'activos' de cambios_colas (triggers de
+  migraciones/pos/0004 y 0005): `sincronizar()` lee la versión (una lectura
+  por clave primaria) y, si cambió, recarga solo los pedidos modificados
+  desde la versión que tiene. Así refleja también lo escrito por otros
+  workers o por rutas que no avisan al índice.
+- Las rutas de escritura de pedidos e items llaman a `registrar_cambio()`,
+  que sincroniza al terminar la unidad de trabajo de la petición. El índice
+  solo ve lo confirmado: si la petición se revierte, no hay nada que recargar.
+- `verificar()` compara el índice con SQLite y devuelve las diferencias.
+
+Los nombres de producto y números de mesa se copian al cargar cada pedido:
+renombrar un producto no cambia los pedidos ya indexados hasta que estos
+cambien o se recargue el índice.
+"""
+
+import threading
+import time
+
+from database import al_terminar_unidad_de_trabajo, get_db_independiente
+from versiones_colas import COLAS, cambios_desde, version_cola
+
+COLA_ACTIVOS = 'activos'
+ESTADOS_ACTIVOS = ('pendiente_pago', 'en_mesa', 'pagado', 'en_cocina', 'listo', 'servido')
+
+
+def cargar_pedidos_activos(cursor, pedido_ids=None):
+    """
+    Lee de SQLite los pedidos activos con número de mesa e items.
+
+    Args:
+        cursor: Cursor de pos.db
+        pedido_ids: Si se indica, solo esos pedidos (los que siguen activos)
+
+    Returns:
+        dict: {pedido_id: pedido con 'mesa_numero' e 'items'}
+    """
+    estados = ','.join('?' for _ in ESTADOS_ACTIVOS)
+    parametros = list(ESTADOS_ACTIVOS)
+    filtro = f'p.estado IN ({estados})'
+    if pedido_ids is not None:
+        if not pedido_ids:
+            return {}
+        filtro += f" AND p.id IN ({','.join('?' for _ in pedido_ids)})"
+        parametros += list(pedido_ids)
+
+    cursor.execute(f'''
+        SELECT p.*, m.numero as mesa_numero
+        FROM pedidos p
+        LEFT JOIN mesas m ON p.mesa_id = m.id
+        WHERE {filtro}
+    ''', parametros)
+    pedidos = {row['id']: dict(row) for row in cursor.fetchall()}
+    for pedido in pedidos.values():
+        pedido['items'] = []
+
+    if pedidos:
+        cursor.execute(f'''
+            SELECT pi.*, pr.nombre as producto_nombre
+            FROM pedido_items pi
+            JOIN productos pr ON pi.producto_id = pr.id
+            WHERE pi.pedido_id IN ({','.join('?' for _ in pedidos)})
+            ORDER BY pi.pedido_id, pi.id
+        ''', list(pedidos))
+        for row in cursor.fetchall():
+            pedidos[row['pedido_id']]['items'].append(dict(row))
+    return pedidos
+
+
+class IndicePedidos:
+    """Pedidos activos de pos.db en memoria, sincronizados por versión"""
+
+    def __init__(self, db_file='pos.db'):
+        self.db_file = db_file
+        self._pedidos = {}
+        self._version = None
+        self._lock = threading.RLock()
+        self.cargas = 0
+        self.sincronizaciones = 0
+        self.pedidos_recargados = 0
+        self.ultima_verificacion = None
+
+    def _conexion(self):
+        return get_db_independiente(self.db_file)
+
+    def cargar(self):
+        """Carga completa desde SQLite (al arrancar o si el historial no alcanza)"""
+        conn = self._conexion()
+        try:
+            cursor = conn.cursor()
+            with self._lock:
+                # La versión se lee antes que los pedidos: un cambio entre ambas
+                # lecturas se vuelve a aplicar en la siguiente sincronización
+                version = version_cola(cursor, COLA_ACTIVOS)
+                self._pedidos = cargar_pedidos_activos(cursor)
+                self._version = version
+                self.cargas += 1
+        finally:
+            conn.close()
+
+    def sincronizar(self):
+        """Aplica los cambios confirmados desde la última versión vista"""
+        conn = self._conexion()
+        try:
+            cursor = conn.cursor()
+            # Camino rápido sin bloquear a otros lectores: nada cambió
+            if self._version is not None and version_cola(cursor, COLA_ACTIVOS) == self._version:
+                return
+            with self._lock:
+                if self._version is None:
+                    self.cargar()
+                    return
+                version = version_cola(cursor, COLA_ACTIVOS)
+                if version == self._version:
+                    return
+                primeros = cambios_desde(cursor, COLA_ACTIVOS, self._version, version)
+                if primeros is None:
+                    self.cargar()
+                    return
+                actuales = cargar_pedidos_activos(cursor, list(primeros))
+                for pedido_id in primeros:
+                    if pedido_id in actuales:
+                        self._pedidos[pedido_id] = actuales[pedido_id]
+                    else:
+                        self._pedidos.pop(pedido_id, None)
+                self._version = version
+                self.sincronizaciones += 1
+                self.pedidos_recargados += len(primeros)
+        finally:
+            conn.close()
+
+    def registrar_cambio(self):
+        """
+        Para las rutas que escriben pedidos o items: sincroniza el índice al
+        terminar la unidad de trabajo de la petición (una vez por petición).
+        """
+        al_terminar_unidad_de_trabajo(self.sincronizar, clave='indice_pedidos')
+
+    def _seleccionar(self, incluye):
+        self.sincronizar()
+        with self._lock:
+            return [dict(p) for p in self._pedidos.values() if incluye(p)]
+
+    def cola(self, cola, pedido_ids=None):
+        """Pedidos de una cola por rol, en el orden de su pantalla"""
+        definicion = COLAS[cola]
+        ids = set(pedido_ids) if pedido_ids is not None else None
+        pedidos = self._seleccionar(
+            lambda p: definicion['incluye'](p) and (ids is None or p['id'] in ids))
+        pedidos.sort(key=definicion['clave'])
+        return pedidos
+
+    def por_estados(self, estados):
+        """Pedidos en `estados` (todos activos), del más reciente al más antiguo"""
+        estados = set(estados)
+        pedidos = self._seleccionar(lambda p: p['estado'] in estados)
+        pedidos.sort(key=lambda p: (p['created_at'] or '', p['id']), reverse=True)
+        return pedidos
+
+    def ocupacion_mesas(self):
+        """{mesa_id: pedidos activos}"""
+        self.sincronizar()
+        ocupacion = {}
+        with self._lock:
+            for pedido in self._pedidos.values():
+                if pedido['mesa_id'] is not None:
+                    ocupacion[pedido['mesa_id']] = ocupacion.get(pedido['mesa_id'], 0) + 1
+        return ocupacion
+
+    def verificar(self, reparar=False):
+        """
+        Compara el índice con SQLite.
+
+        Args:
+            reparar: Si hay diferencias, recarga el índice completo
+
+        Returns:
+            dict: consistente, faltantes, sobrantes y distintos (ids de pedido)
+        """
+        self.sincronizar()
+        conn = self._conexion()
+        try:
+            with self._lock:
+                en_bd = cargar_pedidos_activos(conn.cursor())
+                en_indice = self._pedidos
+                faltantes = sorted(set(en_bd) - set(en_indice))
+                sobrantes = sorted(set(en_indice) - set(en_bd))
+                distintos = sorted(pid for pid in set(en_bd) & set(en_indice)
+                                   if en_bd[pid] != en_indice[pid])
+        finally:
+            conn.close()
+
+        resultado = {
+            'consistente': not (faltantes or sobrantes or distintos),
+            'faltantes': faltantes,
+            'sobrantes': sobrantes,
+            'distintos': distintos,
+        }
+        self.ultima_verificacion = {'instante': time.time(), **resultado}
+        if reparar and not resultado['consistente']:
+            self.cargar()
+        return resultado
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'pedidos': len(self._pedidos),
+                'version': self._version,
+                'cargas': self.cargas,
+                'sincronizaciones': self.sincronizaciones,
+                'pedidos_recargados': self.pedidos_recargados,
+                'consistente': (self.ultima_verificacion or {}).get('consistente'),
+            }
+
+
+indice_pedidos = IndicePedidos()
@@ -5,232 +5,18 @@ Gestión de ingredientes, recetas y órdenes de compra
 
 import os
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify
 from auth import role_required
-from database import get_db
+from database import get_db, escribir_y_esperar, rango_dia
+from migraciones import aplicar_migraciones
 
 inventario_bp = Blueprint('inventario', __name__)
 
 
 def init_inventario_db():
-    """Inicializa las tablas de inventario de materia prima"""
-    conn = get_db()
-    cursor = conn.cursor()
-
-    # Verificar y agregar columna categoria si no existe
-    try:
-        cursor.execute("SELECT categoria FROM materia_prima LIMIT 1")
-    except sqlite3.OperationalError:
-        try:
-            cursor.execute("ALTER TABLE materia_prima ADD COLUMN categoria TEXT DEFAULT 'General'")
-            conn.commit()
-        except:
-            pass
-
-    # Tabla de proveedores
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS proveedores (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            codigo TEXT UNIQUE,
-            nombre TEXT NOT NULL,
-            nombre_comercial TEXT,
-            nit TEXT,
-            nrc TEXT,
-            direccion TEXT,
-            telefono TEXT,
-            correo TEXT,
-            contacto_nombre TEXT,
-            contacto_telefono TEXT,
-            condiciones_pago TEXT DEFAULT 'contado',
-            dias_credito INTEGER DEFAULT 0,
-            activo INTEGER DEFAULT 1,
-            notas TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Tabla de materia prima / ingredientes y productos de consumo
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS materia_prima (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            codigo TEXT UNIQUE,
-            nombre TEXT NOT NULL,
-            descripcion TEXT,
-            categoria TEXT DEFAULT 'General',
-            tipo TEXT DEFAULT 'ingrediente',
-            unidad_medida TEXT DEFAULT 'unidad',
-            stock_actual REAL DEFAULT 0,
-            stock_minimo REAL DEFAULT 10,
-            stock_maximo REAL DEFAULT 500,
-            costo_promedio REAL DEFAULT 0,
-            ultimo_costo REAL DEFAULT 0,
-            proveedor_principal_id INTEGER,
-            activo INTEGER DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (proveedor_principal_id) REFERENCES proveedores(id)
-        )
-    ''')
-
-    # Agregar columna tipo si no existe
-    try:
-        cursor.execute("SELECT tipo FROM materia_prima LIMIT 1")
-    except sqlite3.OperationalError:
-        try:
-            cursor.execute("ALTER TABLE materia_prima ADD COLUMN tipo TEXT DEFAULT 'ingrediente'")
-            conn.commit()
-        except:
-            pass
-
-    # Tabla de recetas (qué materia prima necesita cada producto)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS recetas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            producto_id INTEGER NOT NULL,
-            materia_prima_id INTEGER NOT NULL,
-            cantidad REAL NOT NULL,
-            unidad TEXT,
-            notas TEXT,
-            FOREIGN KEY (producto_id) REFERENCES productos(id),
-            FOREIGN KEY (materia_prima_id) REFERENCES materia_prima(id),
-            UNIQUE(producto_id, materia_prima_id)
-        )
-    ''')
-
-    # Tabla de movimientos de inventario
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS movimientos_inventario (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            materia_prima_id INTEGER NOT NULL,
-            tipo TEXT NOT NULL,
-            cantidad REAL NOT NULL,
-            stock_anterior REAL,
-            stock_nuevo REAL,
-            costo_unitario REAL,
-            referencia_tipo TEXT,
-            referencia_id INTEGER,
-            motivo TEXT,
-            usuario TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (materia_prima_id) REFERENCES materia_prima(id)
-        )
-    ''')
-
-    # Tabla de órdenes de compra
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ordenes_compra (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            numero TEXT UNIQUE,
-            proveedor_id INTEGER NOT NULL,
-            estado TEXT DEFAULT 'borrador',
-            fecha_orden DATE,
-            fecha_esperada DATE,
-            fecha_recepcion DATE,
-            subtotal REAL DEFAULT 0,
-            impuesto REAL DEFAULT 0,
-            total REAL DEFAULT 0,
-            notas TEXT,
-            created_by TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (proveedor_id) REFERENCES proveedores(id)
-        )
-    ''')
-
-    # Tabla de items de órdenes de compra
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS orden_compra_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            orden_id INTEGER NOT NULL,
-            materia_prima_id INTEGER NOT NULL,
-            cantidad_ordenada REAL NOT NULL,
-            cantidad_recibida REAL DEFAULT 0,
-            costo_unitario REAL NOT NULL,
-            subtotal REAL NOT NULL,
-            notas TEXT,
-            FOREIGN KEY (orden_id) REFERENCES ordenes_compra(id),
-            FOREIGN KEY (materia_prima_id) REFERENCES materia_prima(id)
-        )
-    ''')
-
-    # Tabla de relación materia prima - proveedor
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS materia_proveedor (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            materia_prima_id INTEGER NOT NULL,
-            proveedor_id INTEGER NOT NULL,
-            codigo_proveedor TEXT,
-            costo REAL,
-            es_principal INTEGER DEFAULT 0,
-            tiempo_entrega_dias INTEGER,
-            notas TEXT,
-            FOREIGN KEY (materia_prima_id) REFERENCES materia_prima(id),
-            FOREIGN KEY (proveedor_id) REFERENCES proveedores(id),
-            UNIQUE(materia_prima_id, proveedor_id)
-        )
-    ''')
-
-    # Tabla de extracciones de materia prima (control manual de libras/kg extraídas por jornada)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS extracciones_materia_prima (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha DATE NOT NULL,
-            hora TIME,
-            materia_prima_id INTEGER NOT NULL,
-            cantidad_extraida REAL NOT NULL,
-            unidad_medida TEXT,
-            motivo TEXT,
-            descripcion TEXT,
-            usuario TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (materia_prima_id) REFERENCES materia_prima(id)
-        )
-    ''')
-
-    # ============ ÍNDICES PARA OPTIMIZAR CONSULTAS ============
-    # Índices en proveedores
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_proveedores_codigo ON proveedores(codigo)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_proveedores_activo ON proveedores(activo)')
-
-    # Índices en materia_prima
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_materia_prima_codigo ON materia_prima(codigo)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_materia_prima_nombre ON materia_prima(nombre)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_materia_prima_categoria ON materia_prima(categoria)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_materia_prima_activo ON materia_prima(activo)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_materia_prima_proveedor ON materia_prima(proveedor_principal_id)')
-
-    # Índices en recetas
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recetas_producto_id ON recetas(producto_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recetas_materia_prima_id ON recetas(materia_prima_id)')
-
-    # Índices en movimientos_inventario
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimientos_inventario_materia_prima_id ON movimientos_inventario(materia_prima_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimientos_inventario_tipo ON movimientos_inventario(tipo)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimientos_inventario_created_at ON movimientos_inventario(created_at)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimientos_inventario_referencia ON movimientos_inventario(referencia_tipo, referencia_id)')
-
-    # Índices en ordenes_compra
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ordenes_compra_numero ON ordenes_compra(numero)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ordenes_compra_proveedor_id ON ordenes_compra(proveedor_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ordenes_compra_estado ON ordenes_compra(estado)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ordenes_compra_fecha_orden ON ordenes_compra(fecha_orden)')
-
-    # Índices en orden_compra_items
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orden_compra_items_orden_id ON orden_compra_items(orden_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orden_compra_items_materia_prima_id ON orden_compra_items(materia_prima_id)')
-
-    # Índices en materia_proveedor
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_materia_proveedor_materia_prima_id ON materia_proveedor(materia_prima_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_materia_proveedor_proveedor_id ON materia_proveedor(proveedor_id)')
-
-    # Índices en extracciones_materia_prima
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_extracciones_materia_prima_fecha ON extracciones_materia_prima(fecha)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_extracciones_materia_prima_materia_prima_id ON extracciones_materia_prima(materia_prima_id)')
-
-    conn.commit()
-    conn.close()
+    """Aplica las migraciones pendientes (las tablas de inventario viven en pos.db)"""
+    aplicar_migraciones('pos.db')
 
 
 def insertar_datos_iniciales_inventario():
@@ -372,10 +158,6 @@ def insertar_datos_iniciales_inventario():
     conn.close()
 
 
-# Inicializar BD al importar
-init_inventario_db()
-
-
 def inicializar_inventario_productos():
     """Inicializa datos de inventario después de que los productos existan"""
     insertar_datos_iniciales_inventario()
@@ -723,69 +505,69 @@ def ajustar_materia_prima(id):
     if tipo not in ['entrada', 'salida', 'ajuste']:
         return jsonify({'error': 'Tipo de movimiento inválido'}), 400
 
-    conn = get_db()
-    cursor = conn.cursor()
-
-    # Obtener stock actual
-    cursor.execute('SELECT stock_actual, costo_promedio, nombre FROM materia_prima WHERE id = ?', (id,))
-    row = cursor.fetchone()
-
-    if not row:
-        conn.close()
-        return jsonify({'error': 'Materia prima no encontrada'}), 404
-
-    stock_anterior = row['stock_actual']
-    costo_anterior = row['costo_promedio'] or 0
-
-    # Calcular nuevo stock
-    if tipo == 'entrada':
-        stock_nuevo = stock_anterior + cantidad
-        if costo_unitario and costo_unitario > 0:
-            costo_total_anterior = stock_anterior * costo_anterior
-            costo_total_nuevo = cantidad * costo_unitario
-            nuevo_costo_promedio = (costo_total_anterior + costo_total_nuevo) / stock_nuevo if stock_nuevo > 0 else costo_unitario
-        else:
+    def _ajustar(conn):
+        cursor = conn.cursor()
+
+        # Obtener stock actual
+        cursor.execute('SELECT stock_actual, costo_promedio, nombre FROM materia_prima WHERE id = ?', (id,))
+        row = cursor.fetchone()
+
+        if not row:
+            return {'error': 'Materia prima no encontrada'}, 404
+
+        stock_anterior = row['stock_actual']
+        costo_anterior = row['costo_promedio'] or 0
+
+        # Calcular nuevo stock
+        if tipo == 'entrada':
+            stock_nuevo = stock_anterior + cantidad
+            if costo_unitario and costo_unitario > 0:
+                costo_total_anterior = stock_anterior * costo_anterior
+                costo_total_nuevo = cantidad * costo_unitario
+                nuevo_costo_promedio = (costo_total_anterior + costo_total_nuevo) / stock_nuevo if stock_nuevo > 0 else costo_unitario
+            else:
+                nuevo_costo_promedio = costo_anterior
+        elif tipo == 'salida':
+            stock_nuevo = stock_anterior - cantidad
+            if stock_nuevo < 0:
+                return {'error': f'Stock insuficiente de {row["nombre"]}. Disponible: {stock_anterior}'}, 400
+            nuevo_costo_promedio = costo_anterior
+        else:  # ajuste
+            stock_nuevo = cantidad
             nuevo_costo_promedio = costo_anterior
-    elif tipo == 'salida':
-        stock_nuevo = stock_anterior - cantidad
-        if stock_nuevo < 0:
-            conn.close()
-            return jsonify({'error': f'Stock insuficiente de {row["nombre"]}. Disponible: {stock_anterior}'}), 400
-        nuevo_costo_promedio = costo_anterior
-    else:  # ajuste
-        stock_nuevo = cantidad
-        nuevo_costo_promedio = costo_anterior
-
-    # Actualizar inventario
-    cursor.execute('''
-        UPDATE materia_prima SET
-            stock_actual = ?,
-            costo_promedio = ?,
-            ultimo_costo = COALESCE(?, ultimo_costo),
-            updated_at = ?
-        WHERE id = ?
-    ''', (stock_nuevo, nuevo_costo_promedio, costo_unitario, datetime.now().isoformat(), id))
 
-    # Registrar movimiento
-    cursor.execute('''
-        INSERT INTO movimientos_inventario (
-            materia_prima_id, tipo, cantidad, stock_anterior, stock_nuevo,
-            costo_unitario, motivo, usuario
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        id, tipo, cantidad, stock_anterior, stock_nuevo,
-        costo_unitario, motivo, data.get('usuario', 'Sistema')
-    ))
+        # Actualizar inventario
+        cursor.execute('''
+            UPDATE materia_prima SET
+                stock_actual = ?,
+                costo_promedio = ?,
+                ultimo_costo = COALESCE(?, ultimo_costo),
+                updated_at = ?
+            WHERE id = ?
+        ''', (stock_nuevo, nuevo_costo_promedio, costo_unitario, datetime.now().isoformat(), id))
+
+        # Registrar movimiento
+        cursor.execute('''
+            INSERT INTO movimientos_inventario (
+                materia_prima_id, tipo, cantidad, stock_anterior, stock_nuevo,
+                costo_unitario, motivo, usuario
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            id, tipo, cantidad, stock_anterior, stock_nuevo,
+            costo_unitario, motivo, data.get('usuario', 'Sistema')
+        ))
 
-    conn.commit()
-    conn.close()
+        return {
+            'success': True,
+            'stock_anterior': stock_anterior,
+            'stock_nuevo': stock_nuevo,
+            'costo_promedio': nuevo_costo_promedio
+        }, 200
 
-    return jsonify({
-        'success': True,
-        'stock_anterior': stock_anterior,
-        'stock_nuevo': stock_nuevo,
-        'costo_promedio': nuevo_costo_promedio
-    })
+    # Lectura y escritura en un solo trabajo de database.escribir: con
+    # DB_COLA_ESCRITURA=1 lo aplica el hilo escritor con commit agrupado
+    cuerpo, status = escribir_y_esperar(_ajustar)
+    return jsonify(cuerpo), status
 
 
 # ============ ENDPOINTS DE RECETAS ============
@@ -935,11 +717,12 @@ def get_estadisticas_inventario():
     cursor.execute("SELECT COUNT(*) as total FROM ordenes_compra WHERE estado IN ('borrador', 'enviada', 'parcial')")
     stats['ordenes_pendientes'] = cursor.fetchone()['total']
 
-    # Movimientos del día
+    # Movimientos del día (UTC, como CURRENT_TIMESTAMP)
+    inicio, fin = rango_dia(datetime.now(timezone.utc))
     cursor.execute('''
         SELECT COUNT(*) as total FROM movimientos_inventario
-        WHERE DATE(created_at) = DATE('now')
-    ''')
+        WHERE created_at >= ? AND created_at < ?
+    ''', (inicio, fin))
     stats['movimientos_hoy'] = cursor.fetchone()['total']
 
     # Recetas configuradas
@@ -1131,105 +914,105 @@ def recibir_orden_compra(id):
     data = request.get_json()
     items_recibidos = data.get('items', [])
 
-    conn = get_db()
-    cursor = conn.cursor()
+    def _recibir(conn):
+        cursor = conn.cursor()
 
-    cursor.execute('SELECT * FROM ordenes_compra WHERE id = ?', (id,))
-    orden = cursor.fetchone()
+        cursor.execute('SELECT * FROM ordenes_compra WHERE id = ?', (id,))
+        orden = cursor.fetchone()
 
-    if not orden:
-        conn.close()
-        return jsonify({'error': 'Orden no encontrada'}), 404
+        if not orden:
+            return {'error': 'Orden no encontrada'}, 404
 
-    if orden['estado'] in ['recibida', 'cancelada']:
-        conn.close()
-        return jsonify({'error': 'Esta orden ya fue procesada'}), 400
+        if orden['estado'] in ['recibida', 'cancelada']:
+            return {'error': 'Esta orden ya fue procesada'}, 400
 
-    total_recibido = 0
-    total_ordenado = 0
+        total_recibido = 0
+        total_ordenado = 0
 
-    for item_data in items_recibidos:
-        item_id = item_data.get('item_id')
-        cantidad_recibida = float(item_data.get('cantidad_recibida', 0))
+        for item_data in items_recibidos:
+            item_id = item_data.get('item_id')
+            cantidad_recibida = float(item_data.get('cantidad_recibida', 0))
 
-        if cantidad_recibida <= 0:
-            continue
+            if cantidad_recibida <= 0:
+                continue
 
-        cursor.execute('''
-            SELECT * FROM orden_compra_items WHERE id = ? AND orden_id = ?
-        ''', (item_id, id))
-        item = cursor.fetchone()
+            cursor.execute('''
+                SELECT * FROM orden_compra_items WHERE id = ? AND orden_id = ?
+            ''', (item_id, id))
+            item = cursor.fetchone()
 
-        if not item:
-            continue
+            if not item:
+                continue
 
-        # Actualizar cantidad recibida
-        nueva_cantidad_recibida = (item['cantidad_recibida'] or 0) + cantidad_recibida
-        cursor.execute('''
-            UPDATE orden_compra_items SET cantidad_recibida = ? WHERE id = ?
-        ''', (nueva_cantidad_recibida, item_id))
+            # Actualizar cantidad recibida
+            nueva_cantidad_recibida = (item['cantidad_recibida'] or 0) + cantidad_recibida
+            cursor.execute('''
+                UPDATE orden_compra_items SET cantidad_recibida = ? WHERE id = ?
+            ''', (nueva_cantidad_recibida, item_id))
 
-        # Actualizar inventario de materia prima
-        cursor.execute('''
-            SELECT stock_actual, costo_promedio FROM materia_prima WHERE id = ?
-        ''', (item['materia_prima_id'],))
-        mp = cursor.fetchone()
+            # Actualizar inventario de materia prima
+            cursor.execute('''
+                SELECT stock_actual, costo_promedio FROM materia_prima WHERE id = ?
+            ''', (item['materia_prima_id'],))
+            mp = cursor.fetchone()
 
-        if mp:
-            stock_anterior = mp['stock_actual']
-            costo_anterior = mp['costo_promedio'] or 0
-            stock_nuevo = stock_anterior + cantidad_recibida
+            if mp:
+                stock_anterior = mp['stock_actual']
+                costo_anterior = mp['costo_promedio'] or 0
+                stock_nuevo = stock_anterior + cantidad_recibida
 
-            # Calcular costo promedio
-            costo_total_anterior = stock_anterior * costo_anterior
-            costo_total_nuevo = cantidad_recibida * item['costo_unitario']
-            nuevo_costo = (costo_total_anterior + costo_total_nuevo) / stock_nuevo if stock_nuevo > 0 else item['costo_unitario']
+                # Calcular costo promedio
+                costo_total_anterior = stock_anterior * costo_anterior
+                costo_total_nuevo = cantidad_recibida * item['costo_unitario']
+                nuevo_costo = (costo_total_anterior + costo_total_nuevo) / stock_nuevo if stock_nuevo > 0 else item['costo_unitario']
 
-            cursor.execute('''
-                UPDATE materia_prima SET
-                    stock_actual = ?,
-                    costo_promedio = ?,
-                    ultimo_costo = ?,
-                    updated_at = ?
-                WHERE id = ?
-            ''', (stock_nuevo, nuevo_costo, item['costo_unitario'], datetime.now().isoformat(), item['materia_prima_id']))
-
-            # Registrar movimiento
-            cursor.execute('''
-                INSERT INTO movimientos_inventario (
-                    materia_prima_id, tipo, cantidad, stock_anterior, stock_nuevo,
-                    costo_unitario, referencia_tipo, referencia_id, motivo, usuario
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                item['materia_prima_id'], 'entrada', cantidad_recibida, stock_anterior, stock_nuevo,
-                item['costo_unitario'], 'orden_compra', id,
-                f"Recepción OC #{orden['numero']}", data.get('usuario', 'Sistema')
-            ))
-
-        total_recibido += nueva_cantidad_recibida
-        total_ordenado += item['cantidad_ordenada']
-
-    # Actualizar estado de la orden
-    if total_recibido >= total_ordenado:
-        nuevo_estado = 'recibida'
-        fecha_recepcion = datetime.now().strftime('%Y-%m-%d')
-    else:
-        nuevo_estado = 'parcial'
-        fecha_recepcion = None
+                cursor.execute('''
+                    UPDATE materia_prima SET
+                        stock_actual = ?,
+                        costo_promedio = ?,
+                        ultimo_costo = ?,
+                        updated_at = ?
+                    WHERE id = ?
+                ''', (stock_nuevo, nuevo_costo, item['costo_unitario'], datetime.now().isoformat(), item['materia_prima_id']))
 
-    cursor.execute('''
-        UPDATE ordenes_compra SET estado = ?, fecha_recepcion = ?, updated_at = ? WHERE id = ?
-    ''', (nuevo_estado, fecha_recepcion, datetime.now().isoformat(), id))
+                # Registrar movimiento
+                cursor.execute('''
+                    INSERT INTO movimientos_inventario (
+                        materia_prima_id, tipo, cantidad, stock_anterior, stock_nuevo,
+                        costo_unitario, referencia_tipo, referencia_id, motivo, usuario
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    item['materia_prima_id'], 'entrada', cantidad_recibida, stock_anterior, stock_nuevo,
+                    item['costo_unitario'], 'orden_compra', id,
+                    f"Recepción OC #{orden['numero']}", data.get('usuario', 'Sistema')
+                ))
 
-    conn.commit()
-    conn.close()
+            total_recibido += nueva_cantidad_recibida
+            total_ordenado += item['cantidad_ordenada']
 
-    return jsonify({
-        'success': True,
-        'estado': nuevo_estado,
-        'total_recibido': total_recibido,
-        'total_ordenado': total_ordenado
-    })
+        # Actualizar estado de la orden
+        if total_recibido >= total_ordenado:
+            nuevo_estado = 'recibida'
+            fecha_recepcion = datetime.now().strftime('%Y-%m-%d')
+        else:
+            nuevo_estado = 'parcial'
+            fecha_recepcion = None
+
+        cursor.execute('''
+            UPDATE ordenes_compra SET estado = ?, fecha_recepcion = ?, updated_at = ? WHERE id = ?
+        ''', (nuevo_estado, fecha_recepcion, datetime.now().isoformat(), id))
+
+        return {
+            'success': True,
+            'estado': nuevo_estado,
+            'total_recibido': total_recibido,
+            'total_ordenado': total_ordenado
+        }, 200
+
+    # Lectura y escritura en un solo trabajo de database.escribir: con
+    # DB_COLA_ESCRITURA=1 lo aplica el hilo escritor con commit agrupado
+    cuerpo, status = escribir_y_esperar(_recibir)
+    return jsonify(cuerpo), status
 
 
 # ============ ENDPOINTS PARA EXTRACCIONES DE MATERIA PRIMA ============
@@ -1342,6 +1125,13 @@ def listar_extracciones():
     limit = request.args.get('limit', 100, type=int)
     offset = request.args.get('offset', 0, type=int)
 
+    rango = None
+    if fecha:
+        try:
+            rango = rango_dia(fecha)
+        except ValueError:
+            return jsonify({'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+
     conn = get_db()
     cursor = conn.cursor()
 
@@ -1355,9 +1145,9 @@ def listar_extracciones():
     '''
     params = []
 
-    if fecha:
-        query += ' AND DATE(e.fecha) = ?'
-        params.append(fecha)
+    if rango:
+        query += ' AND e.fecha >= ? AND e.fecha < ?'
+        params.extend(rango)
 
     if materia_prima_id:
         query += ' AND e.materia_prima_id = ?'
@@ -1374,9 +1164,9 @@ def listar_extracciones():
         SELECT COUNT(*) as total FROM extracciones_materia_prima e WHERE 1=1
     '''
     count_params = []
-    if fecha:
-        count_query += ' AND DATE(e.fecha) = ?'
-        count_params.append(fecha)
+    if rango:
+        count_query += ' AND e.fecha >= ? AND e.fecha < ?'
+        count_params.extend(rango)
     if materia_prima_id:
         count_query += ' AND e.materia_prima_id = ?'
         count_params.append(materia_prima_id)
@@ -1510,12 +1300,31 @@ def eliminar_extraccion(id):
 
 # ============ FUNCIÓN PARA DESCONTAR STOCK POR VENTA ============
 
-def descontar_stock_pedido(pedido_id):
+def descontar_stock_pedido(pedido_id, conn=None):
     """
     Descuenta la materia prima según las recetas de los productos vendidos
     o directamente si es un producto de consumo (agua, gaseosas, cervezas)
+
+    Si se proporciona `conn`, el descuento se hace dentro de un SAVEPOINT de
+    la transacción del llamador: un fallo solo revierte el descuento y el
+    commit queda a cargo de quien llama.
     """
-    conn = get_db()
+    if conn is not None:
+        conn.execute('SAVEPOINT descontar_stock')
+        try:
+            _descontar_stock_pedido(conn, pedido_id)
+        except Exception:
+            conn.execute('ROLLBACK TO SAVEPOINT descontar_stock')
+            conn.execute('RELEASE SAVEPOINT descontar_stock')
+            raise
+        conn.execute('RELEASE SAVEPOINT descontar_stock')
+        return
+
+    escribir_y_esperar(lambda conn: _descontar_stock_pedido(conn, pedido_id))
+
+
+def _descontar_stock_pedido(conn, pedido_id):
+    """Registra las salidas de inventario de un pedido (sin commit)"""
     cursor = conn.cursor()
 
     # Obtener items del pedido con información del producto
@@ -1563,9 +1372,6 @@ def descontar_stock_pedido(pedido_id):
         # NOTA: Productos preparados (pupusas, chocolate, café, etc.) NO descuentan automáticamente
         # El descuento de materia prima se registra manualmente mediante "extracciones" en el módulo de inventario
 
-    conn.commit()
-    conn.close()
-
 
 # ============ FUNCIÓN INTERNA PARA ACTUALIZAR STOCK ============
 
@@ -0,0 +1,270 @@
+"""
+Armado de las líneas de un pedido en memoria
+
+crear_pedido resolvía el precio de cada producto y combo con una consulta
+por línea, insertaba las líneas una por una y después
+recalcular_totales_pedido releía los items, actualizaba el IVA de cada uno y
+reescribía el pedido. Ahora:
+
+- Los precios salen de la foto de la caché del menú (cache_menu.py), con una
+  sola lectura de la versión por pedido.
+- El IVA de cada línea y los totales se calculan aquí, con los mismos
+  redondeos que recalcular_totales_pedido.
+- Las líneas se insertan con un solo executemany en la transacción del
+  pedido.
+
+Las líneas de desglose de un combo (para cocina) no suman al total: la
+línea del combo es la que se factura.
+
+Las rutas que agregan, modifican o quitan items no recalculan el pedido:
+aplican al pedido solo la diferencia de la línea que cambia
+(`aplicar_delta_totales`), en la misma transacción. La recalculación
+completa (recalcular_totales_pedido) queda como herramienta de reparación.
+"""
+
+from datetime import datetime
+
+IVA_PORCENTAJE = 13.0
+NOTA_DESGLOSE = 'Desglose de combo'
+
+# Líneas que suman a los totales del pedido: todas menos los desgloses
+SQL_LINEA_FACTURABLE = "(notas IS NULL OR notas NOT LIKE '%Desglose de combo%')"
+
+
+def iva_linea(subtotal):
+    """(iva_monto, total_item) de una línea que se factura, redondeados a centavos"""
+    iva_monto = round(subtotal * (IVA_PORCENTAJE / 100), 2)
+    return iva_monto, round(subtotal + iva_monto, 2)
+
+
+def suma_al_total(notas):
+    """Si una línea suma a los totales del pedido (mismo criterio que SQL_LINEA_FACTURABLE)"""
+    return NOTA_DESGLOSE.lower() not in (notas or '').lower()
+
+
+def totales_pedido(subtotal_total, iva_total):
+    """Totales del pedido a partir de la suma de sus líneas"""
+    return {
+        'subtotal': round(subtotal_total, 2),
+        'impuesto': round(iva_total, 2),
+        'total': round(subtotal_total + iva_total, 2)
+    }
+
+
+def aplicar_delta_totales(cursor, pedido_id, subtotal, iva_monto):
+    """
+    Suma (o resta, con valores negativos) una línea a los totales del pedido
+    en una sola sentencia, sin releer sus items.
+
+    Se ejecuta aunque la diferencia sea cero: el trigger de la fila del
+    pedido es el que registra el cambio en las colas
+    (migraciones/pos/0008).
+    """
+    cursor.execute('''
+        UPDATE pedidos
+        SET subtotal = ROUND(COALESCE(subtotal, 0) + ?, 2),
+            impuesto = ROUND(COALESCE(impuesto, 0) + ?, 2),
+            total = ROUND(ROUND(COALESCE(subtotal, 0) + ?, 2) + ROUND(COALESCE(impuesto, 0) + ?, 2), 2),
+            updated_at = ?
+        WHERE id = ?
+    ''', (subtotal, iva_monto, subtotal, iva_monto, datetime.now().isoformat(), pedido_id))
+
+
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def armar_lineas(items, productos, combos):
+    """
+    Resuelve precios y arma las líneas de un pedido con su IVA.
+
+    Args:
+        items: Items pedidos: {'producto_id', 'cantidad', 'notas'} o
+            {'combo_id', 'cantidad'}
+        productos: {producto_id: fila de productos}
+        combos: {combo_id: Combo} (catalogo_combos.py)
+
+    Returns:
+        tuple: (líneas, totales con 'subtotal', 'impuesto' y 'total'). Los
+        items cuyo producto o combo no existe se omiten.
+    """
+    lineas = []
+    subtotal_total = 0.0
+    iva_total = 0.0
+
+    for item in items:
+        cantidad = item.get('cantidad', 1)
+
+        if item.get('combo_id') or item.get('es_combo'):
+            combo = combos.get(_entero(item.get('combo_id')))
+            if combo is None:
+                continue
+            subtotal = combo.precio_combo * cantidad
+            iva_monto, total_item = iva_linea(subtotal)
+            lineas.append({
+                'producto_id': None,
+                'combo_id': combo.id,
+                'cantidad': cantidad,
+                'precio_unitario': combo.precio_combo,
+                'subtotal': subtotal,
+                'iva_porcentaje': IVA_PORCENTAJE,
+                'iva_monto': iva_monto,
+                'total_item': total_item,
+                'notas': item.get('notas', ''),
+                'nombre_item': combo.nombre,
+                'es_combo': True
+            })
+            # Productos del combo para cocina; no suman al total
+            for combo_item in combo.items:
+                lineas.append({
+                    'producto_id': combo_item.producto_id,
+                    'combo_id': None,
+                    'cantidad': combo_item.cantidad * cantidad,
+                    'precio_unitario': 0,
+                    'subtotal': 0,
+                    'iva_porcentaje': IVA_PORCENTAJE,
+                    'iva_monto': 0,
+                    'total_item': 0,
+                    'notas': f'{NOTA_DESGLOSE}: {combo.nombre}',
+                    'producto_nombre': combo_item.producto_nombre,
+                    'es_desglose': True
+                })
+        else:
+            producto = productos.get(_entero(item.get('producto_id')))
+            if producto is None:
+                continue
+            subtotal = producto['precio'] * cantidad
+            iva_monto, total_item = iva_linea(subtotal)
+            lineas.append({
+                'producto_id': producto['id'],
+                'combo_id': None,
+                'cantidad': cantidad,
+                'precio_unitario': producto['precio'],
+                'subtotal': subtotal,
+                'iva_porcentaje': IVA_PORCENTAJE,
+                'iva_monto': iva_monto,
+                'total_item': total_item,
+                'notas': item.get('notas', ''),
+                'producto_nombre': producto['nombre']
+            })
+
+        subtotal_total += subtotal
+        iva_total += iva_monto
+
+    return lineas, totales_pedido(subtotal_total, iva_total)
+
+
+_SQL_INSERTAR_LINEA = '''
+    INSERT INTO pedido_items
+    (pedido_id, producto_id, combo_id, cantidad, precio_unitario, subtotal,
+     iva_porcentaje, iva_monto, total_item, notas)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def _fila_linea(pedido_id, linea):
+    return (pedido_id, linea['producto_id'], linea['combo_id'], linea['cantidad'], linea['precio_unitario'],
+            linea['subtotal'], linea['iva_porcentaje'], linea['iva_monto'], linea['total_item'], linea['notas'])
+
+
+def insertar_linea(cursor, pedido_id, linea):
+    """Inserta una línea de un pedido y retorna su id"""
+    cursor.execute(_SQL_INSERTAR_LINEA, _fila_linea(pedido_id, linea))
+    return cursor.lastrowid
+
+
+def insertar_lineas(cursor, pedido_id, lineas):
+    """Inserta las líneas de un pedido en un solo executemany"""
+    cursor.executemany(_SQL_INSERTAR_LINEA, [_fila_linea(pedido_id, linea) for linea in lineas])
+
+
+def insertar_pedido(cursor, datos, productos, combos):
+    """
+    Crea un pedido con sus líneas y ocupa su mesa, sin confirmar.
+
+    Args:
+        datos: Cuerpo de POST /api/pos/pedidos (mesa_id, mesero, tipo_pago,
+            items, notas, cliente_nombre)
+
+    Returns:
+        dict: 'pedido_id', 'estado', 'subtotal', 'impuesto', 'total' y
+        'lineas' (las líneas insertadas)
+    """
+    mesa_id = datos.get('mesa_id')  # Puede ser None para pedidos para llevar
+    tipo_pago = datos.get('tipo_pago', 'anticipado')
+    lineas, totales = armar_lineas(datos.get('items', []), productos, combos)
+
+    # Estado inicial según tipo de pago
+    estado = 'pendiente_pago' if tipo_pago == 'anticipado' else 'en_mesa'
+
+    cursor.execute('''
+        INSERT INTO pedidos (mesa_id, mesero, estado, tipo_pago, subtotal, impuesto, total, notas, cliente_nombre)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (mesa_id, datos.get('mesero', 'Mesero'), estado, tipo_pago, totales['subtotal'], totales['impuesto'],
+          totales['total'], datos.get('notas', ''), datos.get('cliente_nombre', '')))
+    pedido_id = cursor.lastrowid
+    insertar_lineas(cursor, pedido_id, lineas)
+
+    if mesa_id:
+        cursor.execute('UPDATE mesas SET estado = ? WHERE id = ?', ('ocupada', mesa_id))
+
+    return {'pedido_id': pedido_id, 'estado': estado, **totales, 'lineas': lineas}
+
+
+def leer_linea(cursor, pedido_id, item_id):
+    """Línea de un pedido con lo necesario para editarla (None si no existe)"""
+    cursor.execute('''
+        SELECT id, combo_id, cantidad, precio_unitario, subtotal, iva_monto, notas
+        FROM pedido_items WHERE id = ? AND pedido_id = ?
+    ''', (item_id, pedido_id))
+    return cursor.fetchone()
+
+
+def cambiar_cantidad_linea(cursor, pedido_id, linea, nueva_cantidad):
+    """
+    Cambia la cantidad de una línea (y de los desgloses si es un combo) y
+    aplica la diferencia a los totales del pedido.
+    """
+    nuevo_subtotal = linea['precio_unitario'] * nueva_cantidad
+    iva_monto, total_item = iva_linea(nuevo_subtotal)
+    cursor.execute('''
+        UPDATE pedido_items
+        SET cantidad = ?, subtotal = ?, iva_porcentaje = ?, iva_monto = ?, total_item = ?
+        WHERE id = ?
+    ''', (nueva_cantidad, nuevo_subtotal, IVA_PORCENTAJE, iva_monto, total_item, linea['id']))
+
+    if linea['combo_id']:
+        # Desgloses del combo: multiplicar por el ratio en una sola sentencia
+        ratio = nueva_cantidad / linea['cantidad']
+        cursor.execute('''
+            UPDATE pedido_items
+            SET cantidad = cantidad * ?, subtotal = precio_unitario * cantidad * ?
+            WHERE pedido_id = ? AND combo_id = ? AND notas = ?
+        ''', (ratio, ratio, pedido_id, linea['combo_id'], NOTA_DESGLOSE))
+
+    if suma_al_total(linea['notas']):
+        aplicar_delta_totales(cursor, pedido_id, nuevo_subtotal - (linea['subtotal'] or 0),
+                              iva_monto - (linea['iva_monto'] or 0))
+    else:
+        aplicar_delta_totales(cursor, pedido_id, 0, 0)
+
+
+def quitar_linea(cursor, pedido_id, linea):
+    """
+    Borra una línea (y los desgloses si es un combo) y resta su parte de los
+    totales del pedido.
+    """
+    cursor.execute('DELETE FROM pedido_items WHERE id = ? AND pedido_id = ?', (linea['id'], pedido_id))
+    if linea['combo_id']:
+        cursor.execute('''
+            DELETE FROM pedido_items
+            WHERE pedido_id = ? AND combo_id = ? AND notas = ?
+        ''', (pedido_id, linea['combo_id'], NOTA_DESGLOSE))
+
+    if suma_al_total(linea['notas']):
+        aplicar_delta_totales(cursor, pedido_id, -(linea['subtotal'] or 0), -(linea['iva_monto'] or 0))
+    else:
+        aplicar_delta_totales(cursor, pedido_id, 0, 0)
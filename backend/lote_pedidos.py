@@ -0,0 +1,246 @@
+"""
+Sincronización en lote de pedidos con claves de idempotencia
+
+Las tablets de los meseros pierden el Wi-Fi en el patio: guardan los pedidos
+y ediciones en una cola local y los reintentan. Con un POST /pedidos por
+pedido, un reintento de una petición que sí llegó creaba un pedido
+duplicado. POST /api/pos/pedidos/batch recibe la cola completa:
+
+    {"entradas": [
+        {"clave": "t3-0001", "tipo": "crear_pedido", "pedido": {... cuerpo de POST /pedidos ...}},
+        {"clave": "t3-0002", "tipo": "agregar_item", "pedido_clave": "t3-0001",
+         "producto_id": 4, "cantidad": 2},
+        {"clave": "t3-0003", "tipo": "modificar_item", "pedido_id": 12, "item_clave": "t3-0002",
+         "cantidad": 3},
+        {"clave": "t3-0004", "tipo": "remover_item", "pedido_id": 12, "item_id": 41}
+    ]}
+
+- Cada entrada lleva una clave generada por la tablet. Al aplicarse, la clave
+  y su resultado quedan en `claves_idempotencia` (índice único,
+  migraciones/pos/0007). Una entrada cuya clave ya existe no se vuelve a
+  aplicar: responde el resultado guardado con `repetida: true`.
+- Todo el lote va en una transacción (BEGIN IMMEDIATE) y cada entrada en su
+  SAVEPOINT, como EscritorSerializado en database.py. Una entrada que falla
+  se reporta con su error sin afectar a las demás y no guarda su clave, así
+  que se puede reintentar.
+- Una entrada puede referirse al pedido o al item creado por otra entrada
+  (de este lote o de uno anterior) con `pedido_clave` / `item_clave` en
+  lugar de `pedido_id` / `item_id`.
+
+Las líneas, el IVA y los totales se calculan igual que en las rutas de un
+pedido (lineas_pedido.py), con los precios de la caché del menú.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+from lineas_pedido import (armar_lineas, insertar_linea, insertar_lineas, insertar_pedido,
+                           aplicar_delta_totales, leer_linea, cambiar_cantidad_linea, quitar_linea)
+
+PEDIDOS_LOTE_MAXIMO = int(os.getenv('PEDIDOS_LOTE_MAXIMO', '200'))
+PEDIDOS_LOTE_RETENCION_HORAS = float(os.getenv('PEDIDOS_LOTE_RETENCION_HORAS', '72'))
+
+CLAVE_LONGITUD_MAXIMA = 100
+TIPOS = ('crear_pedido', 'agregar_item', 'modificar_item', 'remover_item')
+
+
+def validar_lote(data):
+    """
+    Valida la forma del cuerpo de un lote (no su contenido).
+
+    Returns:
+        tuple: (entradas, None) o (None, mensaje de error)
+    """
+    entradas = data.get('entradas') if isinstance(data, dict) else None
+    if not isinstance(entradas, list) or not entradas:
+        return None, 'Se requiere una lista "entradas" no vacía'
+    if len(entradas) > PEDIDOS_LOTE_MAXIMO:
+        return None, f'El lote admite como máximo {PEDIDOS_LOTE_MAXIMO} entradas'
+
+    for posicion, entrada in enumerate(entradas):
+        if not isinstance(entrada, dict):
+            return None, f'Entrada {posicion}: debe ser un objeto'
+        clave = entrada.get('clave')
+        if not isinstance(clave, str) or not clave.strip() or len(clave) > CLAVE_LONGITUD_MAXIMA:
+            return None, f'Entrada {posicion}: "clave" debe ser un texto de 1 a {CLAVE_LONGITUD_MAXIMA} caracteres'
+        if entrada.get('tipo') not in TIPOS:
+            return None, f'Entrada {posicion}: "tipo" debe ser uno de {", ".join(TIPOS)}'
+    return entradas, None
+
+
+def aplicar_lote(conn, entradas, productos, combos):
+    """
+    Aplica las entradas de un lote en una transacción, sin confirmar.
+
+    Args:
+        conn: Conexión a pos.db (el commit queda a cargo de quien llama)
+        entradas: Entradas ya validadas con validar_lote
+        productos, combos: Foto del menú (cache_menu.productos_y_combos)
+
+    Returns:
+        tuple: (resultados, aplicadas). `resultados` tiene un resultado por
+        entrada, en orden; `aplicadas` lista (entrada, resultado, líneas
+        insertadas o None) de las entradas aplicadas en este lote, para
+        notificar.
+    """
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    cursor = conn.cursor()
+    ahora = datetime.now()
+
+    limite = ahora - timedelta(hours=PEDIDOS_LOTE_RETENCION_HORAS)
+    cursor.execute('DELETE FROM claves_idempotencia WHERE created_at < ?', (limite.isoformat(),))
+    guardadas = _claves_guardadas(cursor, entradas)
+
+    resultados = []
+    aplicadas = []
+    for entrada in entradas:
+        clave = entrada['clave']
+        if clave in guardadas:
+            resultados.append({**guardadas[clave], 'repetida': True})
+            continue
+
+        conn.execute('SAVEPOINT entrada_lote')
+        try:
+            resultado = {'clave': clave, 'tipo': entrada['tipo'], 'ok': True}
+            resultado.update(_APLICAR[entrada['tipo']](cursor, entrada, productos, combos, guardadas))
+            lineas = resultado.pop('lineas', None)
+            cursor.execute('''
+                INSERT INTO claves_idempotencia (clave, tipo, pedido_id, resultado, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (clave, entrada['tipo'], resultado.get('pedido_id'), json.dumps(resultado), ahora.isoformat()))
+        except Exception as e:
+            conn.execute('ROLLBACK TO SAVEPOINT entrada_lote')
+            conn.execute('RELEASE SAVEPOINT entrada_lote')
+            resultados.append({'clave': clave, 'tipo': entrada['tipo'], 'ok': False, 'error': str(e)})
+            continue
+        conn.execute('RELEASE SAVEPOINT entrada_lote')
+
+        guardadas[clave] = resultado
+        resultados.append({**resultado, 'repetida': False})
+        aplicadas.append((entrada, resultado, lineas))
+
+    return resultados, aplicadas
+
+
+def _claves_guardadas(cursor, entradas):
+    """Resultados ya guardados de las claves del lote y de las referencias a otras entradas"""
+    claves = set()
+    for entrada in entradas:
+        claves.add(entrada['clave'])
+        for referencia in ('pedido_clave', 'item_clave'):
+            if isinstance(entrada.get(referencia), str):
+                claves.add(entrada[referencia])
+    claves = list(claves)
+    cursor.execute(f'''
+        SELECT clave, resultado FROM claves_idempotencia
+        WHERE clave IN ({','.join('?' for _ in claves)})
+    ''', claves)
+    return {clave: json.loads(resultado) for clave, resultado in cursor.fetchall()}
+
+
+def _referencia(entrada, campo, guardadas):
+    """Id de `campo` ('pedido_id' o 'item_id') directo o por la clave de otra entrada"""
+    if entrada.get(campo) is not None:
+        try:
+            return int(entrada[campo])
+        except (TypeError, ValueError):
+            raise ValueError(f'"{campo}" inválido')
+
+    campo_clave = campo.replace('_id', '_clave')
+    clave = entrada.get(campo_clave)
+    if clave is None:
+        raise ValueError(f'Se requiere "{campo}" o "{campo_clave}"')
+    referida = guardadas.get(clave)
+    if referida is None or referida.get(campo) is None:
+        raise ValueError(f'"{campo_clave}" no corresponde a una entrada aplicada')
+    return referida[campo]
+
+
+def _pedido_editable(cursor, entrada, guardadas):
+    """Id del pedido de la entrada, si existe y no está pagado"""
+    pedido_id = _referencia(entrada, 'pedido_id', guardadas)
+    cursor.execute('SELECT estado FROM pedidos WHERE id = ?', (pedido_id,))
+    pedido = cursor.fetchone()
+    if not pedido:
+        raise ValueError('Pedido no encontrado')
+    if pedido['estado'] == 'pagado':
+        raise ValueError('No se puede modificar items de pedido pagado')
+    return pedido_id
+
+
+def _linea(cursor, entrada, pedido_id, guardadas):
+    """Línea del pedido a la que se refiere la entrada"""
+    linea = leer_linea(cursor, pedido_id, _referencia(entrada, 'item_id', guardadas))
+    if not linea:
+        raise ValueError('Item no encontrado en este pedido')
+    return linea
+
+
+def _cantidad(entrada, predeterminada=None):
+    """Cantidad entera >= 1 de la entrada"""
+    try:
+        cantidad = int(entrada.get('cantidad', predeterminada))
+    except (TypeError, ValueError):
+        cantidad = 0
+    if cantidad < 1:
+        raise ValueError('cantidad debe ser >= 1')
+    return cantidad
+
+
+def _totales(cursor, pedido_id):
+    cursor.execute('SELECT subtotal, impuesto, total FROM pedidos WHERE id = ?', (pedido_id,))
+    return dict(cursor.fetchone())
+
+
+def _crear_pedido(cursor, entrada, productos, combos, guardadas):
+    datos = entrada.get('pedido')
+    if not isinstance(datos, dict) or not datos.get('items'):
+        raise ValueError('El pedido debe tener al menos un item')
+    return insertar_pedido(cursor, datos, productos, combos)
+
+
+def _agregar_item(cursor, entrada, productos, combos, guardadas):
+    if bool(entrada.get('producto_id')) == bool(entrada.get('combo_id')):
+        raise ValueError('Proporciona producto_id O combo_id')
+    cantidad = _cantidad(entrada, predeterminada=1)
+    pedido_id = _pedido_editable(cursor, entrada, guardadas)
+
+    lineas, totales = armar_lineas([{**entrada, 'cantidad': cantidad}], productos, combos)
+    if entrada.get('producto_id') and (not lineas or productos[lineas[0]['producto_id']]['disponible'] != 1):
+        raise ValueError('Producto no encontrado o no disponible')
+    if not lineas:
+        raise ValueError('Combo no encontrado')
+
+    # La línea principal va primero; luego, si es un combo, sus desgloses
+    item_id = insertar_linea(cursor, pedido_id, lineas[0])
+    insertar_lineas(cursor, pedido_id, lineas[1:])
+    aplicar_delta_totales(cursor, pedido_id, totales['subtotal'], totales['impuesto'])
+    return {'pedido_id': pedido_id, 'item_id': item_id, **_totales(cursor, pedido_id)}
+
+
+def _modificar_item(cursor, entrada, productos, combos, guardadas):
+    cantidad = _cantidad(entrada)
+    pedido_id = _pedido_editable(cursor, entrada, guardadas)
+    linea = _linea(cursor, entrada, pedido_id, guardadas)
+
+    cambiar_cantidad_linea(cursor, pedido_id, linea, cantidad)
+    return {'pedido_id': pedido_id, 'item_id': linea['id'], 'cantidad_anterior': linea['cantidad'],
+            'cantidad_nueva': cantidad, **_totales(cursor, pedido_id)}
+
+
+def _remover_item(cursor, entrada, productos, combos, guardadas):
+    pedido_id = _pedido_editable(cursor, entrada, guardadas)
+    linea = _linea(cursor, entrada, pedido_id, guardadas)
+
+    quitar_linea(cursor, pedido_id, linea)
+    return {'pedido_id': pedido_id, 'item_id': linea['id'], **_totales(cursor, pedido_id)}
+
+
+_APLICAR = {
+    'crear_pedido': _crear_pedido,
+    'agregar_item': _agregar_item,
+    'modificar_item': _modificar_item,
+    'remover_item': _remover_item,
+}
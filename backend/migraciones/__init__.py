@@ -0,0 +1,202 @@
+"""
+Motor de migraciones de esquema basado en PRAGMA user_version
+
+Cada archivo de BD tiene un paquete con migraciones numeradas:
+
+    migraciones/pos/0001_esquema_inicial.py        -> pos.db
+    migraciones/auth/0001_esquema_inicial.py       -> pos_database.db
+
+Cada módulo define `DESCRIPCION` y `aplicar(conn)`. El número del archivo es
+la versión que queda grabada en `PRAGMA user_version` al aplicarla. Si la BD
+ya está en la última versión, `aplicar_migraciones()` solo lee ese PRAGMA.
+"""
+
+import importlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+from database import get_db, olvidar_pool
+
+# Archivo de BD -> subpaquete con sus migraciones
+BASES_DE_DATOS = {
+    'pos.db': 'pos',
+    'pos_database.db': 'auth',
+}
+
+_PATRON_MIGRACION = re.compile(r'^(\d{4})_(\w+)\.py$')
+_DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+_lock = threading.Lock()
+# Cache de migraciones y de BDs ya verificadas en este proceso
+_disponibles = {}
+_al_dia = set()
+
+
+def migraciones_disponibles(db_file='pos.db'):
+    """
+    Lista las migraciones de un archivo de BD ordenadas por versión.
+
+    Returns:
+        list: Tuplas (version, nombre_modulo)
+    """
+    if db_file in _disponibles:
+        return _disponibles[db_file]
+
+    if db_file not in BASES_DE_DATOS:
+        raise ValueError(f'No hay migraciones registradas para {db_file}')
+
+    paquete = BASES_DE_DATOS[db_file]
+    migraciones = []
+    for archivo in os.listdir(os.path.join(_DIRECTORIO, paquete)):
+        coincidencia = _PATRON_MIGRACION.match(archivo)
+        if coincidencia:
+            migraciones.append((int(coincidencia.group(1)), archivo[:-3]))
+    migraciones.sort()
+
+    versiones = [version for version, _ in migraciones]
+    if versiones != list(range(1, len(versiones) + 1)):
+        raise RuntimeError(f'Migraciones de {db_file} no son consecutivas: {versiones}')
+
+    _disponibles[db_file] = migraciones
+    return migraciones
+
+
+def version_actual(conn):
+    """Retorna la versión de esquema grabada en la BD"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _cargar(db_file, nombre):
+    return importlib.import_module(f'{__name__}.{BASES_DE_DATOS[db_file]}.{nombre}')
+
+
+def aplicar_migraciones(db_file='pos.db', hasta=None):
+    """
+    Aplica las migraciones pendientes de un archivo de BD.
+
+    Cada migración corre en su propia transacción junto con la actualización
+    de user_version, de modo que una falla deja la BD en la última versión
+    completa.
+
+    Args:
+        db_file: Archivo de BD ('pos.db' o 'pos_database.db')
+        hasta: Versión objetivo (por defecto la última disponible)
+
+    Returns:
+        list: Versiones aplicadas (vacía si el esquema ya estaba al día)
+    """
+    if hasta is None and db_file in _al_dia:
+        return []
+
+    migraciones = migraciones_disponibles(db_file)
+    objetivo = migraciones[-1][0] if hasta is None else hasta
+
+    conn = get_db(db_file)
+    try:
+        if version_actual(conn) >= objetivo:
+            if hasta is None:
+                _al_dia.add(db_file)
+            return []
+
+        aplicadas = []
+        with _lock:
+            for version, nombre in migraciones:
+                if version > objetivo:
+                    break
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    # Releer dentro del bloqueo: otro proceso pudo migrar primero
+                    if version_actual(conn) >= version:
+                        conn.rollback()
+                        continue
+                    _cargar(db_file, nombre).aplicar(conn)
+                    conn.execute(f'PRAGMA user_version = {version}')
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                aplicadas.append(version)
+                print(f'[MIGRACIONES] {db_file}: aplicada {nombre}')
+
+        if hasta is None:
+            _al_dia.add(db_file)
+        return aplicadas
+    finally:
+        conn.close()
+
+
+def estado(db_file='pos.db'):
+    """Retorna versión actual, última disponible y migraciones pendientes"""
+    migraciones = migraciones_disponibles(db_file)
+    conn = get_db(db_file)
+    try:
+        actual = version_actual(conn)
+    finally:
+        conn.close()
+
+    pendientes = []
+    for version, nombre in migraciones:
+        if version > actual:
+            pendientes.append({
+                'version': version,
+                'nombre': nombre,
+                'descripcion': _cargar(db_file, nombre).DESCRIPCION
+            })
+
+    return {
+        'db': db_file,
+        'version_actual': actual,
+        'ultima_version': migraciones[-1][0] if migraciones else 0,
+        'pendientes': pendientes
+    }
+
+
+# ============ BDs TEMPORALES (TESTS Y BENCHMARKS) ============
+
+def crear_bd_temporal(paquete='pos', aplicar=True, prefijo='tmp_'):
+    """
+    Crea un archivo de BD en un directorio temporal con las migraciones de
+    `paquete` ('pos' o 'auth') registradas y, por defecto, aplicadas.
+
+    Returns:
+        str: Ruta absoluta del archivo, para get_db() y eliminar_bd_temporal()
+    """
+    nombre = next(db_file for db_file, nombre_paquete in BASES_DE_DATOS.items()
+                  if nombre_paquete == paquete and not os.path.isabs(db_file))
+    ruta = os.path.join(tempfile.mkdtemp(prefix=prefijo), nombre)
+    BASES_DE_DATOS[ruta] = paquete
+    if aplicar:
+        aplicar_migraciones(ruta)
+    return ruta
+
+
+def eliminar_bd_temporal(ruta):
+    """Olvida una BD de crear_bd_temporal(), cierra su pool y borra su directorio"""
+    BASES_DE_DATOS.pop(ruta, None)
+    _disponibles.pop(ruta, None)
+    _al_dia.discard(ruta)
+    olvidar_pool(ruta)
+    shutil.rmtree(os.path.dirname(ruta), ignore_errors=True)
+
+
+# ============ UTILIDADES PARA LOS MÓDULOS DE MIGRACIÓN ============
+
+def columnas(conn, tabla):
+    """Retorna el conjunto de columnas de una tabla (vacío si no existe)"""
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({tabla})')}
+
+
+def agregar_columna(conn, tabla, columna, definicion):
+    """Agrega una columna solo si la tabla existe y aún no la tiene"""
+    existentes = columnas(conn, tabla)
+    if existentes and columna not in existentes:
+        conn.execute(f'ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}')
+
+
+def ejecutar_script(conn, sentencias):
+    """Ejecuta una secuencia de sentencias SQL dentro de la transacción actual"""
+    for sentencia in sentencias:
+        conn.execute(sentencia)
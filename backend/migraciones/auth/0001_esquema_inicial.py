@@ -0,0 +1,52 @@
+"""
+Esquema inicial de pos_database.db (usuarios y sesiones)
+
+Reemplaza las sentencias que auth.init_auth_db ejecutaba en cada arranque.
+"""
+
+from migraciones import ejecutar_script
+
+DESCRIPCION = 'Tablas de usuarios y sesiones'
+
+INDICES = (
+    'CREATE INDEX IF NOT EXISTS idx_usuarios_username ON usuarios(username)',
+    'CREATE INDEX IF NOT EXISTS idx_usuarios_activo ON usuarios(activo)',
+    'CREATE INDEX IF NOT EXISTS idx_usuarios_rol ON usuarios(rol)',
+    'CREATE INDEX IF NOT EXISTS idx_sesiones_usuario_id ON sesiones(usuario_id)',
+    'CREATE INDEX IF NOT EXISTS idx_sesiones_token ON sesiones(token)',
+    'CREATE INDEX IF NOT EXISTS idx_sesiones_expires_at ON sesiones(expires_at)',
+)
+
+
+def aplicar(conn):
+    """Crea las tablas de autenticación y sus índices"""
+    # Tabla de usuarios
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            nombre TEXT NOT NULL,
+            rol TEXT NOT NULL CHECK(rol IN ('manager', 'mesero', 'cajero', 'cocinero')),
+            activo INTEGER DEFAULT 1,
+            ultimo_login TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            created_by INTEGER,
+            FOREIGN KEY (created_by) REFERENCES usuarios(id)
+        )
+    ''')
+
+    # Tabla de sesiones
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sesiones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL,
+            token TEXT UNIQUE NOT NULL,
+            expires_at TEXT NOT NULL,
+            ip_address TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+        )
+    ''')
+
+    ejecutar_script(conn, INDICES)
@@ -0,0 +1,30 @@
+"""
+Lista de revocación para tokens de sesión firmados
+
+En modo AUTH_TOKENS=firmado los tokens se verifican sin consultar `sesiones`;
+esta tabla registra lo que invalida un token antes de su vencimiento:
+
+- jti: un token concreto (logout)
+- emitidos_antes: todos los tokens de un usuario emitidos hasta ese instante
+  (reset de contraseña, cambios o desactivación del usuario)
+
+expires_at (epoch en segundos) indica cuándo la entrada deja de ser
+necesaria porque los tokens afectados ya vencieron por sí solos.
+"""
+
+DESCRIPCION = 'Tabla revocaciones para tokens firmados'
+
+
+def aplicar(conn):
+    """Crea la tabla de revocaciones y su índice de vencimiento"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS revocaciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            jti TEXT,
+            usuario_id INTEGER NOT NULL,
+            emitidos_antes INTEGER,
+            expires_at INTEGER NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_revocaciones_expires_at ON revocaciones(expires_at)')
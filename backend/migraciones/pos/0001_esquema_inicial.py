@@ -0,0 +1,475 @@
+"""
+Esquema inicial de pos.db
+
+Consolida lo que antes creaban al importar pos.init_db,
+inventario.init_inventario_db, clientes.init_db y la tabla de correlativos
+de facturacion. Es idempotente: sobre una BD creada por las versiones
+anteriores solo agrega las columnas e índices que falten.
+"""
+
+from migraciones import agregar_columna, ejecutar_script
+
+DESCRIPCION = 'Tablas de POS, inventario, clientes y correlativos'
+
+# Columnas agregadas con ALTER TABLE en versiones anteriores del esquema
+COLUMNAS_LEGADAS = (
+    ('productos', 'materia_prima_id', 'INTEGER'),
+    ('pedidos', 'cliente_id', 'INTEGER'),
+    ('pedidos', 'metodo_pago', "TEXT DEFAULT 'efectivo'"),
+    ('pedidos', 'cliente_tipo_doc', 'TEXT'),
+    ('pedidos', 'cliente_num_doc', 'TEXT'),
+    ('pedidos', 'cliente_nrc', 'TEXT'),
+    ('pedidos', 'cliente_nombre', 'TEXT'),
+    ('pedidos', 'cliente_direccion', 'TEXT'),
+    ('pedidos', 'cliente_departamento', 'TEXT'),
+    ('pedidos', 'cliente_municipio', 'TEXT'),
+    ('pedidos', 'cliente_telefono', 'TEXT'),
+    ('pedidos', 'cliente_correo', 'TEXT'),
+    ('pedidos', 'dte_tipo', 'TEXT'),
+    ('pedidos', 'dte_codigo_generacion', 'TEXT'),
+    ('pedidos', 'dte_numero_control', 'TEXT'),
+    ('pedidos', 'dte_json', 'TEXT'),
+    ('pedidos', 'dte_xml', 'TEXT'),
+    ('pedidos', 'facturado_at', 'TIMESTAMP'),
+    ('pedidos', 'tipo_comprobante', "TEXT DEFAULT 'ticket'"),
+    ('pedidos', 'aplicar_iva', 'BOOLEAN DEFAULT 0'),
+    ('pedidos', 'propina', 'REAL DEFAULT 0'),
+    ('pedido_items', 'combo_id', 'INTEGER'),
+    ('pedido_items', 'iva_porcentaje', 'REAL DEFAULT 13.0'),
+    ('pedido_items', 'iva_monto', 'REAL DEFAULT 0'),
+    ('pedido_items', 'total_item', 'REAL DEFAULT 0'),
+    ('ventas_diarias', 'propinas_total', 'REAL DEFAULT 0'),
+    ('materia_prima', 'categoria', "TEXT DEFAULT 'General'"),
+    ('materia_prima', 'tipo', "TEXT DEFAULT 'ingrediente'"),
+)
+
+INDICES = (
+    'CREATE INDEX IF NOT EXISTS idx_combos_activo ON combos(activo)',
+    'CREATE INDEX IF NOT EXISTS idx_combos_nombre ON combos(nombre)',
+    'CREATE INDEX IF NOT EXISTS idx_combo_items_combo_id ON combo_items(combo_id)',
+    'CREATE INDEX IF NOT EXISTS idx_combo_items_producto_id ON combo_items(producto_id)',
+    'CREATE INDEX IF NOT EXISTS idx_pedidos_mesa_id ON pedidos(mesa_id)',
+    'CREATE INDEX IF NOT EXISTS idx_pedidos_cliente_id ON pedidos(cliente_id)',
+    'CREATE INDEX IF NOT EXISTS idx_pedidos_estado ON pedidos(estado)',
+    'CREATE INDEX IF NOT EXISTS idx_pedidos_created_at ON pedidos(created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_pedidos_facturado_at ON pedidos(facturado_at)',
+    'CREATE INDEX IF NOT EXISTS idx_pedidos_pagado_at ON pedidos(pagado_at)',
+    'CREATE INDEX IF NOT EXISTS idx_pedido_items_pedido_id ON pedido_items(pedido_id)',
+    'CREATE INDEX IF NOT EXISTS idx_pedido_items_producto_id ON pedido_items(producto_id)',
+    'CREATE INDEX IF NOT EXISTS idx_productos_categoria_id ON productos(categoria_id)',
+    'CREATE INDEX IF NOT EXISTS idx_productos_disponible ON productos(disponible)',
+    'CREATE INDEX IF NOT EXISTS idx_productos_nombre ON productos(nombre)',
+    'CREATE INDEX IF NOT EXISTS idx_mesas_estado ON mesas(estado)',
+    'CREATE INDEX IF NOT EXISTS idx_ventas_diarias_fecha ON ventas_diarias(fecha)',
+    'CREATE INDEX IF NOT EXISTS idx_ventas_diarias_productos_fecha ON ventas_diarias_productos(fecha_venta)',
+    'CREATE INDEX IF NOT EXISTS idx_ventas_diarias_productos_producto_id ON ventas_diarias_productos(producto_id)',
+    'CREATE INDEX IF NOT EXISTS idx_ventas_diarias_categorias_fecha ON ventas_diarias_categorias(fecha_venta)',
+    'CREATE INDEX IF NOT EXISTS idx_ventas_diarias_categorias_categoria_id ON ventas_diarias_categorias(categoria_id)',
+    'CREATE INDEX IF NOT EXISTS idx_proveedores_codigo ON proveedores(codigo)',
+    'CREATE INDEX IF NOT EXISTS idx_proveedores_activo ON proveedores(activo)',
+    'CREATE INDEX IF NOT EXISTS idx_materia_prima_codigo ON materia_prima(codigo)',
+    'CREATE INDEX IF NOT EXISTS idx_materia_prima_nombre ON materia_prima(nombre)',
+    'CREATE INDEX IF NOT EXISTS idx_materia_prima_categoria ON materia_prima(categoria)',
+    'CREATE INDEX IF NOT EXISTS idx_materia_prima_activo ON materia_prima(activo)',
+    'CREATE INDEX IF NOT EXISTS idx_materia_prima_proveedor ON materia_prima(proveedor_principal_id)',
+    'CREATE INDEX IF NOT EXISTS idx_recetas_producto_id ON recetas(producto_id)',
+    'CREATE INDEX IF NOT EXISTS idx_recetas_materia_prima_id ON recetas(materia_prima_id)',
+    'CREATE INDEX IF NOT EXISTS idx_movimientos_inventario_materia_prima_id ON movimientos_inventario(materia_prima_id)',
+    'CREATE INDEX IF NOT EXISTS idx_movimientos_inventario_tipo ON movimientos_inventario(tipo)',
+    'CREATE INDEX IF NOT EXISTS idx_movimientos_inventario_created_at ON movimientos_inventario(created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_movimientos_inventario_referencia ON movimientos_inventario(referencia_tipo, referencia_id)',
+    'CREATE INDEX IF NOT EXISTS idx_ordenes_compra_numero ON ordenes_compra(numero)',
+    'CREATE INDEX IF NOT EXISTS idx_ordenes_compra_proveedor_id ON ordenes_compra(proveedor_id)',
+    'CREATE INDEX IF NOT EXISTS idx_ordenes_compra_estado ON ordenes_compra(estado)',
+    'CREATE INDEX IF NOT EXISTS idx_ordenes_compra_fecha_orden ON ordenes_compra(fecha_orden)',
+    'CREATE INDEX IF NOT EXISTS idx_orden_compra_items_orden_id ON orden_compra_items(orden_id)',
+    'CREATE INDEX IF NOT EXISTS idx_orden_compra_items_materia_prima_id ON orden_compra_items(materia_prima_id)',
+    'CREATE INDEX IF NOT EXISTS idx_materia_proveedor_materia_prima_id ON materia_proveedor(materia_prima_id)',
+    'CREATE INDEX IF NOT EXISTS idx_materia_proveedor_proveedor_id ON materia_proveedor(proveedor_id)',
+    'CREATE INDEX IF NOT EXISTS idx_extracciones_materia_prima_fecha ON extracciones_materia_prima(fecha)',
+    'CREATE INDEX IF NOT EXISTS idx_extracciones_materia_prima_materia_prima_id ON extracciones_materia_prima(materia_prima_id)',
+    'CREATE INDEX IF NOT EXISTS idx_clientes_documento ON clientes(numero_documento)',
+    'CREATE INDEX IF NOT EXISTS idx_clientes_nrc ON clientes(nrc)',
+    'CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes(nombre)',
+    'CREATE INDEX IF NOT EXISTS idx_clientes_codigo ON clientes(codigo)',
+    'CREATE INDEX IF NOT EXISTS idx_clientes_email ON clientes(email)',
+    'CREATE INDEX IF NOT EXISTS idx_clientes_activo ON clientes(activo)',
+    'CREATE INDEX IF NOT EXISTS idx_clientes_tipo_cliente ON clientes(tipo_cliente)',
+)
+
+
+def aplicar(conn):
+    """Crea tablas, agrega columnas legadas faltantes y crea índices"""
+    # ============ POS ============
+    # Tabla de categorías
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS categorias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            orden INTEGER DEFAULT 0
+        )
+    ''')
+
+    # Tabla de combos (bundles de múltiples productos)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS combos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            descripcion TEXT,
+            precio_combo REAL NOT NULL,
+            imagen TEXT,
+            activo INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Tabla de items dentro de combos (relación M:M)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS combo_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            combo_id INTEGER NOT NULL,
+            producto_id INTEGER NOT NULL,
+            cantidad INTEGER NOT NULL,
+            FOREIGN KEY (combo_id) REFERENCES combos(id),
+            FOREIGN KEY (producto_id) REFERENCES productos(id)
+        )
+    ''')
+
+    # Tabla de productos (menú)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS productos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            descripcion TEXT,
+            precio REAL NOT NULL,
+            categoria_id INTEGER,
+            disponible INTEGER DEFAULT 1,
+            imagen TEXT,
+            -- Para productos de consumo directo (agua, gaseosas, cervezas)
+            -- Si tiene materia_prima_id, se descuenta 1:1 de ese inventario
+            materia_prima_id INTEGER,
+            FOREIGN KEY (categoria_id) REFERENCES categorias(id)
+        )
+    ''')
+
+    # Tabla de mesas
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS mesas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero INTEGER NOT NULL UNIQUE,
+            capacidad INTEGER DEFAULT 4,
+            estado TEXT DEFAULT 'libre'
+        )
+    ''')
+
+    # Tabla de pedidos
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pedidos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mesa_id INTEGER,
+            mesero TEXT,
+            estado TEXT DEFAULT 'pendiente_pago',
+            tipo_pago TEXT DEFAULT 'anticipado',
+            subtotal REAL DEFAULT 0,
+            impuesto REAL DEFAULT 0,
+            total REAL DEFAULT 0,
+            notas TEXT,
+            -- Referencia al cliente registrado (opcional)
+            cliente_id INTEGER,
+            -- Campos de cliente para facturación
+            cliente_tipo_doc TEXT,
+            cliente_num_doc TEXT,
+            cliente_nrc TEXT,
+            cliente_nombre TEXT,
+            cliente_direccion TEXT,
+            cliente_departamento TEXT,
+            cliente_municipio TEXT,
+            cliente_telefono TEXT,
+            cliente_correo TEXT,
+            -- Campos de DTE
+            dte_tipo TEXT,
+            dte_codigo_generacion TEXT,
+            dte_numero_control TEXT,
+            dte_json TEXT,
+            dte_xml TEXT,
+            facturado_at TIMESTAMP,
+            -- Información de pago
+            tipo_comprobante TEXT DEFAULT 'ticket',  -- 'factura' o 'ticket'
+            aplicar_iva BOOLEAN DEFAULT 0,          -- 1 si es factura, 0 si es ticket
+            propina REAL DEFAULT 0,                  -- Propina agregada en pago
+            -- Timestamps
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            pagado_at TIMESTAMP,
+            cocina_at TIMESTAMP,
+            listo_at TIMESTAMP,
+            servido_at TIMESTAMP,
+            FOREIGN KEY (mesa_id) REFERENCES mesas(id)
+        )
+    ''')
+
+    # Tabla de items del pedido
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pedido_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pedido_id INTEGER NOT NULL,
+            producto_id INTEGER NOT NULL,
+            combo_id INTEGER,
+            cantidad INTEGER DEFAULT 1,
+            precio_unitario REAL NOT NULL,
+            subtotal REAL NOT NULL,
+            iva_porcentaje REAL DEFAULT 13.0,
+            iva_monto REAL DEFAULT 0,
+            total_item REAL DEFAULT 0,
+            notas TEXT,
+            FOREIGN KEY (pedido_id) REFERENCES pedidos(id),
+            FOREIGN KEY (producto_id) REFERENCES productos(id),
+            FOREIGN KEY (combo_id) REFERENCES combos(id)
+        )
+    ''')
+
+    # Tabla de ventas diarias consolidadas
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ventas_diarias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha DATE UNIQUE NOT NULL,
+            total_pedidos INTEGER DEFAULT 0,
+            total_ventas REAL DEFAULT 0,
+            subtotal_total REAL DEFAULT 0,
+            impuesto_total REAL DEFAULT 0,
+            propinas_total REAL DEFAULT 0,
+            efectivo REAL DEFAULT 0,
+            credito REAL DEFAULT 0,
+            cantidad_transacciones INTEGER DEFAULT 0,
+            pedido_promedio REAL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Tabla de desglose de ventas por producto
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ventas_diarias_productos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha_venta DATE NOT NULL,
+            producto_id INTEGER NOT NULL,
+            producto_nombre TEXT NOT NULL,
+            categoria_id INTEGER,
+            categoria_nombre TEXT,
+            cantidad_vendida INTEGER DEFAULT 0,
+            subtotal REAL DEFAULT 0,
+            FOREIGN KEY (fecha_venta) REFERENCES ventas_diarias(fecha),
+            FOREIGN KEY (producto_id) REFERENCES productos(id),
+            UNIQUE(fecha_venta, producto_id)
+        )
+    ''')
+
+    # Tabla de desglose de ventas por categoría
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ventas_diarias_categorias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha_venta DATE NOT NULL,
+            categoria_id INTEGER NOT NULL,
+            categoria_nombre TEXT NOT NULL,
+            cantidad_vendida INTEGER DEFAULT 0,
+            subtotal REAL DEFAULT 0,
+            FOREIGN KEY (fecha_venta) REFERENCES ventas_diarias(fecha),
+            FOREIGN KEY (categoria_id) REFERENCES categorias(id),
+            UNIQUE(fecha_venta, categoria_id)
+        )
+    ''')
+
+    # ============ INVENTARIO ============
+    # Tabla de proveedores
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS proveedores (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codigo TEXT UNIQUE,
+            nombre TEXT NOT NULL,
+            nombre_comercial TEXT,
+            nit TEXT,
+            nrc TEXT,
+            direccion TEXT,
+            telefono TEXT,
+            correo TEXT,
+            contacto_nombre TEXT,
+            contacto_telefono TEXT,
+            condiciones_pago TEXT DEFAULT 'contado',
+            dias_credito INTEGER DEFAULT 0,
+            activo INTEGER DEFAULT 1,
+            notas TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Tabla de materia prima / ingredientes y productos de consumo
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS materia_prima (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codigo TEXT UNIQUE,
+            nombre TEXT NOT NULL,
+            descripcion TEXT,
+            categoria TEXT DEFAULT 'General',
+            tipo TEXT DEFAULT 'ingrediente',
+            unidad_medida TEXT DEFAULT 'unidad',
+            stock_actual REAL DEFAULT 0,
+            stock_minimo REAL DEFAULT 10,
+            stock_maximo REAL DEFAULT 500,
+            costo_promedio REAL DEFAULT 0,
+            ultimo_costo REAL DEFAULT 0,
+            proveedor_principal_id INTEGER,
+            activo INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (proveedor_principal_id) REFERENCES proveedores(id)
+        )
+    ''')
+
+    # Tabla de recetas (qué materia prima necesita cada producto)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS recetas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            producto_id INTEGER NOT NULL,
+            materia_prima_id INTEGER NOT NULL,
+            cantidad REAL NOT NULL,
+            unidad TEXT,
+            notas TEXT,
+            FOREIGN KEY (producto_id) REFERENCES productos(id),
+            FOREIGN KEY (materia_prima_id) REFERENCES materia_prima(id),
+            UNIQUE(producto_id, materia_prima_id)
+        )
+    ''')
+
+    # Tabla de movimientos de inventario
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS movimientos_inventario (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            materia_prima_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            cantidad REAL NOT NULL,
+            stock_anterior REAL,
+            stock_nuevo REAL,
+            costo_unitario REAL,
+            referencia_tipo TEXT,
+            referencia_id INTEGER,
+            motivo TEXT,
+            usuario TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (materia_prima_id) REFERENCES materia_prima(id)
+        )
+    ''')
+
+    # Tabla de órdenes de compra
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ordenes_compra (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero TEXT UNIQUE,
+            proveedor_id INTEGER NOT NULL,
+            estado TEXT DEFAULT 'borrador',
+            fecha_orden DATE,
+            fecha_esperada DATE,
+            fecha_recepcion DATE,
+            subtotal REAL DEFAULT 0,
+            impuesto REAL DEFAULT 0,
+            total REAL DEFAULT 0,
+            notas TEXT,
+            created_by TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (proveedor_id) REFERENCES proveedores(id)
+        )
+    ''')
+
+    # Tabla de items de órdenes de compra
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS orden_compra_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            orden_id INTEGER NOT NULL,
+            materia_prima_id INTEGER NOT NULL,
+            cantidad_ordenada REAL NOT NULL,
+            cantidad_recibida REAL DEFAULT 0,
+            costo_unitario REAL NOT NULL,
+            subtotal REAL NOT NULL,
+            notas TEXT,
+            FOREIGN KEY (orden_id) REFERENCES ordenes_compra(id),
+            FOREIGN KEY (materia_prima_id) REFERENCES materia_prima(id)
+        )
+    ''')
+
+    # Tabla de relación materia prima - proveedor
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS materia_proveedor (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            materia_prima_id INTEGER NOT NULL,
+            proveedor_id INTEGER NOT NULL,
+            codigo_proveedor TEXT,
+            costo REAL,
+            es_principal INTEGER DEFAULT 0,
+            tiempo_entrega_dias INTEGER,
+            notas TEXT,
+            FOREIGN KEY (materia_prima_id) REFERENCES materia_prima(id),
+            FOREIGN KEY (proveedor_id) REFERENCES proveedores(id),
+            UNIQUE(materia_prima_id, proveedor_id)
+        )
+    ''')
+
+    # Tabla de extracciones de materia prima (control manual de libras/kg extraídas por jornada)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS extracciones_materia_prima (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha DATE NOT NULL,
+            hora TIME,
+            materia_prima_id INTEGER NOT NULL,
+            cantidad_extraida REAL NOT NULL,
+            unidad_medida TEXT,
+            motivo TEXT,
+            descripcion TEXT,
+            usuario TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (materia_prima_id) REFERENCES materia_prima(id)
+        )
+    ''')
+
+    # ============ CLIENTES ============
+    # Tabla de clientes
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS clientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codigo TEXT UNIQUE,
+            tipo_documento TEXT DEFAULT 'DUI',
+            numero_documento TEXT,
+            nrc TEXT,
+            nombre TEXT NOT NULL,
+            nombre_comercial TEXT,
+            direccion TEXT,
+            departamento TEXT,
+            municipio TEXT,
+            telefono TEXT,
+            email TEXT,
+            tipo_cliente TEXT DEFAULT 'consumidor_final',
+            actividad_economica TEXT,
+            credito_autorizado REAL DEFAULT 0,
+            dias_credito INTEGER DEFAULT 0,
+            notas TEXT,
+            activo INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # ============ FACTURACIÓN ============
+    # Correlativos de facturas y tickets
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS correlativos (
+            tipo TEXT PRIMARY KEY,
+            ultimo INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    for tabla, columna, definicion in COLUMNAS_LEGADAS:
+        agregar_columna(conn, tabla, columna, definicion)
+
+    ejecutar_script(conn, INDICES)
@@ -0,0 +1,17 @@
+"""
+Índice compuesto para el crédito utilizado por cliente
+
+Las consultas de crédito (clientes.SQL_CREDITO_UTILIZADO) filtran por
+cliente_id y estado = 'credito' y suman total: con este índice se resuelven
+sin leer la tabla pedidos.
+"""
+
+DESCRIPCION = 'Índice (cliente_id, estado, total) en pedidos'
+
+
+def aplicar(conn):
+    """Crea el índice de cobertura para crédito por cliente"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pedidos_cliente_estado
+        ON pedidos(cliente_id, estado, total)
+    ''')
@@ -0,0 +1,21 @@
+"""
+Índices compuestos para los reportes por día
+
+Los reportes filtran por estado (o dte_tipo) y un rango semiabierto de
+created_at (ver database.rango_dia). Con la igualdad primero y la fecha
+después, SQLite recorre solo las filas del día en lugar de todo el estado.
+"""
+
+DESCRIPCION = 'Índices (estado, created_at) y (dte_tipo, created_at) en pedidos'
+
+
+def aplicar(conn):
+    """Crea los índices compuestos para consultas por rango de fecha"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pedidos_estado_created_at
+        ON pedidos(estado, created_at)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pedidos_dte_tipo_created_at
+        ON pedidos(dte_tipo, created_at)
+    ''')
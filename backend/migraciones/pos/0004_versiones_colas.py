@@ -0,0 +1,128 @@
+"""
+Versiones de las colas por rol (cocina, cajero, mesero)
+
+Cada cambio a un pedido o a sus items que afecta a una cola queda en
+`cambios_colas`; el id de la fila es la nueva versión de esa cola y se copia
+a `versiones_colas`. Lo escriben triggers, así cualquier ruta de escritura
+(y cualquier worker) mueve la versión sin cambios en el código.
+
+`colas_estados` define qué pedidos pertenecen a cada cola y debe coincidir
+con versiones_colas.COLAS. `accion` indica si el pedido entró a la cola, salió
+de ella o cambió dentro de ella. La tabla de cambios se recorta sola y
+conserva las últimas 10000 filas.
+"""
+
+DESCRIPCION = 'Tablas y triggers de versiones de las colas por rol'
+
+# (cola, estado, tipo_pago requerido o None)
+COLAS_ESTADOS = [
+    ('cocina', 'pagado', None),
+    ('cocina', 'en_mesa', None),
+    ('cocina', 'en_cocina', None),
+    ('cajero', 'pendiente_pago', None),
+    ('cajero', 'servido', 'al_final'),
+    ('mesero', 'listo', None),
+]
+
+CAMBIOS_RETENIDOS = 10000
+
+
+def _en_cola(fila):
+    """Condición SQL: el pedido `fila` (NEW u OLD) pertenece a la cola de ce"""
+    return (f"(ce.estado = {fila}.estado AND "
+            f"(ce.tipo_pago IS NULL OR ce.tipo_pago = {fila}.tipo_pago))")
+
+
+def _pedido_de_item(fila):
+    """Condición SQL: el pedido del item `fila` pertenece a la cola de ce"""
+    return (f"EXISTS (SELECT 1 FROM pedidos p WHERE p.id = {fila}.pedido_id "
+            f"AND p.estado = ce.estado AND (ce.tipo_pago IS NULL OR ce.tipo_pago = p.tipo_pago))")
+
+
+def aplicar(conn):
+    """Crea las tablas de versiones y los triggers sobre pedidos y pedido_items"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS colas_estados (
+            cola TEXT NOT NULL,
+            estado TEXT NOT NULL,
+            tipo_pago TEXT,
+            PRIMARY KEY (cola, estado)
+        )
+    ''')
+    conn.executemany('INSERT OR IGNORE INTO colas_estados (cola, estado, tipo_pago) VALUES (?, ?, ?)',
+                     COLAS_ESTADOS)
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS versiones_colas (
+            cola TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO versiones_colas (cola) SELECT DISTINCT cola FROM colas_estados')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cambios_colas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cola TEXT NOT NULL,
+            pedido_id INTEGER NOT NULL,
+            accion TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cambios_colas_cola_id ON cambios_colas(cola, id)')
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_colas_version
+        AFTER INSERT ON cambios_colas
+        BEGIN
+            UPDATE versiones_colas SET version = NEW.id WHERE cola = NEW.cola;
+            DELETE FROM cambios_colas
+            WHERE NEW.id % 500 = 0 AND id <= NEW.id - {CAMBIOS_RETENIDOS};
+        END
+    ''')
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_colas_pedido_insert
+        AFTER INSERT ON pedidos
+        BEGIN
+            INSERT INTO cambios_colas (cola, pedido_id, accion)
+            SELECT DISTINCT ce.cola, NEW.id, 'entra' FROM colas_estados ce
+            WHERE {_en_cola('NEW')};
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_colas_pedido_update
+        AFTER UPDATE ON pedidos
+        BEGIN
+            INSERT INTO cambios_colas (cola, pedido_id, accion)
+            SELECT cola, NEW.id,
+                   CASE WHEN MAX(antes) = 0 THEN 'entra'
+                        WHEN MAX(despues) = 0 THEN 'sale'
+                        ELSE 'cambia' END
+            FROM (
+                SELECT ce.cola, {_en_cola('OLD')} AS antes, {_en_cola('NEW')} AS despues
+                FROM colas_estados ce
+            )
+            GROUP BY cola
+            HAVING MAX(antes) = 1 OR MAX(despues) = 1;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_colas_pedido_delete
+        AFTER DELETE ON pedidos
+        BEGIN
+            INSERT INTO cambios_colas (cola, pedido_id, accion)
+            SELECT DISTINCT ce.cola, OLD.id, 'sale' FROM colas_estados ce
+            WHERE {_en_cola('OLD')};
+        END
+    ''')
+
+    for evento, fila in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_colas_item_{evento.lower()}
+            AFTER {evento} ON pedido_items
+            BEGIN
+                INSERT INTO cambios_colas (cola, pedido_id, accion)
+                SELECT DISTINCT ce.cola, {fila}.pedido_id, 'cambia' FROM colas_estados ce
+                WHERE {_pedido_de_item(fila)};
+            END
+        ''')
@@ -0,0 +1,20 @@
+"""
+Cola 'activos' para el índice en memoria de pedidos activos
+
+Agrega a colas_estados los estados que mantiene indice_pedidos.py. Los
+triggers de 0004 registran desde entonces en cambios_colas cada cambio a un
+pedido activo (o que deja de serlo), que el índice usa para sincronizarse.
+"""
+
+DESCRIPCION = "Cola 'activos' en colas_estados y versiones_colas"
+
+ESTADOS_ACTIVOS = ('pendiente_pago', 'en_mesa', 'pagado', 'en_cocina', 'listo', 'servido')
+
+
+def aplicar(conn):
+    """Registra los estados activos como una cola más"""
+    conn.executemany(
+        "INSERT OR IGNORE INTO colas_estados (cola, estado, tipo_pago) VALUES ('activos', ?, NULL)",
+        [(estado,) for estado in ESTADOS_ACTIVOS]
+    )
+    conn.execute("INSERT OR IGNORE INTO versiones_colas (cola) VALUES ('activos')")
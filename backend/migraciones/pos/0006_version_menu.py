@@ -0,0 +1,33 @@
+"""
+Versión del menú (productos, categorías, combos y sus items)
+
+Un contador en `version_menu` que sube con cada INSERT, UPDATE o DELETE de
+las tablas del menú. Lo escriben triggers, así cualquier ruta de escritura
+(y cualquier worker) invalida la caché del menú de todos los procesos (ver
+cache_menu.py).
+"""
+
+DESCRIPCION = 'Contador de versión del menú con triggers'
+
+TABLAS_MENU = ('productos', 'categorias', 'combos', 'combo_items')
+
+
+def aplicar(conn):
+    """Crea version_menu y los triggers sobre las tablas del menú"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS version_menu (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO version_menu (id, version) VALUES (1, 0)')
+
+    for tabla in TABLAS_MENU:
+        for evento in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_menu_{tabla}_{evento.lower()}
+                AFTER {evento} ON {tabla}
+                BEGIN
+                    UPDATE version_menu SET version = version + 1 WHERE id = 1;
+                END
+            ''')
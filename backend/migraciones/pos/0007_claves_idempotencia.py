@@ -0,0 +1,26 @@
+"""
+Claves de idempotencia de POST /api/pos/pedidos/batch
+
+Cada entrada aplicada de un lote guarda la clave que generó la tablet y su
+resultado. El índice único sobre `clave` garantiza que un reintento no vuelva
+a crear el pedido ni a aplicar la edición (ver lote_pedidos.py). Las claves
+se purgan pasado PEDIDOS_LOTE_RETENCION_HORAS.
+"""
+
+DESCRIPCION = 'Tabla de claves de idempotencia de los lotes de pedidos'
+
+
+def aplicar(conn):
+    """Crea claves_idempotencia con su índice único"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS claves_idempotencia (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            clave TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            pedido_id INTEGER,
+            resultado TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_claves_idempotencia_clave ON claves_idempotencia(clave)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_claves_idempotencia_created_at ON claves_idempotencia(created_at)')
@@ -0,0 +1,37 @@
+"""
+Un cambio por cola en una racha de escrituras a las líneas de un pedido
+
+Los triggers de items de 0004 insertaban un cambio en `cambios_colas` por
+cada fila de `pedido_items` y por cada cola del pedido, y cada inserción
+movía además `versiones_colas`: un pedido de 50 líneas dejaba 102 cambios y
+255 filas escritas para 51 filas de la aplicación.
+
+Ahora un trigger de items no registra nada si el último cambio de la cola
+ya es de ese mismo pedido: la versión vigente ya lo señala y los clientes
+lo releen completo. La guarda no distingue transacciones: una escritura que
+solo toca pedido_items justo después de otro cambio del mismo pedido no
+mueve la versión. Por eso toda ruta de items actualiza también la fila del
+pedido (totales, lineas_pedido.aplicar_delta_totales), cuyo trigger registra
+el cambio siempre.
+"""
+
+DESCRIPCION = 'Triggers de items sin cambios repetidos del mismo pedido'
+
+
+def aplicar(conn):
+    """Reemplaza los triggers de pedido_items por versiones con la guarda"""
+    for evento, fila in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        conn.execute(f'DROP TRIGGER IF EXISTS trg_colas_item_{evento.lower()}')
+        conn.execute(f'''
+            CREATE TRIGGER trg_colas_item_{evento.lower()}
+            AFTER {evento} ON pedido_items
+            BEGIN
+                INSERT INTO cambios_colas (cola, pedido_id, accion)
+                SELECT DISTINCT ce.cola, {fila}.pedido_id, 'cambia' FROM colas_estados ce
+                WHERE EXISTS (SELECT 1 FROM pedidos p WHERE p.id = {fila}.pedido_id
+                              AND p.estado = ce.estado AND (ce.tipo_pago IS NULL OR ce.tipo_pago = p.tipo_pago))
+                  AND NOT EXISTS (SELECT 1 FROM cambios_colas c
+                                  WHERE c.cola = ce.cola AND c.pedido_id = {fila}.pedido_id
+                                    AND c.id = (SELECT version FROM versiones_colas v WHERE v.cola = ce.cola));
+            END
+        ''')
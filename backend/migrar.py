@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Script para consultar y aplicar las migraciones de esquema.
+
+Uso:
+    python3 migrar.py estado                   # Versión actual y pendientes de cada BD
+    python3 migrar.py aplicar                  # Aplica todas las migraciones pendientes
+    python3 migrar.py aplicar --db pos.db      # Solo un archivo de BD
+    python3 migrar.py aplicar --db pos.db --hasta 1
+"""
+
+import argparse
+import os
+import sys
+
+# Agregar ruta del backend al path para importar módulos
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from migraciones import BASES_DE_DATOS, aplicar_migraciones, estado
+
+
+def mostrar_estado(bases):
+    for db_file in bases:
+        info = estado(db_file)
+        print(f"[INFO] {db_file}: versión {info['version_actual']} de {info['ultima_version']}")
+        for pendiente in info['pendientes']:
+            print(f"  - pendiente {pendiente['nombre']}: {pendiente['descripcion']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migraciones de esquema (PRAGMA user_version)')
+    parser.add_argument('accion', choices=['estado', 'aplicar'])
+    parser.add_argument('--db', choices=sorted(BASES_DE_DATOS), help='Archivo de BD (por defecto todos)')
+    parser.add_argument('--hasta', type=int, help='Versión objetivo (requiere --db)')
+    args = parser.parse_args()
+
+    if args.hasta is not None and not args.db:
+        parser.error('--hasta requiere --db')
+
+    bases = [args.db] if args.db else list(BASES_DE_DATOS)
+
+    if args.accion == 'estado':
+        mostrar_estado(bases)
+        return 0
+
+    try:
+        for db_file in bases:
+            aplicadas = aplicar_migraciones(db_file, hasta=args.hasta)
+            if not aplicadas:
+                print(f"[INFO] {db_file}: esquema al día")
+    except Exception as e:
+        print(f"[ERROR] Fallo aplicando migraciones: {e}")
+        return 1
+
+    mostrar_estado(bases)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,20 +1,398 @@
 """
 Módulo de Notificaciones en Tiempo Real
 Maneja WebSocket y fallback con polling para actualizaciones de pedidos
+
+Los eventos de polling pasan por el bus de eventos (bus_eventos.py): con
+varios workers cada proceso recibe los eventos de todos en sus buffers, y los
+emits de Socket.IO se reparten con el client manager del bus.
 """
 
 from flask import request
 from flask_socketio import emit, join_room, leave_room
+from collections import OrderedDict, deque
 from datetime import datetime
+import atexit
 import json
+import os
+import threading
+import time
+
+from bus_eventos import obtener_bus
+
+# Eventos retenidos por canal y antigüedad máxima para el polling
+NOTIF_EVENTOS_POR_CANAL = int(os.getenv('NOTIF_EVENTOS_POR_CANAL', '100'))
+NOTIF_VENTANA_SEGUNDOS = float(os.getenv('NOTIF_VENTANA_SEGUNDOS', '300'))
+
+# Long polling: peticiones estacionadas a la vez y espera máxima por petición
+NOTIF_LONGPOLL_MAX = int(os.getenv('NOTIF_LONGPOLL_MAX', '32'))
+NOTIF_LONGPOLL_ESPERA_MAX = float(os.getenv('NOTIF_LONGPOLL_ESPERA_MAX', '25'))
+
+# Ventana en la que se agrupan los emits de Socket.IO por sala (0 = sin agrupar)
+NOTIF_EMIT_VENTANA_MS = float(os.getenv('NOTIF_EMIT_VENTANA_MS', '50'))
+
+# Canales de polling que lee cada rol (mismas salas que en conectar_usuario)
+CANALES_POR_ROL = {
+    "cocinero": ["cocina"],
+    "mesero": ["meseros"],
+    "cajero": ["cajeros"],
+    "manager": ["managers", "cocina", "meseros", "cajeros"],
+}
 
 # Almacén de conexiones activas
 # Estructura: { session_id: { role, username, rooms } }
 conexiones_activas = {}
 
+# Tema del bus por el que viajan los eventos de polling
+TEMA_NOTIFICACIONES = "notificaciones"
+
+
+class BufferEventos:
+    """
+    Buffers circulares por canal con números de secuencia globales
+
+    Cada evento recibe un `seq` creciente compartido por todos los canales,
+    así los eventos del rol y de 'general' se pueden mezclar en orden. Un
+    cliente pide solo lo posterior a su último `seq`; si entretanto se
+    descartaron eventos que no vio (buffer lleno, más viejos que la ventana
+    o reinicio del servidor) la lectura lo marca como `perdidos` para que
+    el cliente se resincronice.
+
+    Para long polling, `esperar()` estaciona la petición en una variable de
+    condición hasta que llegue un evento para sus canales o venza el plazo.
+    Como mucho `max_en_espera` peticiones esperan a la vez (cada una ocupa
+    un hilo del servidor); las demás se responden de inmediato.
+    """
+
+    def __init__(self, capacidad=NOTIF_EVENTOS_POR_CANAL, ventana=NOTIF_VENTANA_SEGUNDOS,
+                 max_en_espera=NOTIF_LONGPOLL_MAX):
+        self.capacidad = max(1, capacidad)
+        self.ventana = ventana
+        self.max_en_espera = max_en_espera
+        self._canales = {}     # canal -> deque[(seq, instante, evento)]
+        self._descartado = {}  # canal -> último seq expulsado por capacidad
+        self._ultimo = {}      # canal -> último seq agregado
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._cambio = threading.Condition(self._lock)
+        self._en_espera = 0
+        self.long_polls = 0
+        self.despertadas = 0
+        self.vencidas = 0
+        self.rechazadas = 0
+
+    @property
+    def ultimo_seq(self):
+        return self._seq
+
+    def agregar(self, evento, canal, seq=None, instante=None):
+        """
+        Agrega un evento al canal
+
+        Args:
+            evento: dict con información del evento
+            canal: 'cocina', 'meseros', ..., 'general'
+            seq: seq asignado por el bus entre procesos (None = siguiente local)
+            instante: time.monotonic() de creación (None = ahora)
+
+        Returns:
+            int: seq asignado
+        """
+        with self._lock:
+            if seq is None:
+                self._seq += 1
+                seq = self._seq
+            else:
+                self._seq = max(self._seq, seq)
+            buffer = self._canales.get(canal)
+            if buffer is None:
+                buffer = self._canales[canal] = deque(maxlen=self.capacidad)
+            elif len(buffer) == buffer.maxlen:
+                self._descartado[canal] = buffer[0][0]
+            instante = time.monotonic() if instante is None else instante
+            buffer.append((seq, instante, dict(evento, seq=seq)))
+            self._ultimo[canal] = seq
+            if self._en_espera:
+                self._cambio.notify_all()
+            return seq
+
+    def leer(self, canales, desde=None):
+        """
+        Eventos de los canales con seq mayor que `desde`, en orden
+
+        Args:
+            canales: list de canales a mezclar
+            desde: último seq recibido por el cliente (None = toda la ventana)
+
+        Returns:
+            dict: {eventos, ultimo_seq, perdidos}
+        """
+        limite = time.monotonic() - self.ventana
+        with self._lock:
+            ultimo = self._seq
+            perdidos = False
+            if desde is not None and desde > ultimo:
+                # Secuencia de otra instancia del servidor: devolver la ventana completa
+                perdidos, desde = True, None
+            corte = desde if desde is not None else 0
+
+            eventos = []
+            for canal in dict.fromkeys(canales):
+                if self._descartado.get(canal, 0) > corte and desde is not None:
+                    perdidos = True
+                # Los más nuevos están al final: recorrer hacia atrás hasta el corte
+                for seq, instante, evento in reversed(self._canales.get(canal, ())):
+                    if seq <= corte:
+                        break
+                    if instante < limite:
+                        perdidos = perdidos or desde is not None
+                        break
+                    eventos.append(evento)
+
+        eventos.sort(key=lambda e: e["seq"])
+        return {"eventos": eventos, "ultimo_seq": ultimo, "perdidos": perdidos}
+
+    def _hay_nuevos(self, canales, desde):
+        # Un cursor adelantado (otro worker aún no leído, o reinicio) espera
+        # hasta el plazo; leer() lo marca como perdidos si sigue adelantado
+        return any(self._ultimo.get(c, 0) > desde for c in canales)
+
+    def esperar(self, canales, desde, timeout):
+        """
+        Long polling: espera eventos posteriores a `desde` y los lee
+
+        Args:
+            canales: list de canales a mezclar
+            desde: último seq recibido por el cliente
+            timeout: segundos máximos de espera
+
+        Returns:
+            dict: lo mismo que `leer()` más `saturado` (True si no se esperó
+            porque ya había `max_en_espera` peticiones estacionadas)
+        """
+        saturado = False
+        limite = time.monotonic() + timeout
+        with self._cambio:
+            if not self._hay_nuevos(canales, desde):
+                if self._en_espera >= self.max_en_espera:
+                    saturado = True
+                    self.rechazadas += 1
+                else:
+                    self._en_espera += 1
+                    self.long_polls += 1
+                    try:
+                        while not self._hay_nuevos(canales, desde):
+                            restante = limite - time.monotonic()
+                            if restante <= 0:
+                                self.vencidas += 1
+                                break
+                            self._cambio.wait(restante)
+                        else:
+                            self.despertadas += 1
+                    finally:
+                        self._en_espera -= 1
+
+        resultado = self.leer(canales, desde)
+        resultado["saturado"] = saturado
+        return resultado
+
+    def estadisticas(self):
+        """Tamaño de los buffers y métricas del long polling"""
+        with self._lock:
+            return {
+                "ultimo_seq": self._seq,
+                "eventos_por_canal": {canal: len(buffer) for canal, buffer in self._canales.items()},
+                "capacidad_por_canal": self.capacidad,
+                "en_espera": self._en_espera,
+                "max_en_espera": self.max_en_espera,
+                "long_polls": self.long_polls,
+                "despertadas": self.despertadas,
+                "vencidas": self.vencidas,
+                "rechazadas": self.rechazadas,
+            }
+
+
 # Cola de eventos para polling
-# Estructura: { user_id: [eventos] }
-cola_eventos = {}
+cola_eventos = BufferEventos()
+
+
+class ProgramadorEmits:
+    """
+    Agrupa los emits de Socket.IO por sala durante una ventana corta
+
+    Una ráfaga de cambios sobre un pedido (varios items, cambio de estado,
+    ticket) generaba un emit por evento y por sala. Aquí el primer evento de
+    una sala abre una ventana de NOTIF_EMIT_VENTANA_MS; al cerrarse se envía
+    un solo frame a la sala:
+
+    - con un evento, el evento tal cual (mismo nombre y datos de siempre);
+    - con varios, `eventos_lote` con `{"eventos": [{"evento", "datos"}, ...]}`.
+
+    Dentro de la ventana, un `cambio_estado` reemplaza al anterior del mismo
+    pedido y un `item_modificado` al anterior del mismo item: el cliente solo
+    necesita el último. El reemplazo pasa al final para respetar el orden.
+    Un `item_modificado` que reemplaza a otro conserva la `cantidad_anterior`
+    del primero: el cliente ve el cambio completo de la ventana.
+    """
+
+    def __init__(self, ventana_ms=NOTIF_EMIT_VENTANA_MS):
+        self.ventana = max(0.0, ventana_ms) / 1000
+        self._pendientes = {}  # sala -> {socketio, eventos: OrderedDict, recibidos, limite}
+        self._cambio = threading.Condition()
+        self._hilo = None
+        self._contador = 0
+        self.eventos = 0
+        self.eventos_enviados = 0
+        self.frames = 0
+        self.lotes = 0
+        self.coalescidos = 0
+        self.errores = 0
+
+    @staticmethod
+    def _clave_reemplazo(datos):
+        """Clave de los eventos que reemplazan a uno anterior (None = no se reemplaza)"""
+        tipo = datos.get("tipo")
+        if tipo == "cambio_estado":
+            return (tipo, datos.get("pedido_id"))
+        if tipo == "item_modificado":
+            return (tipo, datos.get("pedido_id"), datos.get("item_id"))
+        return None
+
+    @staticmethod
+    def _fusionar(anterior, datos):
+        """Datos de un evento que reemplaza a `anterior` (sin tocar los originales)"""
+        if datos.get("tipo") != "item_modificado":
+            return datos
+        cambios_anteriores = anterior.get("cambios") or {}
+        if "cantidad_anterior" not in cambios_anteriores:
+            return datos
+        cambios = dict(datos.get("cambios") or {})
+        cambios["cantidad_anterior"] = cambios_anteriores["cantidad_anterior"]
+        return {**datos, "cambios": cambios}
+
+    def emitir(self, socketio, nombre, datos, sala):
+        """Programa el emit de `nombre` con `datos` a la sala"""
+        if self.ventana <= 0:
+            with self._cambio:
+                self.eventos += 1
+                self.eventos_enviados += 1
+                self.frames += 1
+            socketio.emit(nombre, datos, room=sala, namespace="/")
+            return
+
+        with self._cambio:
+            self.eventos += 1
+            self._contador += 1
+            lote = self._pendientes.get(sala)
+            if lote is None:
+                lote = self._pendientes[sala] = {
+                    "socketio": socketio,
+                    "eventos": OrderedDict(),
+                    "recibidos": 0,
+                    "limite": time.monotonic() + self.ventana,
+                }
+                self._cambio.notify()
+            clave = self._clave_reemplazo(datos) or ("evento", self._contador)
+            if clave in lote["eventos"]:
+                _, anterior = lote["eventos"].pop(clave)
+                datos = self._fusionar(anterior, datos)
+                self.coalescidos += 1
+            lote["eventos"][clave] = (nombre, datos)
+            lote["recibidos"] += 1
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='emits-socketio', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            with self._cambio:
+                while not self._pendientes:
+                    self._cambio.wait()
+                ahora = time.monotonic()
+                proximo = min(lote["limite"] for lote in self._pendientes.values())
+                if proximo > ahora:
+                    self._cambio.wait(proximo - ahora)
+                    continue
+                listos = [(sala, lote) for sala, lote in self._pendientes.items() if lote["limite"] <= ahora]
+                for sala, _ in listos:
+                    del self._pendientes[sala]
+            for sala, lote in listos:
+                self._enviar(sala, lote)
+
+    def _enviar(self, sala, lote):
+        eventos = list(lote["eventos"].values())
+        try:
+            if len(eventos) == 1:
+                nombre, datos = eventos[0]
+                lote["socketio"].emit(nombre, datos, room=sala, namespace="/")
+            else:
+                lote["socketio"].emit("eventos_lote", {
+                    "eventos": [{"evento": nombre, "datos": datos} for nombre, datos in eventos]
+                }, room=sala, namespace="/")
+        except Exception as e:
+            self.errores += 1
+            print(f"[WARN] Emit a la sala {sala} falló: {e}")
+        with self._cambio:
+            self.eventos_enviados += lote["recibidos"]
+            self.frames += 1
+            if len(eventos) > 1:
+                self.lotes += 1
+
+    def vaciar(self):
+        """Envía de inmediato todo lo pendiente (apagado y tests)"""
+        with self._cambio:
+            listos = list(self._pendientes.items())
+            self._pendientes.clear()
+        for sala, lote in listos:
+            self._enviar(sala, lote)
+
+    def estadisticas(self):
+        """Eventos recibidos, frames enviados y frames ahorrados"""
+        with self._cambio:
+            return {
+                "ventana_ms": self.ventana * 1000,
+                "eventos": self.eventos,
+                "frames": self.frames,
+                "frames_ahorrados": self.eventos_enviados - self.frames,
+                "lotes": self.lotes,
+                "coalescidos": self.coalescidos,
+                "salas_pendientes": len(self._pendientes),
+                "errores": self.errores,
+            }
+
+
+programador_emits = ProgramadorEmits()
+atexit.register(programador_emits.vaciar)
+
+_bus_conectado = None
+_bus_lock = threading.Lock()
+
+
+def _recibir_evento(mensaje, id_mensaje):
+    """Suscriptor del bus: guarda el evento en el buffer de polling de este proceso"""
+    antiguedad = max(0.0, time.time() - mensaje.get("creado_en", time.time()))
+    cola_eventos.agregar(mensaje["evento"], mensaje["canal"], seq=id_mensaje,
+                         instante=time.monotonic() - antiguedad)
+
+
+def conectar_bus():
+    """
+    Suscribe los buffers de polling al bus (una vez por proceso), precarga
+    los eventos recientes publicados por otros workers y arranca el lector.
+
+    Returns:
+        El bus de eventos del proceso
+    """
+    global _bus_conectado
+    if _bus_conectado is None:
+        with _bus_lock:
+            if _bus_conectado is None:
+                bus = obtener_bus()
+                bus.suscribir(TEMA_NOTIFICACIONES, _recibir_evento)
+                for id_mensaje, mensaje in bus.recientes(TEMA_NOTIFICACIONES, NOTIF_VENTANA_SEGUNDOS):
+                    _recibir_evento(mensaje, id_mensaje)
+                bus.iniciar()
+                _bus_conectado = bus
+    return _bus_conectado
 
 # Salas de WebSocket
 # Estructura: { room_name: set(session_ids) }
@@ -91,12 +469,7 @@ class NotificadorPedidos:
         }
 
         # Emitir a cocina en tiempo real (WebSocket)
-        socketio.emit(
-            "evento_pedido",
-            evento,
-            room="cocina",
-            namespace="/"
-        )
+        programador_emits.emitir(socketio, "evento_pedido", evento, "cocina")
 
         # Guardar en cola para polling
         NotificadorPedidos._agregar_a_cola_eventos(evento, "cocina")
@@ -119,20 +492,10 @@ class NotificadorPedidos:
         }
 
         # Notificar a meseros
-        socketio.emit(
-            "evento_pedido",
-            evento,
-            room="meseros",
-            namespace="/"
-        )
+        programador_emits.emitir(socketio, "evento_pedido", evento, "meseros")
 
         # Notificar al pedido específico (en caso de que esté en pantalla de cliente)
-        socketio.emit(
-            "evento_pedido",
-            evento,
-            room=f"pedido_{pedido_id}",
-            namespace="/"
-        )
+        programador_emits.emitir(socketio, "evento_pedido", evento, f"pedido_{pedido_id}")
 
         NotificadorPedidos._agregar_a_cola_eventos(evento, "meseros")
 
@@ -154,30 +517,15 @@ class NotificadorPedidos:
         }
 
         # Notificar a todos interesados
-        socketio.emit(
-            "evento_pedido",
-            evento,
-            room=f"pedido_{pedido_id}",
-            namespace="/"
-        )
+        programador_emits.emitir(socketio, "evento_pedido", evento, f"pedido_{pedido_id}")
 
         # Emitir a cocina si es relevante
         if nuevo_estado in ["en_cocina", "pendiente"]:
-            socketio.emit(
-                "evento_pedido",
-                evento,
-                room="cocina",
-                namespace="/"
-            )
+            programador_emits.emitir(socketio, "evento_pedido", evento, "cocina")
 
         # Emitir a meseros si es relevante
         if nuevo_estado in ["listo", "servido"]:
-            socketio.emit(
-                "evento_pedido",
-                evento,
-                room="meseros",
-                namespace="/"
-            )
+            programador_emits.emitir(socketio, "evento_pedido", evento, "meseros")
 
         NotificadorPedidos._agregar_a_cola_eventos(evento, "general")
 
@@ -201,18 +549,8 @@ class NotificadorPedidos:
         }
 
         # Notificar a cocina y meseros
-        socketio.emit(
-            "evento_pedido",
-            evento,
-            room="cocina",
-            namespace="/"
-        )
-        socketio.emit(
-            "evento_pedido",
-            evento,
-            room="meseros",
-            namespace="/"
-        )
+        programador_emits.emitir(socketio, "evento_pedido", evento, "cocina")
+        programador_emits.emitir(socketio, "evento_pedido", evento, "meseros")
 
         NotificadorPedidos._agregar_a_cola_eventos(evento, "general")
 
@@ -226,18 +564,8 @@ class NotificadorPedidos:
             "timestamp": datetime.now().isoformat()
         }
 
-        socketio.emit(
-            "evento_pedido",
-            evento,
-            room=f"pedido_{pedido_id}",
-            namespace="/"
-        )
-        socketio.emit(
-            "evento_pedido",
-            evento,
-            room="cocina",
-            namespace="/"
-        )
+        programador_emits.emitir(socketio, "evento_pedido", evento, f"pedido_{pedido_id}")
+        programador_emits.emitir(socketio, "evento_pedido", evento, "cocina")
 
         NotificadorPedidos._agregar_a_cola_eventos(evento, "general")
 
@@ -252,54 +580,61 @@ class NotificadorPedidos:
             "timestamp": datetime.now().isoformat()
         }
 
-        socketio.emit(
-            "evento_alerta",
-            evento,
-            room="managers",
-            namespace="/"
-        )
+        programador_emits.emitir(socketio, "evento_alerta", evento, "managers")
 
         NotificadorPedidos._agregar_a_cola_eventos(evento, "managers")
 
     @staticmethod
     def _agregar_a_cola_eventos(evento, rol_destinatario):
         """
-        Agrega un evento a la cola para clientes que usan polling
+        Publica un evento en el bus para los clientes que usan polling
+        (cada worker lo guarda en su cola)
 
         Args:
             evento: dict con información del evento
             rol_destinatario: 'cocina', 'meseros', 'cajeros', 'managers' o 'general'
         """
-        if rol_destinatario not in cola_eventos:
-            cola_eventos[rol_destinatario] = []
-
-        # Mantener un máximo de 100 eventos por cola
-        if len(cola_eventos[rol_destinatario]) >= 100:
-            cola_eventos[rol_destinatario].pop(0)
-
-        cola_eventos[rol_destinatario].append(evento)
+        conectar_bus().publicar(TEMA_NOTIFICACIONES, {
+            "canal": rol_destinatario,
+            "evento": evento,
+            "creado_en": time.time()
+        })
 
     @staticmethod
-    def obtener_eventos_pendientes(rol):
+    def obtener_eventos_pendientes(rol, desde=None):
         """
         Obtiene eventos pendientes para un rol (polling fallback)
 
         Args:
-            rol: Rol del usuario (cocina, meseros, etc.)
+            rol: Rol del usuario (cocinero, mesero, ...) o canal (cocina, meseros, ...)
+            desde: último seq recibido; None devuelve la ventana de 5 minutos
 
         Returns:
-            list: Eventos pendientes
+            dict: {eventos, ultimo_seq, perdidos}
         """
-        eventos = cola_eventos.get(rol, []) + cola_eventos.get("general", [])
+        canales = CANALES_POR_ROL.get(rol, [rol]) + ["general"]
+        return cola_eventos.leer(canales, desde)
 
-        # Limpiar eventos después de 5 minutos (timestamp check en frontend)
-        ahora = datetime.now()
-        eventos_validos = [
-            e for e in eventos
-            if (ahora - datetime.fromisoformat(e["timestamp"])).seconds < 300
-        ]
+    @staticmethod
+    def esperar_eventos(rol, desde, timeout):
+        """
+        Long polling: como obtener_eventos_pendientes, pero espera hasta
+        `timeout` segundos a que llegue un evento posterior a `desde`
 
-        return eventos_validos
+        Returns:
+            dict: {eventos, ultimo_seq, perdidos, saturado}
+        """
+        canales = CANALES_POR_ROL.get(rol, [rol]) + ["general"]
+        timeout = max(0.0, min(timeout, NOTIF_LONGPOLL_ESPERA_MAX))
+        return cola_eventos.esperar(canales, desde, timeout)
+
+    @staticmethod
+    def obtener_estadisticas_polling():
+        """Métricas de los buffers de polling y del bus (para /health)"""
+        estadisticas = cola_eventos.estadisticas()
+        estadisticas["bus"] = obtener_bus().estadisticas()
+        estadisticas["emits"] = programador_emits.estadisticas()
+        return estadisticas
 
     @staticmethod
     def obtener_estado_conexiones():
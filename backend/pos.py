@@ -5,13 +5,22 @@ Sistema de punto de venta con flujos para Mesero, Cajero y Cocina
 
 import os
 from datetime import datetime
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from auth import role_required
 import json
 from facturacion import GeneradorDTE, ControlCorrelativo
-from inventario import descontar_stock_pedido, inicializar_inventario_productos
-from database import get_db
+from inventario import descontar_stock_pedido
+from clientes import obtener_credito_cliente
+from database import get_db, escribir_y_esperar, rango_dia, rango_fechas, filtro_rango
+from migraciones import aplicar_migraciones
 from notificaciones import NotificadorPedidos
+from versiones_colas import version_cola, etag_cola, cambios_desde, clasificar_cambios
+from indice_pedidos import indice_pedidos, ESTADOS_ACTIVOS
+from cache_menu import cache_menu, etag_menu
+from catalogo_combos import combo_a_dict
+from lineas_pedido import (insertar_pedido, iva_linea, totales_pedido, aplicar_delta_totales, leer_linea,
+                           cambiar_cantidad_linea, quitar_linea, IVA_PORCENTAJE, SQL_LINEA_FACTURABLE)
+from lote_pedidos import validar_lote, aplicar_lote
 from upload_handler import save_image, delete_image
 
 pos_bp = Blueprint('pos', __name__)
@@ -25,348 +34,12 @@ def init_socketio(socket_instance):
     socketio = socket_instance
 
 def init_db():
-    """Inicializa la base de datos con las tablas necesarias"""
+    """Aplica las migraciones pendientes de pos.db e inserta el menú inicial"""
+    aplicar_migraciones('pos.db')
+
     conn = get_db()
     cursor = conn.cursor()
 
-    # Tabla de categorías
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS categorias (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            orden INTEGER DEFAULT 0
-        )
-    ''')
-
-    # Tabla de combos (bundles de múltiples productos)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS combos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            descripcion TEXT,
-            precio_combo REAL NOT NULL,
-            imagen TEXT,
-            activo INTEGER DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Tabla de items dentro de combos (relación M:M)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS combo_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            combo_id INTEGER NOT NULL,
-            producto_id INTEGER NOT NULL,
-            cantidad INTEGER NOT NULL,
-            FOREIGN KEY (combo_id) REFERENCES combos(id),
-            FOREIGN KEY (producto_id) REFERENCES productos(id)
-        )
-    ''')
-
-    # Tabla de productos (menú)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS productos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nombre TEXT NOT NULL,
-            descripcion TEXT,
-            precio REAL NOT NULL,
-            categoria_id INTEGER,
-            disponible INTEGER DEFAULT 1,
-            imagen TEXT,
-            -- Para productos de consumo directo (agua, gaseosas, cervezas)
-            -- Si tiene materia_prima_id, se descuenta 1:1 de ese inventario
-            materia_prima_id INTEGER,
-            FOREIGN KEY (categoria_id) REFERENCES categorias(id)
-        )
-    ''')
-
-    # Agregar columna materia_prima_id si no existe (para bases de datos existentes)
-    try:
-        cursor.execute("SELECT materia_prima_id FROM productos LIMIT 1")
-    except sqlite3.OperationalError:
-        try:
-            cursor.execute("ALTER TABLE productos ADD COLUMN materia_prima_id INTEGER")
-        except sqlite3.OperationalError:
-            pass
-
-    # Tabla de mesas
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS mesas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            numero INTEGER NOT NULL UNIQUE,
-            capacidad INTEGER DEFAULT 4,
-            estado TEXT DEFAULT 'libre'
-        )
-    ''')
-
-    # Tabla de pedidos
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pedidos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mesa_id INTEGER,
-            mesero TEXT,
-            estado TEXT DEFAULT 'pendiente_pago',
-            tipo_pago TEXT DEFAULT 'anticipado',
-            subtotal REAL DEFAULT 0,
-            impuesto REAL DEFAULT 0,
-            total REAL DEFAULT 0,
-            notas TEXT,
-            -- Referencia al cliente registrado (opcional)
-            cliente_id INTEGER,
-            -- Campos de cliente para facturación
-            cliente_tipo_doc TEXT,
-            cliente_num_doc TEXT,
-            cliente_nrc TEXT,
-            cliente_nombre TEXT,
-            cliente_direccion TEXT,
-            cliente_departamento TEXT,
-            cliente_municipio TEXT,
-            cliente_telefono TEXT,
-            cliente_correo TEXT,
-            -- Campos de DTE
-            dte_tipo TEXT,
-            dte_codigo_generacion TEXT,
-            dte_numero_control TEXT,
-            dte_json TEXT,
-            dte_xml TEXT,
-            facturado_at TIMESTAMP,
-            -- Información de pago
-            tipo_comprobante TEXT DEFAULT 'ticket',  -- 'factura' o 'ticket'
-            aplicar_iva BOOLEAN DEFAULT 0,          -- 1 si es factura, 0 si es ticket
-            propina REAL DEFAULT 0,                  -- Propina agregada en pago
-            -- Timestamps
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            pagado_at TIMESTAMP,
-            cocina_at TIMESTAMP,
-            listo_at TIMESTAMP,
-            servido_at TIMESTAMP,
-            FOREIGN KEY (mesa_id) REFERENCES mesas(id)
-        )
-    ''')
-
-    # Migración: Agregar campos si no existen (para bases de datos existentes)
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN cliente_id INTEGER')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN metodo_pago TEXT DEFAULT "efectivo"')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN cliente_tipo_doc TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN cliente_num_doc TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN cliente_nrc TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN cliente_nombre TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN cliente_direccion TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN cliente_departamento TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN cliente_municipio TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN cliente_telefono TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN cliente_correo TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN dte_tipo TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN dte_codigo_generacion TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN dte_numero_control TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN dte_json TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN dte_xml TEXT')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN facturado_at TIMESTAMP')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN tipo_comprobante TEXT DEFAULT "ticket"')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN aplicar_iva BOOLEAN DEFAULT 0')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedidos ADD COLUMN propina REAL DEFAULT 0')
-    except:
-        pass
-
-    # Migración: agregar combo_id a pedido_items (para soporte de combos)
-    try:
-        cursor.execute('ALTER TABLE pedido_items ADD COLUMN combo_id INTEGER')
-    except:
-        pass
-
-    # Migraciones: agregar columnas para IVA desglosado
-    try:
-        cursor.execute('ALTER TABLE pedido_items ADD COLUMN iva_porcentaje REAL DEFAULT 13.0')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedido_items ADD COLUMN iva_monto REAL DEFAULT 0')
-    except:
-        pass
-    try:
-        cursor.execute('ALTER TABLE pedido_items ADD COLUMN total_item REAL DEFAULT 0')
-    except:
-        pass
-
-    # Tabla de items del pedido
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pedido_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            pedido_id INTEGER NOT NULL,
-            producto_id INTEGER NOT NULL,
-            combo_id INTEGER,
-            cantidad INTEGER DEFAULT 1,
-            precio_unitario REAL NOT NULL,
-            subtotal REAL NOT NULL,
-            iva_porcentaje REAL DEFAULT 13.0,
-            iva_monto REAL DEFAULT 0,
-            total_item REAL DEFAULT 0,
-            notas TEXT,
-            FOREIGN KEY (pedido_id) REFERENCES pedidos(id),
-            FOREIGN KEY (producto_id) REFERENCES productos(id),
-            FOREIGN KEY (combo_id) REFERENCES combos(id)
-        )
-    ''')
-
-    # Tabla de ventas diarias consolidadas
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ventas_diarias (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha DATE UNIQUE NOT NULL,
-            total_pedidos INTEGER DEFAULT 0,
-            total_ventas REAL DEFAULT 0,
-            subtotal_total REAL DEFAULT 0,
-            impuesto_total REAL DEFAULT 0,
-            propinas_total REAL DEFAULT 0,
-            efectivo REAL DEFAULT 0,
-            credito REAL DEFAULT 0,
-            cantidad_transacciones INTEGER DEFAULT 0,
-            pedido_promedio REAL DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Tabla de desglose de ventas por producto
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ventas_diarias_productos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha_venta DATE NOT NULL,
-            producto_id INTEGER NOT NULL,
-            producto_nombre TEXT NOT NULL,
-            categoria_id INTEGER,
-            categoria_nombre TEXT,
-            cantidad_vendida INTEGER DEFAULT 0,
-            subtotal REAL DEFAULT 0,
-            FOREIGN KEY (fecha_venta) REFERENCES ventas_diarias(fecha),
-            FOREIGN KEY (producto_id) REFERENCES productos(id),
-            UNIQUE(fecha_venta, producto_id)
-        )
-    ''')
-
-    # Tabla de desglose de ventas por categoría
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ventas_diarias_categorias (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha_venta DATE NOT NULL,
-            categoria_id INTEGER NOT NULL,
-            categoria_nombre TEXT NOT NULL,
-            cantidad_vendida INTEGER DEFAULT 0,
-            subtotal REAL DEFAULT 0,
-            FOREIGN KEY (fecha_venta) REFERENCES ventas_diarias(fecha),
-            FOREIGN KEY (categoria_id) REFERENCES categorias(id),
-            UNIQUE(fecha_venta, categoria_id)
-        )
-    ''')
-
-    # Migración: agregar campo propinas_total a ventas_diarias
-    try:
-        cursor.execute('ALTER TABLE ventas_diarias ADD COLUMN propinas_total REAL DEFAULT 0')
-    except:
-        pass
-
-    # ============ ÍNDICES PARA OPTIMIZAR CONSULTAS ============
-    # Índices en combos
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_combos_activo ON combos(activo)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_combos_nombre ON combos(nombre)')
-
-    # Índices en combo_items
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_combo_items_combo_id ON combo_items(combo_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_combo_items_producto_id ON combo_items(producto_id)')
-
-    # Índices en pedidos (tabla más consultada)
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_mesa_id ON pedidos(mesa_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_cliente_id ON pedidos(cliente_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_estado ON pedidos(estado)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_created_at ON pedidos(created_at)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_facturado_at ON pedidos(facturado_at)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedidos_pagado_at ON pedidos(pagado_at)')
-
-    # Índices en pedido_items (tabla de relación pedido-producto)
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedido_items_pedido_id ON pedido_items(pedido_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pedido_items_producto_id ON pedido_items(producto_id)')
-
-    # Índices en productos
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_productos_categoria_id ON productos(categoria_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_productos_disponible ON productos(disponible)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_productos_nombre ON productos(nombre)')
-
-    # Índices en mesas
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_mesas_estado ON mesas(estado)')
-
-    # Índices en ventas_diarias
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ventas_diarias_fecha ON ventas_diarias(fecha)')
-
-    # Índices en ventas_diarias_productos
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ventas_diarias_productos_fecha ON ventas_diarias_productos(fecha_venta)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ventas_diarias_productos_producto_id ON ventas_diarias_productos(producto_id)')
-
-    # Índices en ventas_diarias_categorias
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ventas_diarias_categorias_fecha ON ventas_diarias_categorias(fecha_venta)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ventas_diarias_categorias_categoria_id ON ventas_diarias_categorias(categoria_id)')
-
-    conn.commit()
-
     # Insertar datos iniciales si no existen
     cursor.execute('SELECT COUNT(*) FROM categorias')
     if cursor.fetchone()[0] == 0:
@@ -422,16 +95,13 @@ def insertar_datos_iniciales(conn):
 
     conn.commit()
 
-# Inicializar BD al importar
-init_db()
-# Inicializar inventario para los productos
-inicializar_inventario_productos()
-
 # ============ FUNCIONES HELPER PARA COMBOS ============
 
-def obtener_combo(combo_id):
-    """Obtiene un combo por ID"""
-    conn = get_db()
+def obtener_combo(combo_id, conn=None):
+    """Obtiene un combo por ID (usa `conn` si se proporciona)"""
+    propia = conn is None
+    if propia:
+        conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT c.*, COUNT(ci.id) as cantidad_items
@@ -441,26 +111,12 @@ def obtener_combo(combo_id):
         GROUP BY c.id
     ''', (combo_id,))
     resultado = cursor.fetchone()
-    conn.close()
+    if propia:
+        conn.close()
     return resultado
 
 
-def obtener_items_combo(combo_id):
-    """Obtiene todos los productos dentro de un combo"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT ci.*, p.nombre, p.precio
-        FROM combo_items ci
-        JOIN productos p ON ci.producto_id = p.id
-        WHERE ci.combo_id = ?
-    ''', (combo_id,))
-    items = cursor.fetchall()
-    conn.close()
-    return items
-
-
-def validar_combo(nombre, precio_combo, items):
+def validar_combo(nombre, precio_combo, items, conn=None):
     """
     Valida que un combo sea válido:
     - Debe tener al menos 2 productos
@@ -474,90 +130,94 @@ def validar_combo(nombre, precio_combo, items):
         return False, "Combo debe tener al menos 2 productos"
 
     # Validación 2: todos los productos deben existir y estar disponibles
-    conn = get_db()
+    propia = conn is None
+    if propia:
+        conn = get_db()
     cursor = conn.cursor()
     suma_precios = 0
 
-    for item in items:
-        if not item.get('producto_id') or not item.get('cantidad'):
-            conn.close()
-            return False, "Cada item debe tener producto_id y cantidad"
+    try:
+        for item in items:
+            if not item.get('producto_id') or not item.get('cantidad'):
+                return False, "Cada item debe tener producto_id y cantidad"
 
-        cursor.execute('SELECT precio FROM productos WHERE id = ? AND disponible = 1',
-                      (item['producto_id'],))
-        producto = cursor.fetchone()
+            cursor.execute('SELECT precio FROM productos WHERE id = ? AND disponible = 1',
+                          (item['producto_id'],))
+            producto = cursor.fetchone()
 
-        if not producto:
-            conn.close()
-            return False, f"Producto {item['producto_id']} no existe o no está disponible"
+            if not producto:
+                return False, f"Producto {item['producto_id']} no existe o no está disponible"
 
-        suma_precios += float(producto['precio']) * float(item['cantidad'])
+            suma_precios += float(producto['precio']) * float(item['cantidad'])
 
-    # Validación 3: precio del combo <= suma de productos individuales
-    if float(precio_combo) > suma_precios:
-        conn.close()
-        return False, f"Precio del combo (${precio_combo}) no puede ser mayor a suma de productos (${suma_precios})"
+        # Validación 3: precio del combo <= suma de productos individuales
+        if float(precio_combo) > suma_precios:
+            return False, f"Precio del combo (${precio_combo}) no puede ser mayor a suma de productos (${suma_precios})"
 
-    conn.close()
-    return True, "OK"
+        return True, "OK"
+    finally:
+        if propia:
+            conn.close()
 
 
-def recalcular_totales_pedido(pedido_id):
+def recalcular_totales_pedido(pedido_id, conn=None):
     """
-    Recalcula subtotal, IVA desglosado y total de un pedido
+    Recalcula desde cero el IVA de las líneas y los totales de un pedido
 
-    - Calcula IVA por cada item (13% El Salvador)
-    - Actualiza iva_porcentaje, iva_monto, total_item en cada item
-    - Suma solo items principales (NO desgloces de combo)
+    Las rutas de items mantienen los totales con deltas
+    (lineas_pedido.aplicar_delta_totales); esta función queda como
+    herramienta de reparación:
+    - Lee en una consulta las líneas que suman al total (NO desgloses de combo)
+    - Corrige en un solo executemany las líneas con IVA desfasado (13% El Salvador)
+    - Reescribe subtotal, impuesto y total del pedido
+
+    Si se proporciona `conn`, trabaja dentro de la transacción del llamador
+    y no confirma; el commit queda a cargo de quien llama.
+
+    Returns:
+        dict: Totales del pedido ('subtotal', 'impuesto', 'total')
     """
-    conn = get_db()
+    propia = conn is None
+    if propia:
+        conn = get_db()
     cursor = conn.cursor()
 
-    # Obtener todos los items principales (NO desgloces)
-    # Nota: combo_id puede ser NULL, 0, o '' (string vacío)
-    cursor.execute('''
-        SELECT id, subtotal
+    cursor.execute(f'''
+        SELECT id, subtotal, iva_porcentaje, iva_monto, total_item
         FROM pedido_items
-        WHERE pedido_id = ? AND (combo_id IS NULL OR combo_id = 0 OR combo_id = '')
-          AND (notas IS NULL OR notas NOT LIKE '%Desglose de combo%')
+        WHERE pedido_id = ? AND {SQL_LINEA_FACTURABLE}
     ''', (pedido_id,))
 
-    items = cursor.fetchall()
     subtotal_total = 0.0
     iva_total = 0.0
+    desfasadas = []
+    for item_id, subtotal_item, iva_porcentaje, iva_guardado, total_guardado in cursor.fetchall():
+        subtotal_item = float(subtotal_item) if subtotal_item else 0.0
+        iva_monto, total_item = iva_linea(subtotal_item)
+        if (iva_porcentaje, iva_guardado, total_guardado) != (IVA_PORCENTAJE, iva_monto, total_item):
+            desfasadas.append((IVA_PORCENTAJE, iva_monto, total_item, item_id))
+        subtotal_total += subtotal_item
+        iva_total += iva_monto
 
-    # Calcular IVA para cada item
-    for item in items:
-        item_id = item[0]
-        subtotal_item = float(item[1]) if item[1] else 0.0
-
-        # IVA: 13% (El Salvador)
-        iva_porcentaje = 13.0
-        iva_monto = round(subtotal_item * (iva_porcentaje / 100), 2)
-        total_item = round(subtotal_item + iva_monto, 2)
-
-        # Actualizar el item con IVA desglosado
-        cursor.execute('''
+    if desfasadas:
+        cursor.executemany('''
             UPDATE pedido_items
             SET iva_porcentaje = ?, iva_monto = ?, total_item = ?
             WHERE id = ?
-        ''', (iva_porcentaje, iva_monto, total_item, item_id))
-
-        subtotal_total += subtotal_item
-        iva_total += iva_monto
-
-    total_general = round(subtotal_total + iva_total, 2)
+        ''', desfasadas)
 
-    # Actualizar totales en el pedido
+    totales = totales_pedido(subtotal_total, iva_total)
     cursor.execute('''
         UPDATE pedidos
         SET subtotal = ?, impuesto = ?, total = ?, updated_at = ?
         WHERE id = ?
-    ''', (round(subtotal_total, 2), round(iva_total, 2), total_general,
+    ''', (totales['subtotal'], totales['impuesto'], totales['total'],
           datetime.now().isoformat(), pedido_id))
 
-    conn.commit()
-    conn.close()
+    if propia:
+        conn.commit()
+        conn.close()
+    return totales
 
 # ============ FUNCIONES DE REPORTES ============
 
@@ -580,6 +240,8 @@ def consolidar_ventas_diarias(fecha_str=None):
     cursor = conn.cursor()
 
     try:
+        inicio, fin = rango_dia(fecha_str)
+
         # 1. Obtener pedidos cerrados del día
         cursor.execute('''
             SELECT
@@ -590,8 +252,8 @@ def consolidar_ventas_diarias(fecha_str=None):
                 COALESCE(SUM(CASE WHEN metodo_pago = 'efectivo' THEN total ELSE 0 END), 0) as efectivo,
                 COALESCE(SUM(CASE WHEN metodo_pago = 'credito' THEN total ELSE 0 END), 0) as credito
             FROM pedidos
-            WHERE DATE(created_at) = ? AND estado = 'cerrado'
-        ''', (fecha_str,))
+            WHERE estado = 'cerrado' AND created_at >= ? AND created_at < ?
+        ''', (inicio, fin))
 
         stats = cursor.fetchone()
         total_pedidos = stats[0] if stats[0] else 0
@@ -626,9 +288,9 @@ def consolidar_ventas_diarias(fecha_str=None):
             JOIN productos pr ON pi.producto_id = pr.id
             JOIN pedidos p ON pi.pedido_id = p.id
             LEFT JOIN categorias c ON pr.categoria_id = c.id
-            WHERE DATE(p.created_at) = ? AND p.estado = 'cerrado'
+            WHERE p.estado = 'cerrado' AND p.created_at >= ? AND p.created_at < ?
             GROUP BY pi.producto_id
-        ''', (fecha_str,))
+        ''', (inicio, fin))
 
         productos = cursor.fetchall()
 
@@ -655,9 +317,9 @@ def consolidar_ventas_diarias(fecha_str=None):
             JOIN productos pr ON pi.producto_id = pr.id
             JOIN categorias c ON pr.categoria_id = c.id
             JOIN pedidos p ON pi.pedido_id = p.id
-            WHERE DATE(p.created_at) = ? AND p.estado = 'cerrado'
+            WHERE p.estado = 'cerrado' AND p.created_at >= ? AND p.created_at < ?
             GROUP BY c.id
-        ''', (fecha_str,))
+        ''', (inicio, fin))
 
         categorias = cursor.fetchall()
 
@@ -694,20 +356,26 @@ def consolidar_ventas_diarias(fecha_str=None):
 
 # ============ ENDPOINTS DE PRODUCTOS ============
 
+def _responder_menu(vista):
+    """
+    Respuesta de una vista del menú desde la caché en memoria (ver
+    cache_menu.py): el JSON ya serializado con ETag, o 304 si el cliente ya
+    tiene la versión.
+    """
+    version, cuerpo = cache_menu.obtener(vista)
+    etag = etag_menu(version)
+    if request.if_none_match.contains(etag):
+        respuesta = current_app.response_class(status=304)
+    else:
+        respuesta = current_app.response_class(cuerpo, mimetype='application/json')
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
 @pos_bp.route('/productos', methods=['GET'])
 def get_productos():
     """Obtiene todos los productos del menú"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT p.*, c.nombre as categoria_nombre
-        FROM productos p
-        LEFT JOIN categorias c ON p.categoria_id = c.id
-        ORDER BY c.orden, p.nombre
-    ''')
-    productos = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(productos)
+    return _responder_menu('productos')
 
 @pos_bp.route('/productos/<int:id>', methods=['GET'])
 def get_producto(id):
@@ -810,6 +478,8 @@ def update_producto(id):
             cursor.execute(query, update_values)
 
     conn.commit()
+
+    cache_menu.registrar_cambio()
     conn.close()
     return jsonify({'success': True})
 
@@ -855,6 +525,7 @@ def crear_producto():
 
         producto_id = cursor.lastrowid
         conn.commit()
+        cache_menu.registrar_cambio()
         conn.close()
 
         return jsonify({
@@ -889,6 +560,8 @@ def eliminar_producto(id):
         mensaje = 'Producto eliminado'
 
     conn.commit()
+
+    cache_menu.registrar_cambio()
     conn.close()
 
     return jsonify({'success': True, 'mensaje': mensaje})
@@ -899,37 +572,14 @@ def eliminar_producto(id):
 @pos_bp.route('/categorias', methods=['GET'])
 def get_categorias():
     """Obtiene todas las categorías con conteo de productos"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT c.*, COUNT(p.id) as total_productos
-        FROM categorias c
-        LEFT JOIN productos p ON c.id = p.categoria_id
-        GROUP BY c.id
-        ORDER BY c.orden
-    ''')
-    categorias = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(categorias)
+    return _responder_menu('categorias')
 
 
 @pos_bp.route('/categorias/<int:categoria_id>/productos', methods=['GET'])
 def obtener_productos_categoria(categoria_id):
-    """Obtiene los productos de una categoría"""
+    """Obtiene los productos disponibles de una categoría"""
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, nombre, precio, categoria_id, disponible
-            FROM productos
-            WHERE categoria_id = ? AND disponible = 1
-            ORDER BY nombre
-        ''', (categoria_id,))
-
-        productos = cursor.fetchall()
-        conn.close()
-
-        return jsonify([dict(p) for p in productos])
+        return _responder_menu(('categoria', categoria_id))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -956,6 +606,7 @@ def crear_categoria():
         )
         categoria_id = cursor.lastrowid
         conn.commit()
+        cache_menu.registrar_cambio()
         conn.close()
 
         return jsonify({
@@ -982,6 +633,8 @@ def actualizar_categoria(id):
     ''', (data.get('nombre'), data.get('orden'), id))
 
     conn.commit()
+
+    cache_menu.registrar_cambio()
     conn.close()
 
     return jsonify({'success': True})
@@ -1004,6 +657,7 @@ def eliminar_categoria(id):
 
     cursor.execute('DELETE FROM categorias WHERE id = ?', (id,))
     conn.commit()
+    cache_menu.registrar_cambio()
     conn.close()
 
     return jsonify({'success': True})
@@ -1015,44 +669,7 @@ def eliminar_categoria(id):
 @role_required('mesero', 'cajero', 'manager')
 def listar_combos():
     """Listar todos los combos activos con sus productos"""
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT c.*, COUNT(ci.id) as cantidad_items
-        FROM combos c
-        LEFT JOIN combo_items ci ON c.id = ci.combo_id
-        WHERE c.activo = 1
-        GROUP BY c.id
-        ORDER BY c.nombre
-    ''')
-    combos = [dict(row) for row in cursor.fetchall()]
-
-    # Obtener items para cada combo
-    resultado = []
-    for combo in combos:
-        items = obtener_items_combo(combo['id'])
-        resultado.append({
-            'id': combo['id'],
-            'nombre': combo['nombre'],
-            'descripcion': combo['descripcion'],
-            'precio_combo': combo['precio_combo'],
-            'imagen': combo['imagen'],
-            'activo': combo['activo'],
-            'cantidad_items': combo['cantidad_items'],
-            'items': [
-                {
-                    'id': item[0],
-                    'producto_id': item[1],
-                    'producto_nombre': item[3],
-                    'cantidad': item[2],
-                    'precio_unitario': item[4]
-                } for item in items
-            ]
-        })
-
-    conn.close()
-    return jsonify(resultado)
+    return _responder_menu('combos')
 
 
 @pos_bp.route('/combos', methods=['POST'])
@@ -1126,6 +743,8 @@ def crear_combo():
             ''', (combo_id, item['producto_id'], item['cantidad']))
 
         conn.commit()
+
+        cache_menu.registrar_cambio()
         conn.close()
 
         return jsonify({
@@ -1145,31 +764,12 @@ def crear_combo():
 @pos_bp.route('/combos/<int:combo_id>', methods=['GET'])
 @role_required('mesero', 'cajero', 'manager')
 def obtener_combo_detalle(combo_id):
-    """Obtener detalle de un combo"""
-    combo = obtener_combo(combo_id)
+    """Obtener detalle de un combo (desde el catálogo en memoria)"""
+    combo = cache_menu.combo(combo_id)
     if not combo:
         return jsonify({'error': 'Combo no encontrado'}), 404
 
-    items = obtener_items_combo(combo_id)
-
-    return jsonify({
-        'id': combo['id'],
-        'nombre': combo['nombre'],
-        'descripcion': combo['descripcion'],
-        'precio_combo': combo['precio_combo'],
-        'imagen': combo['imagen'],
-        'activo': combo['activo'],
-        'cantidad_items': combo['cantidad_items'],
-        'items': [
-            {
-                'id': item[0],
-                'producto_id': item[1],
-                'producto_nombre': item[3],
-                'cantidad': item[2],
-                'precio_unitario': item[4]
-            } for item in items
-        ]
-    })
+    return jsonify(combo_a_dict(combo))
 
 
 @pos_bp.route('/combos/<int:combo_id>', methods=['PUT'])
@@ -1258,6 +858,8 @@ def actualizar_combo(combo_id):
                 ''', (combo_id, item['producto_id'], item['cantidad']))
 
         conn.commit()
+
+        cache_menu.registrar_cambio()
         conn.close()
 
         return jsonify({
@@ -1289,6 +891,7 @@ def desactivar_combo(combo_id):
             (combo_id,)
         )
         conn.commit()
+        cache_menu.registrar_cambio()
         conn.close()
 
         return jsonify({
@@ -1309,14 +912,14 @@ def get_mesas():
     """Obtiene todas las mesas con su estado"""
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT m.*,
-               (SELECT COUNT(*) FROM pedidos p WHERE p.mesa_id = m.id AND p.estado NOT IN ('cerrado', 'cancelado')) as pedidos_activos
-        FROM mesas m
-        ORDER BY m.numero
-    ''')
+    cursor.execute('SELECT * FROM mesas ORDER BY numero')
     mesas = [dict(row) for row in cursor.fetchall()]
     conn.close()
+
+    # Pedidos activos por mesa desde el índice en memoria
+    ocupacion = indice_pedidos.ocupacion_mesas()
+    for mesa in mesas:
+        mesa['pedidos_activos'] = ocupacion.get(mesa['id'], 0)
     return jsonify(mesas)
 
 @pos_bp.route('/mesas/<int:id>', methods=['PUT'])
@@ -1378,6 +981,11 @@ def _cargar_items_para_pedidos(cursor, pedido_ids):
 def get_pedidos():
     """Obtiene pedidos filtrados por estado"""
     estado = request.args.get('estado')
+
+    # Solo estados activos: se sirven desde el índice en memoria
+    if estado and set(estado.split(',')) <= set(ESTADOS_ACTIVOS):
+        return jsonify(indice_pedidos.por_estados(estado.split(',')))
+
     conn = get_db()
     cursor = conn.cursor()
 
@@ -1519,141 +1127,106 @@ def crear_pedido():
     """
     data = request.get_json()
 
-    mesa_id = data.get('mesa_id')  # Puede ser None para pedidos para llevar
-    mesero = data.get('mesero', 'Mesero')
-    tipo_pago = data.get('tipo_pago', 'anticipado')
-    items = data.get('items', [])
-    notas = data.get('notas', '')
-    cliente_nombre = data.get('cliente_nombre', '')  # Para pedidos sin mesa
-
-    if not items:
+    if not data.get('items'):
         return jsonify({'error': 'El pedido debe tener al menos un item'}), 400
 
-    conn = get_db()
-    cursor = conn.cursor()
+    # Precios de una misma versión del menú, IVA por línea y totales en
+    # memoria (ver lineas_pedido.py); una sola transacción de escritura
+    productos, combos = cache_menu.productos_y_combos(revisar=True)
 
-    # Calcular totales - soporta productos y combos
-    subtotal = 0
-    items_expandidos = []
-
-    for item in items:
-        cantidad = item.get('cantidad', 1)
-
-        if item.get('combo_id') or item.get('es_combo'):
-            # Es un combo - obtener precio del combo
-            combo_id = item.get('combo_id')
-            cursor.execute('SELECT id, nombre, precio_combo FROM combos WHERE id = ?', (combo_id,))
-            combo = cursor.fetchone()
-            if combo:
-                item['precio_unitario'] = combo['precio_combo']
-                item['subtotal'] = combo['precio_combo'] * cantidad
-                item['nombre_item'] = combo['nombre']
-                item['es_combo'] = True
-                subtotal += item['subtotal']
-                items_expandidos.append(item)
-
-                # Obtener productos del combo para desglose en cocina
-                cursor.execute('''
-                    SELECT ci.producto_id, ci.cantidad, p.nombre, p.precio
-                    FROM combo_items ci
-                    JOIN productos p ON ci.producto_id = p.id
-                    WHERE ci.combo_id = ?
-                ''', (combo_id,))
-                combo_productos = cursor.fetchall()
-                for cp in combo_productos:
-                    items_expandidos.append({
-                        'producto_id': cp['producto_id'],
-                        'cantidad': cp['cantidad'] * cantidad,
-                        'precio_unitario': 0,  # No suma al total
-                        'subtotal': 0,
-                        'notas': f"Desglose de combo: {combo['nombre']}",
-                        'es_desglose': True
-                    })
-        else:
-            # Es un producto normal
-            cursor.execute('SELECT precio FROM productos WHERE id = ?', (item['producto_id'],))
-            producto = cursor.fetchone()
-            if producto:
-                item['precio_unitario'] = producto['precio']
-                item['subtotal'] = producto['precio'] * cantidad
-                subtotal += item['subtotal']
-                items_expandidos.append(item)
+    # Crear pedido, items (productos, combos y su desglose) y ocupar la mesa;
+    # con DB_COLA_ESCRITURA=1 lo aplica el hilo escritor (database.escribir)
+    pedido = escribir_y_esperar(lambda conn: insertar_pedido(conn.cursor(), data, productos, combos))
+    indice_pedidos.registrar_cambio()
 
-    items = items_expandidos
+    _notificar_nuevo_pedido(data, pedido)
 
-    impuesto = round(subtotal * 0.13, 2)  # IVA El Salvador
-    total = round(subtotal + impuesto, 2)
+    return jsonify({
+        'success': True,
+        'pedido_id': pedido['pedido_id'],
+        'estado': pedido['estado'],
+        'subtotal': pedido['subtotal'],
+        'impuesto': pedido['impuesto'],
+        'total': pedido['total']
+    })
 
-    # Estado inicial según tipo de pago
-    estado_inicial = 'pendiente_pago' if tipo_pago == 'anticipado' else 'en_mesa'
 
-    # Crear pedido
-    cursor.execute('''
-        INSERT INTO pedidos (mesa_id, mesero, estado, tipo_pago, subtotal, impuesto, total, notas, cliente_nombre)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (mesa_id, mesero, estado_inicial, tipo_pago, subtotal, impuesto, total, notas, cliente_nombre))
+def _notificar_nuevo_pedido(data, pedido):
+    """Notifica a cocina un pedido recién creado (cuerpo `data`, resultado de insertar_pedido)"""
+    if not socketio:
+        return
+    try:
+        # Preparar datos del pedido para notificación
+        pedido_notif = {
+            "id": pedido['pedido_id'],
+            "mesa_numero": data.get('mesa_id') or None,
+            "mesa_id": data.get('mesa_id'),
+            "items": pedido['lineas'],
+            "tipo": data.get('tipo_pago', 'anticipado'),
+            "cliente_nombre": data.get('cliente_nombre', ''),
+            "mesero": data.get('mesero', 'Mesero'),
+            "subtotal": pedido['subtotal'],
+            "impuesto": pedido['impuesto'],
+            "total": pedido['total'],
+            "estado": pedido['estado'],
+            "timestamp": datetime.now().isoformat()
+        }
 
-    pedido_id = cursor.lastrowid
+        # Solo notificar si está en estado pendiente_pago (listo para cocina)
+        if pedido['estado'] in ['pendiente_pago', 'en_mesa']:
+            NotificadorPedidos.notificar_nuevo_pedido(socketio, pedido_notif)
+    except Exception as e:
+        print(f"Error notificando nuevo pedido {pedido['pedido_id']}: {e}")
 
-    # Crear items (productos y combos)
-    for item in items:
-        cursor.execute('''
-            INSERT INTO pedido_items (pedido_id, producto_id, combo_id, cantidad, precio_unitario, subtotal, notas)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            pedido_id,
-            item.get('producto_id'),
-            item.get('combo_id'),
-            item.get('cantidad', 1),
-            item.get('precio_unitario', 0),
-            item.get('subtotal', 0),
-            item.get('notas', '')
-        ))
 
-    # Actualizar estado de mesa
-    if mesa_id:
-        cursor.execute('UPDATE mesas SET estado = ? WHERE id = ?', ('ocupada', mesa_id))
+@pos_bp.route('/pedidos/batch', methods=['POST'])
+@role_required('mesero', 'cajero', 'manager')
+def sincronizar_lote_pedidos():
+    """
+    Aplica en una transacción la cola de pedidos y ediciones de una tablet
 
-    conn.commit()
+    Cada entrada lleva una clave de idempotencia: una entrada ya aplicada no
+    se repite. Responde un resultado por entrada (ver lote_pedidos.py).
+    """
+    entradas, error = validar_lote(request.get_json(silent=True))
+    if error:
+        return jsonify({'error': error}), 400
 
-    # Recalcular totales con IVA desglosado por item
-    recalcular_totales_pedido(pedido_id)
+    productos, combos = cache_menu.productos_y_combos(revisar=True)
 
-    # Obtener detalles del pedido para notificación
-    cursor.execute('SELECT * FROM pedidos WHERE id = ?', (pedido_id,))
-    pedido_creado = cursor.fetchone()
+    conn = get_db()
+    try:
+        resultados, aplicadas = aplicar_lote(conn, entradas, productos, combos)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        conn.close()
+        return jsonify({'error': str(e)}), 500
+    if aplicadas:
+        indice_pedidos.registrar_cambio()
     conn.close()
 
-    # ===== NOTIFICAR NUEVO PEDIDO A COCINA =====
-    if socketio and pedido_creado:
-        try:
-            # Preparar datos del pedido para notificación
-            pedido_notif = {
-                "id": pedido_id,
-                "mesa_numero": pedido_creado['mesa_id'] or None,
-                "mesa_id": pedido_creado['mesa_id'],
-                "items": items,
-                "tipo": tipo_pago,
-                "cliente_nombre": cliente_nombre,
-                "mesero": mesero,
-                "subtotal": subtotal,
-                "impuesto": impuesto,
-                "total": total,
-                "estado": estado_inicial,
-                "timestamp": datetime.now().isoformat()
-            }
-
-            # Solo notificar si está en estado pendiente_pago (listo para cocina)
-            if estado_inicial in ['pendiente_pago', 'en_mesa']:
-                NotificadorPedidos.notificar_nuevo_pedido(socketio, pedido_notif)
-        except Exception as e:
-            print(f"Error notificando nuevo pedido {pedido_id}: {e}")
+    # ===== NOTIFICAR LO APLICADO EN ESTE LOTE =====
+    tipos_cambio = {'agregar_item': 'item_agregado', 'modificar_item': 'cantidad_modificada',
+                    'remover_item': 'item_removido'}
+    for entrada, resultado, lineas in aplicadas:
+        if entrada['tipo'] == 'crear_pedido':
+            _notificar_nuevo_pedido(entrada['pedido'], {**resultado, 'lineas': lineas})
+        elif socketio:
+            try:
+                cambios = {"tipo_cambio": tipos_cambio[entrada['tipo']], "item_id": resultado['item_id'],
+                           "nuevo_total": resultado['total']}
+                NotificadorPedidos.notificar_item_modificado(socketio, resultado['pedido_id'],
+                                                             resultado['item_id'], cambios)
+            except Exception as e:
+                print(f"Error notificando cambio del pedido {resultado['pedido_id']}: {e}")
 
     return jsonify({
         'success': True,
-        'pedido_id': pedido_id,
-        'estado': estado_inicial,
-        'total': total
+        'aplicadas': len(aplicadas),
+        'repetidas': sum(1 for r in resultados if r.get('repetida')),
+        'fallidas': sum(1 for r in resultados if not r['ok']),
+        'resultados': resultados
     })
 
 @pos_bp.route('/pedidos/<int:id>/estado', methods=['PUT'])
@@ -1671,52 +1244,65 @@ def actualizar_estado_pedido(id):
     if nuevo_estado not in estados_validos:
         return jsonify({'error': f'Estado inválido. Estados válidos: {estados_validos}'}), 400
 
-    conn = get_db()
-    cursor = conn.cursor()
+    def _cambiar_estado(conn):
+        cursor = conn.cursor()
 
-    # Obtener pedido actual
-    cursor.execute('SELECT * FROM pedidos WHERE id = ?', (id,))
-    pedido = cursor.fetchone()
+        # Obtener pedido actual
+        cursor.execute('SELECT * FROM pedidos WHERE id = ?', (id,))
+        pedido = cursor.fetchone()
+
+        if not pedido:
+            return {'error': 'Pedido no encontrado'}, 404
+
+        # Actualizar timestamps según el estado
+        timestamp_field = None
+        if nuevo_estado == 'pagado':
+            timestamp_field = 'pagado_at'
+        elif nuevo_estado == 'en_cocina':
+            timestamp_field = 'cocina_at'
+        elif nuevo_estado == 'listo':
+            timestamp_field = 'listo_at'
+        elif nuevo_estado == 'servido':
+            timestamp_field = 'servido_at'
+
+        if timestamp_field:
+            cursor.execute(f'''
+                UPDATE pedidos SET estado = ?, {timestamp_field} = ?, updated_at = ?
+                WHERE id = ?
+            ''', (nuevo_estado, datetime.now().isoformat(), datetime.now().isoformat(), id))
+        else:
+            cursor.execute('''
+                UPDATE pedidos SET estado = ?, updated_at = ?
+                WHERE id = ?
+            ''', (nuevo_estado, datetime.now().isoformat(), id))
 
-    if not pedido:
-        conn.close()
-        return jsonify({'error': 'Pedido no encontrado'}), 404
+        # Si el pedido se cierra, cancela o va a crédito, verificar si la mesa debe liberarse
+        if nuevo_estado in ['cerrado', 'cancelado', 'credito'] and pedido['mesa_id']:
+            # Solo liberar la mesa si no hay otros pedidos activos
+            cursor.execute('''
+                SELECT COUNT(*) FROM pedidos
+                WHERE mesa_id = ? AND id != ? AND estado NOT IN ('cerrado', 'cancelado', 'credito')
+            ''', (pedido['mesa_id'], id))
+            otros_pedidos_activos = cursor.fetchone()[0]
 
-    # Actualizar timestamps según el estado
-    timestamp_field = None
-    if nuevo_estado == 'pagado':
-        timestamp_field = 'pagado_at'
-    elif nuevo_estado == 'en_cocina':
-        timestamp_field = 'cocina_at'
-    elif nuevo_estado == 'listo':
-        timestamp_field = 'listo_at'
-    elif nuevo_estado == 'servido':
-        timestamp_field = 'servido_at'
-
-    if timestamp_field:
-        cursor.execute(f'''
-            UPDATE pedidos SET estado = ?, {timestamp_field} = ?, updated_at = ?
-            WHERE id = ?
-        ''', (nuevo_estado, datetime.now().isoformat(), datetime.now().isoformat(), id))
-    else:
-        cursor.execute('''
-            UPDATE pedidos SET estado = ?, updated_at = ?
-            WHERE id = ?
-        ''', (nuevo_estado, datetime.now().isoformat(), id))
+            if otros_pedidos_activos == 0:
+                cursor.execute('UPDATE mesas SET estado = ? WHERE id = ?', ('libre', pedido['mesa_id']))
 
-    # Si el pedido se cierra, cancela o va a crédito, verificar si la mesa debe liberarse
-    if nuevo_estado in ['cerrado', 'cancelado', 'credito'] and pedido['mesa_id']:
-        # Solo liberar la mesa si no hay otros pedidos activos
-        cursor.execute('''
-            SELECT COUNT(*) FROM pedidos
-            WHERE mesa_id = ? AND id != ? AND estado NOT IN ('cerrado', 'cancelado', 'credito')
-        ''', (pedido['mesa_id'], id))
-        otros_pedidos_activos = cursor.fetchone()[0]
+        # Descontar stock cuando el pedido se marca como pagado (misma transacción)
+        if nuevo_estado == 'pagado':
+            try:
+                descontar_stock_pedido(id, conn)
+            except Exception as e:
+                print(f"Error descontando stock del pedido {id}: {e}")
 
-        if otros_pedidos_activos == 0:
-            cursor.execute('UPDATE mesas SET estado = ? WHERE id = ?', ('libre', pedido['mesa_id']))
+        return {'success': True, 'estado': nuevo_estado}, 200
 
-    conn.commit()
+    # Lectura, validación y escritura en un solo trabajo de database.escribir:
+    # con DB_COLA_ESCRITURA=1 lo aplica el hilo escritor con commit agrupado
+    cuerpo, status = escribir_y_esperar(_cambiar_estado)
+    if status != 200:
+        return jsonify(cuerpo), status
+    indice_pedidos.registrar_cambio()
 
     # ===== NOTIFICAR CAMBIO DE ESTADO =====
     if socketio:
@@ -1725,16 +1311,7 @@ def actualizar_estado_pedido(id):
         except Exception as e:
             print(f"Error notificando cambio de estado del pedido {id}: {e}")
 
-    conn.close()
-
-    # Descontar stock cuando el pedido se marca como pagado
-    if nuevo_estado == 'pagado':
-        try:
-            descontar_stock_pedido(id)
-        except Exception as e:
-            print(f"Error descontando stock del pedido {id}: {e}")
-
-    return jsonify({'success': True, 'estado': nuevo_estado})
+    return jsonify(cuerpo)
 
 @pos_bp.route('/pedidos/<int:id>/pago', methods=['PUT'])
 @role_required('cajero', 'manager')
@@ -1745,134 +1322,136 @@ def actualizar_pago_pedido(id):
     metodo_pago: 'efectivo' o 'credito'
     """
     data = request.get_json()
-    conn = get_db()
-    cursor = conn.cursor()
 
-    # Obtener pedido actual
-    cursor.execute('SELECT * FROM pedidos WHERE id = ?', (id,))
-    pedido = cursor.fetchone()
+    def _registrar_pago(conn):
+        cursor = conn.cursor()
 
-    if not pedido:
-        conn.close()
-        return jsonify({'error': 'Pedido no encontrado'}), 404
+        # Obtener pedido actual
+        cursor.execute('SELECT * FROM pedidos WHERE id = ?', (id,))
+        pedido = cursor.fetchone()
 
-    tipo_comprobante = data.get('tipo_comprobante', 'ticket')
-    aplicar_iva = data.get('aplicar_iva', 0)
-    propina = data.get('propina', 0)
-    metodo_pago = data.get('metodo_pago', 'efectivo')  # 'efectivo' o 'credito'
-    cliente_id = data.get('cliente_id')  # ID del cliente para pago a crédito
-
-    # Calcular nuevo total si hay cambios
-    subtotal = pedido['subtotal']
-    impuesto = pedido['impuesto']
-
-    # Si es factura (aplicar_iva=1), agregar IVA (13%) al subtotal
-    # Si es ticket (aplicar_iva=0), solo suma propina al total existente
-    if aplicar_iva and tipo_comprobante == 'factura':
-        impuesto = subtotal * 0.13
-        nuevo_total = subtotal + impuesto + propina
-    else:
-        # Para ticket, el total existente ya no tiene IVA
-        nuevo_total = pedido['total'] + propina
+        if not pedido:
+            return {'error': 'Pedido no encontrado'}, 404
 
-    # ===== VALIDAR PAGO A CRÉDITO =====
-    if metodo_pago == 'credito':
-        if not cliente_id:
-            conn.close()
-            return jsonify({'error': 'Debe seleccionar un cliente para pago a crédito'}), 400
+        tipo_comprobante = data.get('tipo_comprobante', 'ticket')
+        aplicar_iva = data.get('aplicar_iva', 0)
+        propina = data.get('propina', 0)
+        metodo_pago = data.get('metodo_pago', 'efectivo')  # 'efectivo' o 'credito'
+        cliente_id = data.get('cliente_id')  # ID del cliente para pago a crédito
 
-        # Obtener información de crédito del cliente
-        cursor.execute('''
-            SELECT id, nombre, credito_autorizado, credito_utilizado
-            FROM clientes WHERE id = ?
-        ''', (cliente_id,))
-        cliente = cursor.fetchone()
+        # Calcular nuevo total si hay cambios
+        subtotal = pedido['subtotal']
+        impuesto = pedido['impuesto']
 
-        if not cliente:
-            conn.close()
-            return jsonify({'error': 'Cliente no encontrado'}), 404
+        # Si es factura (aplicar_iva=1), agregar IVA (13%) al subtotal
+        # Si es ticket (aplicar_iva=0), solo suma propina al total existente
+        if aplicar_iva and tipo_comprobante == 'factura':
+            impuesto = subtotal * 0.13
+            nuevo_total = subtotal + impuesto + propina
+        else:
+            # Para ticket, el total existente ya no tiene IVA
+            nuevo_total = pedido['total'] + propina
 
-        credito_autorizado = cliente['credito_autorizado'] or 0
-        credito_utilizado = cliente['credito_utilizado'] or 0
-        credito_disponible = credito_autorizado - credito_utilizado
+        # ===== VALIDAR PAGO A CRÉDITO =====
+        if metodo_pago == 'credito':
+            if not cliente_id:
+                return {'error': 'Debe seleccionar un cliente para pago a crédito'}, 400
 
-        if credito_disponible < nuevo_total:
-            conn.close()
-            return jsonify({
-                'error': f'Crédito insuficiente. Disponible: ${credito_disponible:.2f}, Total: ${nuevo_total:.2f}'
-            }), 400
+            # Obtener información de crédito del cliente
+            cursor.execute('''
+                SELECT id, nombre, credito_autorizado, credito_utilizado
+                FROM clientes WHERE id = ?
+            ''', (cliente_id,))
+            cliente = cursor.fetchone()
 
-        # Actualizar crédito utilizado del cliente
-        nuevo_credito_utilizado = credito_utilizado + nuevo_total
-        cursor.execute('''
-            UPDATE clientes SET credito_utilizado = ? WHERE id = ?
-        ''', (nuevo_credito_utilizado, cliente_id))
-        print(f"[POS] Crédito actualizado para cliente {cliente['nombre']}: utilizado ${nuevo_credito_utilizado:.2f}")
-
-    # ===== DETERMINAR ESTADO FINAL SEGÚN FLUJO DE PAGO =====
-    tipo_pago = pedido['tipo_pago']  # 'anticipado' o 'al_final'
-    mesa_id = pedido['mesa_id']
-
-    # Determinar el estado después del pago según el flujo
-    if tipo_pago == 'anticipado':
-        # Para llevar: pagado (cocina verá el pedido y hará clic en "Iniciar preparación")
-        # Flujo: pendiente_pago → pagado → en_cocina (cocina) → listo → servido → cerrado
-        estado_final = 'pagado'
-    else:
-        # En mesa (al_final): pagado → cerrado (cliente ya comió, solo falta pagar)
-        estado_final = 'cerrado'
+            if not cliente:
+                return {'error': 'Cliente no encontrado'}, 404
 
-    # Actualizar pedido con información de pago (incluyendo método de pago y cliente)
-    cursor.execute('''
-        UPDATE pedidos
-        SET tipo_comprobante = ?, aplicar_iva = ?, propina = ?,
-            impuesto = ?, total = ?, estado = ?, metodo_pago = ?,
-            cliente_id = ?, pagado_at = ?, updated_at = ?
-        WHERE id = ?
-    ''', (tipo_comprobante, aplicar_iva, propina, impuesto, nuevo_total, estado_final,
-          metodo_pago, cliente_id, datetime.now().isoformat(), datetime.now().isoformat(), id))
+            credito_autorizado = cliente['credito_autorizado'] or 0
+            credito_utilizado = cliente['credito_utilizado'] or 0
+            credito_disponible = credito_autorizado - credito_utilizado
 
-    # ===== LIBERAR MESA SI ES PEDIDO EN MESA (al_final) =====
-    if estado_final == 'cerrado' and mesa_id:
-        # Verificar que no hay otros pedidos activos en esta mesa
+            if credito_disponible < nuevo_total:
+                return {
+                    'error': f'Crédito insuficiente. Disponible: ${credito_disponible:.2f}, Total: ${nuevo_total:.2f}'
+                }, 400
+
+            # Actualizar crédito utilizado del cliente
+            nuevo_credito_utilizado = credito_utilizado + nuevo_total
+            cursor.execute('''
+                UPDATE clientes SET credito_utilizado = ? WHERE id = ?
+            ''', (nuevo_credito_utilizado, cliente_id))
+            print(f"[POS] Crédito actualizado para cliente {cliente['nombre']}: utilizado ${nuevo_credito_utilizado:.2f}")
+
+        # ===== DETERMINAR ESTADO FINAL SEGÚN FLUJO DE PAGO =====
+        tipo_pago = pedido['tipo_pago']  # 'anticipado' o 'al_final'
+        mesa_id = pedido['mesa_id']
+
+        # Determinar el estado después del pago según el flujo
+        if tipo_pago == 'anticipado':
+            # Para llevar: pagado (cocina verá el pedido y hará clic en "Iniciar preparación")
+            # Flujo: pendiente_pago → pagado → en_cocina (cocina) → listo → servido → cerrado
+            estado_final = 'pagado'
+        else:
+            # En mesa (al_final): pagado → cerrado (cliente ya comió, solo falta pagar)
+            estado_final = 'cerrado'
+
+        # Actualizar pedido con información de pago (incluyendo método de pago y cliente)
         cursor.execute('''
-            SELECT COUNT(*) FROM pedidos
-            WHERE mesa_id = ? AND id != ? AND estado NOT IN ('cerrado', 'cancelado')
-        ''', (mesa_id, id))
-        otros_pedidos = cursor.fetchone()[0]
+            UPDATE pedidos
+            SET tipo_comprobante = ?, aplicar_iva = ?, propina = ?,
+                impuesto = ?, total = ?, estado = ?, metodo_pago = ?,
+                cliente_id = ?, pagado_at = ?, updated_at = ?
+            WHERE id = ?
+        ''', (tipo_comprobante, aplicar_iva, propina, impuesto, nuevo_total, estado_final,
+              metodo_pago, cliente_id, datetime.now().isoformat(), datetime.now().isoformat(), id))
 
-        if otros_pedidos == 0:
-            cursor.execute('UPDATE mesas SET estado = ? WHERE id = ?', ('libre', mesa_id))
-            print(f"[POS] Mesa {mesa_id} liberada después de pago del pedido {id}")
+        # ===== LIBERAR MESA SI ES PEDIDO EN MESA (al_final) =====
+        if estado_final == 'cerrado' and mesa_id:
+            # Verificar que no hay otros pedidos activos en esta mesa
+            cursor.execute('''
+                SELECT COUNT(*) FROM pedidos
+                WHERE mesa_id = ? AND id != ? AND estado NOT IN ('cerrado', 'cancelado')
+            ''', (mesa_id, id))
+            otros_pedidos = cursor.fetchone()[0]
 
-    conn.commit()
+            if otros_pedidos == 0:
+                cursor.execute('UPDATE mesas SET estado = ? WHERE id = ?', ('libre', mesa_id))
+                print(f"[POS] Mesa {mesa_id} liberada después de pago del pedido {id}")
 
-    # Descontar stock cuando el pedido se marca como pagado
-    try:
-        descontar_stock_pedido(id)
-    except Exception as e:
-        print(f"Error descontando stock del pedido {id}: {e}")
+        # Descontar stock cuando el pedido se marca como pagado (misma transacción)
+        try:
+            descontar_stock_pedido(id, conn)
+        except Exception as e:
+            print(f"Error descontando stock del pedido {id}: {e}")
+
+        return {
+            'success': True,
+            'tipo_comprobante': tipo_comprobante,
+            'aplicar_iva': aplicar_iva,
+            'propina': propina,
+            'impuesto': impuesto,
+            'total': nuevo_total,
+            'estado': estado_final,
+            'metodo_pago': metodo_pago,
+            'mesa_liberada': estado_final == 'cerrado' and mesa_id is not None
+        }, 200
+
+    # Lectura, validación y escritura en un solo trabajo de database.escribir:
+    # con DB_COLA_ESCRITURA=1 lo aplica el hilo escritor con commit agrupado
+    cuerpo, status = escribir_y_esperar(_registrar_pago)
+    if status != 200:
+        return jsonify(cuerpo), status
+    indice_pedidos.registrar_cambio()
 
     # Notificar cambio de estado si hay socketio
     if socketio:
         try:
-            NotificadorPedidos.notificar_cambio_estado_pedido(socketio, id, estado_final)
+            NotificadorPedidos.notificar_cambio_estado_pedido(socketio, id, cuerpo['estado'])
         except Exception as e:
             print(f"Error notificando cambio de estado del pedido {id}: {e}")
 
-    conn.close()
-
-    return jsonify({
-        'success': True,
-        'tipo_comprobante': tipo_comprobante,
-        'aplicar_iva': aplicar_iva,
-        'propina': propina,
-        'impuesto': impuesto,
-        'total': nuevo_total,
-        'estado': estado_final,
-        'metodo_pago': metodo_pago,
-        'mesa_liberada': estado_final == 'cerrado' and mesa_id is not None
-    })
+    return jsonify(cuerpo)
 
 @pos_bp.route('/pedidos/<int:id>/items', methods=['POST'])
 @role_required('mesero', 'cajero', 'manager')
@@ -1920,27 +1499,29 @@ def agregar_item_pedido(id):
     try:
         if combo_id:
             # ===== AGREGAR COMBO =====
-            combo = obtener_combo(combo_id)
+            combo = cache_menu.combo(combo_id, revisar=True)
             if not combo:
                 conn.close()
                 return jsonify({'error': 'Combo no encontrado'}), 404
 
-            precio_combo = combo['precio_combo']
+            precio_combo = combo.precio_combo
             subtotal_combo = precio_combo * cantidad
+            iva_monto, total_item = iva_linea(subtotal_combo)
 
             # 1. Crear item del combo (para facturación)
             cursor.execute('''
                 INSERT INTO pedido_items
-                (pedido_id, combo_id, cantidad, precio_unitario, subtotal, notas)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (id, combo_id, cantidad, precio_combo, subtotal_combo, 'Combo'))
-
-            # 2. Obtener items del combo y crear items desglosados (para cocina)
-            items_combo = obtener_items_combo(combo_id)
-            for combo_item in items_combo:
-                producto_id_item = combo_item[1]
-                cantidad_producto = combo_item[2] * cantidad  # cantidad del combo x cantidad del producto en combo
-                precio_producto = combo_item[4]
+                (pedido_id, combo_id, cantidad, precio_unitario, subtotal,
+                 iva_porcentaje, iva_monto, total_item, notas)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (id, combo_id, cantidad, precio_combo, subtotal_combo,
+                  IVA_PORCENTAJE, iva_monto, total_item, 'Combo'))
+
+            # 2. Crear items desglosados con los productos del combo (para cocina)
+            for combo_item in combo.items:
+                producto_id_item = combo_item.producto_id
+                cantidad_producto = combo_item.cantidad * cantidad  # cantidad del combo x cantidad del producto en combo
+                precio_producto = combo_item.precio_unitario
                 subtotal_desglosado = precio_producto * cantidad_producto
 
                 cursor.execute('''
@@ -1961,15 +1542,22 @@ def agregar_item_pedido(id):
 
             precio_unitario = producto['precio']
             subtotal_item = precio_unitario * cantidad
+            iva_monto, total_item = iva_linea(subtotal_item)
 
             # Crear item
             cursor.execute('''
-                INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal, notas)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (id, producto_id, cantidad, precio_unitario, subtotal_item, data.get('notas', '')))
+                INSERT INTO pedido_items
+                (pedido_id, producto_id, cantidad, precio_unitario, subtotal,
+                 iva_porcentaje, iva_monto, total_item, notas)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (id, producto_id, cantidad, precio_unitario, subtotal_item,
+                  IVA_PORCENTAJE, iva_monto, total_item, data.get('notas', '')))
 
-        # Recalcular totales del pedido (solo items sin desglose)
-        recalcular_totales_pedido(id)
+        # Sumar solo la línea nueva a los totales (los desgloses no suman)
+        aplicar_delta_totales(cursor, id, subtotal_combo if combo_id else subtotal_item, iva_monto)
+
+        conn.commit()
+        indice_pedidos.registrar_cambio()
 
         # Obtener nuevos totales
         cursor.execute('SELECT subtotal, impuesto, total FROM pedidos WHERE id = ?', (id,))
@@ -2033,9 +1621,7 @@ def remover_item_pedido(pedido_id, item_id):
         return jsonify({'error': 'No se puede remover items de pedido pagado'}), 400
 
     # Validar item
-    cursor.execute('SELECT combo_id FROM pedido_items WHERE id = ? AND pedido_id = ?',
-                  (item_id, pedido_id))
-    item = cursor.fetchone()
+    item = leer_linea(cursor, pedido_id, item_id)
     if not item:
         conn.close()
         return jsonify({'error': 'Item no encontrado en este pedido'}), 404
@@ -2043,24 +1629,12 @@ def remover_item_pedido(pedido_id, item_id):
     combo_id = item['combo_id']
 
     try:
-        if combo_id:
-            # Si es combo, remover el item del combo Y todos sus desgloces
-            cursor.execute('DELETE FROM pedido_items WHERE id = ? AND pedido_id = ?',
-                          (item_id, pedido_id))
-            # Remover desgloces del combo
-            cursor.execute('''
-                DELETE FROM pedido_items
-                WHERE pedido_id = ? AND combo_id = ? AND notas = 'Desglose de combo'
-            ''', (pedido_id, combo_id))
-        else:
-            # Remover item individual
-            cursor.execute('DELETE FROM pedido_items WHERE id = ? AND pedido_id = ?',
-                          (item_id, pedido_id))
-
-        # Recalcular totales
-        recalcular_totales_pedido(pedido_id)
+        # Remover el item (si es combo, también sus desgloses) y restar solo
+        # esa línea de los totales
+        quitar_linea(cursor, pedido_id, item)
 
         conn.commit()
+        indice_pedidos.registrar_cambio()
 
         # ===== NOTIFICAR ITEM REMOVIDO =====
         if socketio:
@@ -2117,11 +1691,7 @@ def modificar_item_pedido(pedido_id, item_id):
         return jsonify({'error': 'No se puede modificar items de pedido pagado'}), 400
 
     # Validar item
-    cursor.execute('''
-        SELECT id, combo_id, cantidad, precio_unitario, subtotal
-        FROM pedido_items WHERE id = ? AND pedido_id = ?
-    ''', (item_id, pedido_id))
-    item = cursor.fetchone()
+    item = leer_linea(cursor, pedido_id, item_id)
     if not item:
         conn.close()
         return jsonify({'error': 'Item no encontrado en este pedido'}), 404
@@ -2129,49 +1699,12 @@ def modificar_item_pedido(pedido_id, item_id):
     combo_id = item['combo_id']
 
     try:
-        if combo_id:
-            # Si es un combo, actualizar el item del combo y todos sus desgloces
-            precio_unitario = item['precio_unitario']
-            cantidad_anterior = item['cantidad']
-            ratio = nueva_cantidad / cantidad_anterior
-
-            # Actualizar item del combo
-            cursor.execute('''
-                UPDATE pedido_items
-                SET cantidad = ?, subtotal = ?
-                WHERE id = ?
-            ''', (nueva_cantidad, precio_unitario * nueva_cantidad, item_id))
-
-            # Actualizar desgloces (multiplicar por el ratio)
-            cursor.execute('''
-                SELECT id, cantidad, precio_unitario
-                FROM pedido_items
-                WHERE pedido_id = ? AND combo_id = ? AND notas = 'Desglose de combo'
-            ''', (pedido_id, combo_id))
-
-            desgloces = cursor.fetchall()
-            for desglose in desgloces:
-                nueva_cant_desglose = desglose['cantidad'] * ratio
-                cursor.execute('''
-                    UPDATE pedido_items
-                    SET cantidad = ?, subtotal = ?
-                    WHERE id = ?
-                ''', (nueva_cant_desglose,
-                      desglose['precio_unitario'] * nueva_cant_desglose,
-                      desglose['id']))
-        else:
-            # Item individual: solo actualizar cantidad y subtotal
-            precio_unitario = item['precio_unitario']
-            cursor.execute('''
-                UPDATE pedido_items
-                SET cantidad = ?, subtotal = ?
-                WHERE id = ?
-            ''', (nueva_cantidad, precio_unitario * nueva_cantidad, item_id))
-
-        # Recalcular totales
-        recalcular_totales_pedido(pedido_id)
+        # Actualizar la línea (y los desgloses si es combo) y aplicar solo
+        # su diferencia a los totales
+        cambiar_cantidad_linea(cursor, pedido_id, item, nueva_cantidad)
 
         conn.commit()
+        indice_pedidos.registrar_cambio()
 
         # ===== NOTIFICAR MODIFICACIÓN DE ITEM =====
         if socketio:
@@ -2202,39 +1735,76 @@ def modificar_item_pedido(pedido_id, item_id):
 
 # ============ ENDPOINTS ESPECÍFICOS POR ROL ============
 
-@pos_bp.route('/cocina/pedidos', methods=['GET'])
-@role_required('cocinero', 'manager')
-def get_pedidos_cocina():
-    """Obtiene pedidos para la cocina (pagados, en_mesa o en_cocina)"""
-    conn = get_db()
-    cursor = conn.cursor()
+def _cargar_cola(cola, pedido_ids=None):
+    """
+    Pedidos de una cola por rol con sus items, en el orden de la pantalla,
+    servidos desde el índice en memoria (ver indice_pedidos.py).
 
-    cursor.execute('''
-        SELECT p.*, m.numero as mesa_numero
-        FROM pedidos p
-        LEFT JOIN mesas m ON p.mesa_id = m.id
-        WHERE p.estado IN ('pagado', 'en_mesa', 'en_cocina')
-        ORDER BY
-            CASE p.estado
-                WHEN 'pagado' THEN 1
-                WHEN 'en_mesa' THEN 2
-                WHEN 'en_cocina' THEN 3
-            END,
-            p.created_at ASC
-    ''')
+    Args:
+        cola: Clave de versiones_colas.COLAS
+        pedido_ids: Si se indica, solo esos pedidos (los que siguen en la cola)
+    """
+    return indice_pedidos.cola(cola, pedido_ids)
 
-    pedidos = [dict(row) for row in cursor.fetchall()]
+def _responder_cola(cola):
+    """
+    Respuesta de una cola por rol con versión (ver versiones_colas.py):
+    la lista completa con ETag, 304 si el cliente ya tiene la versión, o el
+    delta desde ?since_version=N.
+    """
+    since_version = request.args.get('since_version')
+    if since_version is not None:
+        try:
+            since_version = int(since_version)
+        except ValueError:
+            return jsonify({'error': 'since_version debe ser un entero'}), 400
 
-    # Cargar todos los items en una sola query (evitar N+1)
-    pedido_ids = [p['id'] for p in pedidos]
-    items_por_pedido = _cargar_items_para_pedidos(cursor, pedido_ids)
+    conn = get_db()
+    cursor = conn.cursor()
 
-    # Asignar items a cada pedido
-    for pedido in pedidos:
-        pedido['items'] = items_por_pedido.get(pedido['id'], [])
+    # La versión se lee antes que los pedidos: si algo cambia entre ambas
+    # lecturas, el cliente lo vuelve a recibir en el siguiente delta
+    version = version_cola(cursor, cola)
+    etag = etag_cola(cola, version)
 
+    if since_version is None:
+        if request.if_none_match.contains(etag):
+            respuesta = current_app.response_class(status=304)
+        else:
+            respuesta = jsonify(_cargar_cola(cola))
+        respuesta.set_etag(etag)
+        respuesta.headers['X-Cola-Version'] = str(version)
+        # Que el navegador revalide siempre en lugar de usar su copia
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+        conn.close()
+        return respuesta
+
+    primeros = cambios_desde(cursor, cola, since_version, version)
+    if primeros is None:
+        resultado = {'version': version, 'completo': True, 'pedidos': _cargar_cola(cola)}
+    else:
+        en_cola = _cargar_cola(cola, list(primeros))
+        insertados, actualizados, eliminados = clasificar_cambios(primeros, en_cola)
+        resultado = {
+            'version': version,
+            'completo': False,
+            'insertados': insertados,
+            'actualizados': actualizados,
+            'eliminados': eliminados,
+        }
+        if primeros:
+            # Orden actual de la cola para reubicar los pedidos recibidos
+            resultado['orden'] = [pedido['id'] for pedido in _cargar_cola(cola)]
     conn.close()
-    return jsonify(pedidos)
+    respuesta = jsonify(resultado)
+    respuesta.headers['X-Cola-Version'] = str(version)
+    return respuesta
+
+@pos_bp.route('/cocina/pedidos', methods=['GET'])
+@role_required('cocinero', 'manager')
+def get_pedidos_cocina():
+    """Obtiene pedidos para la cocina (pagados, en_mesa o en_cocina)"""
+    return _responder_cola('cocina')
 
 @pos_bp.route('/cajero/pedidos', methods=['GET'])
 @role_required('cajero', 'manager')
@@ -2243,61 +1813,14 @@ def get_pedidos_cajero():
     - pendiente_pago: pedidos anticipados esperando pago antes de cocina
     - servido + tipo_pago=al_final: pedidos servidos esperando pago
     """
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT p.*, m.numero as mesa_numero
-        FROM pedidos p
-        LEFT JOIN mesas m ON p.mesa_id = m.id
-        WHERE p.estado = 'pendiente_pago'
-           OR (p.estado = 'servido' AND p.tipo_pago = 'al_final')
-        ORDER BY
-            CASE WHEN p.estado = 'servido' THEN 0 ELSE 1 END,
-            p.created_at ASC
-    ''')
-
-    pedidos = [dict(row) for row in cursor.fetchall()]
-
-    # Cargar todos los items en una sola query (evitar N+1)
-    pedido_ids = [p['id'] for p in pedidos]
-    items_por_pedido = _cargar_items_para_pedidos(cursor, pedido_ids)
-
-    # Asignar items a cada pedido
-    for pedido in pedidos:
-        pedido['items'] = items_por_pedido.get(pedido['id'], [])
-
-    conn.close()
-    return jsonify(pedidos)
+    return _responder_cola('cajero')
 
 @pos_bp.route('/mesero/pedidos', methods=['GET'])
 @pos_bp.route('/mesero/pedidos-listos', methods=['GET'])
 @role_required('mesero', 'manager')
 def get_pedidos_mesero():
     """Obtiene pedidos listos para servir"""
-    conn = get_db()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        SELECT p.*, m.numero as mesa_numero
-        FROM pedidos p
-        LEFT JOIN mesas m ON p.mesa_id = m.id
-        WHERE p.estado = 'listo'
-        ORDER BY p.listo_at ASC
-    ''')
-
-    pedidos = [dict(row) for row in cursor.fetchall()]
-
-    # Cargar todos los items en una sola query (evitar N+1)
-    pedido_ids = [p['id'] for p in pedidos]
-    items_por_pedido = _cargar_items_para_pedidos(cursor, pedido_ids)
-
-    # Asignar items a cada pedido
-    for pedido in pedidos:
-        pedido['items'] = items_por_pedido.get(pedido['id'], [])
-
-    conn.close()
-    return jsonify(pedidos)
+    return _responder_cola('mesero')
 
 # ============ ESTADÍSTICAS ============
 
@@ -2309,14 +1832,15 @@ def get_estadisticas_hoy():
     cursor = conn.cursor()
 
     hoy = datetime.now().strftime('%Y-%m-%d')
+    inicio, fin = rango_dia(hoy)
 
     # Ventas del día
     cursor.execute('''
         SELECT COUNT(*) as total_pedidos,
                COALESCE(SUM(total), 0) as total_ventas
         FROM pedidos
-        WHERE DATE(created_at) = ? AND estado = 'cerrado'
-    ''', (hoy,))
+        WHERE estado = 'cerrado' AND created_at >= ? AND created_at < ?
+    ''', (inicio, fin))
     ventas = dict(cursor.fetchone())
 
     # Pedidos activos
@@ -2334,11 +1858,11 @@ def get_estadisticas_hoy():
         FROM pedido_items pi
         JOIN productos pr ON pi.producto_id = pr.id
         JOIN pedidos p ON pi.pedido_id = p.id
-        WHERE DATE(p.created_at) = ? AND p.estado = 'cerrado'
+        WHERE p.estado = 'cerrado' AND p.created_at >= ? AND p.created_at < ?
         GROUP BY pr.id
         ORDER BY cantidad DESC
         LIMIT 5
-    ''', (hoy,))
+    ''', (inicio, fin))
     top_productos = [dict(row) for row in cursor.fetchall()]
 
     conn.close()
@@ -2392,6 +1916,7 @@ def get_reportes_hoy():
     else:
         # Calcular en vivo desde pedidos cerrados del día
         # Esto asegura que los cajeros vean los datos en tiempo real
+        inicio, fin = rango_dia(hoy)
         cursor.execute('''
             SELECT
                 COUNT(*) as total_pedidos,
@@ -2402,8 +1927,8 @@ def get_reportes_hoy():
                 COALESCE(SUM(CASE WHEN metodo_pago = 'efectivo' THEN total ELSE 0 END), 0) as efectivo,
                 COALESCE(SUM(CASE WHEN metodo_pago = 'credito' THEN total ELSE 0 END), 0) as credito
             FROM pedidos
-            WHERE DATE(created_at) = ? AND estado = 'cerrado'
-        ''', (hoy,))
+            WHERE estado = 'cerrado' AND created_at >= ? AND created_at < ?
+        ''', (inicio, fin))
 
         row = cursor.fetchone()
         total_pedidos = row[0] if row[0] else 0
@@ -2440,11 +1965,11 @@ def get_reportes_hoy():
             JOIN pedidos ped ON pi.pedido_id = ped.id
             JOIN productos p ON pi.producto_id = p.id
             LEFT JOIN categorias c ON p.categoria_id = c.id
-            WHERE DATE(ped.created_at) = ? AND ped.estado = 'cerrado'
+            WHERE ped.estado = 'cerrado' AND ped.created_at >= ? AND ped.created_at < ?
             GROUP BY pi.producto_id, p.nombre, c.nombre
             ORDER BY cantidad_vendida DESC
             LIMIT 10
-        ''', (hoy,))
+        ''', (inicio, fin))
         productos = [dict(zip(['producto_nombre', 'categoria', 'cantidad_vendida', 'subtotal'], row))
                     for row in cursor.fetchall()]
 
@@ -2458,10 +1983,10 @@ def get_reportes_hoy():
             JOIN pedidos ped ON pi.pedido_id = ped.id
             JOIN productos p ON pi.producto_id = p.id
             LEFT JOIN categorias c ON p.categoria_id = c.id
-            WHERE DATE(ped.created_at) = ? AND ped.estado = 'cerrado'
+            WHERE ped.estado = 'cerrado' AND ped.created_at >= ? AND ped.created_at < ?
             GROUP BY c.id, c.nombre
             ORDER BY subtotal DESC
-        ''', (hoy,))
+        ''', (inicio, fin))
         categorias = [dict(zip(['categoria_nombre', 'cantidad_vendida', 'subtotal'], row))
                      for row in cursor.fetchall()]
 
@@ -2751,18 +2276,11 @@ def procesar_pago_credito(id):
     except Exception:
         pass
 
-    # Obtener información de crédito del cliente desde la base de clientes
+    # Cliente y crédito utilizado en una sola consulta (clientes vive en pos.db)
     try:
-        import sqlite3 as sqlite_clientes
-        conn_clientes = sqlite_clientes.connect('clientes.db')
-        conn_clientes.row_factory = sqlite_clientes.Row
-        cursor_clientes = conn_clientes.cursor()
-
-        cursor_clientes.execute('SELECT * FROM clientes WHERE id = ? AND activo = 1', (cliente_id,))
-        cliente = cursor_clientes.fetchone()
+        cliente = obtener_credito_cliente(cursor, cliente_id)
 
         if not cliente:
-            conn_clientes.close()
             try:
                 conn.rollback()
             except Exception:
@@ -2773,7 +2291,6 @@ def procesar_pago_credito(id):
         credito_autorizado = float(cliente['credito_autorizado'] or 0)
 
         if credito_autorizado <= 0:
-            conn_clientes.close()
             try:
                 conn.rollback()
             except Exception:
@@ -2781,13 +2298,8 @@ def procesar_pago_credito(id):
             conn.close()
             return jsonify({'error': 'Este cliente no tiene crédito autorizado'}), 400
 
-        # Calcular crédito utilizado (pedidos con estado 'credito' no pagados)
-        cursor.execute('''
-            SELECT COALESCE(SUM(total), 0) as total_credito
-            FROM pedidos
-            WHERE cliente_id = ? AND estado = 'credito'
-        ''', (cliente_id,))
-        credito_utilizado = float(cursor.fetchone()['total_credito'] or 0)
+        # Crédito utilizado (pedidos con estado 'credito' no pagados)
+        credito_utilizado = float(cliente['credito_utilizado'] or 0)
 
         credito_disponible = credito_autorizado - credito_utilizado
 
@@ -2797,7 +2309,6 @@ def procesar_pago_credito(id):
         pedido_total = float(pedido_total_row['total']) if pedido_total_row and pedido_total_row['total'] is not None else None
 
         if pedido_total is not None and abs(monto - pedido_total) > 0.01:
-            conn_clientes.close()
             try:
                 conn.rollback()
             except Exception:
@@ -2806,7 +2317,6 @@ def procesar_pago_credito(id):
             return jsonify({'error': 'El monto no coincide con el total del pedido'}), 400
 
         if monto > credito_disponible:
-            conn_clientes.close()
             try:
                 conn.rollback()
             except Exception:
@@ -2818,8 +2328,6 @@ def procesar_pago_credito(id):
                 'credito_autorizado': credito_autorizado,
                 'credito_utilizado': credito_utilizado
             }), 400
-
-        conn_clientes.close()
     except Exception as e:
         try:
             conn.rollback()
@@ -3183,13 +2691,16 @@ def listar_dtes_admin():
         # Tickets (tipo 99 o similar)
         query += " AND dte_tipo != '01'"
 
-    # Filtrar por fechas
-    if fecha_desde:
-        query += " AND DATE(created_at) >= ?"
-        params.append(fecha_desde)
-    if fecha_hasta:
-        query += " AND DATE(created_at) <= ?"
-        params.append(fecha_hasta)
+    # Filtrar por fechas (rango semiabierto sobre created_at)
+    if fecha_desde or fecha_hasta:
+        try:
+            inicio, fin = rango_fechas(fecha_desde or None, fecha_hasta or None)
+        except ValueError:
+            conn.close()
+            return jsonify({'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+        condicion, params_fecha = filtro_rango('created_at', inicio, fin)
+        query += f" AND {condicion}"
+        params.extend(params_fecha)
 
     query += " ORDER BY created_at DESC LIMIT 100"
 
@@ -3312,18 +2823,19 @@ def estadisticas_dtes():
     cursor.execute("SELECT COUNT(*) FROM pedidos WHERE dte_tipo IS NOT NULL AND dte_tipo != '01'")
     total_tickets = cursor.fetchone()[0]
 
-    # Facturas del día
+    # Facturas del día (día local)
+    inicio, fin = rango_dia()
     cursor.execute("""
         SELECT COUNT(*) FROM pedidos
-        WHERE dte_tipo = '01' AND DATE(created_at) = DATE('now', 'localtime')
-    """)
+        WHERE dte_tipo = '01' AND created_at >= ? AND created_at < ?
+    """, (inicio, fin))
     facturas_hoy = cursor.fetchone()[0]
 
     # Total facturado hoy
     cursor.execute("""
         SELECT COALESCE(SUM(total), 0) FROM pedidos
-        WHERE dte_tipo IS NOT NULL AND DATE(created_at) = DATE('now', 'localtime')
-    """)
+        WHERE dte_tipo IS NOT NULL AND created_at >= ? AND created_at < ?
+    """, (inicio, fin))
     total_hoy = cursor.fetchone()[0]
 
     conn.close()
@@ -3334,3 +2846,86 @@ def estadisticas_dtes():
         'facturas_hoy': facturas_hoy,
         'total_hoy': round(total_hoy, 2)
     })
+
+@pos_bp.route('/admin/indice-pedidos', methods=['GET'])
+@role_required('manager')
+def verificar_indice_pedidos():
+    """
+    Compara el índice en memoria de pedidos activos con la BD.
+    Con ?reparar=1 lo recarga completo si encuentra diferencias.
+    """
+    reparar = request.args.get('reparar') == '1'
+    resultado = indice_pedidos.verificar(reparar=reparar)
+    resultado['estadisticas'] = indice_pedidos.estadisticas()
+    return jsonify(resultado)
+
+
+def _pedidos_con_totales_desfasados(cursor):
+    """
+    Pedidos activos (pagados incluidos) cuyos totales guardados no cuadran
+    con la suma de sus líneas facturables, en una consulta agrupada.
+    """
+    cursor.execute(f'''
+        SELECT p.id, p.estado, p.subtotal, p.impuesto, p.total,
+               COALESCE(l.subtotal, 0) AS suma_subtotal,
+               COALESCE(l.impuesto, 0) AS suma_impuesto,
+               COALESCE(l.lineas_desfasadas, 0) AS lineas_desfasadas
+        FROM pedidos p
+        LEFT JOIN (
+            SELECT pedido_id, SUM(subtotal) AS subtotal, SUM(iva_monto) AS impuesto,
+                   SUM(ABS(COALESCE(iva_monto, 0) - ROUND(COALESCE(subtotal, 0) * ?, 2)) > 0.005) AS lineas_desfasadas
+            FROM pedido_items
+            WHERE {SQL_LINEA_FACTURABLE}
+            GROUP BY pedido_id
+        ) l ON l.pedido_id = p.id
+        WHERE p.estado IN ({','.join('?' * len(ESTADOS_ACTIVOS))})
+          AND (ABS(COALESCE(p.subtotal, 0) - COALESCE(l.subtotal, 0)) > 0.005
+               OR ABS(COALESCE(p.impuesto, 0) - COALESCE(l.impuesto, 0)) > 0.005
+               OR ABS(COALESCE(p.total, 0) - COALESCE(l.subtotal, 0) - COALESCE(l.impuesto, 0)) > 0.005
+               OR COALESCE(l.lineas_desfasadas, 0) > 0)
+        ORDER BY p.id
+    ''', (IVA_PORCENTAJE / 100, *ESTADOS_ACTIVOS))
+    return [dict(row) for row in cursor.fetchall()]
+
+
+@pos_bp.route('/admin/totales-pedidos', methods=['GET'])
+@role_required('manager')
+def verificar_totales_pedidos():
+    """
+    Compara los totales guardados de los pedidos activos con la suma de sus
+    líneas. Solo lectura: los pedidos pagados se reportan, y la reparación
+    va por POST /admin/totales-pedidos/reparar.
+    """
+    conn = get_db()
+    desfasados = _pedidos_con_totales_desfasados(conn.cursor())
+    conn.close()
+    return jsonify({
+        'consistente': not desfasados,
+        'desfasados': desfasados
+    })
+
+
+@pos_bp.route('/admin/totales-pedidos/reparar', methods=['POST'])
+@role_required('manager')
+def reparar_totales_pedidos():
+    """
+    Recalcula los totales de los pedidos desfasados que no están pagados.
+    Un pedido pagado ya se cobró con sus totales: se devuelve en `omitidos`
+    sin modificarlo.
+    """
+    conn = get_db()
+    desfasados = _pedidos_con_totales_desfasados(conn.cursor())
+    reparados = [pedido for pedido in desfasados if pedido['estado'] != 'pagado']
+    omitidos = [pedido for pedido in desfasados if pedido['estado'] == 'pagado']
+
+    for pedido in reparados:
+        pedido['totales'] = recalcular_totales_pedido(pedido['id'], conn)
+    if reparados:
+        conn.commit()
+        indice_pedidos.registrar_cambio()
+
+    conn.close()
+    return jsonify({
+        'reparados': reparados,
+        'omitidos': omitidos
+    })
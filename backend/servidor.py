@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Punto de entrada de producción del backend POS
+
+    python servidor.py                      # gevent en 0.0.0.0:5000
+    SERVIDOR_PROCESOS=2 NOTIF_BUS=sqlite python servidor.py   # puertos 5000 y 5001
+
+`python app.py` sigue siendo el modo de desarrollo: Werkzeug con debug y un
+hilo del sistema por conexión, así que cada pantalla de cocina, tablet con
+WebSocket o long poll retiene un hilo (~8 MB de pila reservada) mientras está
+conectada. Aquí la misma aplicación (create_app y sus blueprints) corre con
+concurrencia cooperativa:
+
+- SERVIDOR_MODO=gevent (por defecto): gevent parchea la biblioteca estándar
+  antes de importar la app; cada conexión es una greenlet de unos KB, los
+  WebSocket usan gevent-websocket y Socket.IO corre con async_mode='gevent'.
+  Las esperas del long polling, del pool de conexiones y de los locks ceden
+  el control en lugar de bloquear un hilo. El hash de contraseñas pasa al
+  pool de hilos nativos de gevent (ver contrasenas.py).
+- SERVIDOR_MODO=hilos: el servidor de hilos sin debug ni recarga, como
+  respaldo cuando gevent no está instalado.
+
+Parámetros (variables de entorno o .env):
+
+- SERVIDOR_HOST / SERVIDOR_PUERTO: dirección de escucha (0.0.0.0:5000).
+- SERVIDOR_CONEXIONES_MAX: conexiones simultáneas por proceso (4000). Cada
+  WebSocket o long poll abierto ocupa una durante toda su vida; por encima
+  del límite las conexiones nuevas, incluidas las peticiones normales,
+  esperan en el backlog del socket. Debe quedar por debajo de `ulimit -n`.
+- SERVIDOR_PROCESOS: procesos a lanzar (1), cada uno en SERVIDOR_PUERTO + i.
+  SQLite y la CPU limitan a uno o dos por núcleo. Con más de uno hace falta
+  NOTIF_BUS=sqlite (ver bus_eventos.py) y afinidad por IP en el proxy
+  (nginx `ip_hash`), porque el transporte polling de Socket.IO no es sin estado.
+- SERVIDOR_APAGADO_SEGUNDOS: al recibir SIGTERM/SIGINT se deja de aceptar
+  conexiones y se espera hasta este plazo a las peticiones en curso (10).
+
+Las llamadas a SQLite no son cooperativas: mientras una consulta corre, el
+proceso no atiende otras greenlets, y una greenlet que cede el control con
+una transacción de escritura abierta hace esperar a los demás escritores
+hasta busy_timeout. Por eso las llamadas externas (Digifact) se hacen antes
+de escribir.
+
+La comparación de capacidad entre ambos modos está en benchmark_servidor.py.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv
+
+# Antes de fijar valores por defecto, para que los de .env tengan prioridad
+load_dotenv()
+
+SERVIDOR_MODO = os.getenv('SERVIDOR_MODO', 'gevent')
+SERVIDOR_HOST = os.getenv('SERVIDOR_HOST', '0.0.0.0')
+SERVIDOR_PUERTO = int(os.getenv('SERVIDOR_PUERTO', '5000'))
+SERVIDOR_CONEXIONES_MAX = int(os.getenv('SERVIDOR_CONEXIONES_MAX', '4000'))
+SERVIDOR_PROCESOS = int(os.getenv('SERVIDOR_PROCESOS', '1'))
+SERVIDOR_APAGADO_SEGUNDOS = float(os.getenv('SERVIDOR_APAGADO_SEGUNDOS', '10'))
+
+# Valores por defecto del modo cooperativo (se respetan los ya configurados):
+# una petición de long polling estacionada cuesta una greenlet, no un hilo
+DEFAULTS_GEVENT = {
+    'NOTIF_LONGPOLL_MAX': '500',
+}
+
+
+def _detener_servicios():
+    """Envía lo pendiente y detiene los hilos de fondo antes de salir"""
+    from notificaciones import programador_emits
+    from barrido_sesiones import barrido_sesiones
+    from bus_eventos import obtener_bus
+    import database
+
+    programador_emits.vaciar()
+    barrido_sesiones.detener()
+    obtener_bus().detener()
+    database.detener_escritores()
+    database.cerrar_pools()
+
+
+def servir_gevent(host, puerto):
+    """Sirve la app con gevent y WebSocket nativo; retorna al terminar el apagado"""
+    from gevent import monkey
+    monkey.patch_all()
+
+    os.environ['SOCKETIO_ASYNC_MODE'] = 'gevent'
+    for variable, valor in DEFAULTS_GEVENT.items():
+        os.environ.setdefault(variable, valor)
+
+    import gevent
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+    from geventwebsocket.handler import WebSocketHandler
+
+    import app as app_modulo
+
+    flask_app = app_modulo.create_app()
+    print(app_modulo.reporte_arranque())
+
+    servidor = WSGIServer(
+        (host, puerto), flask_app,
+        handler_class=WebSocketHandler,
+        spawn=Pool(SERVIDOR_CONEXIONES_MAX),
+        log=None,
+    )
+
+    def apagar():
+        print(f"[INFO] Apagando (pid {os.getpid()}): esperando hasta {SERVIDOR_APAGADO_SEGUNDOS:.0f}s "
+              f"a {len(servidor.pool)} conexión(es)")
+        # Deja de aceptar conexiones, espera a las activas y mata las que sigan
+        servidor.stop(timeout=SERVIDOR_APAGADO_SEGUNDOS)
+
+    for senal in (signal.SIGTERM, signal.SIGINT):
+        gevent.signal_handler(senal, lambda: gevent.spawn(apagar))
+
+    print(f"[INFO] Servidor gevent en {host}:{puerto} (pid {os.getpid()}, "
+          f"{SERVIDOR_CONEXIONES_MAX} conexiones máx.)")
+    servidor.serve_forever()
+    _detener_servicios()
+
+
+def servir_hilos(host, puerto):
+    """Sirve la app con el servidor de hilos de Werkzeug, sin debug ni recarga"""
+    import app as app_modulo
+
+    flask_app = app_modulo.create_app()
+    print(app_modulo.reporte_arranque())
+
+    def apagar(*_):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, apagar)
+    print(f"[WARN] Servidor de hilos en {host}:{puerto} (pid {os.getpid()}): "
+          f"un hilo por conexión, instalar gevent para producción")
+    try:
+        app_modulo.socketio.run(flask_app, host=host, port=puerto, debug=False,
+                                use_reloader=False, log_output=False,
+                                allow_unsafe_werkzeug=True)
+    except KeyboardInterrupt:
+        pass
+    _detener_servicios()
+
+
+def supervisar(procesos):
+    """Lanza un proceso por puerto y reenvía las señales de apagado"""
+    if os.getenv('NOTIF_BUS', 'local') == 'local':
+        print("[WARN] Varios procesos con NOTIF_BUS=local: los eventos no se "
+              "comparten entre ellos (usar NOTIF_BUS=sqlite)")
+    hijos = []
+    for i in range(procesos):
+        entorno = dict(os.environ, SERVIDOR_PROCESOS='1', SERVIDOR_PUERTO=str(SERVIDOR_PUERTO + i))
+        hijos.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=entorno))
+
+    def reenviar(senal, _):
+        for hijo in hijos:
+            if hijo.poll() is None:
+                hijo.send_signal(senal)
+
+    signal.signal(signal.SIGTERM, reenviar)
+    signal.signal(signal.SIGINT, reenviar)
+    codigo = 0
+    while hijos:
+        for hijo in list(hijos):
+            if hijo.poll() is not None:
+                hijos.remove(hijo)
+                codigo = codigo or hijo.returncode
+        time.sleep(0.2)
+    return codigo
+
+
+def main():
+    if SERVIDOR_PROCESOS > 1:
+        return supervisar(SERVIDOR_PROCESOS)
+
+    modo = SERVIDOR_MODO
+    if modo == 'gevent':
+        try:
+            import gevent  # noqa: F401
+            import geventwebsocket  # noqa: F401
+        except ImportError:
+            print("[WARN] gevent/gevent-websocket no instalados, usando SERVIDOR_MODO=hilos")
+            modo = 'hilos'
+
+    if modo == 'gevent':
+        servir_gevent(SERVIDOR_HOST, SERVIDOR_PUERTO)
+    elif modo == 'hilos':
+        servir_hilos(SERVIDOR_HOST, SERVIDOR_PUERTO)
+    else:
+        print(f"[ERROR] SERVIDOR_MODO desconocido: {modo} (usar 'gevent' o 'hilos')")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Test suite para el mantenimiento de la tabla sesiones
+Prueba el barrido por lotes (barrido_sesiones.py) y el máximo de sesiones por usuario
+"""
+
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import auth
+import database
+import migraciones
+import tokens_sesion
+from barrido_sesiones import BarridoSesiones
+from cache_sesiones import CacheSesiones
+from tokens_sesion import ListaRevocacion
+
+
+class BaseSesionesTest(unittest.TestCase):
+    """BD de autenticación temporal con un usuario"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('auth')
+
+        conn = self._conexion()
+        conn.execute(
+            "INSERT INTO usuarios (id, username, password_hash, nombre, rol) VALUES (1, 'caja', ?, 'Caja', 'cajero')",
+            (auth.hash_password('Caja1234!'),)
+        )
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def _conexion(self):
+        return database.get_db(self.db_path)
+
+    def _tokens(self):
+        conn = self._conexion()
+        tokens = [row[0] for row in conn.execute('SELECT token FROM sesiones ORDER BY id')]
+        conn.close()
+        return tokens
+
+
+class TestBarridoSesiones(BaseSesionesTest):
+    """Tests para BarridoSesiones"""
+
+    def setUp(self):
+        super().setUp()
+        conn = self._conexion()
+        conn.executemany(
+            'INSERT INTO sesiones (usuario_id, token, expires_at) VALUES (1, ?, ?)',
+            [(f'vencida-{i}', '2020-01-01T00:00:00') for i in range(5)] +
+            [('vigente', '2999-01-01T00:00:00')]
+        )
+        conn.executemany(
+            'INSERT INTO revocaciones (jti, usuario_id, expires_at) VALUES (?, 1, ?)',
+            [('vieja', 1), ('nueva', int(time.time()) + 3600)]
+        )
+        conn.commit()
+        conn.close()
+        self.barrido = BarridoSesiones(self._conexion, intervalo=0, lote=2, pausa_ms=0)
+
+    def test_borra_vencidas_en_lotes(self):
+        """Borra solo lo vencido, en lotes del tamaño configurado"""
+        resultado = self.barrido.barrer()
+        self.assertEqual(resultado['sesiones'], 5)
+        self.assertEqual(resultado['revocaciones'], 1)
+        self.assertEqual(self._tokens(), ['vigente'])
+        self.assertEqual(self.barrido.lotes, 3 + 1)
+
+    def test_estadisticas(self):
+        """Reporta tamaño de la tabla y métricas del último barrido"""
+        antes = self.barrido.estadisticas()
+        self.assertEqual((antes['sesiones'], antes['sesiones_vencidas']), (6, 5))
+        self.barrido.barrer()
+        despues = self.barrido.estadisticas()
+        self.assertEqual((despues['sesiones'], despues['sesiones_vencidas']), (1, 0))
+        self.assertEqual(despues['barridos'], 1)
+        self.assertIsNotNone(despues['ultimo_barrido_at'])
+
+    def test_hilo_periodico(self):
+        """El hilo barre periódicamente y se detiene"""
+        barrido = BarridoSesiones(self._conexion, intervalo=0.01, lote=100, pausa_ms=0)
+        barrido.iniciar()
+        limite = time.time() + 2
+        while barrido.barridos == 0 and time.time() < limite:
+            time.sleep(0.01)
+        barrido.detener()
+        self.assertGreaterEqual(barrido.barridos, 1)
+        self.assertEqual(self._tokens(), ['vigente'])
+
+
+class TestMaximoSesiones(BaseSesionesTest):
+    """El login cierra las sesiones más antiguas por encima del máximo"""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = CacheSesiones(ttl=60)
+        self.parches = [
+            mock.patch.object(auth, 'get_db', self._conexion),
+            mock.patch.object(auth, 'cache_sesiones', self.cache),
+            mock.patch.object(auth, 'AUTH_MAX_SESIONES_USUARIO', 2),
+            mock.patch.dict(os.environ, {'AUTH_TOKENS': 'opaco'}),
+        ]
+        for parche in self.parches:
+            parche.start()
+        app = Flask(__name__)
+        app.register_blueprint(auth.auth_bp, url_prefix='/api/auth')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        for parche in self.parches:
+            parche.stop()
+        super().tearDown()
+
+    def _login(self):
+        r = self.client.post('/api/auth/login', json={'username': 'caja', 'password': 'Caja1234!'})
+        return r.get_json()['token']
+
+    def test_conserva_las_mas_recientes(self):
+        """Con máximo 2, el tercer login cierra la primera sesión"""
+        primera = self._login()
+        self.cache.guardar(primera, {'id': 1})
+        segunda, tercera = self._login(), self._login()
+        self.assertEqual(self._tokens(), [segunda, tercera])
+        self.assertIsNone(self.cache.obtener(primera))
+
+    def _revocados(self):
+        conn = self._conexion()
+        jtis = [row[0] for row in conn.execute('SELECT jti FROM revocaciones ORDER BY id')]
+        conn.close()
+        return jtis
+
+    def test_sesion_opaca_no_se_revoca(self):
+        """Con clave configurada pero tokens opacos, cerrar una sesión no copia el token a revocaciones"""
+        lista = ListaRevocacion(self._conexion, intervalo=0)
+        with mock.patch.dict(os.environ, {'SECRET_KEY': 'clave-de-prueba'}), \
+                mock.patch.object(tokens_sesion, 'lista_revocacion', lista):
+            primera = self._login()
+            self._login(), self._login()
+        self.assertNotIn(primera, self._tokens())
+        self.assertEqual(self._revocados(), [])
+        self.assertEqual(lista.estadisticas()['jtis'], 0)
+
+    def test_sesion_firmada_revoca_su_jti(self):
+        """En modo firmado la sesión cerrada revoca su jti"""
+        lista = ListaRevocacion(self._conexion, intervalo=0)
+        with mock.patch.dict(os.environ, {'AUTH_TOKENS': 'firmado', 'AUTH_TOKEN_SECRET': 'clave-de-prueba'}), \
+                mock.patch.object(tokens_sesion, 'lista_revocacion', lista):
+            self._login()
+            primera = self._tokens()[0]
+            self._login(), self._login()
+        self.assertEqual(self._revocados(), [primera])
+        self.assertEqual(lista.estadisticas()['jtis'], 1)
+
+    def test_sin_limite(self):
+        """Con máximo 0 no se cierra ninguna sesión"""
+        with mock.patch.object(auth, 'AUTH_MAX_SESIONES_USUARIO', 0):
+            for _ in range(3):
+                self._login()
+        self.assertEqual(len(self._tokens()), 3)
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestBarridoSesiones))
+    suite.addTests(loader.loadTestsFromTestCase(TestMaximoSesiones))
+
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
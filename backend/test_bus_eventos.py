@@ -0,0 +1,169 @@
+"""
+Test suite para el bus de eventos entre procesos (bus_eventos.py)
+Prueba el outbox SQLite, la entrega exactamente una vez por proceso y el
+client manager de Socket.IO con dos "workers" en el mismo archivo
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import socketio
+
+import database
+import notificaciones
+from bus_eventos import BusEventosLocal, BusEventosSQLite, GestorSocketIOBus
+from notificaciones import BufferEventos, NotificadorPedidos
+
+
+class BaseBusTest(unittest.TestCase):
+    """Archivo de outbox temporal compartido por varios buses"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'bus_eventos.db')
+        self.buses = []
+
+    def tearDown(self):
+        for bus in self.buses:
+            bus.detener()
+        database.olvidar_pool(self.db_path)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _bus(self, **kwargs):
+        bus = BusEventosSQLite(self.db_path, **kwargs)
+        self.buses.append(bus)
+        return bus
+
+
+class TestBusEventosSQLite(BaseBusTest):
+    """Tests para BusEventosSQLite"""
+
+    def test_cada_proceso_recibe_una_vez_en_orden(self):
+        """Dos buses sobre el mismo outbox reciben todo, en orden y sin duplicados"""
+        a, b = self._bus(), self._bus()
+        recibidos = {'a': [], 'b': []}
+        a.suscribir('t', lambda datos, id_: recibidos['a'].append((id_, datos['n'])))
+        b.suscribir('t', lambda datos, id_: recibidos['b'].append((id_, datos['n'])))
+
+        a.publicar('t', {'n': 1})
+        b.publicar('t', {'n': 2})
+        a.publicar('otro', {'n': 3})
+        for bus in (a, b, a, b):
+            bus.leer_pendientes()
+
+        self.assertEqual([n for _, n in recibidos['a']], [1, 2])
+        self.assertEqual(recibidos['a'], recibidos['b'])
+        ids = [id_ for id_, _ in recibidos['a']]
+        self.assertEqual(ids, sorted(ids))
+
+    def test_proceso_nuevo_no_reentrega_pero_precarga(self):
+        """Un bus nuevo empieza tras el último id; recientes() devuelve lo ya publicado"""
+        a = self._bus()
+        a.publicar('t', {'n': 1})
+        b = self._bus()
+        recibidos = []
+        b.suscribir('t', lambda datos, id_: recibidos.append(datos['n']))
+        self.assertEqual(b.leer_pendientes(), 0)
+        self.assertEqual([datos['n'] for _, datos in b.recientes('t', 60)], [1])
+
+    def test_purga_por_retencion(self):
+        """purgar() borra solo los mensajes más viejos que la retención"""
+        bus = self._bus(retencion=60)
+        bus.publicar('t', {'n': 1})
+        with mock.patch('bus_eventos.time.time', return_value=time.time() + 120):
+            bus.publicar('t', {'n': 2})
+            self.assertEqual(bus.purgar(), 1)
+
+    def test_hilo_lector(self):
+        """El hilo entrega lo publicado por otro proceso sin llamar a leer_pendientes"""
+        a, b = self._bus(), self._bus(intervalo_ms=10)
+        recibidos = []
+        b.suscribir('t', lambda datos, id_: recibidos.append(datos['n']))
+        b.iniciar()
+        a.publicar('t', {'n': 1})
+        limite = time.time() + 2
+        while not recibidos and time.time() < limite:
+            time.sleep(0.01)
+        self.assertEqual(recibidos, [1])
+
+
+class TestPollingEntreWorkers(BaseBusTest):
+    """Los buffers de polling usan el id del outbox como seq"""
+
+    def test_cursor_valido_en_otro_worker(self):
+        a, b = self._bus(), self._bus()
+        buffers = {}
+        for nombre, bus in (('a', a), ('b', b)):
+            buffers[nombre] = BufferEventos(capacidad=10)
+            bus.suscribir(notificaciones.TEMA_NOTIFICACIONES,
+                          lambda m, id_, buf=buffers[nombre]: buf.agregar(m['evento'], m['canal'], seq=id_))
+
+        for i in range(3):
+            a.publicar(notificaciones.TEMA_NOTIFICACIONES, {'canal': 'cocina', 'evento': {'n': i}})
+        a.leer_pendientes()
+        b.leer_pendientes()
+
+        ultimo = buffers['a'].leer(['cocina'])['eventos'][1]['seq']
+        resultado = buffers['b'].leer(['cocina'], desde=ultimo)
+        self.assertEqual([e['n'] for e in resultado['eventos']], [2])
+        self.assertFalse(resultado['perdidos'])
+
+
+class TestGestorSocketIOBus(BaseBusTest):
+    """Dos servidores Socket.IO ("workers") comparten el outbox"""
+
+    def _worker(self):
+        bus = self._bus(intervalo_ms=10)
+        servidor = socketio.Server(async_mode='threading', client_manager=GestorSocketIOBus(bus))
+        enviados = []
+        servidor._send_eio_packet = lambda eio_sid, paquete: enviados.append((eio_sid, paquete.data))
+        servidor.manager.initialize()
+        bus.iniciar()
+        return servidor, enviados
+
+    def _conectar(self, servidor, eio_sid, sala):
+        sid = servidor.manager.connect(eio_sid, '/')
+        servidor.manager.enter_room(sid, '/', sala, eio_sid=eio_sid)
+
+    def test_emit_llega_una_vez_a_cada_socket_de_la_sala(self):
+        """Un emit en un worker llega una sola vez a los sockets de la sala en ambos"""
+        servidor_a, enviados_a = self._worker()
+        servidor_b, enviados_b = self._worker()
+        self._conectar(servidor_a, 'tablet-a', 'cocina')
+        self._conectar(servidor_b, 'tablet-b', 'cocina')
+        self._conectar(servidor_b, 'caja-b', 'cajeros')
+
+        with mock.patch.object(notificaciones, 'cola_eventos', BufferEventos()), \
+                mock.patch.object(notificaciones, '_bus_conectado', BusEventosLocal()):
+            NotificadorPedidos.notificar_nuevo_pedido(servidor_a, {'id': 7})
+
+        limite = time.time() + 3
+        while (not enviados_a or not enviados_b) and time.time() < limite:
+            time.sleep(0.01)
+        time.sleep(0.1)  # Dar tiempo a que llegue un duplicado, si lo hubiera
+
+        self.assertEqual([eio for eio, _ in enviados_a], ['tablet-a'])
+        self.assertEqual([eio for eio, _ in enviados_b], ['tablet-b'])
+        self.assertIn('"pedido":{"id":7}', enviados_b[0][1].replace(' ', ''))
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestBusEventosSQLite))
+    suite.addTests(loader.loadTestsFromTestCase(TestPollingEntreWorkers))
+    suite.addTests(loader.loadTestsFromTestCase(TestGestorSocketIOBus))
+
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
@@ -0,0 +1,152 @@
+"""
+Test suite para la caché del menú (cache_menu.py)
+Prueba la versión por triggers, las vistas serializadas, la invalidación al
+terminar la unidad de trabajo y el ETag/304
+"""
+
+import json
+import sys
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import database
+import migraciones
+import pos
+from cache_menu import CacheMenu, version_menu
+
+
+class TestCacheMenu(unittest.TestCase):
+    """Caché sobre un pos.db temporal"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('pos')
+
+        self.conn = database.get_db(self.db_path)
+        self.conn.executemany('INSERT INTO categorias (nombre, orden) VALUES (?, ?)',
+                              [('Pupusas', 1), ('Bebidas', 2)])
+        self.conn.executemany(
+            'INSERT INTO productos (nombre, precio, categoria_id, disponible) VALUES (?, ?, ?, ?)',
+            [('Pupusa Revuelta', 0.85, 1, 1), ('Pupusa de Frijol', 0.60, 1, 1),
+             ('Pupusa de Mora', 1.00, 1, 0), ('Horchata', 1.00, 2, 1)])
+        self.conn.execute("INSERT INTO combos (nombre, precio_combo) VALUES ('Combo Familiar', 2.0)")
+        self.conn.executemany('INSERT INTO combo_items (combo_id, producto_id, cantidad) VALUES (1, ?, ?)',
+                              [(1, 2), (4, 1)])
+        self.conn.execute("INSERT INTO combos (nombre, precio_combo, activo) VALUES ('Combo Viejo', 1.0, 0)")
+        self.conn.commit()
+        self.cache = CacheMenu(self.db_path, revalidar=60)
+
+    def tearDown(self):
+        self.conn.close()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def _vista(self, vista):
+        return json.loads(self.cache.obtener(vista)[1])
+
+    def test_triggers_suben_la_version(self):
+        """Cualquier escritura a las tablas del menú mueve la versión"""
+        for sql in ("UPDATE productos SET precio = 0.90 WHERE id = 1",
+                    "UPDATE categorias SET orden = 3 WHERE id = 2",
+                    "DELETE FROM combo_items WHERE id = 2",
+                    "UPDATE combos SET activo = 0 WHERE id = 1"):
+            antes = version_menu(self.conn.cursor())
+            self.conn.execute(sql)
+            self.conn.commit()
+            self.assertGreater(version_menu(self.conn.cursor()), antes, sql)
+
+    def test_vistas(self):
+        """Productos, categorías, productos por categoría y combos activos"""
+        productos = self._vista('productos')
+        self.assertEqual([p['nombre'] for p in productos],
+                         ['Pupusa Revuelta', 'Pupusa de Frijol', 'Pupusa de Mora', 'Horchata'])
+        self.assertEqual(productos[0]['categoria_nombre'], 'Pupusas')
+
+        categorias = self._vista('categorias')
+        self.assertEqual([(c['nombre'], c['total_productos']) for c in categorias],
+                         [('Pupusas', 3), ('Bebidas', 1)])
+
+        pupusas = self._vista(('categoria', 1))
+        self.assertEqual([p['nombre'] for p in pupusas], ['Pupusa Revuelta', 'Pupusa de Frijol'])
+        self.assertEqual(set(pupusas[0]), {'id', 'nombre', 'precio', 'categoria_id', 'disponible'})
+        self.assertEqual(self._vista(('categoria', 99)), [])
+
+        combos = self._vista('combos')
+        self.assertEqual([c['nombre'] for c in combos], ['Combo Familiar'])
+        self.assertEqual(combos[0]['cantidad_items'], 2)
+        self.assertEqual(combos[0]['items'][0], {
+            'id': 1, 'producto_id': 1, 'producto_nombre': 'Pupusa Revuelta',
+            'cantidad': 2, 'precio_unitario': 0.85})
+
+    def test_lecturas_sin_consultar_la_bd(self):
+        """Dentro del intervalo de revalidación las lecturas no tocan SQLite"""
+        self._vista('productos')
+        self.conn.execute("UPDATE productos SET precio = 5 WHERE id = 1")
+        self.conn.commit()
+
+        for _ in range(20):
+            self.assertEqual(self._vista('productos')[0]['precio'], 0.85)
+        stats = self.cache.estadisticas()
+        self.assertEqual((stats['revisiones'], stats['recargas']), (1, 1))
+
+        # Con revalidación inmediata ve lo escrito por otra conexión
+        self.cache.revalidar = 0
+        self.assertEqual(self._vista('productos')[0]['precio'], 5)
+        self.assertEqual(self.cache.estadisticas()['recargas'], 2)
+
+    def test_registrar_cambio_invalida_al_terminar_la_peticion(self):
+        """Una escritura por la API se ve en la siguiente lectura"""
+        self._vista('productos')
+        app = Flask(__name__)
+        database.registrar_unidad_de_trabajo(app)
+
+        @app.route('/precio', methods=['PUT'])
+        def precio():
+            conn = database.get_db(self.db_path)
+            conn.execute("UPDATE productos SET precio = 0.95 WHERE id = 1")
+            self.cache.registrar_cambio()
+            # Todavía sin confirmar: la caché no se invalida
+            self.assertEqual(self.cache.estadisticas()['invalidaciones'], 0)
+            return 'ok'
+
+        app.test_client().put('/precio')
+        self.assertEqual(self._vista('productos')[0]['precio'], 0.95)
+        stats = self.cache.estadisticas()
+        self.assertEqual((stats['invalidaciones'], stats['recargas']), (1, 2))
+
+    def test_etag_y_304(self):
+        """Las rutas del menú responden 304 mientras no cambie la versión"""
+        app = Flask(__name__)
+        app.add_url_rule('/productos', 'productos', pos.get_productos)
+        with mock.patch.object(pos, 'cache_menu', self.cache):
+            client = app.test_client()
+            respuesta = client.get('/productos')
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta.mimetype, 'application/json')
+            self.assertEqual(len(respuesta.get_json()), 4)
+            etag = respuesta.headers['ETag']
+
+            respuesta = client.get('/productos', headers={'If-None-Match': etag})
+            self.assertEqual(respuesta.status_code, 304)
+            self.assertEqual(respuesta.data, b'')
+
+            self.conn.execute("DELETE FROM productos WHERE id = 3")
+            self.conn.commit()
+            self.cache.invalidar()
+            respuesta = client.get('/productos', headers={'If-None-Match': etag})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(len(respuesta.get_json()), 3)
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestCacheMenu))
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
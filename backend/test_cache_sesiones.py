@@ -0,0 +1,167 @@
+"""
+Test suite para la caché de sesiones (cache_sesiones.py)
+Prueba TTL, LRU, invalidación y su uso desde login_required
+"""
+
+import sys
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from flask import Flask, jsonify, request
+
+import auth
+import database
+import migraciones
+from cache_sesiones import CacheSesiones
+
+
+class TestCacheSesiones(unittest.TestCase):
+    """Tests para CacheSesiones"""
+
+    def test_acierto_y_fallo(self):
+        """La segunda consulta del mismo token es un acierto"""
+        cache = CacheSesiones(ttl=60, maximo=10)
+        self.assertIsNone(cache.obtener('tok'))
+        cache.guardar('tok', {'id': 1, 'rol': 'mesero'})
+        self.assertEqual(cache.obtener('tok')['rol'], 'mesero')
+        stats = cache.estadisticas()
+        self.assertEqual((stats['aciertos'], stats['fallos']), (1, 1))
+
+    def test_no_guarda_el_token_en_claro(self):
+        """Las claves son el hash del token"""
+        cache = CacheSesiones(ttl=60, maximo=10)
+        cache.guardar('secreto', {'id': 1})
+        self.assertNotIn('secreto', cache._entradas)
+
+    def test_vencimiento(self):
+        """Las entradas vencen con el TTL o con la sesión, lo que ocurra antes"""
+        cache = CacheSesiones(ttl=60, maximo=10)
+        with mock.patch('cache_sesiones.time.monotonic', return_value=100.0):
+            cache.guardar('a', {'id': 1})
+            cache.guardar('b', {'id': 2}, segundos_restantes=5)
+        with mock.patch('cache_sesiones.time.monotonic', return_value=110.0):
+            self.assertIsNotNone(cache.obtener('a'))
+            self.assertIsNone(cache.obtener('b'))
+        with mock.patch('cache_sesiones.time.monotonic', return_value=161.0):
+            self.assertIsNone(cache.obtener('a'))
+        self.assertEqual(cache.estadisticas()['expiradas'], 2)
+
+    def test_descarta_la_menos_usada(self):
+        """Al llenarse se descarta la entrada usada hace más tiempo"""
+        cache = CacheSesiones(ttl=60, maximo=2)
+        cache.guardar('a', {'id': 1})
+        cache.guardar('b', {'id': 2})
+        cache.obtener('a')
+        cache.guardar('c', {'id': 3})
+        self.assertIsNotNone(cache.obtener('a'))
+        self.assertIsNone(cache.obtener('b'))
+        self.assertEqual(cache.estadisticas()['descartadas'], 1)
+
+    def test_invalidacion(self):
+        """Se puede invalidar por token o por usuario"""
+        cache = CacheSesiones(ttl=60, maximo=10)
+        cache.guardar('a', {'id': 1})
+        cache.guardar('b', {'id': 1})
+        cache.guardar('c', {'id': 2})
+        cache.invalidar_token('c')
+        cache.invalidar_usuario(1)
+        self.assertEqual(cache.estadisticas()['entradas'], 0)
+        self.assertEqual(cache.estadisticas()['invalidadas'], 3)
+
+    def test_ttl_cero_desactiva(self):
+        """Con TTL 0 no se cachea nada"""
+        cache = CacheSesiones(ttl=0, maximo=10)
+        cache.guardar('a', {'id': 1})
+        self.assertIsNone(cache.obtener('a'))
+
+
+class TestLoginRequiredConCache(unittest.TestCase):
+    """login_required consulta la BD solo en el primer uso del token"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('auth')
+
+        conn = database.get_db(self.db_path)
+        conn.executemany(
+            'INSERT INTO usuarios (id, username, password_hash, nombre, rol) VALUES (?, ?, ?, ?, ?)',
+            [(1, 'admin', 'x', 'Admin', 'manager'), (2, 'mesero', 'x', 'Mesero', 'mesero')]
+        )
+        expira = (datetime.now() + timedelta(days=1)).isoformat()
+        conn.executemany(
+            'INSERT INTO sesiones (usuario_id, token, expires_at) VALUES (?, ?, ?)',
+            [(1, 'tok-admin', expira), (2, 'tok-mesero', expira)]
+        )
+        conn.commit()
+        conn.close()
+
+        self.cache = CacheSesiones(ttl=60, maximo=10)
+        self.parches = [
+            mock.patch.object(auth, 'get_db', lambda: database.get_db(self.db_path)),
+            mock.patch.object(auth, 'cache_sesiones', self.cache),
+        ]
+        for parche in self.parches:
+            parche.start()
+
+        app = Flask(__name__)
+        app.register_blueprint(auth.auth_bp, url_prefix='/api/auth')
+
+        @app.route('/protegido')
+        @auth.login_required
+        def protegido():
+            return jsonify({'usuario': request.current_user['username']})
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        for parche in self.parches:
+            parche.stop()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def _get(self, token):
+        return self.client.get('/protegido', headers={'Authorization': f'Bearer {token}'})
+
+    def test_segunda_peticion_usa_cache(self):
+        """La segunda petición con el mismo token es un acierto de caché"""
+        self.assertEqual(self._get('tok-mesero').status_code, 200)
+        self.assertEqual(self._get('tok-mesero').get_json()['usuario'], 'mesero')
+        stats = self.cache.estadisticas()
+        self.assertEqual((stats['aciertos'], stats['fallos']), (1, 1))
+
+    def test_logout_invalida(self):
+        """Tras el logout el token deja de ser válido aunque estuviera cacheado"""
+        self._get('tok-mesero')
+        self.client.post('/api/auth/logout', headers={'Authorization': 'Bearer tok-mesero'})
+        self.assertEqual(self._get('tok-mesero').status_code, 401)
+
+    def test_desactivar_usuario_invalida(self):
+        """Desactivar un usuario expulsa de inmediato sus sesiones cacheadas"""
+        self._get('tok-mesero')
+        r = self.client.delete('/api/auth/usuarios/2', headers={'Authorization': 'Bearer tok-admin'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self._get('tok-mesero').status_code, 401)
+
+    def test_actualizar_usuario_refresca_rol(self):
+        """Un cambio de rol se ve en la siguiente petición"""
+        self._get('tok-mesero')
+        r = self.client.put('/api/auth/usuarios/2', json={'rol': 'cajero'},
+                            headers={'Authorization': 'Bearer tok-admin'})
+        self.assertEqual(r.status_code, 200)
+        self._get('tok-mesero')
+        self.assertEqual(self.cache.obtener('tok-mesero')['rol'], 'cajero')
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestCacheSesiones))
+    suite.addTests(loader.loadTestsFromTestCase(TestLoginRequiredConCache))
+
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
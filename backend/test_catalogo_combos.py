@@ -0,0 +1,88 @@
+"""
+Test suite para el catálogo de combos (catalogo_combos.py)
+Prueba la carga en una consulta, los registros inmutables y la lectura
+desde la caché del menú
+"""
+
+import sys
+import unittest
+
+import database
+import migraciones
+from cache_menu import CacheMenu
+from catalogo_combos import cargar_catalogo, combo_a_dict
+
+
+class TestCatalogoCombos(unittest.TestCase):
+    """Catálogo sobre un pos.db temporal"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('pos')
+
+        self.conn = database.get_db(self.db_path)
+        self.conn.execute("INSERT INTO categorias (nombre, orden) VALUES ('Pupusas', 1)")
+        self.conn.executemany('INSERT INTO productos (nombre, precio, categoria_id) VALUES (?, ?, 1)',
+                              [('Pupusa de Queso', 0.75), ('Horchata', 1.00), ('Curtido Extra', 0.25)])
+        self.conn.executemany('INSERT INTO combos (nombre, precio_combo, activo) VALUES (?, ?, ?)',
+                              [('Combo Familiar', 3.50, 1), ('Combo Viejo', 1.50, 0), ('Combo Vacío', 1.00, 1)])
+        self.conn.executemany('INSERT INTO combo_items (combo_id, producto_id, cantidad) VALUES (?, ?, ?)',
+                              [(1, 1, 4), (1, 2, 1), (2, 1, 2), (2, 3, 1)])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def test_carga_en_una_consulta(self):
+        """Todos los combos con sus productos salen de una sola consulta"""
+        consultas = []
+        self.conn.set_trace_callback(consultas.append)
+        catalogo = cargar_catalogo(self.conn.cursor())
+        self.conn.set_trace_callback(None)
+
+        self.assertEqual(len(consultas), 1)
+        self.assertEqual(sorted(catalogo), [1, 2, 3])
+        familiar = catalogo[1]
+        self.assertEqual((familiar.nombre, familiar.precio_combo, familiar.cantidad_items), ('Combo Familiar', 3.5, 2))
+        self.assertEqual([(i.producto_nombre, i.cantidad, i.precio_unitario) for i in familiar.items],
+                         [('Pupusa de Queso', 4, 0.75), ('Horchata', 1, 1.0)])
+        self.assertEqual(catalogo[2].activo, 0)
+        self.assertEqual((catalogo[3].cantidad_items, catalogo[3].items), (0, ()))
+
+    def test_registros_inmutables(self):
+        """Los combos e items del catálogo no se pueden modificar"""
+        combo = cargar_catalogo(self.conn.cursor())[1]
+        with self.assertRaises(AttributeError):
+            combo.precio_combo = 0
+        with self.assertRaises(AttributeError):
+            combo.items[0].cantidad = 10
+        self.assertEqual(combo_a_dict(combo)['items'][0], {
+            'id': 1, 'producto_id': 1, 'producto_nombre': 'Pupusa de Queso',
+            'cantidad': 4, 'precio_unitario': 0.75})
+
+    def test_combo_desde_la_cache_del_menu(self):
+        """revisar=True ve un cambio de precio aunque no toque revalidar"""
+        cache = CacheMenu(self.db_path, revalidar=60)
+        self.assertEqual(cache.combo(1).precio_combo, 3.5)
+        self.assertEqual(cache.combo('2').nombre, 'Combo Viejo')
+        self.assertIsNone(cache.combo(99))
+        self.assertIsNone(cache.combo(None))
+
+        self.conn.execute('UPDATE combos SET precio_combo = 3.25 WHERE id = 1')
+        self.conn.commit()
+        self.assertEqual(cache.combo(1).precio_combo, 3.5)
+        self.assertEqual(cache.combo(1, revisar=True).precio_combo, 3.25)
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestCatalogoCombos))
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
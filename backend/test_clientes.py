@@ -0,0 +1,74 @@
+"""
+Test suite para las consultas de crédito de clientes (clientes.py)
+Prueba el cálculo de crédito utilizado en una sola consulta y su índice
+"""
+
+import sys
+import unittest
+
+import database
+import migraciones
+from clientes import SQL_CREDITO_UTILIZADO, obtener_credito_cliente
+
+
+class TestCreditoClientes(unittest.TestCase):
+    """Tests para obtener_credito_cliente"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('pos')
+
+        self.conn = database.get_db(self.db_path)
+        self.conn.executemany(
+            'INSERT INTO clientes (id, codigo, nombre, credito_autorizado, dias_credito, activo) VALUES (?, ?, ?, ?, ?, ?)',
+            [(1, 'CLI-0001', 'Con crédito', 100.0, 30, 1),
+             (2, 'CLI-0002', 'Inactivo', 50.0, 0, 0)]
+        )
+        self.conn.executemany(
+            'INSERT INTO pedidos (cliente_id, estado, total) VALUES (?, ?, ?)',
+            [(1, 'credito', 20.0), (1, 'credito', 15.5), (1, 'pagado', 99.0), (2, 'credito', 10.0)]
+        )
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def test_credito_utilizado(self):
+        """Solo suma los pedidos en estado 'credito' del cliente"""
+        cliente = obtener_credito_cliente(self.conn.cursor(), 1)
+        self.assertEqual(cliente['nombre'], 'Con crédito')
+        self.assertEqual(cliente['credito_autorizado'], 100.0)
+        self.assertAlmostEqual(cliente['credito_utilizado'], 35.5)
+
+    def test_cliente_sin_pedidos(self):
+        """Un cliente sin pedidos a crédito tiene crédito utilizado 0"""
+        self.conn.execute("INSERT INTO clientes (id, codigo, nombre) VALUES (3, 'CLI-0003', 'Nuevo')")
+        cliente = obtener_credito_cliente(self.conn.cursor(), 3)
+        self.assertEqual(cliente['credito_utilizado'], 0)
+
+    def test_cliente_inactivo_o_inexistente(self):
+        """Clientes inactivos o inexistentes retornan None"""
+        self.assertIsNone(obtener_credito_cliente(self.conn.cursor(), 2))
+        self.assertIsNone(obtener_credito_cliente(self.conn.cursor(), 999))
+
+    def test_usa_indice_de_cobertura(self):
+        """El crédito utilizado se resuelve con idx_pedidos_cliente_estado"""
+        plan = ' '.join(row['detail'] for row in self.conn.execute(
+            f'EXPLAIN QUERY PLAN SELECT {SQL_CREDITO_UTILIZADO} FROM clientes c WHERE c.id = 1'
+        ))
+        self.assertIn('COVERING INDEX idx_pedidos_cliente_estado', plan)
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestCreditoClientes))
+
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
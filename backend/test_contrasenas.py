@@ -0,0 +1,174 @@
+"""
+Test suite para el hash de contraseñas (contrasenas.py)
+Prueba formato con parámetros, compatibilidad con hashes legados,
+regeneración en el login y el ejecutor acotado
+"""
+
+import hashlib
+import sys
+import threading
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import auth
+import contrasenas
+import database
+import migraciones
+from contrasenas import EjecutorHash, hash_password, necesita_rehash, verify_password
+
+
+def hash_legado(password, salt='abc123'):
+    """Formato `salt:hash` que generaban las versiones anteriores"""
+    return salt + ':' + hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000).hex()
+
+
+class TestHashContrasenas(unittest.TestCase):
+    """Tests para hash_password, verify_password y necesita_rehash"""
+
+    def test_formato_con_parametros(self):
+        """El hash guarda algoritmo, iteraciones y salt"""
+        algoritmo, iteraciones, salt, valor = hash_password('Clave123!', iteraciones=1000).split('$')
+        self.assertEqual(algoritmo, 'pbkdf2_sha256')
+        self.assertEqual(iteraciones, '1000')
+        self.assertEqual(len(valor), 64)
+
+    def test_verificacion(self):
+        """Acepta la contraseña correcta y rechaza la incorrecta"""
+        almacenado = hash_password('Clave123!', iteraciones=1000)
+        self.assertTrue(verify_password('Clave123!', almacenado))
+        self.assertFalse(verify_password('Otra123!', almacenado))
+        self.assertFalse(verify_password('Clave123!', 'basura'))
+
+    def test_hash_legado(self):
+        """Los hashes `salt:hash` siguen siendo válidos y piden regenerarse"""
+        almacenado = hash_legado('Clave123!')
+        self.assertTrue(verify_password('Clave123!', almacenado))
+        self.assertTrue(necesita_rehash(almacenado))
+
+    def test_rehash_por_iteraciones(self):
+        """Un hash con menos iteraciones que las configuradas pide regenerarse"""
+        with mock.patch.object(contrasenas, 'PASSWORD_ITERACIONES', 2000):
+            self.assertTrue(necesita_rehash(hash_password('x', iteraciones=1000)))
+            self.assertFalse(necesita_rehash(hash_password('x')))
+
+
+class TestEjecutorHash(unittest.TestCase):
+    """Tests para EjecutorHash"""
+
+    def test_concurrencia_acotada(self):
+        """Con un worker los cálculos simultáneos esperan en cola"""
+        ejecutor = EjecutorHash(workers=1, tipo='hilos')
+        hilos = [threading.Thread(target=ejecutor.calcular, args=('x', 'salt', 50000)) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        ejecutor.detener()
+
+        stats = ejecutor.estadisticas()
+        self.assertEqual(stats['completados'], 4)
+        self.assertEqual(stats['pendientes'], 0)
+        self.assertGreater(stats['espera_max_ms'], 0)
+
+    def test_ejecutor_de_procesos(self):
+        """El ejecutor de procesos produce el mismo resultado"""
+        ejecutor = EjecutorHash(workers=1, tipo='procesos')
+        try:
+            resultado = ejecutor.calcular('Clave123!', 'abc123', 100000)
+        finally:
+            ejecutor.detener()
+        self.assertEqual(resultado, hash_legado('Clave123!').split(':')[1])
+
+    def test_hilos_nativos_con_gevent(self):
+        """Con threading parcheado por gevent el modo hilos usa el pool nativo de gevent"""
+        from gevent.threadpool import ThreadPoolExecutor as ThreadPoolExecutorNativo
+
+        ejecutor = EjecutorHash(workers=1, tipo='hilos')
+        with mock.patch.object(contrasenas, '_threading_parcheado', return_value=True):
+            try:
+                resultado = ejecutor.calcular('Clave123!', 'abc123', 100000)
+                self.assertIsInstance(ejecutor._ejecutor, ThreadPoolExecutorNativo)
+            finally:
+                ejecutor.detener()
+        self.assertEqual(resultado, hash_legado('Clave123!').split(':')[1])
+        self.assertFalse(contrasenas._threading_parcheado())
+
+
+class TestRehashEnLogin(unittest.TestCase):
+    """El login regenera los hashes legados de forma transparente"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('auth')
+
+        conn = database.get_db(self.db_path)
+        conn.execute(
+            "INSERT INTO usuarios (id, username, password_hash, nombre, rol) VALUES (1, 'caja', ?, 'Caja', 'cajero')",
+            (hash_legado('Caja1234!'),)
+        )
+        conn.commit()
+        conn.close()
+
+        self.parche = mock.patch.object(auth, 'get_db', lambda: database.get_db(self.db_path))
+        self.parche.start()
+        app = Flask(__name__)
+        app.register_blueprint(auth.auth_bp, url_prefix='/api/auth')
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.parche.stop()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def _hash_guardado(self):
+        conn = database.get_db(self.db_path)
+        valor = conn.execute('SELECT password_hash FROM usuarios WHERE id = 1').fetchone()[0]
+        conn.close()
+        return valor
+
+    def test_login_regenera_hash_legado(self):
+        """Tras el login el hash queda en el formato nuevo y sigue validando"""
+        r = self.client.post('/api/auth/login', json={'username': 'caja', 'password': 'Caja1234!'})
+        self.assertEqual(r.status_code, 200)
+        nuevo = self._hash_guardado()
+        self.assertTrue(nuevo.startswith('pbkdf2_sha256$'))
+        self.assertTrue(verify_password('Caja1234!', nuevo))
+
+    def test_rehash_fuera_de_la_transaccion(self):
+        """El PBKDF2 del rehash corre sin una escritura abierta en la BD de auth"""
+        original = auth.hash_password
+        en_transaccion = []
+
+        def hash_vigilado(password):
+            en_transaccion.append(database.get_db(self.db_path).in_transaction)
+            return original(password)
+
+        with mock.patch.object(auth, 'hash_password', hash_vigilado):
+            r = self.client.post('/api/auth/login', json={'username': 'caja', 'password': 'Caja1234!'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(en_transaccion, [False])
+        self.assertTrue(self._hash_guardado().startswith('pbkdf2_sha256$'))
+
+    def test_login_fallido_no_regenera(self):
+        """Con contraseña incorrecta el hash no cambia"""
+        anterior = self._hash_guardado()
+        r = self.client.post('/api/auth/login', json={'username': 'caja', 'password': 'Mala1234!'})
+        self.assertEqual(r.status_code, 401)
+        self.assertEqual(self._hash_guardado(), anterior)
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestHashContrasenas))
+    suite.addTests(loader.loadTestsFromTestCase(TestEjecutorHash))
+    suite.addTests(loader.loadTestsFromTestCase(TestRehashEnLogin))
+
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
@@ -3,10 +3,18 @@ Test suite para CSRF protection (csrf.py)
 Prueba generación, validación y consumo de tokens CSRF
 """
 
+import json
 import sys
+import time
 import unittest
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from csrf import generate_csrf_token, validate_csrf_token, _cleanup_expired_tokens
+from unittest import mock
+
+from flask import Flask, jsonify
+
+import csrf
+from csrf import generate_csrf_token, validate_csrf_token, _cleanup_expired_tokens, inject_token_into_json
 
 
 class TestCSRFTokenGeneration(unittest.TestCase):
@@ -112,11 +120,13 @@ class TestCSRFTokenCleanup(unittest.TestCase):
 
     def test_cleanup_removes_expired(self):
         """Limpieza debe remover tokens expirados"""
-        # Esta prueba verificaría que _cleanup_expired_tokens funciona
-        # Requeriría manipular el reloj del sistema
-        # Por ahora verificamos que la función existe
-        from csrf import _cleanup_expired_tokens
-        self.assertTrue(callable(_cleanup_expired_tokens))
+        ahora = time.time()
+        usados = OrderedDict([('a', ahora - 10), ('b', ahora + 10), ('c', ahora - 5), ('d', ahora + 20)])
+        with mock.patch.object(csrf, '_used_nonces', usados):
+            _cleanup_expired_tokens()
+            self.assertEqual(list(usados), ['b', 'c', 'd'])
+            _cleanup_expired_tokens(full=True)
+            self.assertEqual(list(usados), ['b', 'd'])
 
 
 class TestCSRFTokenIntegration(unittest.TestCase):
@@ -175,6 +185,120 @@ class TestCSRFTokenIntegration(unittest.TestCase):
         self.assertIn("invalid", msg.lower())
 
 
+class TestCSRFTokenEnRespuesta(unittest.TestCase):
+    """Tests para la entrega del token en las respuestas (CSRF_MODE)"""
+
+    def test_inserta_en_objeto_sin_decodificar(self):
+        """El token se agrega al objeto JSON y el resultado sigue siendo JSON válido"""
+        body = inject_token_into_json(b'{"a": [1, {"b": "}"}]}\n', 'tok')
+        self.assertEqual(json.loads(body), {'a': [1, {'b': '}'}], '_csrf_token': 'tok'})
+        self.assertEqual(json.loads(inject_token_into_json(b'{ }', 'tok')), {'_csrf_token': 'tok'})
+
+    def test_no_modifica_listas_ni_texto(self):
+        """Listas y cuerpos que no son objetos no se tocan"""
+        self.assertIsNone(inject_token_into_json(b'[{"a": 1}]', 'tok'))
+        self.assertIsNone(inject_token_into_json(b'"texto"', 'tok'))
+
+    def test_modos_en_after_request(self):
+        """Ambos modos envían la cabecera; solo `body` modifica el JSON"""
+        from app import add_csrf_token
+
+        flask_app = Flask(__name__)
+        with flask_app.app_context():
+            with mock.patch.object(csrf, 'CSRF_MODE', 'header'):
+                response = add_csrf_token(jsonify({'ok': True}))
+            self.assertTrue(response.headers['X-CSRF-Token'])
+            self.assertEqual(response.get_json(), {'ok': True})
+
+            with mock.patch.object(csrf, 'CSRF_MODE', 'body'):
+                response = add_csrf_token(jsonify({'ok': True}))
+            self.assertEqual(response.get_json()['_csrf_token'], response.headers['X-CSRF-Token'])
+
+
+class TestCSRFTokenFirmado(unittest.TestCase):
+    """Tests para tokens firmados sin estado (vinculación, ventana de reuso, memoria)"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.parche = mock.patch.dict('os.environ', {'CSRF_SECRET': 'clave-compartida'})
+        self.parche.start()
+
+    def tearDown(self):
+        self.parche.stop()
+
+    def _en_sesion(self, sesion):
+        return self.app.test_request_context(headers={'Authorization': f'Bearer {sesion}'})
+
+    def test_valido_en_otro_worker(self):
+        """Con la misma clave otro proceso valida el token sin estado compartido"""
+        with self._en_sesion('sesion-a'):
+            token = generate_csrf_token()
+        with mock.patch.object(csrf, '_process_key', b'otra'), self._en_sesion('sesion-a'):
+            self.assertEqual(validate_csrf_token(token), (True, ''))
+
+    def test_vinculado_a_la_sesion(self):
+        """Un token emitido para una sesión no vale en otra"""
+        with self._en_sesion('sesion-a'):
+            token = generate_csrf_token()
+        with self._en_sesion('sesion-b'):
+            self.assertFalse(validate_csrf_token(token)[0])
+
+    def test_ventana_de_reuso_y_expiracion(self):
+        """Reusable dentro de 5 s, de un solo uso después y expirado a la hora"""
+        ahora = time.time()
+        with self._en_sesion('sesion-a'):
+            with mock.patch('csrf.time.time', return_value=ahora):
+                token = generate_csrf_token()
+                self.assertTrue(validate_csrf_token(token)[0])
+                self.assertTrue(validate_csrf_token(token)[0])
+            with mock.patch('csrf.time.time', return_value=ahora + 10):
+                self.assertTrue(validate_csrf_token(token)[0])
+                self.assertFalse(validate_csrf_token(token)[0])
+            with mock.patch('csrf.time.time', return_value=ahora):
+                viejo = generate_csrf_token()
+            with mock.patch('csrf.time.time', return_value=ahora + 3601):
+                self.assertIn('expired', validate_csrf_token(viejo)[1])
+
+    def test_memoria_constante(self):
+        """Emitir tokens no guarda nada y los usados se acotan a CSRF_REPLAY_CACHE"""
+        antes = len(csrf._used_nonces)
+        for _ in range(1000):
+            generate_csrf_token()
+        self.assertEqual(len(csrf._used_nonces), antes)
+
+        ahora = time.time()
+        with mock.patch.object(csrf, 'CSRF_REPLAY_CACHE', 10), \
+                mock.patch.object(csrf, '_used_nonces', OrderedDict()):
+            with mock.patch('csrf.time.time', return_value=ahora):
+                tokens = [generate_csrf_token() for _ in range(50)]
+            with mock.patch('csrf.time.time', return_value=ahora + 10):
+                validos = [validate_csrf_token(token)[0] for token in tokens]
+            self.assertEqual(validos, [True] * 10 + [False] * 40)
+            self.assertEqual(len(csrf._used_nonces), 10)
+
+    def test_usado_no_revive_con_la_cache_llena(self):
+        """Un token ya usado sigue rechazado aunque lleguen muchos nonces después"""
+        ahora = time.time()
+        with mock.patch.object(csrf, 'CSRF_REPLAY_CACHE', 10), \
+                mock.patch.object(csrf, '_used_nonces', OrderedDict()):
+            with mock.patch('csrf.time.time', return_value=ahora):
+                usado = generate_csrf_token()
+            with mock.patch('csrf.time.time', return_value=ahora + 100):
+                nuevos = [generate_csrf_token() for _ in range(20)]
+            with mock.patch('csrf.time.time', return_value=ahora + 110):
+                self.assertTrue(validate_csrf_token(usado)[0])
+                for token in nuevos:
+                    validate_csrf_token(token)
+                self.assertFalse(validate_csrf_token(usado)[0])
+
+            # Vencidos los primeros, sus nonces se liberan y entran tokens nuevos
+            with mock.patch('csrf.time.time', return_value=ahora + 3650):
+                token = generate_csrf_token()
+            with mock.patch('csrf.time.time', return_value=ahora + 3660):
+                self.assertTrue(validate_csrf_token(token)[0])
+                self.assertNotIn(usado.split('.')[1], csrf._used_nonces)
+
+
 def run_tests():
     """Ejecuta todos los tests"""
     # Crear test suite
@@ -186,6 +310,8 @@ def run_tests():
     suite.addTests(loader.loadTestsFromTestCase(TestCSRFTokenValidation))
     suite.addTests(loader.loadTestsFromTestCase(TestCSRFTokenCleanup))
     suite.addTests(loader.loadTestsFromTestCase(TestCSRFTokenIntegration))
+    suite.addTests(loader.loadTestsFromTestCase(TestCSRFTokenEnRespuesta))
+    suite.addTests(loader.loadTestsFromTestCase(TestCSRFTokenFirmado))
 
     # Ejecutar tests
     runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,417 @@
+"""
+Test suite para el pool de conexiones (database.py)
+Prueba reutilización de conexiones, PRAGMAs y estadísticas del pool
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import inspect
+import threading
+import unittest
+from unittest import mock
+
+from flask import Flask, jsonify
+
+import database
+import inventario
+import migraciones
+import pos
+from cache_menu import CacheMenu
+from indice_pedidos import IndicePedidos
+from database import (
+    EscritorSerializado, PoolConexiones, get_db, liberar_unidad_de_trabajo,
+    registrar_unidad_de_trabajo
+)
+
+
+class BaseDBTest(unittest.TestCase):
+    """Crea un archivo de BD temporal para cada test"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'test.db')
+
+    def tearDown(self):
+        database.olvidar_pool(self.db_path)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+class TestPoolConexiones(BaseDBTest):
+    """Tests para el pool de conexiones"""
+
+    def test_conexion_se_reutiliza(self):
+        """close() debe devolver la conexión al pool para reutilizarla"""
+        conn1 = get_db(self.db_path)
+        conn1.close()
+        conn2 = get_db(self.db_path)
+        self.assertIs(conn1, conn2)
+        conn2.close()
+
+    def test_pragmas_aplicados(self):
+        """Las conexiones deben abrirse en WAL con foreign keys y busy_timeout"""
+        conn = get_db(self.db_path)
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(conn.execute('PRAGMA foreign_keys').fetchone()[0], 1)
+        self.assertGreater(conn.execute('PRAGMA busy_timeout').fetchone()[0], 0)
+        conn.close()
+
+    def test_row_factory(self):
+        """Las filas deben poder accederse por nombre de columna"""
+        conn = get_db(self.db_path)
+        row = conn.execute('SELECT 1 AS uno').fetchone()
+        self.assertEqual(row['uno'], 1)
+        conn.close()
+
+    def test_cambios_sin_commit_se_descartan(self):
+        """Devolver una conexión con transacción abierta debe hacer rollback"""
+        conn = get_db(self.db_path)
+        conn.execute('CREATE TABLE t (x INTEGER)')
+        conn.commit()
+        conn.execute('INSERT INTO t VALUES (1)')
+        conn.close()
+
+        conn = get_db(self.db_path)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM t').fetchone()[0], 0)
+        conn.close()
+
+    def test_doble_close_no_duplica(self):
+        """Un segundo close() no debe devolver la conexión dos veces"""
+        conn = get_db(self.db_path)
+        conn.close()
+        conn.close()
+        stats = database._obtener_pool(self.db_path).estadisticas()
+        self.assertEqual(stats['conexiones_libres'], 1)
+
+    def test_estadisticas(self):
+        """El pool debe contar checkouts y conexiones abiertas"""
+        conn1 = get_db(self.db_path)
+        conn2 = get_db(self.db_path)
+        stats = database._obtener_pool(self.db_path).estadisticas()
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['conexiones_abiertas'], 2)
+        conn1.close()
+        conn2.close()
+
+    def test_espera_cuando_pool_lleno(self):
+        """Con el pool lleno, obtener() debe esperar a que se libere una conexión"""
+        pool = PoolConexiones(self.db_path, tamano=1, timeout=2)
+        conn = pool.obtener()
+        obtenidas = []
+
+        def tomar():
+            obtenidas.append(pool.obtener())
+
+        hilo = threading.Thread(target=tomar)
+        hilo.start()
+        conn.close()
+        hilo.join(timeout=5)
+
+        self.assertEqual(len(obtenidas), 1)
+        self.assertIs(obtenidas[0], conn)
+        self.assertEqual(pool.estadisticas()['esperas'], 1)
+        obtenidas[0].close()
+        pool.cerrar()
+
+    def test_desborde_tras_timeout(self):
+        """Si nadie libera una conexión, se abre una de desborde"""
+        pool = PoolConexiones(self.db_path, tamano=1, timeout=0.05)
+        conn1 = pool.obtener()
+        conn2 = pool.obtener()
+        self.assertIsNot(conn1, conn2)
+        self.assertEqual(pool.estadisticas()['desbordes'], 1)
+        conn1.close()
+        conn2.close()
+        pool.cerrar()
+
+
+class TestUnidadDeTrabajo(BaseDBTest):
+    """Tests para la conexión/transacción única por petición"""
+
+    def setUp(self):
+        super().setUp()
+        conn = get_db(self.db_path)
+        conn.execute('CREATE TABLE t (x INTEGER)')
+        conn.commit()
+        conn.close()
+
+        self.app = Flask(__name__)
+        registrar_unidad_de_trabajo(self.app)
+        db_path = self.db_path
+
+        def insertar(valor):
+            conn = get_db(db_path)
+            conn.execute('INSERT INTO t VALUES (?)', (valor,))
+            conn.close()
+
+        @self.app.route('/misma')
+        def misma():
+            return jsonify({'misma': get_db(db_path) is get_db(db_path)})
+
+        @self.app.route('/ok')
+        def ok():
+            insertar(1)
+            insertar(2)
+            return jsonify({'success': True})
+
+        @self.app.route('/error')
+        def error():
+            insertar(3)
+            return jsonify({'error': 'fallo'}), 400
+
+        @self.app.route('/excepcion')
+        def excepcion():
+            insertar(4)
+            raise RuntimeError('fallo')
+
+        @self.app.route('/liberar')
+        def liberar():
+            insertar(5)
+            liberar_unidad_de_trabajo()
+            stats = database._obtener_pool(db_path).estadisticas()
+            insertar(6)
+            return jsonify({'libres': stats['conexiones_libres'] == stats['conexiones_abiertas']}), 400
+
+        def trabajo(valor, status):
+            def _trabajo(conn):
+                conn.execute('INSERT INTO t VALUES (?)', (valor,))
+                return {'valor': valor}, status
+            cuerpo, status = database.escribir_y_esperar(_trabajo, db_path)
+            return jsonify(cuerpo), status
+
+        self.app.add_url_rule('/trabajo', 'trabajo', lambda: trabajo(7, 200))
+        self.app.add_url_rule('/trabajo-con-error', 'trabajo_con_error', lambda: trabajo(8, 409))
+
+    def _valores(self):
+        conn = get_db(self.db_path)
+        valores = [row['x'] for row in conn.execute('SELECT x FROM t ORDER BY x')]
+        conn.close()
+        return valores
+
+    def test_misma_conexion_en_peticion(self):
+        """Todas las llamadas a get_db() de una petición comparten conexión"""
+        resp = self.app.test_client().get('/misma')
+        self.assertTrue(resp.get_json()['misma'])
+
+    def test_commit_al_terminar(self):
+        """Los cambios de una respuesta exitosa se confirman en un solo commit"""
+        self.assertEqual(self.app.test_client().get('/ok').status_code, 200)
+        self.assertEqual(self._valores(), [1, 2])
+
+    def test_rollback_en_error(self):
+        """Una respuesta de error descarta los cambios no confirmados"""
+        self.assertEqual(self.app.test_client().get('/error').status_code, 400)
+        self.assertEqual(self._valores(), [])
+
+    def test_rollback_en_excepcion(self):
+        """Una excepción no controlada descarta los cambios y libera la conexión"""
+        self.assertEqual(self.app.test_client().get('/excepcion').status_code, 500)
+        self.assertEqual(self._valores(), [])
+        stats = database._obtener_pool(self.db_path).estadisticas()
+        self.assertEqual(stats['conexiones_libres'], stats['conexiones_abiertas'])
+
+    def test_trabajo_con_error_no_se_confirma(self):
+        """escribir_y_esperar no confirma un trabajo que retorna un status de error, con o sin cola"""
+        for cola in (False, True):
+            with mock.patch.object(database, 'DB_COLA_ESCRITURA', cola):
+                self.assertEqual(self.app.test_client().get('/trabajo-con-error').status_code, 409)
+                self.assertEqual(self._valores(), [])
+                self.assertEqual(self.app.test_client().get('/trabajo').status_code, 200)
+                self.assertEqual(self._valores(), [7])
+                conn = get_db(self.db_path)
+                conn.execute('DELETE FROM t')
+                conn.commit()
+                conn.close()
+
+    def test_liberar_antes_de_esperar(self):
+        """liberar_unidad_de_trabajo confirma lo previo y devuelve la conexión al pool"""
+        resp = self.app.test_client().get('/liberar')
+        self.assertTrue(resp.get_json()['libres'])
+        # Lo posterior pertenece a una unidad nueva, que se revierte por el 400
+        self.assertEqual(self._valores(), [5])
+
+
+class TestEscritorSerializado(BaseDBTest):
+    """Tests para la cola de escritura con commit agrupado"""
+
+    def setUp(self):
+        super().setUp()
+        conn = get_db(self.db_path)
+        conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, x INTEGER)')
+        conn.commit()
+        conn.close()
+        self.escritor = EscritorSerializado(self.db_path, tamano_lote=50, latencia_ms=20)
+
+    def tearDown(self):
+        self.escritor.detener()
+        super().tearDown()
+
+    @staticmethod
+    def _insertar(valor):
+        def trabajo(conn):
+            return conn.execute('INSERT INTO t (x) VALUES (?)', (valor,)).lastrowid
+        return trabajo
+
+    def test_resultado_lastrowid(self):
+        """El Future debe resolver al resultado del trabajo tras el commit"""
+        futuro = self.escritor.enviar(self._insertar(7))
+        rowid = futuro.result(timeout=5)
+        conn = get_db(self.db_path)
+        fila = conn.execute('SELECT x FROM t WHERE id = ?', (rowid,)).fetchone()
+        conn.close()
+        self.assertEqual(fila['x'], 7)
+
+    def test_commit_agrupado(self):
+        """Trabajos concurrentes se confirman en menos commits que trabajos"""
+        futuros = []
+
+        def enviar(inicio):
+            for i in range(inicio, inicio + 25):
+                futuros.append(self.escritor.enviar(self._insertar(i)))
+
+        hilos = [threading.Thread(target=enviar, args=(n * 25,)) for n in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        for futuro in futuros:
+            futuro.result(timeout=5)
+
+        stats = self.escritor.estadisticas()
+        self.assertEqual(stats['trabajos'], 200)
+        self.assertLess(stats['lotes'], 200)
+        self.assertEqual(stats['fallidos'], 0)
+
+    def test_fallo_aislado(self):
+        """Un trabajo que falla no revierte los demás trabajos del lote"""
+        def fallar(conn):
+            conn.execute('INSERT INTO t (x) VALUES (99)')
+            raise ValueError('fallo')
+
+        ok1 = self.escritor.enviar(self._insertar(1))
+        malo = self.escritor.enviar(fallar)
+        ok2 = self.escritor.enviar(self._insertar(2))
+
+        ok1.result(timeout=5)
+        ok2.result(timeout=5)
+        with self.assertRaises(ValueError):
+            malo.result(timeout=5)
+
+        conn = get_db(self.db_path)
+        valores = [row['x'] for row in conn.execute('SELECT x FROM t ORDER BY x')]
+        conn.close()
+        self.assertEqual(valores, [1, 2])
+        self.assertEqual(self.escritor.estadisticas()['fallidos'], 1)
+
+
+class TestRutasConColaDeEscritura(unittest.TestCase):
+    """Rutas de escritura reales con DB_COLA_ESCRITURA=1 sobre un pos.db temporal"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('pos')
+
+        conn = get_db(self.db_path)
+        conn.execute("INSERT INTO categorias (nombre, orden) VALUES ('Pupusas', 1)")
+        conn.execute("INSERT INTO productos (nombre, precio, categoria_id) VALUES ('Pupusa Revuelta', 0.85, 1)")
+        conn.execute("INSERT INTO mesas (numero, capacidad) VALUES (1, 4)")
+        conn.execute("INSERT INTO materia_prima (codigo, nombre, unidad_medida, stock_actual) "
+                     "VALUES ('MP001', 'Masa de Maíz', 'lb', 10)")
+        conn.commit()
+        conn.close()
+
+        app = Flask(__name__)
+        registrar_unidad_de_trabajo(app)
+        for regla, vista, metodo in (
+                ('/pedidos', pos.crear_pedido, 'POST'),
+                ('/pedidos/<int:id>/estado', pos.actualizar_estado_pedido, 'PUT'),
+                ('/pedidos/<int:id>/pago', pos.actualizar_pago_pedido, 'PUT'),
+                ('/materia-prima/<int:id>/ajuste', inventario.ajustar_materia_prima, 'POST')):
+            app.add_url_rule(regla, vista.__name__, inspect.unwrap(vista), methods=[metodo])
+
+        escribir_aqui = lambda funcion: database.escribir_y_esperar(funcion, self.db_path)
+        self.parches = [
+            mock.patch.object(database, 'DB_COLA_ESCRITURA', True),
+            mock.patch.object(pos, 'escribir_y_esperar', escribir_aqui),
+            mock.patch.object(inventario, 'escribir_y_esperar', escribir_aqui),
+            mock.patch.object(pos, 'get_db', lambda: get_db(self.db_path)),
+            mock.patch.object(pos, 'cache_menu', CacheMenu(self.db_path, revalidar=60)),
+            mock.patch.object(pos, 'indice_pedidos', IndicePedidos(self.db_path)),
+        ]
+        for parche in self.parches:
+            parche.start()
+        self.app = app
+
+    def tearDown(self):
+        for parche in self.parches:
+            parche.stop()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def test_pedidos_concurrentes_por_el_hilo_escritor(self):
+        """crear_pedido y actualizar_estado_pedido escriben por la cola sin bloqueos"""
+        respuestas = []
+
+        def tablet():
+            client = self.app.test_client()
+            respuesta = client.post('/pedidos', json={'mesa_id': 1, 'tipo_pago': 'al_final',
+                                                      'items': [{'producto_id': 1, 'cantidad': 2}]})
+            pedido_id = respuesta.get_json()['pedido_id']
+            respuestas.append(respuesta.status_code)
+            respuestas.append(client.put(f'/pedidos/{pedido_id}/estado',
+                                         json={'estado': 'en_cocina'}).status_code)
+
+        hilos = [threading.Thread(target=tablet) for _ in range(10)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(respuestas, [200] * 20)
+        stats = database.obtener_escritor(self.db_path).estadisticas()
+        self.assertEqual((stats['trabajos'], stats['fallidos']), (20, 0))
+        conn = get_db(self.db_path)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM pedidos WHERE estado = 'en_cocina'").fetchone()[0], 10)
+        self.assertEqual(conn.execute("SELECT estado FROM mesas WHERE id = 1").fetchone()[0], 'ocupada')
+        conn.close()
+
+    def test_validacion_y_pago_dentro_del_trabajo(self):
+        """Los errores de validación salen del trabajo; el pago y el ajuste se confirman"""
+        client = self.app.test_client()
+        self.assertEqual(client.put('/pedidos/99/estado', json={'estado': 'listo'}).status_code, 404)
+
+        pedido_id = client.post('/pedidos', json={'mesa_id': 1, 'tipo_pago': 'al_final',
+                                                  'items': [{'producto_id': 1}]}).get_json()['pedido_id']
+        respuesta = client.put(f'/pedidos/{pedido_id}/pago', json={'metodo_pago': 'efectivo'})
+        self.assertEqual(respuesta.get_json()['estado'], 'cerrado')
+        self.assertTrue(respuesta.get_json()['mesa_liberada'])
+
+        respuesta = client.post('/materia-prima/1/ajuste', json={'tipo': 'salida', 'cantidad': 15})
+        self.assertEqual(respuesta.status_code, 400)
+        respuesta = client.post('/materia-prima/1/ajuste', json={'tipo': 'salida', 'cantidad': 4})
+        self.assertEqual(respuesta.get_json()['stock_nuevo'], 6)
+
+        conn = get_db(self.db_path)
+        self.assertEqual(conn.execute("SELECT estado FROM mesas WHERE id = 1").fetchone()[0], 'libre')
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM movimientos_inventario').fetchone()[0], 1)
+        conn.close()
+        # El 404 y el 400 descartan su SAVEPOINT: cuentan como trabajos fallidos
+        stats = database.obtener_escritor(self.db_path).estadisticas()
+        self.assertEqual((stats['trabajos'], stats['fallidos']), (3, 2))
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestPoolConexiones))
+    suite.addTests(loader.loadTestsFromTestCase(TestUnidadDeTrabajo))
+    suite.addTests(loader.loadTestsFromTestCase(TestEscritorSerializado))
+    suite.addTests(loader.loadTestsFromTestCase(TestRutasConColaDeEscritura))
+
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
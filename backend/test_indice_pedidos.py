@@ -0,0 +1,146 @@
+"""
+Test suite para el índice en memoria de pedidos activos (indice_pedidos.py)
+Prueba la carga, la sincronización por versión, el registro al terminar la
+unidad de trabajo y el verificador de consistencia
+"""
+
+import sys
+import unittest
+
+from flask import Flask
+
+import database
+import migraciones
+from indice_pedidos import IndicePedidos
+
+
+class TestIndicePedidos(unittest.TestCase):
+    """Índice sobre un pos.db temporal"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('pos')
+
+        self.conn = database.get_db(self.db_path)
+        self.conn.execute("INSERT INTO categorias (nombre, orden) VALUES ('Pupusas', 1)")
+        self.conn.execute("INSERT INTO productos (nombre, precio, categoria_id) VALUES ('Pupusa de Queso', 0.75, 1)")
+        self.conn.executemany('INSERT INTO mesas (numero) VALUES (?)', [(1,), (2,)])
+        self.conn.commit()
+        self.indice = IndicePedidos(self.db_path)
+
+    def tearDown(self):
+        self.conn.close()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def _crear_pedido(self, estado, mesa_id=None, tipo_pago='anticipado', created_at='2025-01-01 12:00:00'):
+        cursor = self.conn.execute(
+            'INSERT INTO pedidos (estado, mesa_id, tipo_pago, total, created_at) VALUES (?, ?, ?, 1.5, ?)',
+            (estado, mesa_id, tipo_pago, created_at))
+        self.conn.execute('INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal) '
+                          'VALUES (?, 1, 2, 0.75, 1.5)', (cursor.lastrowid,))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def test_carga_solo_activos(self):
+        """La carga inicial toma los estados activos con mesa e items"""
+        activo = self._crear_pedido('en_cocina', mesa_id=1)
+        self._crear_pedido('cerrado', mesa_id=1)
+        self._crear_pedido('credito', mesa_id=2)
+        self.indice.cargar()
+
+        cocina = self.indice.cola('cocina')
+        self.assertEqual([p['id'] for p in cocina], [activo])
+        self.assertEqual(cocina[0]['mesa_numero'], 1)
+        self.assertEqual(cocina[0]['items'][0]['producto_nombre'], 'Pupusa de Queso')
+        self.assertEqual(self.indice.ocupacion_mesas(), {1: 1})
+
+    def test_sincroniza_cambios_de_otro_proceso(self):
+        """Lo escrito por otra conexión aparece en la siguiente lectura"""
+        self.indice.cargar()
+        pedido_id = self._crear_pedido('pagado', mesa_id=2)
+        self.assertEqual([p['id'] for p in self.indice.cola('cocina')], [pedido_id])
+
+        self.conn.execute("UPDATE pedidos SET estado = 'listo', listo_at = '2025-01-01 12:10:00' WHERE id = ?",
+                          (pedido_id,))
+        self.conn.commit()
+        self.assertEqual(self.indice.cola('cocina'), [])
+        self.assertEqual([p['id'] for p in self.indice.cola('mesero')], [pedido_id])
+
+        self.conn.execute("UPDATE pedidos SET estado = 'cerrado' WHERE id = ?", (pedido_id,))
+        self.conn.commit()
+        self.assertEqual(self.indice.ocupacion_mesas(), {})
+        self.assertEqual(self.indice.estadisticas()['pedidos'], 0)
+
+    def test_orden_de_las_colas(self):
+        """Cocina ordena por estado y antigüedad; cajero pone primero los servidos"""
+        en_cocina = self._crear_pedido('en_cocina', created_at='2025-01-01 10:00:00')
+        pagado = self._crear_pedido('pagado', created_at='2025-01-01 11:00:00')
+        en_mesa = self._crear_pedido('en_mesa', created_at='2025-01-01 09:00:00')
+        pendiente = self._crear_pedido('pendiente_pago', created_at='2025-01-01 08:00:00')
+        servido = self._crear_pedido('servido', tipo_pago='al_final', created_at='2025-01-01 12:00:00')
+        self._crear_pedido('servido', tipo_pago='anticipado')
+
+        self.assertEqual([p['id'] for p in self.indice.cola('cocina')], [pagado, en_mesa, en_cocina])
+        self.assertEqual([p['id'] for p in self.indice.cola('cajero')], [servido, pendiente])
+        self.assertEqual([p['id'] for p in self.indice.por_estados(['pagado', 'en_mesa'])], [pagado, en_mesa])
+
+    def test_registrar_cambio_al_terminar_la_peticion(self):
+        """registrar_cambio sincroniza una vez al terminar la unidad de trabajo"""
+        self.indice.cargar()
+        app = Flask(__name__)
+        database.registrar_unidad_de_trabajo(app)
+
+        @app.route('/crear', methods=['POST'])
+        def crear():
+            conn = database.get_db(self.db_path)
+            conn.execute("INSERT INTO pedidos (estado, total) VALUES ('pagado', 1)")
+            self.indice.registrar_cambio()
+            self.indice.registrar_cambio()
+            # Todavía sin confirmar: el índice no lo ve
+            self.assertEqual(self.indice.estadisticas()['sincronizaciones'], 0)
+            return 'ok'
+
+        app.test_client().post('/crear')
+        stats = self.indice.estadisticas()
+        self.assertEqual((stats['pedidos'], stats['sincronizaciones']), (1, 1))
+
+    def test_verificador_detecta_y_repara(self):
+        """verificar() encuentra diferencias con SQLite y las repara"""
+        pedido_id = self._crear_pedido('en_cocina')
+        self.indice.cargar()
+        self.assertTrue(self.indice.verificar()['consistente'])
+
+        # Simula un índice desviado
+        self.indice._pedidos[pedido_id]['total'] = 99
+        self.indice._pedidos[999] = {'id': 999, 'estado': 'pagado', 'mesa_id': None}
+        resultado = self.indice.verificar(reparar=True)
+        self.assertFalse(resultado['consistente'])
+        self.assertEqual(resultado['distintos'], [pedido_id])
+        self.assertEqual(resultado['sobrantes'], [999])
+        self.assertTrue(self.indice.verificar()['consistente'])
+
+    def test_historial_recortado_recarga(self):
+        """Si faltan cambios en el historial se recarga el índice completo"""
+        self.indice.cargar()
+        self.conn.execute('DELETE FROM cambios_colas')
+        self.conn.commit()
+        self._crear_pedido('pagado')
+        self._crear_pedido('pagado')
+        self.conn.execute('DELETE FROM cambios_colas WHERE id = (SELECT MIN(id) FROM cambios_colas)')
+        self.conn.commit()
+
+        self.assertEqual(len(self.indice.cola('cocina')), 2)
+        self.assertEqual(self.indice.estadisticas()['cargas'], 2)
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestIndicePedidos))
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
@@ -0,0 +1,188 @@
+"""
+Test suite para el armado de líneas de pedido (lineas_pedido.py)
+Prueba que el IVA y los totales calculados en memoria, y los mantenidos con
+deltas por las rutas de items, coinciden con recalcular_totales_pedido
+"""
+
+import inspect
+import random
+import sys
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import database
+import migraciones
+import pos
+from catalogo_combos import cargar_catalogo
+from indice_pedidos import IndicePedidos
+from lineas_pedido import armar_lineas, insertar_lineas
+from pos import recalcular_totales_pedido
+
+
+class TestLineasPedido(unittest.TestCase):
+    """Líneas de pedido sobre un pos.db temporal"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('pos')
+
+        self.conn = database.get_db(self.db_path)
+        self.conn.execute("INSERT INTO categorias (nombre, orden) VALUES ('Pupusas', 1)")
+        self.conn.executemany('INSERT INTO productos (nombre, precio, categoria_id) VALUES (?, ?, 1)',
+                              [(f'Producto {i}', round(0.35 + i * 0.15, 2)) for i in range(12)])
+        self.conn.execute("INSERT INTO combos (nombre, precio_combo) VALUES ('Combo Familiar', 3.50)")
+        self.conn.executemany('INSERT INTO combo_items (combo_id, producto_id, cantidad) VALUES (1, ?, ?)',
+                              [(1, 4), (2, 1)])
+        self.conn.commit()
+        self.productos = {row['id']: dict(row) for row in self.conn.execute('SELECT * FROM productos')}
+        self.combos = cargar_catalogo(self.conn.cursor())
+
+    def tearDown(self):
+        self.conn.close()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def test_totales_iguales_a_recalcular(self):
+        """El IVA por línea y los totales coinciden con la recalculación completa"""
+        random.seed(7)
+        for num_lineas in (1, 10, 50):
+            items = [{'producto_id': random.randint(1, 12), 'cantidad': random.randint(1, 5)}
+                     for _ in range(num_lineas)]
+            lineas, totales = armar_lineas(items, self.productos, self.combos)
+            cursor = self.conn.execute(
+                "INSERT INTO pedidos (estado, subtotal, impuesto, total) VALUES ('en_mesa', ?, ?, ?)",
+                (totales['subtotal'], totales['impuesto'], totales['total']))
+            pedido_id = cursor.lastrowid
+            insertar_lineas(self.conn.cursor(), pedido_id, lineas)
+            antes = [tuple(row) for row in self.conn.execute(
+                'SELECT iva_monto, total_item FROM pedido_items WHERE pedido_id = ? ORDER BY id', (pedido_id,))]
+
+            recalcular_totales_pedido(pedido_id, self.conn)
+            despues = [tuple(row) for row in self.conn.execute(
+                'SELECT iva_monto, total_item FROM pedido_items WHERE pedido_id = ? ORDER BY id', (pedido_id,))]
+            pedido = self.conn.execute('SELECT subtotal, impuesto, total FROM pedidos WHERE id = ?',
+                                       (pedido_id,)).fetchone()
+            self.assertEqual(antes, despues)
+            self.assertEqual(dict(pedido), totales)
+        self.conn.rollback()
+
+    def test_combos_y_items_inexistentes(self):
+        """Un combo agrega su línea y el desglose sin precio; lo inexistente se omite"""
+        items = [{'combo_id': '1', 'cantidad': 2}, {'producto_id': 99}, {'combo_id': 42},
+                 {'producto_id': 3, 'cantidad': 1, 'notas': 'sin curtido'}]
+        lineas, totales = armar_lineas(items, self.productos, self.combos)
+
+        self.assertEqual([(l['producto_id'], l['combo_id'], l['cantidad'], l['subtotal']) for l in lineas],
+                         [(None, 1, 2, 7.0), (1, None, 8, 0), (2, None, 2, 0), (3, None, 1, 0.65)])
+        self.assertEqual(lineas[1]['notas'], 'Desglose de combo: Combo Familiar')
+        self.assertEqual(lineas[3]['notas'], 'sin curtido')
+        self.assertEqual(totales, {'subtotal': 7.65, 'impuesto': 0.99, 'total': 8.64})
+
+    def _app_items(self):
+        """App con las rutas de items (sin autenticación) sobre el pos.db temporal"""
+        app = Flask(__name__)
+        database.registrar_unidad_de_trabajo(app)
+        app.add_url_rule('/pedidos/<int:id>/items', 'agregar',
+                         inspect.unwrap(pos.agregar_item_pedido), methods=['POST'])
+        app.add_url_rule('/pedidos/<int:pedido_id>/items/<int:item_id>', 'modificar',
+                         inspect.unwrap(pos.modificar_item_pedido), methods=['PUT'])
+        app.add_url_rule('/pedidos/<int:pedido_id>/items/<int:item_id>', 'remover',
+                         inspect.unwrap(pos.remover_item_pedido), methods=['DELETE'])
+        app.add_url_rule('/admin/totales-pedidos', 'totales',
+                         inspect.unwrap(pos.verificar_totales_pedidos))
+        app.add_url_rule('/admin/totales-pedidos/reparar', 'reparar_totales',
+                         inspect.unwrap(pos.reparar_totales_pedidos), methods=['POST'])
+        parches = [
+            mock.patch.object(pos, 'get_db', lambda: database.get_db(self.db_path)),
+            mock.patch.object(pos, 'indice_pedidos', IndicePedidos(self.db_path)),
+        ]
+        for parche in parches:
+            parche.start()
+            self.addCleanup(parche.stop)
+        return app.test_client()
+
+    def _totales(self, pedido_id):
+        return tuple(self.conn.execute('SELECT subtotal, impuesto, total FROM pedidos WHERE id = ?',
+                                       (pedido_id,)).fetchone())
+
+    def test_deltas_iguales_a_recalcular(self):
+        """Tras muchas ediciones, los totales por deltas coinciden con la recalculación"""
+        client = self._app_items()
+        pedido_id = self.conn.execute("INSERT INTO pedidos (estado) VALUES ('en_mesa')").lastrowid
+        self.conn.commit()
+
+        random.seed(11)
+        items = []
+        for _ in range(60):
+            operacion = random.random()
+            if not items or operacion < 0.5:
+                respuesta = client.post(f'/pedidos/{pedido_id}/items', json={
+                    'producto_id': random.randint(1, 12), 'cantidad': random.randint(1, 4)})
+                self.assertEqual(respuesta.status_code, 201)
+                items = [row[0] for row in self.conn.execute(
+                    'SELECT id FROM pedido_items WHERE pedido_id = ?', (pedido_id,))]
+            elif operacion < 0.85:
+                respuesta = client.put(f'/pedidos/{pedido_id}/items/{random.choice(items)}',
+                                       json={'cantidad': random.randint(1, 6)})
+                self.assertEqual(respuesta.status_code, 200)
+            else:
+                item_id = items.pop(random.randrange(len(items)))
+                self.assertEqual(client.delete(f'/pedidos/{pedido_id}/items/{item_id}').status_code, 200)
+
+        incrementales = self._totales(pedido_id)
+        lineas = [tuple(row) for row in self.conn.execute(
+            'SELECT iva_monto, total_item FROM pedido_items WHERE pedido_id = ? ORDER BY id', (pedido_id,))]
+        self.assertGreater(incrementales[2], 0)
+
+        recalcular_totales_pedido(pedido_id, self.conn)
+        self.assertEqual(self._totales(pedido_id), incrementales)
+        self.assertEqual([tuple(row) for row in self.conn.execute(
+            'SELECT iva_monto, total_item FROM pedido_items WHERE pedido_id = ? ORDER BY id', (pedido_id,))],
+            lineas)
+        self.conn.rollback()
+
+    def test_verificar_y_reparar_totales(self):
+        """El endpoint de administración detecta y repara pedidos desfasados"""
+        client = self._app_items()
+        ids = [self.conn.execute("INSERT INTO pedidos (estado) VALUES ('en_mesa')").lastrowid
+               for _ in range(3)]
+        self.conn.commit()
+        for pedido_id in ids:
+            client.post(f'/pedidos/{pedido_id}/items', json={'producto_id': 2, 'cantidad': 3})
+        self.conn.execute("UPDATE pedidos SET estado = 'pagado' WHERE id = ?", (ids[2],))
+        self.conn.commit()
+        self.assertTrue(client.get('/admin/totales-pedidos').get_json()['consistente'])
+
+        # Desfase escrito por fuera de las rutas de items
+        self.conn.execute('UPDATE pedidos SET total = 0 WHERE id IN (?, ?)', (ids[1], ids[2]))
+        self.conn.commit()
+        resultado = client.get('/admin/totales-pedidos').get_json()
+        self.assertEqual([(p['id'], p['estado']) for p in resultado['desfasados']],
+                         [(ids[1], 'en_mesa'), (ids[2], 'pagado')])
+        self.assertNotIn('reparado', resultado)
+        self.assertEqual(self._totales(ids[1])[2], 0)
+        self.assertEqual(client.get('/admin/totales-pedidos?reparar=1').get_json(), resultado)
+        self.assertEqual(self._totales(ids[1])[2], 0)
+
+        # Se reparan los abiertos; el pagado se reporta sin tocarlo
+        resultado = client.post('/admin/totales-pedidos/reparar').get_json()
+        self.assertEqual([p['id'] for p in resultado['reparados']], [ids[1]])
+        self.assertEqual(resultado['reparados'][0]['totales']['total'], self._totales(ids[0])[2])
+        self.assertEqual([p['id'] for p in resultado['omitidos']], [ids[2]])
+        self.assertEqual(self._totales(ids[1]), self._totales(ids[0]))
+        self.assertEqual(self._totales(ids[2])[2], 0)
+        self.assertEqual([p['id'] for p in client.get('/admin/totales-pedidos').get_json()['desfasados']],
+                         [ids[2]])
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestLineasPedido))
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
@@ -0,0 +1,172 @@
+"""
+Test suite para la sincronización en lote de pedidos (lote_pedidos.py)
+Prueba POST /pedidos/batch: claves de idempotencia, referencias entre
+entradas, errores por entrada y una sola transacción por lote
+"""
+
+import inspect
+import sqlite3
+import sys
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import database
+import migraciones
+import pos
+from cache_menu import CacheMenu
+from indice_pedidos import IndicePedidos
+
+
+class TestLotePedidos(unittest.TestCase):
+    """Lotes sobre un pos.db temporal"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('pos')
+
+        self.conn = database.get_db(self.db_path)
+        self.conn.execute("INSERT INTO categorias (nombre, orden) VALUES ('Pupusas', 1)")
+        self.conn.executemany('INSERT INTO productos (nombre, precio, categoria_id) VALUES (?, ?, 1)',
+                              [('Pupusa Revuelta', 0.85), ('Pupusa de Queso', 0.75), ('Horchata', 1.00)])
+        self.conn.execute("INSERT INTO mesas (numero, capacidad) VALUES (7, 4)")
+        self.conn.commit()
+
+        app = Flask(__name__)
+        database.registrar_unidad_de_trabajo(app)
+        app.add_url_rule('/pedidos/batch', 'lote', inspect.unwrap(pos.sincronizar_lote_pedidos),
+                         methods=['POST'])
+        self.parches = [
+            mock.patch.object(pos, 'get_db', lambda: database.get_db(self.db_path)),
+            mock.patch.object(pos, 'indice_pedidos', IndicePedidos(self.db_path)),
+            mock.patch.object(pos, 'cache_menu', CacheMenu(self.db_path, revalidar=60)),
+        ]
+        for parche in self.parches:
+            parche.start()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        for parche in self.parches:
+            parche.stop()
+        self.conn.close()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def _lote(self, entradas):
+        return self.client.post('/pedidos/batch', json={'entradas': entradas})
+
+    def _contar(self, tabla):
+        return self.conn.execute(f'SELECT COUNT(*) FROM {tabla}').fetchone()[0]
+
+    def test_reintento_no_duplica(self):
+        """Reenviar el mismo lote responde lo guardado sin volver a aplicarlo"""
+        entradas = [
+            {'clave': 't1-1', 'tipo': 'crear_pedido',
+             'pedido': {'mesa_id': 1, 'tipo_pago': 'al_final', 'items': [{'producto_id': 1, 'cantidad': 4}]}},
+            {'clave': 't1-2', 'tipo': 'agregar_item', 'pedido_clave': 't1-1', 'producto_id': 3},
+            {'clave': 't1-3', 'tipo': 'modificar_item', 'pedido_clave': 't1-1', 'item_clave': 't1-2',
+             'cantidad': 2},
+            {'clave': 't1-4', 'tipo': 'crear_pedido', 'pedido': {'items': [{'producto_id': 2}]}},
+        ]
+        respuesta = self._lote(entradas)
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.get_json()
+        self.assertEqual((datos['aplicadas'], datos['repetidas'], datos['fallidas']), (4, 0, 0))
+        pedido_id = datos['resultados'][0]['pedido_id']
+        self.assertEqual(datos['resultados'][2]['pedido_id'], pedido_id)
+        self.assertEqual(datos['resultados'][2]['total'], round((3.4 + 2.0) * 1.13, 2))
+
+        # La conexión se cortó antes de la respuesta: la tablet reenvía todo
+        reintento = self._lote(entradas).get_json()
+        self.assertEqual((reintento['aplicadas'], reintento['repetidas']), (0, 4))
+        self.assertEqual([{k: v for k, v in r.items() if k != 'repetida'} for r in reintento['resultados']],
+                         [{k: v for k, v in r.items() if k != 'repetida'} for r in datos['resultados']])
+        self.assertEqual(self._contar('pedidos'), 2)
+        self.assertEqual(self._contar('pedido_items'), 3)
+
+        # Totales mantenidos por deltas iguales a la recalculación completa
+        guardado = dict(self.conn.execute('SELECT subtotal, impuesto, total FROM pedidos WHERE id = ?',
+                                          (pedido_id,)).fetchone())
+        self.assertEqual(pos.recalcular_totales_pedido(pedido_id, self.conn), guardado)
+        self.conn.rollback()
+        self.assertEqual(self.conn.execute('SELECT estado FROM mesas WHERE id = 1').fetchone()[0], 'ocupada')
+
+    def test_errores_por_entrada(self):
+        """Una entrada inválida no afecta a las demás ni guarda su clave"""
+        resultados = self._lote([
+            {'clave': 't2-1', 'tipo': 'crear_pedido', 'pedido': {'items': [{'producto_id': 1}]}},
+            {'clave': 't2-2', 'tipo': 'modificar_item', 'pedido_clave': 't2-1', 'item_id': 999, 'cantidad': 2},
+            {'clave': 't2-3', 'tipo': 'agregar_item', 'pedido_clave': 't2-9', 'producto_id': 1},
+            {'clave': 't2-4', 'tipo': 'agregar_item', 'pedido_clave': 't2-1', 'producto_id': 99},
+            {'clave': 't2-5', 'tipo': 'remover_item', 'pedido_clave': 't2-1', 'item_id': 1},
+        ]).get_json()['resultados']
+        self.assertEqual([r['ok'] for r in resultados], [True, False, False, False, True])
+        self.assertEqual(resultados[1]['error'], 'Item no encontrado en este pedido')
+        self.assertEqual(resultados[3]['error'], 'Producto no encontrado o no disponible')
+        self.assertEqual(resultados[4]['total'], 0)
+
+        claves = [row[0] for row in self.conn.execute('SELECT clave FROM claves_idempotencia ORDER BY clave')]
+        self.assertEqual(claves, ['t2-1', 't2-5'])
+
+        # Una entrada fallida se puede reintentar
+        reintento = self._lote([{'clave': 't2-4', 'tipo': 'agregar_item', 'pedido_clave': 't2-1',
+                                 'producto_id': 2}]).get_json()
+        self.assertEqual((reintento['aplicadas'], reintento['resultados'][0]['total']), (1, 0.85))
+
+    def test_agregar_item_no_disponible(self):
+        """Un producto marcado como no disponible no se agrega"""
+        self.conn.execute('UPDATE productos SET disponible = 0 WHERE id = 3')
+        self.conn.commit()
+        resultados = self._lote([
+            {'clave': 't4-1', 'tipo': 'crear_pedido', 'pedido': {'items': [{'producto_id': 1}]}},
+            {'clave': 't4-2', 'tipo': 'agregar_item', 'pedido_clave': 't4-1', 'producto_id': 3},
+        ]).get_json()['resultados']
+        self.assertEqual([r['ok'] for r in resultados], [True, False])
+        self.assertEqual(resultados[1]['error'], 'Producto no encontrado o no disponible')
+        self.assertEqual(self._contar('pedido_items'), 1)
+        self.assertEqual(self._contar('claves_idempotencia'), 1)
+
+    def test_agregar_item_retorna_su_linea(self):
+        """El item_id de cada entrada agregar_item es el de la línea que insertó"""
+        resultados = self._lote([
+            {'clave': 't5-1', 'tipo': 'crear_pedido', 'pedido': {'items': [{'producto_id': 1}]}},
+            {'clave': 't5-2', 'tipo': 'agregar_item', 'pedido_clave': 't5-1', 'producto_id': 3,
+             'cantidad': 2},
+            {'clave': 't5-3', 'tipo': 'agregar_item', 'pedido_clave': 't5-1', 'producto_id': 2},
+        ]).get_json()['resultados']
+        self.assertTrue(all(r['ok'] for r in resultados))
+        lineas = [tuple(self.conn.execute('SELECT pedido_id, producto_id, cantidad FROM pedido_items WHERE id = ?',
+                                          (r['item_id'],)).fetchone())
+                  for r in resultados[1:]]
+        pedido_id = resultados[0]['pedido_id']
+        self.assertEqual(lineas, [(pedido_id, 3, 2), (pedido_id, 2, 1)])
+
+    def test_lote_invalido(self):
+        """La forma del lote se valida antes de abrir la transacción"""
+        for cuerpo in ({}, {'entradas': []}, {'entradas': [{'tipo': 'crear_pedido'}]},
+                       {'entradas': [{'clave': 'x', 'tipo': 'borrar_todo'}]}):
+            self.assertEqual(self.client.post('/pedidos/batch', json=cuerpo).status_code, 400)
+        self.assertEqual(self._contar('claves_idempotencia'), 0)
+
+    def test_indice_unico(self):
+        """La BD rechaza dos filas con la misma clave"""
+        fila = ('t3-1', 'crear_pedido', None, '{}', '2026-01-01T00:00:00')
+        sql = ('INSERT INTO claves_idempotencia (clave, tipo, pedido_id, resultado, created_at) '
+               'VALUES (?, ?, ?, ?, ?)')
+        self.conn.execute(sql, fila)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.conn.execute(sql, fila)
+        self.conn.rollback()
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestLotePedidos))
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
@@ -0,0 +1,111 @@
+"""
+Test suite para el motor de migraciones (migraciones/)
+Prueba versionado con PRAGMA user_version, idempotencia y camino rápido
+"""
+
+import sys
+import sqlite3
+import unittest
+from unittest import mock
+
+import migraciones
+from migraciones import aplicar_migraciones, estado, migraciones_disponibles
+
+
+class BaseMigracionTest(unittest.TestCase):
+    """Registra un archivo de BD temporal con las migraciones de pos.db"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('pos', aplicar=False)
+
+    def tearDown(self):
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def _version(self):
+        conn = sqlite3.connect(self.db_path)
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.close()
+        return version
+
+
+class TestMigraciones(BaseMigracionTest):
+    """Tests para aplicar_migraciones y estado"""
+
+    def test_bd_nueva_queda_en_ultima_version(self):
+        """Una BD vacía debe quedar en la última versión con todas las tablas"""
+        ultima = migraciones_disponibles(self.db_path)[-1][0]
+        aplicadas = aplicar_migraciones(self.db_path)
+        self.assertEqual(aplicadas, list(range(1, ultima + 1)))
+        self.assertEqual(self._version(), ultima)
+
+        conn = sqlite3.connect(self.db_path)
+        tablas = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.close()
+        for tabla in ('pedidos', 'pedido_items', 'materia_prima', 'clientes', 'correlativos'):
+            self.assertIn(tabla, tablas)
+
+    def test_camino_rapido_sin_trabajo(self):
+        """Con el esquema al día no debe cargarse ninguna migración"""
+        aplicar_migraciones(self.db_path)
+        migraciones._al_dia.discard(self.db_path)
+        with mock.patch.object(migraciones, '_cargar') as cargar:
+            self.assertEqual(aplicar_migraciones(self.db_path), [])
+            cargar.assert_not_called()
+
+    def test_bd_legada_recibe_columnas_faltantes(self):
+        """Una BD creada por versiones anteriores se actualiza sin perder datos"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE pedidos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, mesa_id INTEGER, estado TEXT,
+                total REAL, created_at TIMESTAMP, pagado_at TIMESTAMP
+            )
+        ''')
+        conn.execute('INSERT INTO pedidos (mesa_id, total) VALUES (1, 5.0)')
+        conn.commit()
+        conn.close()
+
+        aplicar_migraciones(self.db_path)
+
+        conn = sqlite3.connect(self.db_path)
+        columnas = {row[1] for row in conn.execute('PRAGMA table_info(pedidos)')}
+        total = conn.execute('SELECT total FROM pedidos').fetchone()[0]
+        conn.close()
+        self.assertIn('propina', columnas)
+        self.assertIn('cliente_id', columnas)
+        self.assertEqual(total, 5.0)
+
+    def test_falla_revierte_la_migracion(self):
+        """Si una migración falla, user_version no debe avanzar"""
+        modulo = mock.Mock()
+        modulo.aplicar.side_effect = sqlite3.OperationalError('fallo')
+        with mock.patch.object(migraciones, '_cargar', return_value=modulo):
+            with self.assertRaises(sqlite3.OperationalError):
+                aplicar_migraciones(self.db_path)
+        self.assertEqual(self._version(), 0)
+
+    def test_estado_lista_pendientes(self):
+        """estado() debe reportar versión actual y migraciones pendientes"""
+        info = estado(self.db_path)
+        self.assertEqual(info['version_actual'], 0)
+        self.assertEqual(len(info['pendientes']), info['ultima_version'])
+
+        aplicar_migraciones(self.db_path)
+        info = estado(self.db_path)
+        self.assertEqual(info['version_actual'], info['ultima_version'])
+        self.assertEqual(info['pendientes'], [])
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestMigraciones))
+
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
@@ -0,0 +1,254 @@
+"""
+Test suite para el polling de notificaciones (notificaciones.py)
+Prueba el buffer circular con cursor `since`, la detección de eventos perdidos,
+el long polling y la agrupación de emits de Socket.IO
+"""
+
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+import notificaciones
+from notificaciones import BufferEventos, NotificadorPedidos, ProgramadorEmits
+
+
+class TestBufferEventos(unittest.TestCase):
+    """Tests para BufferEventos"""
+
+    def test_secuencia_global_y_orden(self):
+        """Los seq crecen entre canales y la lectura mezcla en orden"""
+        buffer = BufferEventos(capacidad=10)
+        buffer.agregar({'tipo': 'a'}, 'cocina')
+        buffer.agregar({'tipo': 'b'}, 'general')
+        buffer.agregar({'tipo': 'c'}, 'meseros')
+        buffer.agregar({'tipo': 'd'}, 'cocina')
+
+        resultado = buffer.leer(['cocina', 'general'])
+        self.assertEqual([e['tipo'] for e in resultado['eventos']], ['a', 'b', 'd'])
+        self.assertEqual([e['seq'] for e in resultado['eventos']], [1, 2, 4])
+        self.assertEqual(resultado['ultimo_seq'], 4)
+        self.assertFalse(resultado['perdidos'])
+
+    def test_since_devuelve_solo_nuevos(self):
+        """Con `desde` solo vuelven los eventos posteriores"""
+        buffer = BufferEventos(capacidad=10)
+        for i in range(5):
+            buffer.agregar({'n': i}, 'cocina')
+        resultado = buffer.leer(['cocina'], desde=3)
+        self.assertEqual([e['n'] for e in resultado['eventos']], [3, 4])
+        self.assertEqual(buffer.leer(['cocina'], desde=5)['eventos'], [])
+
+    def test_hueco_por_capacidad(self):
+        """Si el buffer descartó eventos no vistos se reporta `perdidos`"""
+        buffer = BufferEventos(capacidad=3)
+        for i in range(6):
+            buffer.agregar({'n': i}, 'cocina')
+        self.assertTrue(buffer.leer(['cocina'], desde=1)['perdidos'])
+        self.assertFalse(buffer.leer(['cocina'], desde=3)['perdidos'])
+        # Descartes de un canal que el rol no lee no cuentan
+        self.assertFalse(buffer.leer(['meseros'], desde=1)['perdidos'])
+
+    def test_hueco_por_ventana(self):
+        """Eventos vencidos no se devuelven y, si no se vieron, cuentan como perdidos"""
+        buffer = BufferEventos(capacidad=10, ventana=300)
+        buffer.agregar({'n': 0}, 'cocina')
+        ahora = time.monotonic()
+        with mock.patch('notificaciones.time.monotonic', return_value=ahora + 301):
+            buffer.agregar({'n': 1}, 'cocina')
+            self.assertEqual([e['n'] for e in buffer.leer(['cocina'])['eventos']], [1])
+            self.assertTrue(buffer.leer(['cocina'], desde=0)['perdidos'])
+            self.assertFalse(buffer.leer(['cocina'], desde=1)['perdidos'])
+
+    def test_cursor_de_otro_servidor(self):
+        """Un `since` mayor que el último seq (reinicio) pide resincronizar"""
+        buffer = BufferEventos(capacidad=10)
+        buffer.agregar({'n': 0}, 'cocina')
+        resultado = buffer.leer(['cocina'], desde=50)
+        self.assertTrue(resultado['perdidos'])
+        self.assertEqual(len(resultado['eventos']), 1)
+
+
+class TestLongPolling(unittest.TestCase):
+    """Tests para BufferEventos.esperar"""
+
+    def _esperar_en_hilo(self, buffer, canales, desde, timeout):
+        resultado = {}
+
+        def esperar():
+            resultado.update(buffer.esperar(canales, desde, timeout))
+
+        hilo = threading.Thread(target=esperar)
+        hilo.start()
+        limite = time.time() + 2
+        while buffer.estadisticas()['en_espera'] == 0 and time.time() < limite:
+            time.sleep(0.005)
+        return hilo, resultado
+
+    def test_despierta_con_evento_del_canal(self):
+        """La petición estacionada vuelve en cuanto llega un evento de sus canales"""
+        buffer = BufferEventos(capacidad=10)
+        hilo, resultado = self._esperar_en_hilo(buffer, ['cocina', 'general'], 0, 10)
+
+        inicio = time.monotonic()
+        buffer.agregar({'n': 'otro'}, 'meseros')   # otro canal: sigue esperando
+        buffer.agregar({'n': 'nuevo'}, 'cocina')
+        hilo.join(2)
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual([e['n'] for e in resultado['eventos']], ['nuevo'])
+        self.assertFalse(resultado['saturado'])
+        self.assertEqual(buffer.estadisticas()['despertadas'], 1)
+
+    def test_vence_sin_eventos(self):
+        """Sin eventos vuelve vacía al vencer el plazo"""
+        buffer = BufferEventos(capacidad=10)
+        resultado = buffer.esperar(['cocina'], 0, 0.05)
+        self.assertEqual(resultado['eventos'], [])
+        self.assertEqual(buffer.estadisticas()['vencidas'], 1)
+
+    def test_responde_sin_esperar_si_hay_pendientes(self):
+        """Si ya hay eventos posteriores al cursor no se estaciona"""
+        buffer = BufferEventos(capacidad=10)
+        buffer.agregar({'n': 0}, 'cocina')
+        resultado = buffer.esperar(['cocina'], 0, 10)
+        self.assertEqual(len(resultado['eventos']), 1)
+        self.assertEqual(buffer.estadisticas()['long_polls'], 0)
+
+    def test_limite_de_estacionadas(self):
+        """Por encima de max_en_espera se responde de inmediato como saturado"""
+        buffer = BufferEventos(capacidad=10, max_en_espera=1)
+        hilo, _ = self._esperar_en_hilo(buffer, ['cocina'], 0, 10)
+
+        resultado = buffer.esperar(['cocina'], 0, 10)
+        self.assertTrue(resultado['saturado'])
+        self.assertEqual(buffer.estadisticas()['rechazadas'], 1)
+
+        buffer.agregar({'n': 0}, 'cocina')
+        hilo.join(2)
+        self.assertFalse(hilo.is_alive())
+
+
+class TestProgramadorEmits(unittest.TestCase):
+    """Tests para ProgramadorEmits"""
+
+    def setUp(self):
+        self.socketio = mock.Mock()
+
+    def _emits(self):
+        return [(c.args[0], c.args[1], c.kwargs['room']) for c in self.socketio.emit.call_args_list]
+
+    def test_evento_unico_sin_cambios(self):
+        """Un solo evento en la ventana se envía con su nombre y datos de siempre"""
+        programador = ProgramadorEmits(ventana_ms=1000)
+        programador.emitir(self.socketio, 'evento_pedido', {'tipo': 'nuevo_pedido'}, 'cocina')
+        self.socketio.emit.assert_not_called()
+        programador.vaciar()
+        self.assertEqual(self._emits(), [('evento_pedido', {'tipo': 'nuevo_pedido'}, 'cocina')])
+
+    def test_lote_por_sala_con_reemplazos(self):
+        """Una ráfaga da un frame por sala y solo el último estado de cada pedido"""
+        programador = ProgramadorEmits(ventana_ms=1000)
+        for estado in ('pendiente', 'en_cocina'):
+            programador.emitir(self.socketio, 'evento_pedido',
+                               {'tipo': 'cambio_estado', 'pedido_id': 1, 'estado': estado}, 'cocina')
+        for cantidad in (2, 3):
+            programador.emitir(self.socketio, 'evento_pedido',
+                               {'tipo': 'item_modificado', 'pedido_id': 1, 'item_id': 5, 'cantidad': cantidad}, 'cocina')
+        programador.emitir(self.socketio, 'evento_pedido',
+                           {'tipo': 'cambio_estado', 'pedido_id': 2, 'estado': 'en_cocina'}, 'cocina')
+        programador.emitir(self.socketio, 'evento_alerta', {'tipo': 'alerta_stock'}, 'managers')
+        programador.vaciar()
+
+        emits = sorted(self._emits(), key=lambda e: e[2])
+        self.assertEqual([(nombre, sala) for nombre, _, sala in emits],
+                         [('eventos_lote', 'cocina'), ('evento_alerta', 'managers')])
+        lote = emits[0][1]['eventos']
+        self.assertEqual([(e['datos'].get('estado'), e['datos'].get('cantidad')) for e in lote],
+                         [('en_cocina', None), (None, 3), ('en_cocina', None)])
+
+        stats = programador.estadisticas()
+        self.assertEqual((stats['eventos'], stats['frames'], stats['coalescidos']), (6, 2, 2))
+        self.assertEqual(stats['frames_ahorrados'], 4)
+
+    def test_item_modificado_conserva_cantidad_anterior(self):
+        """Al reemplazar un item_modificado queda la primera cantidad_anterior y la última cantidad_nueva"""
+        programador = ProgramadorEmits(ventana_ms=1000)
+        eventos = [{'tipo': 'item_modificado', 'pedido_id': 1, 'item_id': 5,
+                    'cambios': {'cantidad_anterior': anterior, 'cantidad_nueva': nueva}}
+                   for anterior, nueva in ((2, 3), (3, 5), (5, 4))]
+        for evento in eventos:
+            programador.emitir(self.socketio, 'evento_pedido', evento, 'cocina')
+        programador.vaciar()
+
+        self.assertEqual([datos['cambios'] for _, datos, _ in self._emits()],
+                         [{'cantidad_anterior': 2, 'cantidad_nueva': 4}])
+        # Los datos originales (compartidos con otras salas) no se modifican
+        self.assertEqual(eventos[2]['cambios'], {'cantidad_anterior': 5, 'cantidad_nueva': 4})
+
+    def test_envio_al_cerrar_la_ventana(self):
+        """El hilo envía el lote cuando vence la ventana"""
+        programador = ProgramadorEmits(ventana_ms=20)
+        programador.emitir(self.socketio, 'evento_pedido', {'tipo': 'nuevo_pedido'}, 'cocina')
+        programador.emitir(self.socketio, 'evento_pedido', {'tipo': 'nuevo_pedido'}, 'cocina')
+        limite = time.time() + 2
+        while not self.socketio.emit.called and time.time() < limite:
+            time.sleep(0.005)
+        self.assertEqual([nombre for nombre, _, _ in self._emits()], ['eventos_lote'])
+
+    def test_sin_ventana(self):
+        """Con ventana 0 cada evento se emite de inmediato"""
+        programador = ProgramadorEmits(ventana_ms=0)
+        programador.emitir(self.socketio, 'evento_pedido', {'tipo': 'nuevo_pedido'}, 'cocina')
+        self.assertEqual(len(self._emits()), 1)
+
+
+class TestPollingPorRol(unittest.TestCase):
+    """obtener_eventos_pendientes lee los canales del rol más 'general'"""
+
+    def setUp(self):
+        self.parche = mock.patch.object(notificaciones, 'cola_eventos', BufferEventos(capacidad=10))
+        self.parche.start()
+        self.socketio = mock.Mock()
+
+    def tearDown(self):
+        self.parche.stop()
+
+    def test_rol_cocinero_recibe_cocina_y_general(self):
+        """El cocinero ve pedidos nuevos y cambios, no las alertas de managers"""
+        NotificadorPedidos.notificar_nuevo_pedido(self.socketio, {'id': 1})
+        NotificadorPedidos.notificar_cambio_estado_pedido(self.socketio, 1, 'listo')
+        NotificadorPedidos.notificar_stock_bajo(self.socketio, 7, 'Pan', 1)
+
+        resultado = NotificadorPedidos.obtener_eventos_pendientes('cocinero')
+        self.assertEqual([e['tipo'] for e in resultado['eventos']], ['nuevo_pedido', 'cambio_estado'])
+        self.assertEqual(NotificadorPedidos.obtener_eventos_pendientes('cocina')['eventos'],
+                         resultado['eventos'])
+        manager = NotificadorPedidos.obtener_eventos_pendientes('manager', desde=2)
+        self.assertEqual([e['tipo'] for e in manager['eventos']], ['alerta_stock'])
+
+    def test_espera_acotada(self):
+        """esperar_eventos no espera más que NOTIF_LONGPOLL_ESPERA_MAX"""
+        with mock.patch.object(notificaciones, 'NOTIF_LONGPOLL_ESPERA_MAX', 0.05):
+            inicio = time.monotonic()
+            resultado = NotificadorPedidos.esperar_eventos('cocinero', 0, 60)
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual(resultado['eventos'], [])
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestBufferEventos))
+    suite.addTests(loader.loadTestsFromTestCase(TestLongPolling))
+    suite.addTests(loader.loadTestsFromTestCase(TestProgramadorEmits))
+    suite.addTests(loader.loadTestsFromTestCase(TestPollingPorRol))
+
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
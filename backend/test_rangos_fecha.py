@@ -0,0 +1,141 @@
+"""
+Test suite para los filtros por día con rangos semiabiertos (database.rango_dia)
+Prueba equivalencia con DATE(columna) = ? y el uso de índices (EXPLAIN QUERY PLAN)
+"""
+
+import sys
+import unittest
+from datetime import date, datetime
+
+import database
+import migraciones
+from database import filtro_rango, rango_dia, rango_fechas
+
+
+class TestRangoDia(unittest.TestCase):
+    """Tests para rango_dia, rango_fechas y filtro_rango"""
+
+    def test_rango_de_un_dia(self):
+        """Un día se convierte en [día, día siguiente)"""
+        self.assertEqual(rango_dia('2025-03-31'), ('2025-03-31', '2025-04-01'))
+        self.assertEqual(rango_dia('2024-12-31'), ('2024-12-31', '2025-01-01'))
+
+    def test_acepta_date_y_datetime(self):
+        """Acepta date/datetime además de texto"""
+        self.assertEqual(rango_dia(date(2024, 2, 28)), ('2024-02-28', '2024-02-29'))
+        self.assertEqual(rango_dia(datetime(2024, 2, 29, 23, 59)), ('2024-02-29', '2024-03-01'))
+
+    def test_sin_fecha_usa_hoy(self):
+        """Sin argumentos se usa el día local actual"""
+        self.assertEqual(rango_dia()[0], date.today().isoformat())
+
+    def test_rango_abierto(self):
+        """Los extremos None quedan abiertos"""
+        self.assertEqual(rango_fechas('2025-01-01', None), ('2025-01-01', None))
+        self.assertEqual(rango_fechas(None, '2025-01-31'), (None, '2025-02-01'))
+        self.assertEqual(filtro_rango('created_at', None, '2025-02-01'),
+                         ('created_at < ?', ['2025-02-01']))
+
+    def test_fecha_invalida(self):
+        """Formatos distintos de YYYY-MM-DD lanzan ValueError"""
+        for invalida in ('31/01/2025', '2025-02-30', 'hoy'):
+            with self.assertRaises(ValueError):
+                rango_dia(invalida)
+
+
+class TestConsultasPorDia(unittest.TestCase):
+    """Equivalencia y planes de consulta sobre un pos.db temporal"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('pos')
+
+        self.conn = database.get_db(self.db_path)
+        # Mezcla los formatos que escribe la app: CURRENT_TIMESTAMP e isoformat()
+        self.conn.executemany(
+            'INSERT INTO pedidos (estado, total, dte_tipo, created_at) VALUES (?, ?, ?, ?)',
+            [('cerrado', 10.0, '01', '2025-03-30 23:59:59'),
+             ('cerrado', 20.0, '01', '2025-03-31 00:00:00'),
+             ('cerrado', 30.0, None, '2025-03-31T12:30:00.123456'),
+             ('pagado', 40.0, '99', '2025-03-31 23:59:59'),
+             ('cerrado', 50.0, '01', '2025-04-01 00:00:00')]
+        )
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def _plan(self, sql, params):
+        return ' '.join(row['detail'] for row in self.conn.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+
+    def test_equivale_a_date(self):
+        """El rango devuelve las mismas filas que DATE(created_at) = ?"""
+        inicio, fin = rango_dia('2025-03-31')
+        por_rango = self.conn.execute(
+            "SELECT id FROM pedidos WHERE created_at >= ? AND created_at < ? ORDER BY id",
+            (inicio, fin)).fetchall()
+        por_date = self.conn.execute(
+            "SELECT id FROM pedidos WHERE DATE(created_at) = ? ORDER BY id",
+            ('2025-03-31',)).fetchall()
+        self.assertEqual([r['id'] for r in por_rango], [r['id'] for r in por_date])
+        self.assertEqual(len(por_rango), 3)
+
+    def test_ventas_del_dia_usan_indice_estado_fecha(self):
+        """Ventas cerradas del día: búsqueda por (estado, created_at)"""
+        plan = self._plan(
+            "SELECT COUNT(*), SUM(total) FROM pedidos "
+            "WHERE estado = 'cerrado' AND created_at >= ? AND created_at < ?",
+            rango_dia('2025-03-31'))
+        self.assertIn('idx_pedidos_estado_created_at (estado=? AND created_at>? AND created_at<?)', plan)
+
+    def test_desglose_por_producto_parte_de_pedidos(self):
+        """El JOIN con pedido_items arranca por el índice de pedidos del día"""
+        plan = self._plan('''
+            SELECT pi.producto_id, SUM(pi.cantidad)
+            FROM pedido_items pi
+            JOIN productos pr ON pi.producto_id = pr.id
+            JOIN pedidos p ON pi.pedido_id = p.id
+            WHERE p.estado = 'cerrado' AND p.created_at >= ? AND p.created_at < ?
+            GROUP BY pi.producto_id
+        ''', rango_dia('2025-03-31'))
+        self.assertIn('idx_pedidos_estado_created_at', plan)
+        self.assertIn('idx_pedido_items_pedido_id', plan)
+
+    def test_dtes_del_dia_usan_indice_dte_fecha(self):
+        """Facturas del día: búsqueda por (dte_tipo, created_at)"""
+        plan = self._plan(
+            "SELECT COUNT(*) FROM pedidos "
+            "WHERE dte_tipo = '01' AND created_at >= ? AND created_at < ?",
+            rango_dia('2025-03-31'))
+        self.assertIn('idx_pedidos_dte_tipo_created_at (dte_tipo=? AND created_at>? AND created_at<?)', plan)
+
+    def test_movimientos_y_extracciones_usan_indice(self):
+        """Movimientos y extracciones del día buscan por su índice de fecha"""
+        rango = rango_dia('2025-03-31')
+        plan = self._plan(
+            'SELECT COUNT(*) FROM movimientos_inventario WHERE created_at >= ? AND created_at < ?', rango)
+        self.assertIn('idx_movimientos_inventario_created_at (created_at>? AND created_at<?)', plan)
+        plan = self._plan(
+            'SELECT COUNT(*) FROM extracciones_materia_prima e WHERE e.fecha >= ? AND e.fecha < ?', rango)
+        self.assertIn('idx_extracciones_materia_prima_fecha (fecha>? AND fecha<?)', plan)
+
+    def test_date_no_es_sargable(self):
+        """Referencia: con DATE(created_at) = ? no hay búsqueda por rango"""
+        plan = self._plan('SELECT COUNT(*) FROM pedidos WHERE DATE(created_at) = ?', ('2025-03-31',))
+        self.assertNotIn('created_at>?', plan)
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestRangoDia))
+    suite.addTests(loader.loadTestsFromTestCase(TestConsultasPorDia))
+
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
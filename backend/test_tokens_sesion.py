@@ -0,0 +1,203 @@
+"""
+Test suite para los tokens de sesión firmados (tokens_sesion.py)
+Prueba firma, vencimiento, revocación entre procesos y convivencia con tokens opacos
+"""
+
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask, jsonify, request
+
+import auth
+import database
+import migraciones
+import tokens_sesion
+from cache_sesiones import CacheSesiones
+from tokens_sesion import ListaRevocacion, emitir_token, leer_token, verificar_token
+
+USUARIO = {'id': 7, 'username': 'mesero1', 'nombre': 'Mesero Uno', 'rol': 'mesero'}
+
+
+class BaseTokensTest(unittest.TestCase):
+    """Clave HMAC fija y BD de autenticación temporal"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('auth')
+
+        self.lista = ListaRevocacion(lambda: database.get_db(self.db_path), intervalo=0)
+        self.parches = [
+            mock.patch.dict(os.environ, {'AUTH_TOKENS': 'firmado', 'AUTH_TOKEN_SECRET': 'clave-de-prueba'}),
+            mock.patch.object(tokens_sesion, 'lista_revocacion', self.lista),
+        ]
+        for parche in self.parches:
+            parche.start()
+
+    def tearDown(self):
+        for parche in self.parches:
+            parche.stop()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+
+class TestTokensFirmados(BaseTokensTest):
+    """Tests para emitir_token y verificar_token"""
+
+    def test_ida_y_vuelta(self):
+        """Un token recién emitido se verifica con los datos del usuario"""
+        token, claims = emitir_token(USUARIO)
+        usuario = verificar_token(token)
+        self.assertEqual(usuario['id'], 7)
+        self.assertEqual(usuario['rol'], 'mesero')
+        self.assertEqual(usuario['jti'], claims['jti'])
+
+    def test_token_alterado(self):
+        """Cambiar el payload o la firma invalida el token"""
+        token, _ = emitir_token(USUARIO)
+        cuerpo, firma = token.split('.')
+        otro, _ = emitir_token(dict(USUARIO, rol='manager'))
+        self.assertIsNone(verificar_token(f"{otro.split('.')[0]}.{firma}"))
+        self.assertIsNone(verificar_token(f'{cuerpo}.{firma[:-2]}xx'))
+        self.assertIsNone(verificar_token('no.es-un-token'))
+
+    def test_otra_clave(self):
+        """Un token firmado con otra clave no es válido"""
+        token, _ = emitir_token(USUARIO)
+        with mock.patch.dict(os.environ, {'AUTH_TOKEN_SECRET': 'otra-clave'}):
+            self.assertIsNone(leer_token(token))
+
+    def test_vencido(self):
+        """Un token vencido no es válido"""
+        token, _ = emitir_token(USUARIO, duracion=-1)
+        self.assertIsNone(verificar_token(token))
+
+    def test_sin_clave_modo_opaco(self):
+        """Sin clave configurada el modo firmado queda desactivado"""
+        with mock.patch.dict(os.environ, {'AUTH_TOKEN_SECRET': '', 'SECRET_KEY': ''}):
+            self.assertEqual(tokens_sesion.modo_tokens(), 'opaco')
+
+
+class TestListaRevocacion(BaseTokensTest):
+    """Revocaciones escritas por un proceso y leídas por otro"""
+
+    def test_revocar_token(self):
+        """Un jti revocado deja de verificarse"""
+        token, claims = emitir_token(USUARIO)
+        conn = database.get_db(self.db_path)
+        tokens_sesion.revocar_token(conn, claims)
+        conn.commit()
+        conn.close()
+        self.assertIsNone(verificar_token(token))
+
+    def test_revocacion_desde_otro_proceso(self):
+        """Otra lista (otro worker) ve la revocación al sincronizar"""
+        token, _ = emitir_token(USUARIO)
+        otro_proceso = ListaRevocacion(lambda: database.get_db(self.db_path), intervalo=0)
+        conn = database.get_db(self.db_path)
+        with mock.patch.object(tokens_sesion, 'lista_revocacion', otro_proceso):
+            tokens_sesion.revocar_usuario(conn, USUARIO['id'])
+        conn.commit()
+        conn.close()
+
+        self.assertIsNone(verificar_token(token))
+        self.assertEqual(self.lista.estadisticas()['usuarios'], 1)
+
+    def test_tokens_posteriores_al_corte(self):
+        """Revocar un usuario no afecta a los tokens emitidos después"""
+        conn = database.get_db(self.db_path)
+        tokens_sesion.revocar_usuario(conn, USUARIO['id'])
+        conn.commit()
+        conn.close()
+        time.sleep(0.002)
+        token, _ = emitir_token(USUARIO)
+        self.assertIsNotNone(verificar_token(token))
+
+    def test_compacta_entradas_vencidas(self):
+        """Las revocaciones de tokens ya vencidos no se cargan"""
+        conn = database.get_db(self.db_path)
+        conn.execute("INSERT INTO revocaciones (jti, usuario_id, expires_at) VALUES ('viejo', 1, 1)")
+        conn.commit()
+        conn.close()
+        self.lista.sincronizar(forzar=True)
+        self.assertEqual(self.lista.estadisticas()['jtis'], 0)
+
+
+class TestAuthConTokensFirmados(BaseTokensTest):
+    """login, logout y login_required en modo firmado"""
+
+    def setUp(self):
+        super().setUp()
+        conn = database.get_db(self.db_path)
+        conn.executemany(
+            'INSERT INTO usuarios (id, username, password_hash, nombre, rol) VALUES (?, ?, ?, ?, ?)',
+            [(1, 'admin', auth.hash_password('Admin123!'), 'Admin', 'manager'),
+             (2, 'mesero', auth.hash_password('Mesero123!'), 'Mesero', 'mesero')]
+        )
+        # Sesión opaca abierta antes de cambiar de modo
+        conn.execute("INSERT INTO sesiones (usuario_id, token, expires_at) VALUES (2, 'opaco-vivo', '2999-01-01')")
+        conn.commit()
+        conn.close()
+
+        for parche in (mock.patch.object(auth, 'get_db', lambda: database.get_db(self.db_path)),
+                       mock.patch.object(auth, 'cache_sesiones', CacheSesiones(ttl=60))):
+            parche.start()
+            self.parches.append(parche)
+
+        app = Flask(__name__)
+        app.register_blueprint(auth.auth_bp, url_prefix='/api/auth')
+
+        @app.route('/protegido')
+        @auth.login_required
+        def protegido():
+            return jsonify({'usuario': request.current_user['username']})
+
+        self.client = app.test_client()
+
+    def _login(self, username, password):
+        r = self.client.post('/api/auth/login', json={'username': username, 'password': password})
+        return r.get_json()['token']
+
+    def _get(self, token):
+        return self.client.get('/protegido', headers={'Authorization': f'Bearer {token}'})
+
+    def test_login_emite_token_firmado(self):
+        """El login emite un token firmado que no requiere la BD para validarse"""
+        token = self._login('mesero', 'Mesero123!')
+        self.assertIn('.', token)
+        with mock.patch.object(auth, 'get_db', side_effect=AssertionError('consulta a la BD')):
+            self.assertEqual(self._get(token).get_json()['usuario'], 'mesero')
+
+    def test_logout_revoca(self):
+        """Tras el logout el token firmado es rechazado"""
+        token = self._login('mesero', 'Mesero123!')
+        self.client.post('/api/auth/logout', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(self._get(token).status_code, 401)
+
+    def test_desactivar_revoca(self):
+        """Desactivar al usuario revoca sus tokens firmados"""
+        token = self._login('mesero', 'Mesero123!')
+        admin = self._login('admin', 'Admin123!')
+        self.client.delete('/api/auth/usuarios/2', headers={'Authorization': f'Bearer {admin}'})
+        self.assertEqual(self._get(token).status_code, 401)
+
+    def test_sesion_opaca_sigue_valida(self):
+        """Las sesiones opacas abiertas antes del cambio de modo siguen valiendo"""
+        self.assertEqual(self._get('opaco-vivo').status_code, 200)
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestTokensFirmados))
+    suite.addTests(loader.loadTestsFromTestCase(TestListaRevocacion))
+    suite.addTests(loader.loadTestsFromTestCase(TestAuthConTokensFirmados))
+
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
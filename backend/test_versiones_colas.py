@@ -0,0 +1,178 @@
+"""
+Test suite para las versiones de las colas por rol (versiones_colas.py)
+Prueba los triggers de versión, el ETag/304 y los deltas con since_version
+"""
+
+import sys
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import database
+import migraciones
+import pos
+from indice_pedidos import IndicePedidos
+from lineas_pedido import cambiar_cantidad_linea, leer_linea
+from versiones_colas import cambios_desde, version_cola
+
+
+class TestVersionesColas(unittest.TestCase):
+    """Triggers y deltas sobre un pos.db temporal"""
+
+    def setUp(self):
+        self.db_path = migraciones.crear_bd_temporal('pos')
+
+        self.conn = database.get_db(self.db_path)
+        self.conn.execute("INSERT INTO categorias (nombre, orden) VALUES ('Pupusas', 1)")
+        self.conn.execute("INSERT INTO productos (nombre, precio, categoria_id) VALUES ('Pupusa de Queso', 0.75, 1)")
+        self.conn.commit()
+
+        self.app = Flask(__name__)
+        self.app.add_url_rule('/cola/<cola>', 'cola', pos._responder_cola)
+        self.parches = [
+            mock.patch.object(pos, 'get_db', lambda: database.get_db(self.db_path)),
+            mock.patch.object(pos, 'indice_pedidos', IndicePedidos(self.db_path)),
+        ]
+        for parche in self.parches:
+            parche.start()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        for parche in self.parches:
+            parche.stop()
+        self.conn.close()
+        migraciones.eliminar_bd_temporal(self.db_path)
+
+    def _crear_pedido(self, estado, tipo_pago='anticipado'):
+        cursor = self.conn.execute('INSERT INTO pedidos (estado, tipo_pago, total) VALUES (?, ?, 1.5)',
+                                   (estado, tipo_pago))
+        self.conn.execute('INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal) '
+                          'VALUES (?, 1, 2, 0.75, 1.5)', (cursor.lastrowid,))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def _estado(self, pedido_id, estado):
+        self.conn.execute('UPDATE pedidos SET estado = ? WHERE id = ?', (estado, pedido_id))
+        self.conn.commit()
+
+    def _version(self, cola):
+        return version_cola(self.conn.cursor(), cola)
+
+    def test_version_sube_solo_en_las_colas_afectadas(self):
+        """Un cambio de estado mueve la versión de las colas de origen y destino"""
+        pedido_id = self._crear_pedido('pagado')
+        cocina, mesero, cajero = self._version('cocina'), self._version('mesero'), self._version('cajero')
+        self.assertGreater(cocina, 0)
+
+        self._estado(pedido_id, 'listo')
+        self.assertGreater(self._version('cocina'), cocina)
+        self.assertGreater(self._version('mesero'), mesero)
+        self.assertEqual(self._version('cajero'), cajero)
+
+        # Servido con pago anticipado no entra a la cola del cajero
+        self._estado(pedido_id, 'servido')
+        self.assertEqual(self._version('cajero'), cajero)
+
+    def test_cambio_de_item_sube_la_version(self):
+        """Agregar o borrar un item de un pedido en cola cambia la versión"""
+        pedido_id = self._crear_pedido('en_cocina')
+        self._crear_pedido('en_cocina')
+        antes = self._version('cocina')
+        self.conn.execute('DELETE FROM pedido_items WHERE pedido_id = ?', (pedido_id,))
+        self.conn.commit()
+        self.assertGreater(self._version('cocina'), antes)
+
+    def test_racha_de_items_registra_un_cambio(self):
+        """Muchas líneas seguidas del mismo pedido dejan un solo cambio por cola"""
+        pedido_id = self._crear_pedido('en_cocina')
+        versiones = (self._version('cocina'), self._version('activos'))
+        self.conn.executemany('INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal) '
+                              'VALUES (?, 1, 1, 0.75, 0.75)', [(pedido_id,)] * 50)
+        self.conn.commit()
+        self.assertEqual((self._version('cocina'), self._version('activos')), versiones)
+
+        # Las rutas de items actualizan los totales del pedido, que sí registra el cambio
+        self.conn.execute('UPDATE pedidos SET total = total + 37.5 WHERE id = ?', (pedido_id,))
+        self.conn.commit()
+        self.assertGreater(self._version('cocina'), versiones[0])
+
+    def test_edicion_sin_diferencia_sube_la_version(self):
+        """Una edición que no cambia los totales igual toca el pedido y mueve la versión"""
+        pedido_id = self._crear_pedido('en_cocina')
+        antes = self._version('cocina')
+        cursor = self.conn.cursor()
+        item_id = cursor.execute('SELECT id FROM pedido_items WHERE pedido_id = ?', (pedido_id,)).fetchone()[0]
+        cambiar_cantidad_linea(cursor, pedido_id, leer_linea(cursor, pedido_id, item_id), 2)
+        self.conn.commit()
+        self.assertGreater(self._version('cocina'), antes)
+
+    def test_etag_y_304(self):
+        """Sin cambios el cliente recibe 304; tras un cambio, la lista nueva"""
+        self._crear_pedido('pagado')
+        respuesta = self.client.get('/cola/cocina')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.get_json()), 1)
+        etag = respuesta.headers['ETag']
+
+        respuesta = self.client.get('/cola/cocina', headers={'If-None-Match': etag})
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta.data, b'')
+
+        self._crear_pedido('en_mesa')
+        respuesta = self.client.get('/cola/cocina', headers={'If-None-Match': etag})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.get_json()), 2)
+        self.assertNotEqual(respuesta.headers['ETag'], etag)
+
+    def test_delta_desde_version(self):
+        """since_version devuelve insertados, actualizados y eliminados"""
+        sigue = self._crear_pedido('pagado')
+        sale = self._crear_pedido('en_cocina')
+        version = int(self.client.get('/cola/cocina').headers['X-Cola-Version'])
+
+        self._estado(sigue, 'en_cocina')
+        self._estado(sale, 'listo')
+        nuevo = self._crear_pedido('en_mesa')
+        efimero = self._crear_pedido('pagado')
+        self._estado(efimero, 'cancelado')
+
+        delta = self.client.get(f'/cola/cocina?since_version={version}').get_json()
+        self.assertFalse(delta['completo'])
+        self.assertEqual([p['id'] for p in delta['insertados']], [nuevo])
+        self.assertEqual([p['id'] for p in delta['actualizados']], [sigue])
+        self.assertEqual(delta['actualizados'][0]['estado'], 'en_cocina')
+        self.assertEqual(len(delta['actualizados'][0]['items']), 1)
+        self.assertEqual(delta['eliminados'], [sale])
+        self.assertEqual(delta['orden'], [nuevo, sigue])
+
+        vacio = self.client.get(f"/cola/cocina?since_version={delta['version']}").get_json()
+        self.assertEqual((vacio['insertados'], vacio['actualizados'], vacio['eliminados']), ([], [], []))
+
+    def test_delta_fuera_del_historial(self):
+        """Una versión recortada o futura devuelve la cola completa"""
+        self._crear_pedido('pagado')
+        version = self._version('cocina')
+        self.assertIsNone(cambios_desde(self.conn.cursor(), 'cocina', version + 5, version))
+
+        self.conn.execute('DELETE FROM cambios_colas')
+        self._crear_pedido('pagado')
+        delta = self.client.get('/cola/cocina?since_version=0').get_json()
+        self.assertTrue(delta['completo'])
+        self.assertEqual(len(delta['pedidos']), 2)
+
+        self.assertEqual(self.client.get('/cola/cocina?since_version=x').status_code, 400)
+
+
+def run_tests():
+    """Ejecuta todos los tests"""
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTests(loader.loadTestsFromTestCase(TestVersionesColas))
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_tests())
@@ -0,0 +1,256 @@
+"""
+Tokens de sesión firmados (HMAC-SHA256) y lista de revocación en memoria
+
+Con AUTH_TOKENS=firmado el login emite tokens autocontenidos:
+
+    base64url(payload JSON) + '.' + base64url(HMAC-SHA256(payload))
+
+El payload lleva id, username, nombre, rol, emisión (ms), vencimiento y un
+identificador único (jti), de modo que `login_required` verifica el token sin
+tocar SQLite y varios procesos worker pueden atender al mismo usuario sin
+compartir un almacén de sesiones. La tabla `sesiones` queda como registro de
+auditoría (guarda el jti, no el token).
+
+Lo que invalida un token antes de vencer se escribe en la tabla
+`revocaciones` de pos_database.db. Cada proceso mantiene una copia en memoria
+que aplica al instante sus propias revocaciones y lee las de otros procesos
+de forma incremental cada AUTH_REVOCACION_SYNC segundos.
+
+Migración de sesiones vivas: el modo solo decide qué tipo de token emite el
+login. `login_required` acepta ambos tipos (los tokens opacos no contienen
+'.'), así que al cambiar de modo las sesiones abiertas siguen valiendo hasta
+vencer o cerrarse, en cualquiera de los dos sentidos.
+
+La clave es AUTH_TOKEN_SECRET (o SECRET_KEY). Sin clave configurada los tokens
+firmados se desactivan y se emiten tokens opacos.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+from database import get_db_inventory
+
+DURACION_SESION = 12 * 3600  # segundos, igual que las sesiones opacas
+LONGITUD_JTI = 16  # secrets.token_urlsafe(12); los tokens opacos tienen 43
+AUTH_REVOCACION_SYNC = float(os.getenv('AUTH_REVOCACION_SYNC', '2'))
+
+
+def modo_tokens():
+    """'firmado' si está configurado y hay clave; 'opaco' en otro caso"""
+    if os.getenv('AUTH_TOKENS', 'opaco') == 'firmado' and _clave():
+        return 'firmado'
+    return 'opaco'
+
+
+def _clave():
+    """Clave HMAC (se lee en cada uso: .env puede cargarse después del import)"""
+    clave = os.getenv('AUTH_TOKEN_SECRET') or os.getenv('SECRET_KEY')
+    return clave.encode() if clave else None
+
+
+def firmas_disponibles():
+    """True si hay clave HMAC, es decir, si pueden existir tokens firmados"""
+    return _clave() is not None
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b'=').decode()
+
+
+def _desde_b64(texto):
+    return base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def _firmar(cuerpo, clave):
+    return _b64(hmac.new(clave, cuerpo.encode(), hashlib.sha256).digest())
+
+
+def es_token_firmado(token):
+    """Los tokens opacos (secrets.token_urlsafe) nunca contienen '.'"""
+    return '.' in token
+
+
+def es_jti(valor):
+    """True si un valor de `sesiones.token` es un jti y no un token opaco"""
+    return isinstance(valor, str) and len(valor) == LONGITUD_JTI
+
+
+def ahora_ms():
+    return int(time.time() * 1000)
+
+
+def emitir_token(usuario, duracion=DURACION_SESION):
+    """
+    Emite un token firmado para una fila de usuarios.
+
+    Returns:
+        tuple: (token, claims)
+    """
+    emitido = ahora_ms()
+    claims = {
+        'uid': usuario['id'],
+        'usr': usuario['username'],
+        'nom': usuario['nombre'],
+        'rol': usuario['rol'],
+        'iat': emitido,
+        'exp': emitido // 1000 + duracion,
+        'jti': secrets.token_urlsafe(12),
+    }
+    cuerpo = _b64(json.dumps(claims, separators=(',', ':'), sort_keys=True).encode())
+    return f'{cuerpo}.{_firmar(cuerpo, _clave())}', claims
+
+
+def leer_token(token):
+    """
+    Verifica firma y formato de un token, sin mirar vencimiento ni revocación.
+
+    Returns:
+        dict: claims del token, o None si no es válido
+    """
+    clave = _clave()
+    if not clave:
+        return None
+    cuerpo, _, firma = token.partition('.')
+    if not firma or not hmac.compare_digest(firma, _firmar(cuerpo, clave)):
+        return None
+    try:
+        claims = json.loads(_desde_b64(cuerpo))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(claims, dict) or not {'uid', 'rol', 'iat', 'exp', 'jti'} <= claims.keys():
+        return None
+    return claims
+
+
+def verificar_token(token):
+    """
+    Verifica un token firmado: firma, vencimiento y lista de revocación.
+
+    Returns:
+        dict: usuario con las claves que usan los handlers, o None
+    """
+    claims = leer_token(token)
+    if claims is None or claims['exp'] <= time.time():
+        return None
+    if lista_revocacion.revocado(claims):
+        return None
+    return {
+        'id': claims['uid'],
+        'username': claims.get('usr'),
+        'nombre': claims.get('nom'),
+        'rol': claims['rol'],
+        'activo': 1,
+        'jti': claims['jti'],
+    }
+
+
+class ListaRevocacion:
+    """Copia en memoria de la tabla revocaciones, sincronizada por id creciente"""
+
+    def __init__(self, obtener_conexion=get_db_inventory, intervalo=AUTH_REVOCACION_SYNC):
+        self._obtener_conexion = obtener_conexion
+        self.intervalo = intervalo
+        self._jtis = {}    # jti -> expires_at
+        self._cortes = {}  # usuario_id -> (emitidos_antes, expires_at)
+        self._ultimo_id = 0
+        self._proxima_sync = 0.0
+        self._lock = threading.Lock()
+        self.sincronizaciones = 0
+
+    def _aplicar(self, jti, usuario_id, emitidos_antes, expires_at):
+        if jti:
+            self._jtis[jti] = expires_at
+        if emitidos_antes is not None:
+            actual = self._cortes.get(usuario_id)
+            if actual is None or actual[0] < emitidos_antes:
+                self._cortes[usuario_id] = (emitidos_antes, expires_at)
+
+    def sincronizar(self, forzar=False):
+        """Lee las revocaciones nuevas de la BD (como máximo una vez por intervalo)"""
+        ahora = time.monotonic()
+        if not forzar and ahora < self._proxima_sync:
+            return
+        if not self._lock.acquire(blocking=forzar):
+            return  # Otro hilo ya está sincronizando
+        try:
+            self._proxima_sync = ahora + self.intervalo
+            epoch = int(time.time())
+            conn = self._obtener_conexion()
+            try:
+                filas = conn.execute('''
+                    SELECT id, jti, usuario_id, emitidos_antes, expires_at
+                    FROM revocaciones WHERE id > ? AND expires_at > ?
+                    ORDER BY id
+                ''', (self._ultimo_id, epoch)).fetchall()
+            finally:
+                conn.close()
+            for fila in filas:
+                self._aplicar(fila[1], fila[2], fila[3], fila[4])
+                self._ultimo_id = fila[0]
+            # Compactar: olvidar entradas cuyos tokens ya vencieron
+            self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > epoch}
+            self._cortes = {uid: c for uid, c in self._cortes.items() if c[1] > epoch}
+            self.sincronizaciones += 1
+        finally:
+            self._lock.release()
+
+    def revocado(self, claims):
+        """True si el token fue revocado por jti o por corte del usuario"""
+        self.sincronizar()
+        if claims['jti'] in self._jtis:
+            return True
+        corte = self._cortes.get(claims['uid'])
+        return corte is not None and claims['iat'] <= corte[0]
+
+    def registrar(self, jti, usuario_id, emitidos_antes, expires_at):
+        """Aplica en memoria una revocación recién escrita por este proceso"""
+        with self._lock:
+            self._aplicar(jti, usuario_id, emitidos_antes, expires_at)
+
+    def estadisticas(self):
+        return {
+            'jtis': len(self._jtis),
+            'usuarios': len(self._cortes),
+            'ultimo_id': self._ultimo_id,
+            'sincronizaciones': self.sincronizaciones,
+        }
+
+
+lista_revocacion = ListaRevocacion()
+
+
+def revocar_token(conn, claims):
+    """Revoca un token firmado concreto (logout). No hace commit."""
+    revocar_jti(conn, claims['jti'], claims['uid'], claims['exp'])
+
+
+def revocar_jti(conn, jti, usuario_id, expires_at):
+    """Revoca un jti hasta `expires_at` (epoch). No hace commit."""
+    conn.execute(
+        'INSERT INTO revocaciones (jti, usuario_id, expires_at) VALUES (?, ?, ?)',
+        (jti, usuario_id, expires_at)
+    )
+    lista_revocacion.registrar(jti, usuario_id, None, expires_at)
+
+
+def revocar_usuario(conn, usuario_id):
+    """
+    Revoca todos los tokens firmados emitidos hasta ahora para un usuario.
+    No hace commit. Sin clave configurada no puede haber tokens firmados y no
+    se escribe nada.
+    """
+    if not _clave():
+        return
+    corte = ahora_ms()
+    expires_at = corte // 1000 + DURACION_SESION
+    conn.execute(
+        'INSERT INTO revocaciones (usuario_id, emitidos_antes, expires_at) VALUES (?, ?, ?)',
+        (usuario_id, corte, expires_at)
+    )
+    lista_revocacion.registrar(None, usuario_id, corte, expires_at)
@@ -0,0 +1,114 @@
+"""
+Versiones de las colas de pedidos por rol
+
+Las pantallas de cocina, caja y meseros refrescan su cola cada pocos
+segundos. Cada cola tiene una versión que sube con cualquier cambio a un
+pedido o item que la afecta (triggers de migraciones/pos/0004), de modo que:
+
+- GET /api/pos/<rol>/pedidos responde con ETag y X-Cola-Version; con
+  If-None-Match igual a la versión actual responde 304 sin consultar pedidos.
+- ?since_version=N responde solo los pedidos insertados, actualizados y
+  eliminados de la cola desde N. Si N ya no está en el historial (o es de
+  otra BD) responde la cola completa con `completo: true`.
+
+La versión vive en pos.db, así que vale igual en todos los workers.
+"""
+
+# Pedidos de cada cola y su orden en pantalla, aplicados al índice en memoria
+# (indice_pedidos.py). Mismas reglas que la tabla colas_estados de los triggers.
+_ORDEN_COCINA = {'pagado': 1, 'en_mesa': 2, 'en_cocina': 3}
+
+COLAS = {
+    # pagado, en_mesa, en_cocina; por estado y antigüedad
+    'cocina': {
+        'incluye': lambda p: p['estado'] in _ORDEN_COCINA,
+        'clave': lambda p: (_ORDEN_COCINA[p['estado']], _texto(p['created_at']), p['id']),
+    },
+    # pendiente_pago y servidos por pagar al final; primero los servidos
+    'cajero': {
+        'incluye': lambda p: (p['estado'] == 'pendiente_pago'
+                              or (p['estado'] == 'servido' and p['tipo_pago'] == 'al_final')),
+        'clave': lambda p: (0 if p['estado'] == 'servido' else 1, _texto(p['created_at']), p['id']),
+    },
+    # listos para servir, por hora de listo
+    'mesero': {
+        'incluye': lambda p: p['estado'] == 'listo',
+        'clave': lambda p: (_texto(p['listo_at']), p['id']),
+    },
+}
+
+
+def _texto(valor):
+    """Clave de orden como en SQLite: NULL antes que cualquier texto"""
+    return (valor is not None, valor or '')
+
+
+def version_cola(cursor, cola):
+    """Versión actual de una cola (0 si nunca cambió)"""
+    cursor.execute('SELECT version FROM versiones_colas WHERE cola = ?', (cola,))
+    fila = cursor.fetchone()
+    return fila[0] if fila else 0
+
+
+def etag_cola(cola, version):
+    """ETag de la cola completa en una versión"""
+    return f'{cola}-{version}'
+
+
+def cambios_desde(cursor, cola, desde, version):
+    """
+    Primer cambio de cada pedido de la cola entre `desde` y `version`.
+
+    Args:
+        cursor: Cursor de pos.db
+        cola: 'cocina', 'cajero' o 'mesero'
+        desde: Versión que tiene el cliente
+        version: Versión actual (leída antes)
+
+    Returns:
+        dict: {pedido_id: 'entra' | 'sale' | 'cambia'}, o None si el
+        historial ya no alcanza a `desde` y hay que enviar la cola completa
+    """
+    if desde > version or desde < 0:
+        return None
+    if desde == version:
+        return {}
+
+    # El recorte borra las filas más viejas: si falta alguna posterior a `desde`
+    # el cliente debe recargar la cola completa
+    cursor.execute('SELECT MIN(id) FROM cambios_colas')
+    minimo = cursor.fetchone()[0]
+    if minimo is None or desde < minimo - 1:
+        return None
+
+    cursor.execute('''
+        SELECT pedido_id, accion FROM cambios_colas
+        WHERE cola = ? AND id > ? AND id <= ?
+        ORDER BY id
+    ''', (cola, desde, version))
+    primeros = {}
+    for pedido_id, accion in cursor.fetchall():
+        primeros.setdefault(pedido_id, accion)
+    return primeros
+
+
+def clasificar_cambios(primeros, pedidos_en_cola):
+    """
+    Separa los pedidos cambiados en insertados, actualizados y eliminados.
+
+    Args:
+        primeros: Resultado de cambios_desde()
+        pedidos_en_cola: Pedidos cambiados que siguen en la cola (dicts con 'id')
+
+    Returns:
+        tuple: (insertados, actualizados, ids eliminados)
+    """
+    presentes = {pedido['id'] for pedido in pedidos_en_cola}
+    insertados = [p for p in pedidos_en_cola if primeros.get(p['id']) == 'entra']
+    actualizados = [p for p in pedidos_en_cola if primeros.get(p['id']) != 'entra']
+    # Un pedido que entró y salió después de `desde` nunca llegó al cliente
+    eliminados = sorted(
+        pedido_id for pedido_id, accion in primeros.items()
+        if pedido_id not in presentes and accion != 'entra'
+    )
+    return insertados, actualizados, eliminados
@@ -20,12 +20,19 @@ class ClienteNotificaciones {
         // Polling solo como fallback - intervalo más largo para evitar saturación
         this.intervaloPolling = opciones.intervaloPolling || 30000; // 30 segundos (antes 3s)
         this.idIntervalo = null;
+        // Último número de secuencia recibido por polling (cursor `since`)
+        this.ultimoSeq = null;
+        // Long polling: el servidor retiene la petición hasta que hay eventos
+        this.longPolling = opciones.longPolling !== false;
+        this.esperaLongPolling = opciones.esperaLongPolling || 25; // segundos
+        this.abortPolling = null;
 
         // Event handlers
         this.handlers = {
             'evento_pedido': [],
             'evento_alerta': [],
             'conexion_confirmada': [],
+            'resincronizar': [],
             'error': []
         };
 
@@ -59,11 +66,7 @@ class ClienteNotificaciones {
             this.websocketActivo = false;
         }
 
-        if (this.idIntervalo) {
-            clearInterval(this.idIntervalo);
-            this.idIntervalo = null;
-            this.pollingActivo = false;
-        }
+        this._detenerPolling();
     }
 
     /**
@@ -179,10 +182,8 @@ class ClienteNotificaciones {
             this.websocketActivo = true;
 
             // ===== DETENER POLLING SI ESTABA ACTIVO =====
-            if (this.pollingActivo && this.idIntervalo) {
-                clearInterval(this.idIntervalo);
-                this.idIntervalo = null;
-                this.pollingActivo = false;
+            if (this.pollingActivo) {
+                this._detenerPolling();
                 this.log('Polling detenido - WebSocket activo');
             }
 
@@ -209,6 +210,17 @@ class ClienteNotificaciones {
             this._ejecutarHandlers('evento_alerta', evento);
         });
 
+        // Ráfagas de eventos que el servidor agrupa en un solo frame por sala
+        this.socket.on('eventos_lote', (lote) => {
+            const eventos = (lote && lote.eventos) || [];
+            this.log(`Lote recibido: ${eventos.length} evento(s)`);
+            eventos.forEach(({ evento, datos }) => {
+                if (evento === 'evento_pedido' || evento === 'evento_alerta') {
+                    this._ejecutarHandlers(evento, datos);
+                }
+            });
+        });
+
         this.socket.on('disconnect', () => {
             this.log('Desconectado del servidor WebSocket');
             this.websocketActivo = false;
@@ -242,9 +254,16 @@ class ClienteNotificaciones {
     _iniciarPolling() {
         if (this.pollingActivo) return;
 
-        this.log(`Iniciando polling cada ${this.intervaloPolling}ms`);
         this.pollingActivo = true;
 
+        if (this.longPolling) {
+            this.log(`Iniciando long polling (espera ${this.esperaLongPolling}s)`);
+            this._cicloLongPolling();
+            return;
+        }
+
+        this.log(`Iniciando polling cada ${this.intervaloPolling}ms`);
+
         // Obtener eventos iniciales
         this._obtenerEventosPolling();
 
@@ -254,16 +273,63 @@ class ClienteNotificaciones {
         }, this.intervaloPolling);
     }
 
+    /**
+     * Detiene el polling (periódico o long polling) y cancela la petición en curso
+     */
+    _detenerPolling() {
+        this.pollingActivo = false;
+        if (this.idIntervalo) {
+            clearInterval(this.idIntervalo);
+            clearTimeout(this.idIntervalo);
+            this.idIntervalo = null;
+        }
+        if (this.abortPolling) {
+            this.abortPolling.abort();
+            this.abortPolling = null;
+        }
+    }
+
+    /**
+     * Long polling: encadena peticiones que el servidor retiene hasta que hay
+     * eventos. Tras un error o si el servidor está saturado espera el
+     * intervalo normal antes de reintentar.
+     */
+    _cicloLongPolling() {
+        if (!this.pollingActivo) return;
+
+        this._obtenerEventosPolling(this.esperaLongPolling).then(datos => {
+            if (!this.pollingActivo) return;
+            const inmediato = datos && !datos.error && !datos.saturado;
+            this.idIntervalo = setTimeout(() => {
+                this._cicloLongPolling();
+            }, inmediato ? 0 : this.intervaloPolling);
+        });
+    }
+
     /**
      * Obtiene eventos mediante polling (HTTP GET)
+     *
+     * @param {number} espera - Segundos de long polling (0 = respuesta inmediata)
+     * @returns {Promise<Object|undefined>} Respuesta del servidor
      */
-    _obtenerEventosPolling() {
-        fetch(`/api/notificaciones/polling/${this.rol}`, {
+    _obtenerEventosPolling(espera = 0) {
+        const params = new URLSearchParams();
+        if (this.ultimoSeq !== null) {
+            params.set('since', this.ultimoSeq);
+            // Sin cursor no hay nada que esperar: la primera petición es inmediata
+            if (espera > 0) params.set('wait', espera);
+        }
+        const query = params.toString() ? `?${params}` : '';
+
+        this.abortPolling = typeof AbortController !== 'undefined' ? new AbortController() : null;
+
+        return fetch(`/api/notificaciones/polling/${this.rol}${query}`, {
             method: 'GET',
             headers: {
                 'Content-Type': 'application/json'
             },
-            credentials: 'include'
+            credentials: 'include',
+            signal: this.abortPolling ? this.abortPolling.signal : undefined
         })
             .then(response => {
                 if (response.status === 401) {
@@ -274,14 +340,27 @@ class ClienteNotificaciones {
                 return response.json();
             })
             .then(datos => {
-                if (datos && datos.eventos && datos.eventos.length > 0) {
+                if (!datos) return;
+
+                // Se perdieron eventos (buffer lleno o reinicio): recargar el estado completo
+                if (datos.perdidos && this.ultimoSeq !== null) {
+                    this.log('Eventos perdidos, solicitando resincronización', 'error');
+                    this._ejecutarHandlers('resincronizar', { ultimo_seq: datos.ultimo_seq });
+                }
+                if (typeof datos.ultimo_seq === 'number') {
+                    this.ultimoSeq = datos.ultimo_seq;
+                }
+
+                if (datos.eventos && datos.eventos.length > 0) {
                     this.log(`${datos.eventos.length} evento(s) recibido(s) por polling`);
                     datos.eventos.forEach(evento => {
                         this._procesarEvento(evento);
                     });
                 }
+                return datos;
             })
             .catch(err => {
+                if (err.name === 'AbortError') return;
                 this.log(`Error en polling: ${err.message}`, 'error');
             });
     }